@@ -24,8 +24,7 @@ from PyQt6.QtGui import QColor
 # --- SQLAlchemy and OpenPyXL Imports ---
 from sqlalchemy import text
 from sqlalchemy.engine import Engine
-from openpyxl.utils import get_column_letter
-from openpyxl.worksheet.worksheet import Worksheet
+from excel_export import DataFrameSheet, start_excel_export
 
 # --- UI CONSTANTS (Assuming they are shared) ---
 PRIMARY_ACCENT_COLOR = "#007bff"
@@ -399,27 +398,6 @@ class InventoryAuditSummaryPage(QWidget):
             QMessageBox.warning(self, "Audit Warning",
                                 f"{error_count} lots flagged with audit errors (Negative running balance detected).")
 
-    def _format_excel_sheet(self, worksheet: Worksheet, df: pd.DataFrame):
-        # Format numeric columns (3rd column onwards typically)
-
-        # Helper function to auto-size and format currency
-        def setup_column(col_idx, num_format=None):
-            column_letter = get_column_letter(col_idx)
-            max_length = max(df.iloc[:, col_idx - 1].astype(str).map(len).max(), len(df.columns[col_idx - 1])) + 2
-            worksheet.column_dimensions[column_letter].width = max_length
-            if num_format:
-                for cell in worksheet[column_letter][1:]:
-                    cell.number_format = num_format
-
-        # Format columns based on their index (1-based)
-        for i in range(3, 8):
-            setup_column(i, '#,##0.00')
-
-        # Auto-size remaining columns
-        setup_column(1)
-        setup_column(2)
-        setup_column(8)
-
     def _export_to_excel(self):
         if self.current_audit_df.empty:
             QMessageBox.information(self, "Export Failed", "No audit data to export.")
@@ -429,33 +407,30 @@ class InventoryAuditSummaryPage(QWidget):
         filepath, _ = QFileDialog.getSaveFileName(self, "Save Audit Report", default_filename, "Excel Files (*.xlsx)")
 
         if filepath:
-            try:
-                export_df = self.current_audit_df.rename(
-                    columns={
-                        'product_code': 'PRODUCT_CODE',
-                        'lot_number': 'LOT_NUMBER',
-                        'final_balance': 'FINAL_BALANCE_QTY',
-                        'total_in': 'TOTAL_IN_QTY',
-                        'total_out': 'TOTAL_OUT_QTY',
-                        'calculated_difference': 'BALANCE_CHECK_DIFF',
-                        'minimum_running_balance': 'MIN_RUNNING_BALANCE',
-                        'audit_status': 'AUDIT_STATUS'
-                    }
-                )
-
-                # Reorder columns slightly for Excel readability
-                final_cols = ['PRODUCT_CODE', 'LOT_NUMBER', 'FINAL_BALANCE_QTY', 'TOTAL_IN_QTY', 'TOTAL_OUT_QTY',
-                              'BALANCE_CHECK_DIFF', 'MIN_RUNNING_BALANCE', 'AUDIT_STATUS']
-
-                with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-                    export_df[final_cols].to_excel(writer, index=False, sheet_name='Audit Summary')
-                    self._format_excel_sheet(writer.sheets['Audit Summary'], export_df[final_cols])
-
-                filename = os.path.basename(filepath)
-                self.log_audit_trail("EXPORT_AUDIT_SUMMARY", f"User exported audit summary report to '{filename}'.")
-                QMessageBox.information(self, "Export Successful", f"Audit data exported to:\n{filename}")
-            except Exception:
-                show_error_message(self, "Export Error", "Failed to save file.", traceback.format_exc())
+            export_df = self.current_audit_df.rename(
+                columns={
+                    'product_code': 'PRODUCT_CODE',
+                    'lot_number': 'LOT_NUMBER',
+                    'final_balance': 'FINAL_BALANCE_QTY',
+                    'total_in': 'TOTAL_IN_QTY',
+                    'total_out': 'TOTAL_OUT_QTY',
+                    'calculated_difference': 'BALANCE_CHECK_DIFF',
+                    'minimum_running_balance': 'MIN_RUNNING_BALANCE',
+                    'audit_status': 'AUDIT_STATUS'
+                }
+            )
+
+            # Reorder columns slightly for Excel readability
+            final_cols = ['PRODUCT_CODE', 'LOT_NUMBER', 'FINAL_BALANCE_QTY', 'TOTAL_IN_QTY', 'TOTAL_OUT_QTY',
+                          'BALANCE_CHECK_DIFF', 'MIN_RUNNING_BALANCE', 'AUDIT_STATUS']
+            sheet = DataFrameSheet('Audit Summary', export_df[final_cols], number_columns=final_cols[2:7])
+            start_excel_export(self, filepath, [sheet], self._on_export_finished,
+                               lambda message, details: show_error_message(self, "Export Error", message, details))
+
+    def _on_export_finished(self, filepath: str, counts: dict):
+        filename = os.path.basename(filepath)
+        self.log_audit_trail("EXPORT_AUDIT_SUMMARY", f"User exported audit summary report to '{filename}'.")
+        QMessageBox.information(self, "Export Successful", f"Audit data exported to:\n{filename}")
 
 # Note: For this to run, the caller application needs to instantiate this InventoryAuditSummaryPage
 # and pass the required engine, username, and log function.
\ No newline at end of file
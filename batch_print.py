@@ -0,0 +1,205 @@
+import traceback
+
+import qtawesome as fa
+from PyQt6.QtCore import Qt, QDate, QSizeF, QThread, QObject, pyqtSignal
+from PyQt6.QtGui import QPageSize
+from PyQt6.QtPrintSupport import QPrinter, QPrintPreviewDialog
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QDateEdit, QCheckBox, QPushButton,
+                             QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView, QProgressBar,
+                             QMessageBox)
+from sqlalchemy import text
+
+from pdf_render import paint_pdf, release_pdf
+from print_documents import DOC_DR, DOC_RRF, DOC_RR, DOCUMENT_SOURCES, load_print_jobs, render_spool_pdf
+
+# (title, date column, party column, page size in inches, page size name)
+BATCH_DOCUMENTS = {
+    DOC_DR: ("Delivery Receipts", 'delivery_date', 'customer_name', (8.5, 6.5), "Delivery Receipt (Landscape 8.5x6.5)"),
+    DOC_RRF: ("RRF Forms", 'rrf_date', 'customer_name', (8.5, 5.5), "RRF Form"),
+    DOC_RR: ("Receiving Reports", 'receive_date', 'receive_from', (8.5, 5.5), "RRRG Form"),
+}
+
+
+class BatchPrintWorker(QObject):
+    """Loads the selected documents in bulk and renders them into one spool PDF in a process pool."""
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(object, list)
+    error = pyqtSignal(str, str)
+
+    def __init__(self, engine, doc_type: str, doc_nos: list):
+        super().__init__()
+        self.engine = engine
+        self.doc_type = doc_type
+        self.doc_nos = doc_nos
+
+    def run(self):
+        try:
+            with self.engine.connect() as conn:
+                jobs = load_print_jobs(conn, self.doc_type, self.doc_nos)
+            spool = render_spool_pdf(jobs, progress_callback=self.progress.emit)
+            self.finished.emit(spool, [job[1] for job in jobs])
+        except Exception:
+            self.error.emit("Batch PDF generation failed.", traceback.format_exc())
+
+
+class BatchPrintDialog(QDialog):
+    """Picks the documents for a date range and prints them as a single merged job."""
+
+    def __init__(self, engine, username, log_audit_trail_func, doc_type: str, parent=None):
+        super().__init__(parent)
+        self.engine = engine
+        self.username = username
+        self.log_audit_trail = log_audit_trail_func
+        self.doc_type = doc_type
+        self.title, self.date_column, self.party_column, page_inches, self.page_name = BATCH_DOCUMENTS[doc_type]
+        self.primary_table, _, self.key_column, _, _ = DOCUMENT_SOURCES[doc_type]
+        self.page_inches = page_inches
+        self.printer = QPrinter()
+        self.worker_thread = None
+        self.worker = None
+        self.spool_buffer = None
+
+        self.setWindowTitle(f"Batch Print {self.title}")
+        self.setMinimumSize(640, 520)
+        layout = QVBoxLayout(self)
+
+        filter_layout = QHBoxLayout()
+        self.date_from = QDateEdit(QDate.currentDate(), calendarPopup=True, displayFormat="yyyy-MM-dd")
+        self.date_to = QDateEdit(QDate.currentDate(), calendarPopup=True, displayFormat="yyyy-MM-dd")
+        self.unprinted_only_check = QCheckBox("Unprinted only")
+        self.unprinted_only_check.setChecked(True)
+        load_btn = QPushButton(fa.icon('fa5s.search'), " Load")
+        filter_layout.addWidget(QLabel("From:"))
+        filter_layout.addWidget(self.date_from)
+        filter_layout.addWidget(QLabel("To:"))
+        filter_layout.addWidget(self.date_to)
+        filter_layout.addWidget(self.unprinted_only_check)
+        filter_layout.addStretch()
+        filter_layout.addWidget(load_btn)
+        layout.addLayout(filter_layout)
+
+        self.table = QTableWidget(0, 4)
+        self.table.setHorizontalHeaderLabels(["Print", "No.", "Date", "Customer"])
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.horizontalHeader().setSectionResizeMode(3, QHeaderView.ResizeMode.Stretch)
+        layout.addWidget(self.table)
+
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setVisible(False)
+        layout.addWidget(self.progress_bar)
+
+        button_layout = QHBoxLayout()
+        self.status_label = QLabel("")
+        self.print_btn = QPushButton(fa.icon('fa5s.print'), " Generate && Print")
+        close_btn = QPushButton("Close")
+        button_layout.addWidget(self.status_label, 1)
+        button_layout.addWidget(self.print_btn)
+        button_layout.addWidget(close_btn)
+        layout.addLayout(button_layout)
+
+        load_btn.clicked.connect(self._load_documents)
+        self.print_btn.clicked.connect(self._start_batch)
+        close_btn.clicked.connect(self.reject)
+        self._load_documents()
+
+    def _load_documents(self):
+        query = (f"SELECT {self.key_column} AS doc_no, {self.date_column} AS doc_date, {self.party_column} AS party "
+                 f"FROM {self.primary_table} WHERE is_deleted IS NOT TRUE "
+                 f"AND {self.date_column} BETWEEN :start AND :end")
+        if self.unprinted_only_check.isChecked():
+            query += " AND is_printed IS NOT TRUE"
+        query += f" ORDER BY {self.key_column}"
+        params = {"start": self.date_from.date().toPyDate(), "end": self.date_to.date().toPyDate()}
+        try:
+            with self.engine.connect() as conn:
+                rows = conn.execute(text(query), params).mappings().all()
+        except Exception as e:
+            QMessageBox.critical(self, "Database Error", f"Could not load documents: {e}")
+            return
+        self.table.setRowCount(len(rows))
+        for row_idx, row in enumerate(rows):
+            check_item = QTableWidgetItem()
+            check_item.setFlags(Qt.ItemFlag.ItemIsUserCheckable | Qt.ItemFlag.ItemIsEnabled)
+            check_item.setCheckState(Qt.CheckState.Checked)
+            self.table.setItem(row_idx, 0, check_item)
+            self.table.setItem(row_idx, 1, QTableWidgetItem(str(row['doc_no'])))
+            self.table.setItem(row_idx, 2, QTableWidgetItem(str(row['doc_date'] or '')))
+            self.table.setItem(row_idx, 3, QTableWidgetItem(row['party'] or ''))
+        self.table.resizeColumnsToContents()
+        self.status_label.setText(f"{len(rows)} document(s) found.")
+
+    def _checked_doc_nos(self) -> list:
+        return [self.table.item(r, 1).text() for r in range(self.table.rowCount())
+                if self.table.item(r, 0).checkState() == Qt.CheckState.Checked]
+
+    def _start_batch(self):
+        doc_nos = self._checked_doc_nos()
+        if not doc_nos:
+            QMessageBox.warning(self, "Nothing Selected", "Tick at least one document to print.")
+            return
+        if self.worker_thread and self.worker_thread.isRunning(): return
+        self.print_btn.setEnabled(False)
+        self.progress_bar.setRange(0, len(doc_nos))
+        self.progress_bar.setValue(0)
+        self.progress_bar.setVisible(True)
+        self.status_label.setText(f"Generating {len(doc_nos)} document(s)...")
+
+        self.worker_thread = QThread()
+        self.worker = BatchPrintWorker(self.engine, self.doc_type, doc_nos)
+        self.worker.moveToThread(self.worker_thread)
+        self.worker_thread.started.connect(self.worker.run)
+        self.worker.progress.connect(lambda done, total: self.progress_bar.setValue(done))
+        self.worker.finished.connect(self._on_spool_ready)
+        self.worker.error.connect(self._on_batch_error)
+        self.worker.finished.connect(self.worker_thread.quit)
+        self.worker.error.connect(self.worker_thread.quit)
+        self.worker_thread.finished.connect(self.worker.deleteLater)
+        self.worker_thread.finished.connect(self.worker_thread.deleteLater)
+        self.worker_thread.finished.connect(self._reset_thread_state)
+        self.worker_thread.start()
+
+    def _reset_thread_state(self):
+        self.worker_thread = None
+        self.worker = None
+        self.print_btn.setEnabled(True)
+        self.progress_bar.setVisible(False)
+
+    def _on_batch_error(self, message: str, detailed_traceback: str):
+        print(detailed_traceback)
+        self.status_label.setText("")
+        QMessageBox.critical(self, "PDF Generation Error", message)
+
+    def _on_spool_ready(self, spool_buffer, printed_nos: list):
+        self.status_label.setText(f"{len(printed_nos)} document(s) ready.")
+        self.spool_buffer = spool_buffer
+        width, height = self.page_inches
+        self.printer.setPageSize(QPageSize(QSizeF(width, height), QPageSize.Unit.Inch, self.page_name))
+        self.printer.setFullPage(True)
+        preview = QPrintPreviewDialog(self.printer, self)
+        preview.paintRequested.connect(self._handle_paint_request)
+        preview.resize(1000, 800)
+        accepted = preview.exec()
+        release_pdf(self.spool_buffer)
+        self.spool_buffer = None
+        if accepted:
+            self._mark_printed(printed_nos)
+
+    def _handle_paint_request(self, printer: QPrinter):
+        if not self.spool_buffer: return
+        try:
+            paint_pdf(printer, self.spool_buffer, print_dpi=600 if self.doc_type == DOC_DR else 300)
+        except Exception as e:
+            QMessageBox.critical(self, "Print Error", f"An error occurred during printing: {e}")
+
+    def _mark_printed(self, doc_nos: list):
+        try:
+            with self.engine.connect() as conn, conn.begin():
+                conn.execute(text(f"UPDATE {self.primary_table} SET is_printed = TRUE "
+                                  f"WHERE {self.key_column} = ANY(:nos)"), {"nos": doc_nos})
+            self.log_audit_trail(f"BATCH_PRINT_{self.doc_type}",
+                                 f"Batch printed {len(doc_nos)} {self.doc_type}(s): {', '.join(doc_nos)}")
+            self._load_documents()
+        except Exception as e:
+            QMessageBox.critical(self, "Database Error", f"Could not mark documents as printed: {e}")
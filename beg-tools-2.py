@@ -9,6 +9,8 @@ from PyQt6.QtCore import QThread, pyqtSignal
 from PyQt6.QtGui import QFont
 import os
 
+from lot_ranges import expand_lot_ranges
+
 
 class ExcelProcessor(QThread):
     progress_updated = pyqtSignal(int)
@@ -87,120 +89,13 @@ class ExcelProcessor(QThread):
 
     def process_dataframe(self, df):
         """Process a dataframe to expand lot number ranges, including BOX_NUMBER if present."""
-        processed_rows = []
-        has_box_number = 'BOX_NUMBER' in df.columns  # Check for BOX_NUMBER presence
-
-        for _, row in df.iterrows():
-            lot_number = str(row['LOT_NUMBER'])
-            quantity = row['QTY']
-            product_code = row['PRODUCT_CODE']
-            location = row['LOCATION']
-
-            box_number = row['BOX_NUMBER'] if has_box_number else None  # Extract Box Number
-
-            # Check if lot_number contains a range (contains '-')
-            if '-' in lot_number and not lot_number.endswith('-'):
-                try:
-                    # Pass BOX NUMBER info to range processing
-                    range_result = self.process_lot_range(
-                        lot_number, quantity, product_code, location, box_number, has_box_number
-                    )
-                    if range_result:
-                        processed_rows.extend(range_result)
-                    else:
-                        # Keep original if processing failed
-                        row_data = {
-                            'PRODUCT_CODE': product_code,
-                            'LOT_NUMBER': lot_number,
-                            'QTY': round(float(quantity), 2),
-                            'LOCATION': location
-                        }
-                        if has_box_number:
-                            row_data['BOX_NUMBER'] = box_number
-                        processed_rows.append(row_data)
-                except Exception:
-                    # Keep original if any error occurs
-                    row_data = {
-                        'PRODUCT_CODE': product_code,
-                        'LOT_NUMBER': lot_number,
-                        'QTY': round(float(quantity), 2),
-                        'LOCATION': location
-                    }
-                    if has_box_number:
-                        row_data['BOX_NUMBER'] = box_number
-                    processed_rows.append(row_data)
-            else:
-                # Not a range, keep as is
-                row_data = {
-                    'PRODUCT_CODE': product_code,
-                    'LOT_NUMBER': lot_number,
-                    'QTY': round(float(quantity), 2),
-                    'LOCATION': location
-                }
-                if has_box_number:
-                    row_data['BOX_NUMBER'] = box_number
-                processed_rows.append(row_data)
-
-        result_df = pd.DataFrame(processed_rows)
-        # Ensure all QTY values have exactly 2 decimal places
-        if 'QTY' in result_df.columns:
-            result_df['QTY'] = result_df['QTY'].round(2)
-
-        # Define the target column order
+        if df.empty:
+            return pd.DataFrame()
+        # Box number is carried over identically for all expanded lot numbers
         final_cols = ['PRODUCT_CODE', 'LOT_NUMBER', 'QTY', 'LOCATION']
-        if has_box_number:
+        if 'BOX_NUMBER' in df.columns:
             final_cols.append('BOX_NUMBER')
-
-        # Filter existing columns and reindex
-        if not result_df.empty:
-            existing_cols = [col for col in final_cols if col in result_df.columns]
-            result_df = result_df.reindex(columns=existing_cols, fill_value='')
-
-        return result_df
-
-    def process_lot_range(self, lot_range, total_qty, product_code, location, box_number, has_box_number):
-        """Process a single lot number range, incorporating box number if available."""
-        range_parts = lot_range.split('-')
-        if len(range_parts) != 2:
-            return None
-
-        start_lot = range_parts[0].strip()
-        end_lot = range_parts[1].strip()
-
-        # Extract numeric and suffix parts
-        start_num = ''.join(filter(str.isdigit, start_lot))
-        start_suffix = ''.join(filter(str.isalpha, start_lot))
-
-        end_num = ''.join(filter(str.isdigit, end_lot))
-        end_suffix = ''.join(filter(str.isalpha, end_lot))
-
-        # Verify suffixes match and numbers are valid
-        if start_suffix == end_suffix and start_num and end_num:
-            start_num = int(start_num)
-            end_num = int(end_num)
-
-            if start_num <= end_num:
-                total_items = end_num - start_num + 1
-                qty_per_item = total_qty / total_items
-
-                # Create individual entries
-                result = []
-                for i in range(total_items):
-                    current_num = start_num + i
-                    new_lot_number = f"{current_num}{start_suffix}"
-
-                    row_data = {
-                        'PRODUCT_CODE': product_code,
-                        'LOT_NUMBER': new_lot_number,
-                        'QTY': round(qty_per_item, 2),
-                        'LOCATION': location
-                    }
-                    if has_box_number:
-                        # Box number is carried over identically for all expanded lot numbers
-                        row_data['BOX_NUMBER'] = box_number
-
-                    result.append(row_data)
-                return result
+        return expand_lot_ranges(df[final_cols])
 
 
 class ExcelTableWidget(QTableWidget):
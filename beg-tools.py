@@ -9,6 +9,8 @@ from PyQt6.QtCore import QThread, pyqtSignal
 from PyQt6.QtGui import QFont
 import os
 
+from lot_ranges import expand_lot_ranges
+
 
 class ExcelProcessor(QThread):
     progress_updated = pyqtSignal(int)
@@ -87,92 +89,9 @@ class ExcelProcessor(QThread):
 
     def process_dataframe(self, df):
         """Process a dataframe to expand lot number ranges"""
-        processed_rows = []
-
-        for _, row in df.iterrows():
-            lot_number = str(row['LOT_NUMBER'])
-            quantity = row['QTY']
-            product_code = row['PRODUCT_CODE']
-            location = row['LOCATION']
-
-            # Check if lot_number contains a range (contains '-')
-            if '-' in lot_number and not lot_number.endswith('-'):
-                try:
-                    range_result = self.process_lot_range(lot_number, quantity, product_code, location)
-                    if range_result:
-                        processed_rows.extend(range_result)
-                    else:
-                        # Keep original if processing failed
-                        processed_rows.append({
-                            'PRODUCT_CODE': product_code,
-                            'LOT_NUMBER': lot_number,
-                            'QTY': round(float(quantity), 2),  # 2 decimal places
-                            'LOCATION': location
-                        })
-                except Exception:
-                    # Keep original if any error occurs
-                    processed_rows.append({
-                        'PRODUCT_CODE': product_code,
-                        'LOT_NUMBER': lot_number,
-                        'QTY': round(float(quantity), 2),  # 2 decimal places
-                        'LOCATION': location
-                    })
-            else:
-                # Not a range, keep as is
-                processed_rows.append({
-                    'PRODUCT_CODE': product_code,
-                    'LOT_NUMBER': lot_number,
-                    'QTY': round(float(quantity), 2),  # 2 decimal places
-                    'LOCATION': location
-                })
-
-        result_df = pd.DataFrame(processed_rows)
-        # Ensure all QTY values have exactly 2 decimal places
-        if 'QTY' in result_df.columns:
-            result_df['QTY'] = result_df['QTY'].round(2)
-        return result_df
-
-    def process_lot_range(self, lot_range, total_qty, product_code, location):
-        """Process a single lot number range - FIXED to keep letters at the back"""
-        range_parts = lot_range.split('-')
-        if len(range_parts) != 2:
-            return None
-
-        start_lot = range_parts[0].strip()  # e.g., "8048X"
-        end_lot = range_parts[1].strip()  # e.g., "8051X"
-
-        # Extract numeric and suffix parts - FIXED LOGIC
-        # Get numeric prefix (all digits from start)
-        start_num = ''.join(filter(str.isdigit, start_lot))  # "8048"
-        # Get alpha suffix (all letters from end)
-        start_suffix = ''.join(filter(str.isalpha, start_lot))  # "X"
-
-        end_num = ''.join(filter(str.isdigit, end_lot))  # "8051"
-        end_suffix = ''.join(filter(str.isalpha, end_lot))  # "X"
-
-        # Verify suffixes match and numbers are valid
-        if start_suffix == end_suffix and start_num and end_num:
-            start_num = int(start_num)  # 8048
-            end_num = int(end_num)  # 8051
-
-            if start_num <= end_num:
-                total_items = end_num - start_num + 1  # 4 items
-                qty_per_item = total_qty / total_items  # 200 / 4 = 50
-
-                # Create individual entries - KEEP LETTERS AT THE BACK
-                result = []
-                for i in range(total_items):
-                    current_num = start_num + i  # 8048, 8049, 8050, 8051
-                    # Format: number first, then suffix (letters at back)
-                    new_lot_number = f"{current_num}{start_suffix}"  # "8048X", "8049X", "8050X", "8051X"
-
-                    result.append({
-                        'PRODUCT_CODE': product_code,
-                        'LOT_NUMBER': new_lot_number,
-                        'QTY': round(qty_per_item, 2),  # 50.00
-                        'LOCATION': location
-                    })
-                return result
+        if df.empty:
+            return pd.DataFrame()
+        return expand_lot_ranges(df[['PRODUCT_CODE', 'LOT_NUMBER', 'QTY', 'LOCATION']])
 
 
 class ExcelTableWidget(QTableWidget):
@@ -3,14 +3,16 @@
 import sys
 import traceback
 from decimal import Decimal, InvalidOperation
-from PyQt6.QtCore import Qt, QDate, QSize
+from PyQt6.QtCore import Qt, QDate, QSize, QThread
 from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit,
                              QPushButton, QTableWidget, QTableWidgetItem, QHeaderView,
                              QMessageBox, QGroupBox, QGridLayout, QAbstractItemView,
-                             QDateEdit, QDoubleSpinBox, QComboBox, QFrame)
+                             QDateEdit, QDoubleSpinBox, QComboBox, QFrame, QProgressBar)
 from sqlalchemy import text, Engine
 import qtawesome as fa
 
+from beginning_import import BeginningImportDialog, BeginningImportWorker
+
 # --- UI CONSTANTS (Copied from good_inventory_page.py for consistency) ---
 PRIMARY_ACCENT_COLOR = "#007bff"
 NEUTRAL_COLOR = "#6c757d"
@@ -44,6 +46,8 @@ class BeginningBalancePage(QWidget):
         self.username = username
         self.log_audit_trail = log_audit_trail_func
         self.selected_record_id = None
+        self.import_thread = None
+        self.import_worker = None
         self._setup_ui()
         self.setStyleSheet(self._get_styles())
 
@@ -138,15 +142,25 @@ class BeginningBalancePage(QWidget):
         header_layout.addWidget(icon_label)
         header_layout.addWidget(QLabel("<h1>Beginning Balance Editor - Good</h1>"))
         header_layout.addStretch()
+        self.import_button = QPushButton("Import from Excel...", icon=fa.icon('fa5s.file-import', color=HEADER_AND_ICON_COLOR))
+        self.import_button.setObjectName("PrimaryButton")
+        header_layout.addWidget(self.import_button)
         main_layout.addLayout(header_layout)
 
+        self.import_progress = QProgressBar()
+        self.import_progress.setVisible(False)
+        self.import_progress.setTextVisible(True)
+        main_layout.addWidget(self.import_progress)
+
         # --- Instruction Box ---
         instruction_group = QGroupBox("Instructions")
         instruction_layout = QVBoxLayout(instruction_group)
 
         instruction_text = (
             "Manage the foundational inventory records. To edit an item, select it from the table on the left. "
-            "To create a new one, click the 'New' button first, then fill in the details and save."
+            "To create a new one, click the 'New' button first, then fill in the details and save. "
+            "Use 'Import from Excel...' to load a whole beginning inventory workbook ('mb' / 'dc' sheets); "
+            "lot ranges are expanded automatically."
         )
         instruction_label = QLabel(instruction_text)
         instruction_label.setStyleSheet("font-style: italic; color: #555; background: transparent;")
@@ -258,6 +272,7 @@ class BeginningBalancePage(QWidget):
         self.new_button.clicked.connect(self._clear_form)
         self.save_button.clicked.connect(self._save_record)
         self.delete_button.clicked.connect(self._delete_record)
+        self.import_button.clicked.connect(self._start_import)
 
     def _load_all_records(self):
         self.table.setRowCount(0)
@@ -405,4 +420,59 @@ class BeginningBalancePage(QWidget):
                 self._load_all_records()
             except Exception as e:
                 QMessageBox.critical(self, "Database Error", f"Failed to delete record: {e}")
-                print(traceback.format_exc())
\ No newline at end of file
+                print(traceback.format_exc())
+
+    def _start_import(self):
+        if self.import_thread is not None:
+            return
+        dialog = BeginningImportDialog(self)
+        if not dialog.exec():
+            return
+        path, target_table, mode, dry_run = dialog.options()
+        self.import_button.setEnabled(False)
+        self.import_progress.setValue(0)
+        self.import_progress.setFormat("Reading workbook...")
+        self.import_progress.setVisible(True)
+
+        self.import_thread = QThread()
+        self.import_worker = BeginningImportWorker(self.engine, path, target_table, mode, dry_run)
+        self.import_worker.moveToThread(self.import_thread)
+        self.import_thread.started.connect(self.import_worker.run)
+        self.import_worker.progress.connect(self._on_import_progress)
+        self.import_worker.finished.connect(self._on_import_finished)
+        self.import_worker.error.connect(self._on_import_error)
+        self.import_worker.finished.connect(self.import_thread.quit)
+        self.import_worker.error.connect(self.import_thread.quit)
+        self.import_thread.finished.connect(self.import_worker.deleteLater)
+        self.import_thread.finished.connect(self.import_thread.deleteLater)
+        self.import_thread.finished.connect(self._reset_import_state)
+        self.import_thread.start()
+
+    def _reset_import_state(self):
+        self.import_thread = None
+        self.import_worker = None
+        self.import_button.setEnabled(True)
+        self.import_progress.setVisible(False)
+
+    def _on_import_progress(self, percent: int, message: str):
+        self.import_progress.setValue(percent)
+        self.import_progress.setFormat(f"{message} (%p%)")
+
+    def _on_import_finished(self, report):
+        if not report.dry_run:
+            self.log_audit_trail("IMPORT_BEGINV",
+                                 f"Imported {report.inserted} lot(s) into {report.target_table} ({report.mode}) "
+                                 f"from {report.path}; {len(report.rejects)} row(s) rejected")
+        box = QMessageBox(QMessageBox.Icon.Warning if report.rejects else QMessageBox.Icon.Information,
+                          "Import Validation Report" if report.dry_run else "Import Complete", report.summary(),
+                          parent=self)
+        if report.rejects or report.duplicates:
+            box.setInformativeText(f"{len(report.rejects)} row(s) were rejected. See details.")
+            box.setDetailedText(report.details())
+        box.exec()
+        self._clear_form()
+        self._load_all_records()
+
+    def _on_import_error(self, error_message: str, detailed_traceback: str):
+        print(detailed_traceback)
+        QMessageBox.critical(self, "Import Error", f"{error_message}\n\nNo records were changed.")
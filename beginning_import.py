@@ -0,0 +1,399 @@
+"""
+Streaming import of a beginning-inventory workbook into beginv_sheet1 / beg_invfailed1.
+
+The workbook is read with openpyxl in read-only mode one chunk of rows at a time; each chunk is validated,
+its lot ranges expanded (lot_ranges.expand_lot_ranges, the same rule as the beg-tools) and COPY'd into a
+temporary staging table. Nothing touches the target table until every sheet has been staged; the staged
+rows then replace or merge into the target inside the same transaction, so readers see either the old
+inventory or the new one, never half of it. Memory stays at roughly one chunk regardless of file size.
+
+Sheets named 'mb'/'dc' set the FG type of their rows; any other sheet uses its FG_TYPE column, falling back
+to the product-code rule of the inventory queries (a '-' in the code means DC).
+"""
+import io
+import os
+import re
+import time
+import traceback
+
+import pandas as pd
+import qtawesome as fa
+from PyQt6.QtCore import QObject, pyqtSignal
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QFormLayout, QLineEdit, QPushButton, QComboBox,
+                             QCheckBox, QDialogButtonBox, QFileDialog, QMessageBox)
+from sqlalchemy import text
+
+from lot_ranges import expand_lot_ranges
+
+TARGET_TABLES = {'Good (beginv_sheet1)': 'beginv_sheet1', 'Failed (beg_invfailed1)': 'beg_invfailed1'}
+MODE_REPLACE, MODE_MERGE = 'replace', 'merge'
+CHUNK_ROWS = 5000
+MAX_TEXT_LENGTH = 50  # VARCHAR(50) columns of the beginning-inventory tables
+STAGING_TABLE = 'beginv_import_staging'
+
+IMPORT_COLUMNS = ['fg_type', 'production_date', 'product_code', 'customer', 'lot_number', 'qty', 'location',
+                  'remarks', 'box_number', 'bag_number', 'floor_number']
+STAGING_COLUMNS = IMPORT_COLUMNS + ['source_sheet', 'source_row']
+VARCHAR_COLUMNS = ('fg_type', 'product_code', 'lot_number', 'location', 'box_number', 'bag_number', 'floor_number')
+
+# normalised header -> column; headers are upper-cased with spaces, dots and slashes turned into underscores
+COLUMN_ALIASES = {
+    'PRODUCT_CODE': 'product_code', 'PROD_CODE': 'product_code', 'PRODUCT': 'product_code',
+    'LOT_NUMBER': 'lot_number', 'LOT_NO': 'lot_number', 'LOT': 'lot_number',
+    'QTY': 'qty', 'QUANTITY': 'qty', 'QTY_KG': 'qty', 'QTY_(KG)': 'qty',
+    'LOCATION': 'location', 'WAREHOUSE': 'location',
+    'FG_TYPE': 'fg_type', 'PRODUCTION_DATE': 'production_date', 'PROD_DATE': 'production_date',
+    'CUSTOMER': 'customer', 'REMARKS': 'remarks',
+    'BOX_NUMBER': 'box_number', 'BOX_NO': 'box_number', 'BAG_NUMBER': 'bag_number', 'BAG_NO': 'bag_number',
+    'FLOOR_NUMBER': 'floor_number', 'FLOOR_NO': 'floor_number',
+}
+REQUIRED_COLUMNS = ('product_code', 'lot_number', 'qty')
+SHEET_FG_TYPES = {'MB': 'MB', 'DC': 'DC'}
+
+
+class ImportReport:
+    """Counts and rejected rows of one import run."""
+
+    def __init__(self, path: str, target_table: str, mode: str, dry_run: bool):
+        self.path, self.target_table, self.mode, self.dry_run = path, target_table, mode, dry_run
+        self.sheets = {}  # sheet -> {'read', 'rejected', 'staged'}
+        self.rejects = []  # (sheet, excel row, reason, product_code, lot_number, qty)
+        self.skipped_sheets = []  # (sheet, reason)
+        self.duplicates = []  # (product_code, lot_number, count)
+        self.replaced = self.updated = self.inserted = 0
+        self.seconds = 0.0
+
+    @property
+    def staged(self) -> int:
+        return sum(s['staged'] for s in self.sheets.values())
+
+    def sheet(self, name: str) -> dict:
+        return self.sheets.setdefault(name, {'read': 0, 'rejected': 0, 'staged': 0})
+
+    def summary(self) -> str:
+        lines = [f"File: {os.path.basename(self.path)}", f"Target: {self.target_table} ({self.mode})"]
+        for name, s in self.sheets.items():
+            lines.append(f"Sheet '{name}': {s['read']} row(s) read, {s['rejected']} rejected, "
+                         f"{s['staged']} lot(s) after range expansion")
+        lines.extend(f"Sheet '{name}' skipped: {reason}" for name, reason in self.skipped_sheets)
+        if self.duplicates:
+            lines.append(f"{len(self.duplicates)} product/lot pair(s) appear more than once"
+                         + (" (the last row wins when merging)" if self.mode == MODE_MERGE else ""))
+        if self.dry_run:
+            lines.append(f"Validation only: {self.staged} lot(s) would be imported; nothing was written.")
+        elif self.mode == MODE_REPLACE:
+            lines.append(f"Replaced {self.replaced} existing record(s) with {self.inserted} imported lot(s).")
+        else:
+            lines.append(f"Updated {self.updated} and inserted {self.inserted} record(s).")
+        lines.append(f"Finished in {self.seconds:.1f}s.")
+        return "\n".join(lines)
+
+    def details(self, limit: int = 500) -> str:
+        lines = [f"{sheet} row {row}: {reason} [{code} / {lot} / {qty}]"
+                 for sheet, row, reason, code, lot, qty in self.rejects[:limit]]
+        if len(self.rejects) > limit:
+            lines.append(f"... and {len(self.rejects) - limit} more rejected row(s).")
+        lines.extend(f"Duplicate: {code} / {lot} x{count}" for code, lot, count in self.duplicates[:limit])
+        return "\n".join(lines)
+
+
+def _normalise_header(value) -> str:
+    return re.sub(r'[\s./]+', '_', str(value or '').strip().upper())
+
+
+def _cell_text(value):
+    """Cell value as stripped text or None; whole-number floats (8048.0) lose the decimal part."""
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip() or None
+
+
+def read_sheet_chunks(ws, chunk_rows: int = CHUNK_ROWS):
+    """
+    Returns an iterator of (first_excel_row, DataFrame) for a read-only worksheet, CHUNK_ROWS at a time, with the
+    columns renamed through COLUMN_ALIASES. The header is read here, so a missing required column raises ValueError
+    on the call itself rather than while the chunks are consumed.
+    """
+    rows = ws.iter_rows(values_only=True)
+    header = next(rows, None) or ()
+    columns = {}
+    for index, value in enumerate(header):
+        column = COLUMN_ALIASES.get(_normalise_header(value))
+        if column and column not in columns.values():
+            columns[index] = column
+    missing = [c for c in REQUIRED_COLUMNS if c not in columns.values()]
+    if missing:
+        raise ValueError(f"missing column(s): {', '.join(c.upper() for c in missing)}")
+    return _chunks(rows, columns, chunk_rows)
+
+
+def _chunks(rows, columns: dict, chunk_rows: int):
+    indexes = list(columns)
+    chunk, first_row = [], 2
+    for excel_row, values in enumerate(rows, start=2):
+        if not any(v not in (None, '') for v in values):
+            continue
+        chunk.append([values[i] if i < len(values) else None for i in indexes] + [excel_row])
+        if len(chunk) >= chunk_rows:
+            yield first_row, pd.DataFrame(chunk, columns=list(columns.values()) + ['source_row'])
+            chunk, first_row = [], excel_row + 1
+    if chunk:
+        yield first_row, pd.DataFrame(chunk, columns=list(columns.values()) + ['source_row'])
+
+
+def prepare_chunk(df: pd.DataFrame, sheet_name: str, report: ImportReport) -> pd.DataFrame:
+    """Cleans and validates one chunk, records rejected rows and returns the range-expanded rows to stage."""
+    for column in IMPORT_COLUMNS:
+        if column not in df.columns:
+            df[column] = None
+    for column in ('product_code', 'lot_number', 'fg_type', 'location', 'customer', 'remarks', 'box_number',
+                   'bag_number', 'floor_number'):
+        df[column] = df[column].map(_cell_text)
+    for column in ('product_code', 'lot_number', 'fg_type'):
+        df[column] = df[column].map(lambda v: v.upper() if isinstance(v, str) else v)
+
+    sheet_fg_type = SHEET_FG_TYPES.get(sheet_name.strip().upper())
+    if sheet_fg_type:
+        df['fg_type'] = sheet_fg_type
+    else:
+        derived = df['product_code'].fillna('').str.contains('-', regex=False).map({True: 'DC', False: 'MB'})
+        df['fg_type'] = df['fg_type'].fillna(derived)
+
+    df['production_date'] = df['production_date'].map(lambda v: None if isinstance(v, str) and not v.strip() else v)
+    qty = pd.to_numeric(df['qty'], errors='coerce')
+    dates = pd.to_datetime(df['production_date'], errors='coerce')
+
+    reasons = pd.Series(None, index=df.index, dtype=object)
+
+    def reject(mask, reason):
+        reasons[mask & reasons.isna()] = reason
+
+    reject(df['product_code'].isna(), "Missing product code")
+    reject(df['lot_number'].isna(), "Missing lot number")
+    reject(qty.isna(), "Quantity is not a number")
+    reject(qty < 0, "Negative quantity")
+    reject(df['production_date'].notna() & dates.isna(), "Invalid production date")
+    for column in VARCHAR_COLUMNS:
+        if column != 'lot_number':  # ranges are checked after expansion
+            reject(df[column].map(lambda v: len(v) if isinstance(v, str) else 0) > MAX_TEXT_LENGTH,
+                   f"{column} longer than {MAX_TEXT_LENGTH} characters")
+
+    rejected = reasons.notna()
+    for (_, row), reason in zip(df[rejected].iterrows(), reasons[rejected]):
+        report.rejects.append((sheet_name, row['source_row'], reason, row['product_code'], row['lot_number'],
+                               row['qty']))
+    stats = report.sheet(sheet_name)
+    stats['read'] += len(df)
+    stats['rejected'] += int(rejected.sum())
+
+    valid = df[~rejected].copy()
+    valid['qty'] = qty[~rejected]
+    valid['production_date'] = dates[~rejected].dt.date
+    valid['source_sheet'] = sheet_name
+    expanded = expand_lot_ranges(valid[STAGING_COLUMNS], lot_col='lot_number', qty_col='qty')
+
+    too_long = expanded['lot_number'].str.len() > MAX_TEXT_LENGTH
+    for _, row in expanded[too_long].iterrows():
+        report.rejects.append((sheet_name, row['source_row'], f"lot_number longer than {MAX_TEXT_LENGTH} characters",
+                               row['product_code'], row['lot_number'], row['qty']))
+    stats['rejected'] += int(too_long.sum())
+    expanded = expanded[~too_long]
+    stats['staged'] += len(expanded)
+    return expanded
+
+
+def copy_rows(cursor, df: pd.DataFrame):
+    """COPYs a prepared chunk into the staging table over the psycopg2 cursor of the import transaction."""
+    buffer = io.StringIO()
+    df.to_csv(buffer, columns=STAGING_COLUMNS, header=False, index=False, na_rep='\\N')
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {STAGING_TABLE} ({', '.join(STAGING_COLUMNS)}) FROM STDIN "
+                       f"WITH (FORMAT csv, NULL '\\N')", buffer)
+
+
+def _create_staging(conn):
+    conn.execute(text(f"""
+        CREATE TEMP TABLE {STAGING_TABLE} (
+            fg_type VARCHAR(50), production_date DATE, product_code VARCHAR(50) NOT NULL, customer TEXT,
+            lot_number VARCHAR(50) NOT NULL, qty NUMERIC(15, 6) NOT NULL, location VARCHAR(50), remarks TEXT,
+            box_number VARCHAR(50), bag_number VARCHAR(50), floor_number VARCHAR(50),
+            source_sheet TEXT, source_row INTEGER
+        ) ON COMMIT DROP
+    """))
+
+
+def _apply_staging(conn, target_table: str, mode: str, report: ImportReport):
+    columns = ', '.join(IMPORT_COLUMNS)
+    if mode == MODE_REPLACE:
+        # DELETE rather than TRUNCATE: readers keep seeing the old rows until commit instead of blocking
+        report.replaced = conn.execute(text(f"DELETE FROM {target_table}")).rowcount
+        report.inserted = conn.execute(text(
+            f"INSERT INTO {target_table} ({columns}) SELECT {columns} FROM {STAGING_TABLE} "
+            f"ORDER BY source_sheet, source_row")).rowcount
+        return
+    # merge: one row per product/lot, the last occurrence in the workbook wins
+    conn.execute(text(f"""
+        CREATE TEMP TABLE {STAGING_TABLE}_latest ON COMMIT DROP AS
+        SELECT DISTINCT ON (product_code, lot_number) {columns}
+        FROM {STAGING_TABLE} ORDER BY product_code, lot_number, source_sheet DESC, source_row DESC
+    """))
+    report.updated = conn.execute(text(f"""
+        UPDATE {target_table} t SET
+            fg_type = s.fg_type, production_date = COALESCE(s.production_date, t.production_date),
+            customer = COALESCE(s.customer, t.customer), qty = s.qty, location = COALESCE(s.location, t.location),
+            remarks = COALESCE(s.remarks, t.remarks), box_number = COALESCE(s.box_number, t.box_number),
+            bag_number = COALESCE(s.bag_number, t.bag_number), floor_number = COALESCE(s.floor_number, t.floor_number)
+        FROM {STAGING_TABLE}_latest s
+        WHERE UPPER(TRIM(t.product_code)) = s.product_code AND UPPER(TRIM(t.lot_number)) = s.lot_number
+    """)).rowcount
+    report.inserted = conn.execute(text(f"""
+        INSERT INTO {target_table} ({columns})
+        SELECT {', '.join('s.' + c for c in IMPORT_COLUMNS)} FROM {STAGING_TABLE}_latest s
+        WHERE NOT EXISTS (SELECT 1 FROM {target_table} t
+                          WHERE UPPER(TRIM(t.product_code)) = s.product_code AND UPPER(TRIM(t.lot_number)) = s.lot_number)
+    """)).rowcount
+
+
+def import_beginning_inventory(engine, path: str, target_table: str, mode: str = MODE_REPLACE,
+                               dry_run: bool = False, chunk_rows: int = CHUNK_ROWS, progress=None) -> ImportReport:
+    """
+    Streams the workbook into the staging table and applies it to target_table in one transaction.
+    With dry_run everything is validated and staged, then rolled back. progress(percent, message) is optional.
+    """
+    from openpyxl import load_workbook
+
+    if target_table not in TARGET_TABLES.values():
+        raise ValueError(f"Unknown beginning-inventory table: {target_table}")
+    report = ImportReport(path, target_table, mode, dry_run)
+    progress = progress or (lambda percent, message: None)
+    started = time.monotonic()
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        total_rows = sum(max((ws.max_row or 1) - 1, 0) for ws in wb.worksheets) or 1
+        done = 0
+        with engine.connect() as conn:
+            trans = conn.begin()
+            try:
+                _create_staging(conn)
+                cursor = conn.connection.cursor()
+                for ws in wb.worksheets:
+                    try:
+                        chunks = read_sheet_chunks(ws, chunk_rows)
+                    except ValueError as e:
+                        report.skipped_sheets.append((ws.title, str(e)))
+                        continue
+                    for first_row, chunk in chunks:
+                        prepared = prepare_chunk(chunk, ws.title, report)
+                        if not prepared.empty:
+                            copy_rows(cursor, prepared)
+                        done += len(chunk)
+                        progress(min(90, int(done * 90 / total_rows)),
+                                 f"Sheet '{ws.title}': staged rows {first_row}-{first_row + len(chunk) - 1}")
+                if not report.staged:
+                    raise ValueError("No valid rows were found in the workbook.\n\n" + report.summary())
+
+                report.duplicates = [tuple(r) for r in conn.execute(text(f"""
+                    SELECT product_code, lot_number, COUNT(*) FROM {STAGING_TABLE}
+                    GROUP BY product_code, lot_number HAVING COUNT(*) > 1 ORDER BY product_code, lot_number
+                """)).all()]
+                progress(92, f"Applying {report.staged} lot(s) to {target_table}...")
+                _apply_staging(conn, target_table, mode, report)
+                if dry_run:
+                    trans.rollback()
+                else:
+                    trans.commit()
+            except Exception:
+                if trans.is_active:
+                    trans.rollback()
+                raise
+    finally:
+        wb.close()
+    report.seconds = time.monotonic() - started
+    progress(100, "Done.")
+    return report
+
+
+class BeginningImportWorker(QObject):
+    progress = pyqtSignal(int, str)
+    finished = pyqtSignal(object)
+    error = pyqtSignal(str, str)
+
+    def __init__(self, engine, path: str, target_table: str, mode: str, dry_run: bool):
+        super().__init__()
+        self.engine = engine
+        self.path = path
+        self.target_table = target_table
+        self.mode = mode
+        self.dry_run = dry_run
+
+    def run(self):
+        try:
+            report = import_beginning_inventory(self.engine, self.path, self.target_table, self.mode, self.dry_run,
+                                                progress=self.progress.emit)
+            self.finished.emit(report)
+        except Exception as e:
+            self.error.emit(f"Beginning inventory import failed: {e}", traceback.format_exc())
+
+
+class BeginningImportDialog(QDialog):
+    """Asks for the workbook, the target table and whether to replace or merge."""
+
+    def __init__(self, parent=None, default_target: str = 'beginv_sheet1'):
+        super().__init__(parent)
+        self.setWindowTitle("Import Beginning Inventory")
+        self.setMinimumWidth(520)
+        layout = QVBoxLayout(self)
+        form = QFormLayout()
+
+        file_layout = QHBoxLayout()
+        self.path_input = QLineEdit(placeholderText="Workbook with 'mb' / 'dc' sheets...")
+        browse_btn = QPushButton(fa.icon('fa5s.folder-open'), "Browse...")
+        browse_btn.clicked.connect(self._browse)
+        file_layout.addWidget(self.path_input)
+        file_layout.addWidget(browse_btn)
+        form.addRow("Excel File:", file_layout)
+
+        self.target_combo = QComboBox()
+        for label, table in TARGET_TABLES.items():
+            self.target_combo.addItem(label, table)
+        self.target_combo.setCurrentIndex(max(0, self.target_combo.findData(default_target)))
+        form.addRow("Import Into:", self.target_combo)
+
+        self.mode_combo = QComboBox()
+        self.mode_combo.addItem("Replace all existing records", MODE_REPLACE)
+        self.mode_combo.addItem("Merge (update matching product/lot, add new)", MODE_MERGE)
+        form.addRow("Mode:", self.mode_combo)
+
+        self.dry_run_check = QCheckBox("Validate only (do not write anything)")
+        form.addRow("", self.dry_run_check)
+        layout.addLayout(form)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        buttons.button(QDialogButtonBox.StandardButton.Ok).setText("Import")
+        buttons.accepted.connect(self._accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+    def _browse(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Select Beginning Inventory Workbook", "",
+                                              "Excel Files (*.xlsx *.xlsm)")
+        if path:
+            self.path_input.setText(path)
+
+    def _accept(self):
+        if not os.path.isfile(self.path_input.text().strip()):
+            QMessageBox.warning(self, "Input Error", "Please select an existing Excel file.")
+            return
+        if (self.mode_combo.currentData() == MODE_REPLACE and not self.dry_run_check.isChecked()
+                and QMessageBox.question(self, "Confirm Replace",
+                                         f"All records in {self.target_combo.currentData()} will be replaced by the "
+                                         f"workbook's contents. Continue?") != QMessageBox.StandardButton.Yes):
+            return
+        self.accept()
+
+    def options(self) -> tuple:
+        return (self.path_input.text().strip(), self.target_combo.currentData(), self.mode_combo.currentData(),
+                self.dry_run_check.isChecked())
@@ -0,0 +1,222 @@
+"""
+Type-ahead for the product, customer, lot and production-form fields.
+
+Two sources of suggestions:
+- PrefixIndex, a sorted list searched with bisect, built once per reference-data list (see
+  reference_data.bind_reference_combo): a lookup costs O(log n + shown) instead of Qt's scan of the whole model.
+- PREFIX_QUERIES, indexed LIKE 'prefix%' queries for values too many to hold in every combo (lots,
+  production form IDs). They run on one shared background thread; results are cached per prefix, and a prefix
+  whose result came back complete answers every longer prefix locally, so only the first keystrokes reach the
+  database.
+
+IndexedCompleter shows the suggestions on a line edit or editable combo without touching the combo's own model.
+"""
+import bisect
+import time
+import traceback
+from collections import OrderedDict
+
+from PyQt6.QtCore import QObject, QThread, QStringListModel, Qt, pyqtSignal
+from PyQt6.QtWidgets import QApplication, QComboBox, QCompleter
+from sqlalchemy import text
+
+SUGGESTION_LIMIT = 50
+PREFIX_CACHE_SIZE = 1000
+PREFIX_CACHE_SECONDS = 120  # lots arrive with the production sync; cached prefixes go stale after this
+
+# name -> query taking :prefix (a LIKE pattern) and :limit
+PREFIX_QUERIES = {
+    'production_lots': "SELECT lot_number FROM legacy_production WHERE lot_number LIKE :prefix ESCAPE '\\' "
+                       "ORDER BY lot_number LIMIT :limit",
+    'production_form_ids': "SELECT DISTINCT prod_id FROM legacy_production WHERE prod_id LIKE :prefix ESCAPE '\\' "
+                           "ORDER BY prod_id LIMIT :limit",
+}
+
+# text_pattern_ops so LIKE 'prefix%' uses the index under any database collation.
+PREFIX_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_legacy_production_lot_prefix ON legacy_production (lot_number text_pattern_ops);",
+    "CREATE INDEX IF NOT EXISTS idx_legacy_production_prod_id_prefix ON legacy_production (prod_id text_pattern_ops);",
+]
+
+
+def ensure_prefix_indexes(connection):
+    for ddl in PREFIX_INDEXES:
+        connection.execute(text(ddl))
+
+
+def _like_prefix(prefix: str) -> str:
+    return prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+class PrefixIndex:
+    """Case-insensitive prefix (and optionally substring) search over a fixed list of strings."""
+
+    def __init__(self, values):
+        pairs = sorted((str(v).upper(), str(v)) for v in values if v)
+        self._keys = [k for k, _ in pairs]
+        self._values = [v for _, v in pairs]
+
+    def __len__(self):
+        return len(self._keys)
+
+    def matches(self, prefix: str, limit: int = SUGGESTION_LIMIT, contains: bool = False) -> list:
+        key = prefix.strip().upper()
+        if not key:
+            return []
+        start = bisect.bisect_left(self._keys, key)
+        end = bisect.bisect_left(self._keys, key + '\uffff', start)
+        found = self._values[start:min(end, start + limit)]
+        if contains and len(found) < limit:
+            # Substring hits after the prefix hits; a linear pass, only over what the prefix didn't cover.
+            for i, k in enumerate(self._keys):
+                if key in k and not (start <= i < end):
+                    found.append(self._values[i])
+                    if len(found) >= limit:
+                        break
+        return found
+
+
+class IndexedCompleter(QCompleter):
+    """
+    A completer that asks lookup(text) for its rows on every edit. lookup returns a list, or None when the
+    answer will come later through show_suggestions() (the background prefix queries).
+    """
+
+    def __init__(self, widget, lookup, parent=None):
+        super().__init__(parent or widget)
+        self._lookup = lookup
+        self._model = QStringListModel(self)
+        self.setModel(self._model)
+        self.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        self.setCompletionMode(QCompleter.CompletionMode.UnfilteredPopupCompletion)
+        self.setMaxVisibleItems(15)
+        line_edit = widget.lineEdit() if isinstance(widget, QComboBox) else widget
+        widget.setCompleter(self)
+        self._line_edit = line_edit
+        line_edit.textEdited.connect(self._on_text_edited)
+        if isinstance(widget, QComboBox):
+            # QComboBox maps a picked suggestion back onto its own model and clears the text when the value
+            # isn't there (database suggestions usually aren't); put the text back.
+            self.activated.connect(widget.setCurrentText)
+
+    def set_lookup(self, lookup):
+        self._lookup = lookup
+
+    def current_prefix(self) -> str:
+        return self._line_edit.text().strip().upper()
+
+    def _on_text_edited(self, typed: str):
+        values = self._lookup(typed) if typed.strip() else []
+        if values is not None:
+            self.show_suggestions(values)
+
+    def show_suggestions(self, values: list):
+        self._model.setStringList(values)
+        if values and self._line_edit.hasFocus() and values != [self._line_edit.text()]:
+            self.complete()
+        else:
+            self.popup().hide()
+
+
+class _PrefixQueryWorker(QObject):
+    found = pyqtSignal(object, str, str, list, bool)  # engine, source, prefix, values, complete
+    error = pyqtSignal(str, str)
+
+    def __init__(self):
+        super().__init__()
+        self.latest = {}  # (engine id, source) -> newest prefix asked for; older requests are skipped
+
+    def run_query(self, engine, source: str, prefix: str):
+        if self.latest.get((id(engine), source)) != prefix:
+            return
+        try:
+            with engine.connect() as conn:
+                values = conn.execute(text(PREFIX_QUERIES[source]),
+                                      {"prefix": _like_prefix(prefix), "limit": SUGGESTION_LIMIT + 1}).scalars().all()
+            values = [str(v) for v in values]
+            self.found.emit(engine, source, prefix, values[:SUGGESTION_LIMIT], len(values) <= SUGGESTION_LIMIT)
+        except Exception as e:
+            self.error.emit(f"Prefix lookup failed: {e}", traceback.format_exc())
+
+
+class PrefixQueryService(QObject):
+    """One background thread and one prefix cache per process, shared by every database-backed completer."""
+    _requested = pyqtSignal(object, str, str)
+    found = pyqtSignal(object, str, str, list)  # engine, source, prefix, values
+
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        super().__init__()
+        self._cache = OrderedDict()  # (engine id, source, prefix) -> (fetched at, values, complete)
+        self._thread = QThread()
+        self._worker = _PrefixQueryWorker()
+        self._worker.moveToThread(self._thread)
+        self._requested.connect(self._worker.run_query)
+        self._worker.found.connect(self._on_found)
+        self._worker.error.connect(lambda message, trace: print(f"{message}\n{trace}"))
+        app = QApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.shutdown)
+        self._thread.start()
+
+    def shutdown(self):
+        self._thread.quit()
+        self._thread.wait()
+
+    def lookup(self, engine, source: str, typed: str):
+        """Cached suggestions for typed, or None after queueing a query (answered through found)."""
+        prefix = typed.strip().upper()
+        if not prefix:
+            return []
+        cached = self._cached(engine, source, prefix)
+        if cached is not None:
+            return cached
+        self._worker.latest[(id(engine), source)] = prefix
+        self._requested.emit(engine, source, prefix)
+        return None
+
+    def _cached(self, engine, source: str, prefix: str):
+        now = time.monotonic()
+        for length in range(len(prefix), 0, -1):
+            key = (id(engine), source, prefix[:length])
+            entry = self._cache.get(key)
+            if entry is None:
+                continue
+            fetched_at, values, complete = entry
+            if now - fetched_at > PREFIX_CACHE_SECONDS:
+                del self._cache[key]
+                continue
+            if length == len(prefix):
+                self._cache.move_to_end(key)
+                return values
+            if complete:  # every value under the shorter prefix is here, so filter it
+                return [v for v in values if v.upper().startswith(prefix)]
+        return None
+
+    def _on_found(self, engine, source: str, prefix: str, values: list, complete: bool):
+        self._cache[(id(engine), source, prefix)] = (time.monotonic(), values, complete)
+        while len(self._cache) > PREFIX_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        self.found.emit(engine, source, prefix, values)
+
+
+def attach_prefix_query_completer(widget, engine, source: str) -> IndexedCompleter:
+    """Database-backed type-ahead on a line edit or editable combo, e.g. source='production_lots'."""
+    service = PrefixQueryService.instance()
+    completer = IndexedCompleter(widget, lambda typed: service.lookup(engine, source, typed))
+
+    def on_found(found_engine, found_source, prefix, values):
+        if found_engine is engine and found_source == source and completer.current_prefix() == prefix:
+            completer.show_suggestions(values)
+
+    service.found.connect(on_found)
+    completer.destroyed.connect(lambda: service.found.disconnect(on_found))
+    return completer
+
@@ -1,18 +1,17 @@
 import sys
 from datetime import datetime, date
 from decimal import Decimal
-from typing import Dict, Any, List
 import traceback
 
 # --- PyQt6 Imports ---
-from PyQt6.QtCore import Qt, QSize, QPointF
+from PyQt6.QtCore import Qt, QSize, QThread, QObject, pyqtSignal
 from PyQt6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QGridLayout, QGroupBox, QLabel,
     QFrame, QHBoxLayout, QSplitter, QTableWidget, QTableWidgetItem,
     QHeaderView, QAbstractItemView, QApplication, QSizePolicy,
     QTabWidget, QLineEdit, QPushButton, QMessageBox
 )
-from PyQt6.QtGui import QFont, QColor, QPainter, QPen
+from PyQt6.QtGui import QFont, QPainter
 
 # --- Qtawesome Import ---
 import qtawesome as fa
@@ -20,10 +19,8 @@ import qtawesome as qta
 
 # --- Charting Library Import ---
 try:
-    from PyQt6.QtCharts import (
-        QChart, QChartView, QLineSeries, QPieSeries, QPieSlice,
-        QValueAxis, QBarCategoryAxis, QHorizontalBarSeries, QBarSeries, QBarSet
-    )
+    from PyQt6.QtCharts import QChartView
+    from dashboard_charts import DashboardCharts, chart_animations_enabled
 
     CHARTS_AVAILABLE = True
 except ImportError:
@@ -33,6 +30,7 @@ except ImportError:
 
 # --- Database Imports ---
 from sqlalchemy import text, create_engine, exc
+from dashboard_data import DashboardDataService, EMPTY_KPIS, build_chart_data
 
 # --- UNIFIED UI CONSTANTS ---
 COLOR_ACCENT = '#007bff'
@@ -99,6 +97,23 @@ class KPIWidget(QFrame):
         layout.addStretch()
 
 
+class DashboardDataWorker(QObject):
+    """Loads a dashboard snapshot (KPIs, recent activity and prepared chart data) off the GUI thread."""
+    finished = pyqtSignal(dict)
+    error = pyqtSignal(str, str)
+
+    def __init__(self, data_service: DashboardDataService, force: bool = False):
+        super().__init__()
+        self.data_service = data_service
+        self.force = force
+
+    def run(self):
+        try:
+            self.finished.emit(self.data_service.get(force=self.force))
+        except Exception:
+            self.error.emit("Failed to load dashboard data.", traceback.format_exc())
+
+
 # --- DashboardAnalyticsPage ---
 class DashboardAnalyticsPage(QWidget):
     def __init__(self, db_engine, username, log_audit_trail_func):
@@ -106,6 +121,9 @@ class DashboardAnalyticsPage(QWidget):
         self.engine = db_engine
         self.username = username
         self.log_audit_trail = log_audit_trail_func
+        self.data_service = DashboardDataService(db_engine)
+        self.data_thread = None
+        self.data_worker = None
         self._setup_ui()
         self.refresh_page()
 
@@ -121,7 +139,7 @@ class DashboardAnalyticsPage(QWidget):
         instruction_label.setStyleSheet("font-style: italic; color: #555;")
 
         self.refresh_button = QPushButton(fa.icon('fa5s.sync-alt'), " Refresh Data")
-        self.refresh_button.clicked.connect(self.refresh_page)
+        self.refresh_button.clicked.connect(lambda: self.refresh_page(force=True))
 
         top_header_layout.addWidget(header)
         top_header_layout.addWidget(instruction_label, 1, Qt.AlignmentFlag.AlignCenter)
@@ -168,6 +186,12 @@ class DashboardAnalyticsPage(QWidget):
 
         main_layout.addLayout(content_grid, 1)
 
+        # Charts are created once and updated in place on every refresh.
+        self.charts = DashboardCharts(
+            self.flow_chart_view, self.volume_chart_view, self.top_products_chart_view,
+            COLOR_SUCCESS, COLOR_DANGER, COLOR_PRIMARY, animations=chart_animations_enabled()
+        ) if CHARTS_AVAILABLE else None
+
     def _create_chart_view_or_placeholder(self, chart_type: str) -> QWidget:
         if CHARTS_AVAILABLE:
             chart_view = QChartView()
@@ -181,20 +205,43 @@ class DashboardAnalyticsPage(QWidget):
             placeholder.setStyleSheet("border: 1px dashed #ccc; color: #555;")
             return placeholder
 
-    def refresh_page(self):
-        self._clear_kpis()
-        self._load_data()
+    def refresh_page(self, force: bool = False):
+        if self.data_thread and self.data_thread.isRunning(): return
+        self.refresh_button.setEnabled(False)
+        self.data_thread = QThread()
+        self.data_worker = DashboardDataWorker(self.data_service, force)
+        self.data_worker.moveToThread(self.data_thread)
+        self.data_thread.started.connect(self.data_worker.run)
+        self.data_worker.finished.connect(self._load_data)
+        self.data_worker.error.connect(self._on_data_error)
+        self.data_worker.finished.connect(self.data_thread.quit)
+        self.data_worker.error.connect(self.data_thread.quit)
+        self.data_thread.finished.connect(self.data_worker.deleteLater)
+        self.data_thread.finished.connect(self.data_thread.deleteLater)
+        self.data_thread.finished.connect(self._reset_thread_state)
+        self.data_thread.start()
         self.log_audit_trail("REFRESH_DASHBOARD", "User refreshed the analytics dashboard.")
 
+    def _reset_thread_state(self):
+        self.data_thread = None
+        self.data_worker = None
+        self.refresh_button.setEnabled(True)
+
     def _clear_kpis(self):
         while self.kpi_layout.count():
             child = self.kpi_layout.takeAt(0)
             if child.widget():
                 child.widget().deleteLater()
 
-    def _load_data(self):
-        self._load_recent_activity()
-        kpi_data = self._fetch_kpi_data()
+    def _on_data_error(self, error_message: str, detailed_traceback: str):
+        print(f"Error fetching dashboard data: {detailed_traceback}")
+        QMessageBox.critical(self, "Database Error", error_message)
+        self._load_data({'kpi': dict(EMPTY_KPIS), 'charts': build_chart_data({})})
+
+    def _load_data(self, data: dict):
+        self._clear_kpis()
+        self._load_recent_activity(data.get('recent_activity', []))
+        kpi_data = data['kpi']
 
         self.kpi_layout.addWidget(
             KPIWidget("Total Stock (KG)", f"{kpi_data.get('total_stock', 0):,.2f}", 'fa5s.weight', COLOR_PRIMARY), 0, 0)
@@ -215,238 +262,25 @@ class DashboardAnalyticsPage(QWidget):
             KPIWidget("Failed Transactions (30d)", f"{kpi_data.get('failed_tx_30d', 0):,}", 'fa5s.exclamation-triangle',
                       COLOR_DANGER), 1, 2)
 
-        if CHARTS_AVAILABLE:
-            self._create_flow_chart()
-            self._create_volume_barchart()
-            self._create_top_products_chart()
-
-    # --- MODIFIED: THIS METHOD NOW CORRECTLY INCLUDES beginning inventory ---
-    def _fetch_kpi_data(self) -> Dict[str, Any]:
-        try:
-            with self.engine.connect() as conn:
-                summary_query = text("""
-                    WITH current_stock_calc AS (
-                        -- Beginning Inventory
-                        SELECT
-                            product_code,
-                            qty AS balance
-                        FROM beginv_sheet1
-                        WHERE product_code IS NOT NULL AND TRIM(product_code) <> ''
-
-                        UNION ALL
-
-                        -- Transactions
-                        SELECT
-                            product_code,
-                            (quantity_in - quantity_out) AS balance
-                        FROM transactions
-                        WHERE product_code IS NOT NULL AND TRIM(product_code) <> ''
-                    )
-                    SELECT 
-                        (SELECT COALESCE(SUM(balance), 0) FROM current_stock_calc) as total_stock,
-                        (SELECT COUNT(id) FROM transactions WHERE EXTRACT(YEAR FROM transaction_date) = EXTRACT(YEAR FROM NOW())) as total_tx_ytd,
-                        (SELECT COALESCE(SUM(quantity_in), 0) FROM transactions WHERE EXTRACT(YEAR FROM transaction_date) = EXTRACT(YEAR FROM NOW())) as total_in_ytd,
-                        (SELECT COALESCE(SUM(quantity_out), 0) FROM transactions WHERE EXTRACT(YEAR FROM transaction_date) = EXTRACT(YEAR FROM NOW())) as total_out_ytd,
-                        (SELECT COUNT(DISTINCT product_code) FROM current_stock_calc WHERE balance > 0) as unique_products,
-                        (SELECT COUNT(id) FROM failed_transactions WHERE transaction_date >= NOW() - INTERVAL '30 days') as failed_count;
-                """)
-                result = conn.execute(summary_query).mappings().one()
-
-            return dict(result)
-
-        except Exception as e:
-            QMessageBox.critical(self, "Database Error", f"Failed to fetch KPI data: {e}")
-            print(f"Error fetching KPI data: {e}")
-            return {}
-
-    def _load_recent_activity(self):
-        try:
-            with self.engine.connect() as conn:
-                query = text("""
-                    SELECT transaction_date, transaction_type, source_ref_no, product_code, 
-                           quantity_in, quantity_out, remarks
-                    FROM transactions ORDER BY transaction_date DESC, id DESC LIMIT 20
-                """)
-                results = conn.execute(query).mappings().all()
-
-            self.activity_table.setRowCount(len(results))
-            for row_idx, record in enumerate(results):
-                self.activity_table.setItem(row_idx, 0, QTableWidgetItem(str(record['transaction_date'])))
-                self.activity_table.setItem(row_idx, 1, QTableWidgetItem(record['transaction_type']))
-                self.activity_table.setItem(row_idx, 2, QTableWidgetItem(record['source_ref_no']))
-                self.activity_table.setItem(row_idx, 3, QTableWidgetItem(record['product_code'] or 'N/A'))
-                in_qty = Decimal(str(record.get('quantity_in', 0) or 0))
-                out_qty = Decimal(str(record.get('quantity_out', 0) or 0))
-                in_item = QTableWidgetItem(f"{in_qty:,.2f}");
-                out_item = QTableWidgetItem(f"{out_qty:,.2f}")
-                in_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
-                out_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
-                self.activity_table.setItem(row_idx, 4, in_item)
-                self.activity_table.setItem(row_idx, 5, out_item)
-                self.activity_table.setItem(row_idx, 6, QTableWidgetItem(record.get('remarks', '') or ''))
-        except Exception as e:
-            QMessageBox.critical(self, "Database Error", f"Failed to load recent activity: {e}")
-            self.activity_table.setRowCount(0)
-
-    def _create_flow_chart(self):
-        series_in = QLineSeries();
-        series_in.setName("Stock IN")
-        series_out = QLineSeries();
-        series_out.setName("Stock OUT")
-        series_net = QLineSeries();
-        series_net.setName("Net Flow")
-
-        series_in.setPen(QPen(QColor(COLOR_SUCCESS), 3))
-        series_out.setPen(QPen(QColor(COLOR_DANGER), 3))
-        net_pen = QPen(QColor(COLOR_PRIMARY), 2);
-        net_pen.setStyle(Qt.PenStyle.DashLine);
-        series_net.setPen(net_pen)
-        series_in.hovered.connect(self._handle_series_hover)
-        series_out.hovered.connect(self._handle_series_hover)
-        series_net.hovered.connect(self._handle_series_hover)
-
-        query = text("""
-            SELECT TO_CHAR(transaction_date, 'YYYY-MM') AS month, 
-                   SUM(quantity_in) AS total_in, 
-                   SUM(quantity_out) AS total_out
-            FROM transactions 
-            WHERE transaction_date >= date_trunc('month', NOW()) - INTERVAL '11 months'
-            GROUP BY month 
-            ORDER BY month;
-        """)
-        categories, max_val = [], 0
-        try:
-            with self.engine.connect() as conn:
-                results = conn.execute(query).mappings().all()
-            for i, row in enumerate(results):
-                categories.append(datetime.strptime(row['month'], '%Y-%m').strftime('%b-%y'))
-                qty_in = float(row['total_in'] or 0);
-                qty_out = float(row['total_out'] or 0)
-                series_in.append(i, qty_in);
-                series_out.append(i, qty_out);
-                series_net.append(i, qty_in - qty_out)
-                max_val = max(max_val, qty_in, qty_out)
-        except Exception as e:
-            QMessageBox.critical(self, "Chart Error", f"Error fetching line chart data: {e}")
-
-        chart = QChart();
-        chart.addSeries(series_in);
-        chart.addSeries(series_out);
-        chart.addSeries(series_net)
-        chart.setAnimationOptions(QChart.AnimationOption.SeriesAnimations)
-        axis_x = QBarCategoryAxis();
-        axis_x.append(categories);
-        chart.addAxis(axis_x, Qt.AlignmentFlag.AlignBottom)
-        axis_y = QValueAxis();
-        axis_y.setLabelFormat("%.0f kg");
-        axis_y.setRange(0, (max_val * 1.1) if max_val > 0 else 10)
-        chart.addAxis(axis_y, Qt.AlignmentFlag.AlignLeft)
-        series_in.attachAxis(axis_x);
-        series_in.attachAxis(axis_y)
-        series_out.attachAxis(axis_x);
-        series_out.attachAxis(axis_y)
-        series_net.attachAxis(axis_x);
-        series_net.attachAxis(axis_y)
-        chart.legend().setVisible(True);
-        chart.legend().setAlignment(Qt.AlignmentFlag.AlignBottom)
-        self.flow_chart_view.setChart(chart)
-
-    def _handle_series_hover(self, point: QPointF, state: bool):
-        if state:
-            series = self.sender()
-            self.flow_chart_view.setToolTip(f"{series.name()}: {point.y():,.2f} kg")
-        else:
-            self.flow_chart_view.setToolTip("")
-
-    def _create_volume_barchart(self):
-        series = QHorizontalBarSeries()
-        query = text(
-            "SELECT transaction_type, COUNT(id) as tx_count FROM transactions GROUP BY transaction_type ORDER BY tx_count ASC;")
-        categories, max_val = [], 0
-        try:
-            with self.engine.connect() as conn:
-                results = conn.execute(query).mappings().all()
-            bar_set = QBarSet("Count")
-            for row in results:
-                categories.append(row['transaction_type'])
-                count = int(row['tx_count'])
-                bar_set.append(count)
-                max_val = max(max_val, count)
-            series.append(bar_set)
-        except Exception as e:
-            QMessageBox.critical(self, "Chart Error", f"Error fetching bar chart data: {e}")
-
-        chart = QChart();
-        chart.addSeries(series)
-        chart.setAnimationOptions(QChart.AnimationOption.SeriesAnimations)
-        axis_y = QBarCategoryAxis();
-        axis_y.append(categories);
-        chart.addAxis(axis_y, Qt.AlignmentFlag.AlignLeft)
-        axis_x = QValueAxis();
-        axis_x.setRange(0, (max_val * 1.1) if max_val > 0 else 10);
-        chart.addAxis(axis_x, Qt.AlignmentFlag.AlignBottom)
-        series.attachAxis(axis_x);
-        series.attachAxis(axis_y)
-        chart.legend().setVisible(False)
-        self.volume_chart_view.setChart(chart)
-
-    # --- MODIFIED: THIS METHOD NOW CORRECTLY CALCULATES STOCK BALANCE ---
-    def _create_top_products_chart(self):
-        series = QBarSeries()
-
-        query = text("""
-            WITH current_stock_calc AS (
-                -- Beginning Inventory
-                SELECT
-                    product_code,
-                    qty AS balance
-                FROM beginv_sheet1
-                WHERE product_code IS NOT NULL AND TRIM(product_code) <> ''
-
-                UNION ALL
-
-                -- Transactions
-                SELECT
-                    product_code,
-                    (quantity_in - quantity_out) AS balance
-                FROM transactions
-                WHERE product_code IS NOT NULL AND TRIM(product_code) <> ''
-            )
-            SELECT product_code, SUM(balance) as stock_balance 
-            FROM current_stock_calc 
-            GROUP BY product_code 
-            HAVING SUM(balance) > 0.001
-            ORDER BY stock_balance DESC 
-            LIMIT 10;
-        """)
-
-        categories, max_val = [], 0
-        try:
-            with self.engine.connect() as conn:
-                results = conn.execute(query).mappings().all()
-            bar_set = QBarSet("Stock (kg)")
-            for row in results:
-                categories.append(row['product_code'])
-                balance = float(row['stock_balance'])
-                bar_set.append(balance)
-                max_val = max(max_val, balance)
-            series.append(bar_set)
-        except Exception as e:
-            QMessageBox.critical(self, "Chart Error", f"Error fetching top products data: {e}")
-
-        chart = QChart();
-        chart.addSeries(series)
-        chart.setAnimationOptions(QChart.AnimationOption.SeriesAnimations)
-        axis_x = QBarCategoryAxis();
-        axis_x.append(categories);
-        chart.addAxis(axis_x, Qt.AlignmentFlag.AlignBottom)
-        axis_y = QValueAxis();
-        axis_y.setRange(0, (max_val * 1.1) if max_val > 0 else 10);
-        chart.addAxis(axis_y, Qt.AlignmentFlag.AlignLeft)
-        series.attachAxis(axis_x);
-        series.attachAxis(axis_y)
-        chart.legend().setVisible(False)
-        self.top_products_chart_view.setChart(chart)
+        if self.charts is not None:
+            self.charts.update(data['charts'])
+
+    def _load_recent_activity(self, results: list):
+        self.activity_table.setRowCount(len(results))
+        for row_idx, record in enumerate(results):
+            self.activity_table.setItem(row_idx, 0, QTableWidgetItem(str(record['transaction_date'])))
+            self.activity_table.setItem(row_idx, 1, QTableWidgetItem(record['transaction_type']))
+            self.activity_table.setItem(row_idx, 2, QTableWidgetItem(record['source_ref_no']))
+            self.activity_table.setItem(row_idx, 3, QTableWidgetItem(record['product_code'] or 'N/A'))
+            in_qty = Decimal(str(record.get('quantity_in', 0) or 0))
+            out_qty = Decimal(str(record.get('quantity_out', 0) or 0))
+            in_item = QTableWidgetItem(f"{in_qty:,.2f}");
+            out_item = QTableWidgetItem(f"{out_qty:,.2f}")
+            in_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+            out_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+            self.activity_table.setItem(row_idx, 4, in_item)
+            self.activity_table.setItem(row_idx, 5, out_item)
+            self.activity_table.setItem(row_idx, 6, QTableWidgetItem(record.get('remarks', '') or ''))
 
 
 # --- (The rest of the file is unchanged, but included for completeness) ---
@@ -0,0 +1,134 @@
+"""
+Long-lived chart objects for the dashboard pages.
+
+The three dashboard charts are built once and refreshed in place (series.replace(), axis categories/ranges),
+fed by the plain lists produced by dashboard_data.build_chart_data() on the worker thread. Nothing is
+reallocated per refresh, so memory stays flat over a long shift (tests/test_dashboard_charts.py refreshes them
+a hundred times and checks the object count).
+"""
+from PyQt6.QtCore import Qt, QPointF, QSettings
+from PyQt6.QtGui import QColor, QPen
+from PyQt6.QtCharts import (
+    QChart, QChartView, QLineSeries, QValueAxis, QBarCategoryAxis, QHorizontalBarSeries, QBarSeries, QBarSet
+)
+
+# Chart animations replay on every refresh and are the main source of stalls; they are opt-in.
+ANIMATIONS_SETTING_KEY = "dashboard/chart_animations"
+
+
+def chart_animations_enabled() -> bool:
+    return QSettings("MyCompany", "FGInventoryApp").value(ANIMATIONS_SETTING_KEY, False, type=bool)
+
+
+def _axis_max(max_val: float) -> float:
+    return (max_val * 1.1) if max_val > 0 else 10
+
+
+def _set_bar_values(bar_set: QBarSet, values: list):
+    """Updates a bar set in place, only growing or shrinking it when the number of bars changes."""
+    existing = bar_set.count()
+    for i, value in enumerate(values[:existing]):
+        bar_set.replace(i, value)
+    if existing > len(values):
+        bar_set.remove(len(values), existing - len(values))
+    elif len(values) > existing:
+        bar_set.append(values[existing:])
+
+
+class DashboardCharts:
+    """Owns the flow, volume and top-products charts shown in three existing QChartViews."""
+
+    def __init__(self, flow_view: QChartView, volume_view: QChartView, top_products_view: QChartView,
+                 in_color: str, out_color: str, net_color: str, animations: bool = False):
+        self.flow_view = flow_view
+
+        # --- Inventory flow (line chart) ---
+        self.series_in = QLineSeries()
+        self.series_in.setName("Stock IN")
+        self.series_in.setPen(QPen(QColor(in_color), 3))
+        self.series_out = QLineSeries()
+        self.series_out.setName("Stock OUT")
+        self.series_out.setPen(QPen(QColor(out_color), 3))
+        self.series_net = QLineSeries()
+        self.series_net.setName("Net Flow")
+        net_pen = QPen(QColor(net_color), 2)
+        net_pen.setStyle(Qt.PenStyle.DashLine)
+        self.series_net.setPen(net_pen)
+
+        self.flow_chart = QChart()
+        self.flow_axis_x = QBarCategoryAxis()
+        self.flow_axis_y = QValueAxis()
+        self.flow_axis_y.setLabelFormat("%.0f kg")
+        self.flow_chart.addAxis(self.flow_axis_x, Qt.AlignmentFlag.AlignBottom)
+        self.flow_chart.addAxis(self.flow_axis_y, Qt.AlignmentFlag.AlignLeft)
+        for series in (self.series_in, self.series_out, self.series_net):
+            self.flow_chart.addSeries(series)
+            series.attachAxis(self.flow_axis_x)
+            series.attachAxis(self.flow_axis_y)
+            series.hovered.connect(lambda point, state, s=series: self._handle_series_hover(s, point, state))
+        self.flow_chart.legend().setVisible(True)
+        self.flow_chart.legend().setAlignment(Qt.AlignmentFlag.AlignBottom)
+        flow_view.setChart(self.flow_chart)
+
+        # --- Transaction volume (horizontal bars) ---
+        self.volume_set = QBarSet("Count")
+        volume_series = QHorizontalBarSeries()
+        volume_series.append(self.volume_set)
+        self.volume_chart = QChart()
+        self.volume_chart.addSeries(volume_series)
+        self.volume_axis_y = QBarCategoryAxis()
+        self.volume_axis_x = QValueAxis()
+        self.volume_chart.addAxis(self.volume_axis_y, Qt.AlignmentFlag.AlignLeft)
+        self.volume_chart.addAxis(self.volume_axis_x, Qt.AlignmentFlag.AlignBottom)
+        volume_series.attachAxis(self.volume_axis_x)
+        volume_series.attachAxis(self.volume_axis_y)
+        self.volume_chart.legend().setVisible(False)
+        volume_view.setChart(self.volume_chart)
+
+        # --- Top products (vertical bars) ---
+        self.top_set = QBarSet("Stock (kg)")
+        top_series = QBarSeries()
+        top_series.append(self.top_set)
+        self.top_chart = QChart()
+        self.top_chart.addSeries(top_series)
+        self.top_axis_x = QBarCategoryAxis()
+        self.top_axis_y = QValueAxis()
+        self.top_chart.addAxis(self.top_axis_x, Qt.AlignmentFlag.AlignBottom)
+        self.top_chart.addAxis(self.top_axis_y, Qt.AlignmentFlag.AlignLeft)
+        top_series.attachAxis(self.top_axis_x)
+        top_series.attachAxis(self.top_axis_y)
+        self.top_chart.legend().setVisible(False)
+        top_products_view.setChart(self.top_chart)
+
+        self.set_animations_enabled(animations)
+
+    def set_animations_enabled(self, enabled: bool):
+        option = QChart.AnimationOption.SeriesAnimations if enabled else QChart.AnimationOption.NoAnimation
+        for chart in (self.flow_chart, self.volume_chart, self.top_chart):
+            chart.setAnimationOptions(option)
+
+    def update(self, chart_data: dict):
+        """Applies a build_chart_data() result to the existing chart objects."""
+        flow = chart_data['flow']
+        self.flow_axis_x.setCategories(flow['categories'])
+        self.flow_axis_y.setRange(0, _axis_max(flow['max']))
+        self.series_in.replace([QPointF(i, v) for i, v in enumerate(flow['in'])])
+        self.series_out.replace([QPointF(i, v) for i, v in enumerate(flow['out'])])
+        self.series_net.replace([QPointF(i, v) for i, v in enumerate(flow['net'])])
+
+        volume = chart_data['volume']
+        self.volume_axis_y.setCategories(volume['categories'])
+        self.volume_axis_x.setRange(0, _axis_max(max(volume['values'], default=0)))
+        _set_bar_values(self.volume_set, volume['values'])
+
+        top = chart_data['top_products']
+        self.top_axis_x.setCategories(top['categories'])
+        self.top_axis_y.setRange(0, _axis_max(max(top['values'], default=0)))
+        _set_bar_values(self.top_set, top['values'])
+
+    def _handle_series_hover(self, series: QLineSeries, point: QPointF, state: bool):
+        if state:
+            self.flow_view.setToolTip(f"{series.name()}: {point.y():,.2f} kg")
+        else:
+            self.flow_view.setToolTip("")
+
@@ -0,0 +1,158 @@
+import json
+import threading
+import time
+from datetime import date, datetime
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+# How long a dashboard snapshot is served from memory before the database is queried again.
+DEFAULT_CACHE_TTL_SECONDS = 30
+
+# Every dashboard dataset is produced by this single statement so that a refresh costs one round trip.
+# Period totals come from the trigger-maintained movement_daily rollup (see movement_rollup.py) rather than
+# the raw ledgers; all date predicates are plain range comparisons so the planner can use indexes.
+DASHBOARD_QUERY = text("""
+    WITH stock_by_product AS (
+        SELECT product_code, SUM(balance) AS balance, BOOL_OR(balance > 0) AS has_positive_row
+        FROM (
+            SELECT product_code, qty AS balance
+            FROM beginv_sheet1
+            WHERE product_code IS NOT NULL AND TRIM(product_code) <> ''
+            UNION ALL
+            SELECT product_code, (quantity_in - quantity_out) AS balance
+            FROM transactions
+            WHERE product_code IS NOT NULL AND TRIM(product_code) <> ''
+        ) current_stock_calc
+        GROUP BY product_code
+    ),
+    ytd AS (
+        SELECT COALESCE(SUM(tx_count), 0) AS tx_count,
+               COALESCE(SUM(quantity_in), 0) AS total_in,
+               COALESCE(SUM(quantity_out), 0) AS total_out
+        FROM movement_daily
+        WHERE NOT is_failed AND movement_date >= :year_start AND movement_date < :next_year_start
+    ),
+    recent AS (
+        SELECT id, transaction_date, transaction_type, source_ref_no, product_code, quantity_in, quantity_out, remarks
+        FROM transactions ORDER BY transaction_date DESC, id DESC LIMIT 20
+    ),
+    flow AS (
+        SELECT to_char(movement_date, 'YYYY-MM') AS month,
+               SUM(quantity_in) AS total_in, SUM(quantity_out) AS total_out
+        FROM movement_daily
+        WHERE NOT is_failed AND movement_date >= :flow_start
+        GROUP BY month
+    ),
+    volume AS (
+        SELECT transaction_type, SUM(tx_count) AS tx_count
+        FROM movement_daily WHERE NOT is_failed
+        GROUP BY transaction_type HAVING SUM(tx_count) > 0
+    ),
+    top_products AS (
+        SELECT product_code, balance AS stock_balance
+        FROM stock_by_product WHERE balance > 0.001
+        ORDER BY balance DESC LIMIT 10
+    )
+    SELECT json_build_object(
+        'kpi', json_build_object(
+            'total_stock', (SELECT COALESCE(SUM(balance), 0) FROM stock_by_product),
+            'total_in_ytd', (SELECT total_in FROM ytd),
+            'total_out_ytd', (SELECT total_out FROM ytd),
+            'total_transactions_ytd', (SELECT tx_count FROM ytd),
+            'unique_products', (SELECT COUNT(*) FROM stock_by_product WHERE has_positive_row),
+            'failed_tx_30d', (SELECT COALESCE(SUM(tx_count), 0) FROM movement_daily
+                                 WHERE is_failed AND movement_date >= :failed_since)
+        ),
+        'recent_activity', COALESCE((SELECT json_agg(r ORDER BY r.transaction_date DESC, r.id DESC) FROM recent r), '[]'::json),
+        'flow', COALESCE((SELECT json_agg(f ORDER BY f.month) FROM flow f), '[]'::json),
+        'volume', COALESCE((SELECT json_agg(v ORDER BY v.tx_count ASC) FROM volume v), '[]'::json),
+        'top_products', COALESCE((SELECT json_agg(p ORDER BY p.stock_balance DESC) FROM top_products p), '[]'::json)
+    ) AS payload;
+""")
+
+EMPTY_KPIS = {'total_stock': 0, 'total_in_ytd': 0, 'total_out_ytd': 0, 'total_transactions_ytd': 0,
+              'unique_products': 0, 'failed_tx_30d': 0}
+
+
+def _shift_month(day: date, months: int) -> date:
+    """Returns the first day of the month that is `months` away from `day`."""
+    month_index = day.year * 12 + (day.month - 1) + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def dashboard_query_params(today: date | None = None) -> dict:
+    """Computes the date boundaries used by DASHBOARD_QUERY."""
+    today = today or date.today()
+    return {
+        'year_start': date(today.year, 1, 1),
+        'next_year_start': date(today.year + 1, 1, 1),
+        'flow_start': _shift_month(today, -11),
+        'failed_since': date.fromordinal(today.toordinal() - 30),
+    }
+
+
+def build_chart_data(payload: dict) -> dict:
+    """
+    Turns the raw flow/volume/top_products rows into plain lists the chart widgets can apply directly,
+    so the GUI thread never has to parse or aggregate anything.
+    """
+    flow = payload.get('flow') or []
+    months = [datetime.strptime(row['month'], '%Y-%m').strftime('%b-%y') for row in flow]
+    qty_in = [float(row['total_in'] or 0) for row in flow]
+    qty_out = [float(row['total_out'] or 0) for row in flow]
+    volume = payload.get('volume') or []
+    top_products = payload.get('top_products') or []
+    return {
+        'flow': {
+            'categories': months,
+            'in': qty_in,
+            'out': qty_out,
+            'net': [i - o for i, o in zip(qty_in, qty_out)],
+            'max': max(qty_in + qty_out, default=0),
+        },
+        'volume': {
+            'categories': [row['transaction_type'] for row in volume],
+            'values': [int(row['tx_count']) for row in volume],
+        },
+        'top_products': {
+            'categories': [row['product_code'] for row in top_products],
+            'values': [float(row['stock_balance']) for row in top_products],
+        },
+    }
+
+
+class DashboardDataService:
+    """
+    Fetches every dataset shown on the dashboard in one query and keeps the result for a short TTL.
+    Safe to call from worker threads; concurrent callers share a single in-flight fetch.
+    """
+
+    def __init__(self, engine: Engine, ttl_seconds: float = DEFAULT_CACHE_TTL_SECONDS):
+        self.engine = engine
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._cached: dict | None = None
+        self._cached_at = 0.0
+
+    def invalidate(self):
+        with self._lock:
+            self._cached = None
+
+    def get(self, force: bool = False) -> dict:
+        with self._lock:
+            is_fresh = self._cached is not None and (time.monotonic() - self._cached_at) < self.ttl_seconds
+            if is_fresh and not force:
+                return self._cached
+            data = self._fetch()
+            self._cached, self._cached_at = data, time.monotonic()
+            return data
+
+    def _fetch(self) -> dict:
+        with self.engine.connect() as conn:
+            payload = conn.execute(DASHBOARD_QUERY, dashboard_query_params()).scalar_one()
+        if isinstance(payload, str):
+            payload = json.loads(payload)
+        payload['kpi'] = {**EMPTY_KPIS, **{k: v for k, v in (payload.get('kpi') or {}).items() if v is not None}}
+        payload['charts'] = build_chart_data(payload)
+        return payload
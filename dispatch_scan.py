@@ -0,0 +1,205 @@
+"""
+Batch dispatch scanning for the DR scanner tab.
+
+While loading a truck the camera keeps running and every distinct DR number goes into an in-memory manifest.
+Pending entries are validated against product_delivery_primary/delivery_tracking with one query per burst of
+scans, and "Commit Dispatch" writes every valid DR to delivery_tracking in a single transaction.
+"""
+from collections import OrderedDict
+from datetime import datetime
+
+import qtawesome as fa
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal, QDateTime
+from PyQt6.QtGui import QColor
+from PyQt6.QtWidgets import (QGroupBox, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTableWidget,
+                             QTableWidgetItem, QHeaderView, QAbstractItemView, QMessageBox)
+from sqlalchemy import text
+
+DISPATCH_STATUS = "Out for Delivery"
+VALIDATE_DELAY_MS = 800  # validate once the scanner has been quiet this long
+
+PENDING, READY, NOT_FOUND, ALREADY_SCANNED, DISPATCHED = 'Pending', 'Ready', 'Not Found', 'Already Scanned', 'Dispatched'
+STATE_COLORS = {PENDING: '#7f8c8d', READY: '#27ae60', NOT_FOUND: '#c0392b', ALREADY_SCANNED: '#e67e22',
+                DISPATCHED: '#2980b9'}
+
+
+class DispatchManifest:
+    """Ordered set of scanned DRs with their validation state."""
+
+    def __init__(self):
+        self.entries = OrderedDict()  # dr_no -> {'scanned_at', 'customer', 'state', 'detail'}
+
+    def add(self, dr_no: str) -> bool:
+        if dr_no in self.entries:
+            return False
+        self.entries[dr_no] = {'scanned_at': QDateTime.currentDateTime().toString("hh:mm:ss AP"), 'customer': '',
+                               'state': PENDING, 'detail': ''}
+        return True
+
+    def remove(self, dr_no: str):
+        self.entries.pop(dr_no, None)
+
+    def clear(self):
+        self.entries.clear()
+
+    def with_state(self, *states) -> list:
+        return [dr_no for dr_no, entry in self.entries.items() if entry['state'] in states]
+
+    def counts(self) -> dict:
+        counts = dict.fromkeys(STATE_COLORS, 0)
+        for entry in self.entries.values():
+            counts[entry['state']] += 1
+        return counts
+
+
+def validate_dispatch(conn, dr_nos: list) -> dict:
+    """One query for a set of DRs: dr_no -> (customer_name, existing tracking status or None). Missing DRs are absent."""
+    if not dr_nos:
+        return {}
+    rows = conn.execute(text("""
+        SELECT p.dr_no, p.customer_name, dt.status AS tracking_status
+        FROM product_delivery_primary p
+        LEFT JOIN delivery_tracking dt ON dt.dr_no = p.dr_no
+        WHERE p.dr_no = ANY(:nos) AND p.is_deleted IS NOT TRUE
+    """), {"nos": list(dr_nos)}).mappings().all()
+    return {r['dr_no']: (r['customer_name'] or '', r['tracking_status']) for r in rows}
+
+
+def commit_dispatch(conn, dr_nos: list, username: str, status: str = DISPATCH_STATUS) -> list:
+    """
+    Inserts tracking rows for every DR in one statement; must run inside the caller's transaction.
+    DRs deleted or tracked by another station since validation are skipped. Returns the DR numbers written.
+    """
+    if not dr_nos:
+        return []
+    rows = conn.execute(text("""
+        INSERT INTO delivery_tracking (dr_no, status, scanned_by, scanned_on)
+        SELECT p.dr_no, :status, :user, :now
+        FROM product_delivery_primary p
+        WHERE p.dr_no = ANY(:nos) AND p.is_deleted IS NOT TRUE
+        ON CONFLICT (dr_no) DO NOTHING
+        RETURNING dr_no
+    """), {"nos": list(dr_nos), "status": status, "user": username, "now": datetime.now()}).scalars().all()
+    return list(rows)
+
+
+class DispatchManifestPanel(QGroupBox):
+    """Running manifest of a batch-scan session with validate/commit controls."""
+    committed = pyqtSignal(list)
+
+    def __init__(self, engine, username, log_audit_trail_func, parent=None):
+        super().__init__("Dispatch Manifest (Batch Scan Session)", parent)
+        self.engine = engine
+        self.username = username
+        self.log_audit_trail = log_audit_trail_func
+        self.manifest = DispatchManifest()
+        self._validate_timer = QTimer(self, singleShot=True, interval=VALIDATE_DELAY_MS)
+        self._validate_timer.timeout.connect(self.validate_pending)
+
+        layout = QVBoxLayout(self)
+        self.table = QTableWidget(0, 4)
+        self.table.setHorizontalHeaderLabels(["DR No.", "Customer", "Scanned At", "Status"])
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        layout.addWidget(self.table)
+
+        button_layout = QHBoxLayout()
+        self.summary_label = QLabel()
+        self.summary_label.setStyleSheet("font-weight: bold;")
+        remove_btn = QPushButton(fa.icon('fa5s.minus-circle'), "Remove Selected")
+        clear_btn = QPushButton(fa.icon('fa5s.trash-alt'), "Clear")
+        self.commit_btn = QPushButton(fa.icon('fa5s.truck'), "Commit Dispatch")
+        button_layout.addWidget(self.summary_label, 1)
+        button_layout.addWidget(remove_btn)
+        button_layout.addWidget(clear_btn)
+        button_layout.addWidget(self.commit_btn)
+        layout.addLayout(button_layout)
+
+        remove_btn.clicked.connect(self._remove_selected)
+        clear_btn.clicked.connect(self._clear)
+        self.commit_btn.clicked.connect(self.commit)
+        self._refresh_table()
+
+    def add_scan(self, dr_no: str) -> bool:
+        dr_no = dr_no.strip().upper()
+        if not dr_no or not self.manifest.add(dr_no):
+            return False
+        self._refresh_table()
+        self._validate_timer.start()
+        return True
+
+    def validate_pending(self):
+        pending = self.manifest.with_state(PENDING)
+        if not pending:
+            return
+        try:
+            with self.engine.connect() as conn:
+                found = validate_dispatch(conn, pending)
+        except Exception as e:
+            QMessageBox.critical(self, "Database Error", f"Could not validate scanned DRs:\n{e}")
+            return
+        for dr_no in pending:
+            entry = self.manifest.entries.get(dr_no)
+            if entry is None: continue
+            if dr_no not in found:
+                entry['state'] = NOT_FOUND
+                continue
+            entry['customer'], tracking_status = found[dr_no]
+            entry['state'], entry['detail'] = (ALREADY_SCANNED, tracking_status) if tracking_status else (READY, '')
+        self._refresh_table()
+
+    def commit(self):
+        self._validate_timer.stop()
+        self.validate_pending()
+        ready = self.manifest.with_state(READY)
+        if not ready:
+            QMessageBox.information(self, "Nothing to Commit", "There are no valid, unscanned DRs in the manifest.")
+            return
+        try:
+            with self.engine.connect() as conn:
+                with conn.begin():
+                    written = commit_dispatch(conn, ready, self.username)
+        except Exception as e:
+            QMessageBox.critical(self, "Database Error", f"Dispatch was not saved; no DRs were updated:\n{e}")
+            return
+        written_set = set(written)
+        for dr_no in ready:
+            entry = self.manifest.entries[dr_no]
+            entry['state'], entry['detail'] = (DISPATCHED, '') if dr_no in written_set else (ALREADY_SCANNED, '')
+        self.log_audit_trail("BATCH_UPDATE_DELIVERY_STATUS",
+                             f"{len(written)} DR(s) set to {DISPATCH_STATUS}: {', '.join(written)}")
+        self._refresh_table()
+        self.committed.emit(written)
+
+    def _remove_selected(self):
+        for index in sorted({i.row() for i in self.table.selectedIndexes()}, reverse=True):
+            self.manifest.remove(self.table.item(index, 0).text())
+        self._refresh_table()
+
+    def _clear(self):
+        if self.manifest.with_state(PENDING, READY) and QMessageBox.question(
+                self, "Clear Manifest", "Discard the uncommitted DRs in this manifest?") != QMessageBox.StandardButton.Yes:
+            return
+        self.manifest.clear()
+        self._refresh_table()
+
+    def _refresh_table(self):
+        entries = list(self.manifest.entries.items())
+        self.table.setRowCount(len(entries))
+        for row, (dr_no, entry) in enumerate(reversed(entries)):  # newest scan on top
+            status_text = f"{entry['state']} ({entry['detail']})" if entry['detail'] else entry['state']
+            status_item = QTableWidgetItem(status_text)
+            status_item.setForeground(QColor(STATE_COLORS[entry['state']]))
+            self.table.setItem(row, 0, QTableWidgetItem(dr_no))
+            self.table.setItem(row, 1, QTableWidgetItem(entry['customer']))
+            self.table.setItem(row, 2, QTableWidgetItem(entry['scanned_at']))
+            self.table.setItem(row, 3, status_item)
+        counts = self.manifest.counts()
+        self.summary_label.setText(
+            f"Scanned: {len(entries)} | Ready: {counts[READY]} | Pending: {counts[PENDING]} | "
+            f"Not Found: {counts[NOT_FOUND]} | Already Scanned: {counts[ALREADY_SCANNED]} | "
+            f"Dispatched: {counts[DISPATCHED]}")
+        self.commit_btn.setText(f"Commit Dispatch ({counts[READY] + counts[PENDING]})")
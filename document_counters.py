@@ -0,0 +1,120 @@
+"""
+Document numbers (FGE-/QCF-/QCE-/QCFP- endorsement refs, RR, RRF, REQ and DR numbers) allocated from
+document_counters, one row per numbering series.
+
+next_document_number() bumps the series' row with a single UPDATE ... RETURNING inside the caller's transaction,
+so the row stays locked until the document is inserted and committed: two workstations can never draw the same
+number, and a save that rolls back hands its number back. This replaces the pages' read-max-then-increment
+queries, which raced between workstations and ended in unique-key violations.
+
+A series without a row yet (a new day or month) is seeded from the highest number already in its document table,
+so switching over continues the existing numbering. tests/test_document_counters.py stress-tests concurrent
+allocation on SQLite.
+"""
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import text
+
+COUNTERS_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS document_counters (
+        counter_key VARCHAR(100) PRIMARY KEY,
+        last_value BIGINT NOT NULL,
+        updated_on TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+# prefix_format: strftime pattern of the series prefix ('' for one global series); width: zero padding;
+# table / column: where issued numbers live (for seeding); start_setting: app_settings key with the first number.
+DocumentSeries = namedtuple('DocumentSeries', 'prefix_format width table column start_setting')
+
+SERIES = {
+    'FGE': DocumentSeries('FGE-%Y%m%d-', 4, 'fg_endorsements_primary', 'system_ref_no', None),
+    'QCF': DocumentSeries('QCF-%y%m-', 4, 'qcf_endorsements_primary', 'system_ref_no', None),
+    'QCE': DocumentSeries('QCE-%y%m-', 4, 'qce_endorsements_primary', 'system_ref_no', None),
+    'QCFP': DocumentSeries('QCFP-%y%m-', 4, 'qcfp_endorsements_primary', 'system_ref_no', None),
+    'RR': DocumentSeries('RRRG%y%m', 3, 'receiving_reports_primary', 'rr_no', None),
+    'REQ': DocumentSeries('REQ-%Y%m%d-', 4, 'requisition_logbook', 'req_id', None),
+    'RRF': DocumentSeries('', 5, 'rrf_primary', 'rrf_no', 'RRF_SEQUENCE_START'),
+    'DR': DocumentSeries('', 0, 'product_delivery_primary', 'dr_no', 'DR_SEQUENCE_START'),
+}
+
+DEFAULT_STARTS = {'DR_SEQUENCE_START': 100001, 'RRF_SEQUENCE_START': 1}
+
+BUMP_SQL = """
+    UPDATE document_counters SET last_value = last_value + 1, updated_on = CURRENT_TIMESTAMP
+    WHERE counter_key = :key RETURNING last_value
+"""
+
+# Two clients seeding the same new series: the second one's insert turns into the bump.
+SEED_SQL = """
+    INSERT INTO document_counters (counter_key, last_value) VALUES (:key, :value)
+    ON CONFLICT (counter_key) DO UPDATE SET last_value = document_counters.last_value + 1,
+        updated_on = CURRENT_TIMESTAMP
+    RETURNING last_value
+"""
+
+
+def ensure_document_counters(connection):
+    connection.execute(text(COUNTERS_TABLE_DDL))
+
+
+def _series_prefix(series: DocumentSeries, when) -> str:
+    return (when or datetime.now()).strftime(series.prefix_format) if series.prefix_format else ''
+
+
+def _counter_key(kind: str, prefix: str) -> str:
+    return f"{kind}:{prefix}" if prefix else kind
+
+
+def _format(series: DocumentSeries, prefix: str, value: int) -> str:
+    return f"{prefix}{value:0{series.width}d}"
+
+
+def _start_number(connection, series: DocumentSeries) -> int:
+    if not series.start_setting:
+        return 1
+    value = connection.execute(text("SELECT setting_value FROM app_settings WHERE setting_key = :key"),
+                               {"key": series.start_setting}).scalar_one_or_none()
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_STARTS[series.start_setting]
+
+
+def _highest_issued(connection, series: DocumentSeries, prefix: str) -> int:
+    """Highest number already in the document table for the series; only read when its counter row is new."""
+    numbers = connection.execute(text(f"SELECT {series.column} FROM {series.table} WHERE {series.column} LIKE :p"),
+                                 {"p": f"{prefix}%"}).scalars()
+    suffixes = [n[len(prefix):] for n in numbers if n]
+    if series.width and not prefix:
+        suffixes = [s for s in suffixes if len(s) == series.width]
+    return max((int(s) for s in suffixes if s.isdigit()), default=0)
+
+
+def next_document_number(connection, kind: str, when=None) -> str:
+    """Allocates the next number of a series. Call inside the transaction that inserts the document."""
+    series = SERIES[kind]
+    prefix = _series_prefix(series, when)
+    key = _counter_key(kind, prefix)
+    value = connection.execute(text(BUMP_SQL), {"key": key}).scalar_one_or_none()
+    if value is None:
+        seed = _highest_issued(connection, series, prefix) + 1
+        value = connection.execute(text(SEED_SQL), {"key": key, "value": seed}).scalar_one()
+    start = _start_number(connection, series)
+    if value < start:  # the start setting was raised past the series; the row is already locked by the bump
+        value = connection.execute(text("UPDATE document_counters SET last_value = :v WHERE counter_key = :key "
+                                        "RETURNING last_value"), {"v": start, "key": key}).scalar_one()
+    return _format(series, prefix, value)
+
+
+def preview_document_number(connection, kind: str, when=None) -> str:
+    """The number the next save will most likely get, for display; nothing is reserved."""
+    series = SERIES[kind]
+    prefix = _series_prefix(series, when)
+    last = connection.execute(text("SELECT last_value FROM document_counters WHERE counter_key = :key"),
+                              {"key": _counter_key(kind, prefix)}).scalar_one_or_none()
+    if last is None:
+        last = _highest_issued(connection, series, prefix)
+    return _format(series, prefix, max(last + 1, _start_number(connection, series)))
+
@@ -0,0 +1,153 @@
+"""
+Process-wide fonts and paragraph stylesheets for the reportlab document generators (DR, RRF, RR).
+
+Fonts are resolved against a list of candidate files (Windows, the application folder, common Linux
+locations), parsed once and registered under stable aliases, so the generators can keep referring to
+'Arial'/'LucidaSans' whatever file actually backs them. Stylesheets are built once per process and shared
+between documents; reportlab never mutates ParagraphStyle objects while laying out a story.
+"""
+import os
+import sys
+import threading
+
+from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle, StyleSheet1
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+APP_DIR = os.path.dirname(os.path.abspath(sys.argv[0] if sys.argv and sys.argv[0] else __file__))
+WINDOWS_FONT_DIR = os.path.join(os.environ.get('WINDIR', 'C:/Windows'), 'Fonts')
+LINUX_FONT_DIRS = [
+    '/usr/share/fonts/truetype/msttcorefonts',
+    '/usr/share/fonts/truetype/liberation',
+    '/usr/share/fonts/truetype/liberation2',
+    '/usr/share/fonts/liberation-sans',
+    '/usr/share/fonts/truetype/dejavu',
+    '/usr/share/fonts/dejavu',
+]
+
+# alias -> candidate (regular file, bold file) pairs, in order of preference
+FONT_FAMILIES = {
+    'LucidaSans': [('LSANS.TTF', 'LTYPEB.TTF'), ('arial.ttf', 'arialbd.ttf'), ('Arial.ttf', 'Arial_Bold.ttf'),
+                   ('LiberationSans-Regular.ttf', 'LiberationSans-Bold.ttf'), ('DejaVuSans.ttf', 'DejaVuSans-Bold.ttf')],
+    'Arial': [('arial.ttf', 'arialbd.ttf'), ('Arial.ttf', 'Arial_Bold.ttf'),
+              ('LiberationSans-Regular.ttf', 'LiberationSans-Bold.ttf'), ('DejaVuSans.ttf', 'DejaVuSans-Bold.ttf')],
+}
+BUILTIN_FALLBACK = ('Helvetica', 'Helvetica-Bold')
+
+_lock = threading.Lock()
+_families: dict = {}
+_stylesheets: dict = {}
+
+
+def _find_font_file(file_name: str):
+    for folder in [APP_DIR, os.getcwd(), WINDOWS_FONT_DIR] + LINUX_FONT_DIRS:
+        path = os.path.join(folder, file_name)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def _register_family(alias: str) -> tuple:
+    """Registers '<alias>' and '<alias>-Bold' from the first available candidate pair."""
+    normal_name, bold_name = alias, f"{alias}-Bold"
+    for regular_file, bold_file in FONT_FAMILIES[alias]:
+        regular_path, bold_path = _find_font_file(regular_file), _find_font_file(bold_file)
+        if not (regular_path and bold_path):
+            continue
+        try:
+            pdfmetrics.registerFont(TTFont(normal_name, regular_path))
+            pdfmetrics.registerFont(TTFont(bold_name, bold_path))
+            break
+        except Exception as e:
+            print(f"Font '{regular_file}' could not be loaded: {e}")
+    else:
+        print(f"No TrueType font found for '{alias}'. Falling back to {BUILTIN_FALLBACK[0]}.")
+        pdfmetrics.registerFont(pdfmetrics.Font(normal_name, BUILTIN_FALLBACK[0], 'WinAnsiEncoding'))
+        pdfmetrics.registerFont(pdfmetrics.Font(bold_name, BUILTIN_FALLBACK[1], 'WinAnsiEncoding'))
+    pdfmetrics.registerFontFamily(alias, normal=normal_name, bold=bold_name)
+    return normal_name, bold_name
+
+
+def font_family(alias: str) -> tuple:
+    """Returns the (normal, bold) font names for alias, registering them on first use."""
+    with _lock:
+        if alias not in _families:
+            _families[alias] = _register_family(alias)
+        return _families[alias]
+
+
+def _dr_stylesheet() -> StyleSheet1:
+    FONT_NORMAL, FONT_BOLD = font_family('Arial')
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(name='DRTitle', fontName=FONT_BOLD, fontSize=14, alignment=TA_LEFT))
+    styles.add(ParagraphStyle(name='DRLabel', fontName=FONT_NORMAL, fontSize=10, alignment=TA_LEFT))
+    styles.add(ParagraphStyle(name='DRNumber', fontName=FONT_BOLD, fontSize=16, alignment=TA_LEFT))
+    styles.add(ParagraphStyle(name='DRData', fontName=FONT_NORMAL, fontSize=10, alignment=TA_LEFT))
+    styles.add(ParagraphStyle(name='CustomerData', fontName=FONT_BOLD, fontSize=12, leading=12))
+    styles.add(ParagraphStyle(name='CustomerData2', fontName=FONT_BOLD, fontSize=10, leading=12))
+    styles.add(ParagraphStyle(name='ItemHeader', fontName=FONT_BOLD, fontSize=9, alignment=TA_CENTER))
+    styles.add(ParagraphStyle(name='ItemText', fontName=FONT_NORMAL, fontSize=10, alignment=TA_CENTER))
+    styles.add(ParagraphStyle(name='ItemTextRight', parent=styles['ItemText'], alignment=TA_RIGHT))
+    styles.add(ParagraphStyle(name='ItemDesc', fontName=FONT_BOLD, fontSize=10, leading=11))
+    styles.add(ParagraphStyle(name='NothingFollows', fontName=FONT_BOLD, fontSize=9, alignment=TA_CENTER))
+    styles.add(ParagraphStyle(name='FooterText', fontName=FONT_NORMAL, fontSize=9))
+    styles.add(ParagraphStyle(name='Footerby', fontName=FONT_NORMAL, fontSize=9, alignment=TA_LEFT, leading=10))
+    styles.add(ParagraphStyle(name='ImportantText', fontName=FONT_NORMAL, fontSize=7, leading=8))
+    return styles
+
+
+def _rrf_stylesheet() -> StyleSheet1:
+    normal, bold = font_family('LucidaSans')
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(name='MainStyle', fontName=normal, fontSize=10, leading=11))
+    styles.add(ParagraphStyle(name='MainStyleBold', parent=styles['MainStyle'], fontName=bold))
+    styles.add(ParagraphStyle(name='MainStyleRight', parent=styles['MainStyleBold'], alignment=TA_RIGHT))
+    styles.add(ParagraphStyle(name='MainStyleCenter', parent=styles['MainStyleBold'], alignment=TA_CENTER))
+    styles.add(ParagraphStyle(name='Footer', fontName=bold, fontSize=9, leading=10))
+    styles.add(ParagraphStyle(name='FooterSig', fontName=normal, fontSize=8, alignment=TA_CENTER))
+    styles.add(ParagraphStyle(name='FooterSub', fontName=normal, fontSize=8, alignment=TA_CENTER))
+    styles.add(ParagraphStyle(name='RemarkStyle', fontName=normal, fontSize=9, leading=9, leftIndent=10))
+    return styles
+
+
+def _rr_stylesheet() -> StyleSheet1:
+    normal, bold = font_family('LucidaSans')
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(name='MainStyle', fontName=normal, fontSize=9, leading=10))
+    styles.add(ParagraphStyle(name='MainStyleBold', parent=styles['MainStyle'], fontName=bold))
+    styles.add(ParagraphStyle(name='MainStyleRight', parent=styles['MainStyle'], alignment=TA_RIGHT))
+    styles.add(ParagraphStyle(name='MainStyleBoldRight', parent=styles['MainStyleBold'], alignment=TA_RIGHT))
+    styles.add(ParagraphStyle(name='MainStyleCenter', parent=styles['MainStyle'], alignment=TA_CENTER))
+    styles.add(ParagraphStyle(name='MainStyleBoldCenter', parent=styles['MainStyleBold'], alignment=TA_CENTER))
+    styles.add(ParagraphStyle(name='Footer', fontName=bold, fontSize=8, leading=9))
+    styles.add(ParagraphStyle(name='FooterSig', fontName=normal, fontSize=8, alignment=TA_CENTER))
+    styles.add(ParagraphStyle(name='FooterSub', fontName=normal, fontSize=7, alignment=TA_CENTER))
+    styles.add(ParagraphStyle(name='RemarkStyle', fontName=normal, fontSize=8, leading=9, leftIndent=5))
+    return styles
+
+
+STYLESHEET_BUILDERS = {'DR': _dr_stylesheet, 'RRF': _rrf_stylesheet, 'RR': _rr_stylesheet}
+
+
+def stylesheet(doc_type: str) -> StyleSheet1:
+    """Returns the shared stylesheet for a document type ('DR', 'RRF' or 'RR')."""
+    styles = _stylesheets.get(doc_type)
+    if styles is None:
+        styles = STYLESHEET_BUILDERS[doc_type]()
+        with _lock:
+            styles = _stylesheets.setdefault(doc_type, styles)
+    return styles
+
+
+def warm_up():
+    """Resolves every font and builds every stylesheet; used as the print-pool worker initializer."""
+    for doc_type in STYLESHEET_BUILDERS:
+        stylesheet(doc_type)
+
+
+def clear_caches():
+    """Forgets resolved fonts and stylesheets (benchmarks only; registered fonts stay in pdfmetrics)."""
+    with _lock:
+        _families.clear()
+        _stylesheets.clear()
@@ -0,0 +1,369 @@
+"""
+Outbound report email queue.
+
+Reports are written to a spool directory (one folder per message: job.json plus the .xlsx attachments) and
+delivered by a background sender, so pressing "Email" never waits on SMTP. The sender delivers every due
+message over one authenticated SMTP connection per batch; a failed message is retried with exponential
+backoff and moved to failed/ once it runs out of attempts or the server rejects it permanently. Messages
+left in the spool by a crash or an offline network go out on the next start.
+
+SMTP settings are read when a batch is sent, never stored in the spool, so the password stays in QSettings
+and corrected settings apply to messages already queued. smtp_security ('ssl' / 'starttls' / 'none') is
+derived from the port as before (465 -> SSL, otherwise STARTTLS); 'none' exists for local test servers.
+
+tests/test_email_spool.py delivers to a local aiosmtpd stub to check connection reuse, retry and rejection.
+"""
+import json
+import os
+import queue
+import random
+import shutil
+import smtplib
+import ssl
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime
+from email.message import EmailMessage
+
+try:
+    from PyQt6.QtCore import QObject, QSettings, pyqtSignal
+    from PyQt6.QtWidgets import QMessageBox
+
+    QT_AVAILABLE = True
+except ImportError:  # the spool and sender also run without a GUI (scheduled_reports.py)
+    QT_AVAILABLE = False
+
+XLSX_MIME = ('application', 'vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+DEFAULT_SPOOL_DIR = os.path.join(os.path.expanduser("~"), ".fg_inventory", "email_spool")
+SPOOL_DIR_SETTING_KEY = "email/spool_dir"
+MAX_ATTEMPTS = 8
+RETRY_BASE_SECONDS = 60  # 1, 2, 4 ... minutes between attempts
+RETRY_MAX_SECONDS = 3600
+POLL_SECONDS = 30
+SMTP_TIMEOUT = 30
+REQUIRED_SETTINGS = ('sender_email', 'smtp_server', 'smtp_port')
+
+
+class PermanentEmailError(Exception):
+    """The message can never be delivered as queued (rejected recipients, unusable job)."""
+
+
+def retry_delay(attempts: int) -> float:
+    delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** max(0, attempts - 1))
+    return delay * random.uniform(0.9, 1.1)
+
+
+def smtp_security(config: dict) -> str:
+    return config.get('smtp_security') or ('ssl' if int(config['smtp_port']) == 465 else 'starttls')
+
+
+def open_smtp(config: dict):
+    """Connects and logs in once; the caller sends as many messages as it has over the returned session."""
+    missing = [key for key in REQUIRED_SETTINGS if not config.get(key)]
+    if missing:
+        raise ValueError("Incomplete email settings. Please configure them in the Settings menu.")
+    host, port, security = config['smtp_server'], int(config['smtp_port']), smtp_security(config)
+    context = ssl.create_default_context()
+    if security == 'ssl':
+        server = smtplib.SMTP_SSL(host, port, context=context, timeout=SMTP_TIMEOUT)
+    else:
+        server = smtplib.SMTP(host, port, timeout=SMTP_TIMEOUT)
+        if security == 'starttls':
+            server.starttls(context=context)
+    if config.get('sender_password'):
+        server.login(config['sender_email'], config['sender_password'])
+    return server
+
+
+class EmailSpool:
+    """The spool directory: <root>/<job id>/ for queued messages, <root>/failed/<job id>/ for dead ones."""
+
+    def __init__(self, root: str = DEFAULT_SPOOL_DIR):
+        self.root = root
+        self.failed_dir = os.path.join(root, 'failed')
+        os.makedirs(self.failed_dir, exist_ok=True)
+
+    def enqueue(self, subject: str, recipients: list, body: str, attachments: dict, meta: dict = None,
+                job_id: str = None) -> str:
+        """
+        Writes the attachments ({filename: [excel_export sheets]}) and job.json into a hidden folder and
+        renames it into place, so the sender never sees a half-written message.
+        """
+        job_id = job_id or f"{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}"
+        tmp_dir = os.path.join(self.root, f".tmp-{job_id}")
+        os.makedirs(tmp_dir)
+        try:
+            if attachments:
+                from excel_export import write_workbook
+            for filename, sheets in attachments.items():
+                write_workbook(os.path.join(tmp_dir, filename), sheets)
+            job = {'id': job_id, 'subject': subject, 'recipients': list(recipients), 'body': body,
+                   'attachments': list(attachments), 'meta': meta or {}, 'created_at': time.time(),
+                   'attempts': 0, 'next_attempt_at': 0, 'last_error': None}
+            self._write_job(tmp_dir, job)
+            os.rename(tmp_dir, os.path.join(self.root, job_id))
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        return job_id
+
+    def _write_job(self, job_dir: str, job: dict):
+        tmp_path = os.path.join(job_dir, 'job.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(job, f)
+        os.replace(tmp_path, os.path.join(job_dir, 'job.json'))
+
+    def jobs(self) -> list:
+        jobs = []
+        for name in os.listdir(self.root):
+            job_path = os.path.join(self.root, name, 'job.json')
+            if name.startswith('.') or name == 'failed' or not os.path.isfile(job_path):
+                continue
+            try:
+                with open(job_path, encoding='utf-8') as f:
+                    jobs.append(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"EmailSpool: Skipping unreadable job {name}: {e}")
+        return sorted(jobs, key=lambda j: j['created_at'])
+
+    def due_jobs(self, now: float = None) -> list:
+        now = time.time() if now is None else now
+        return [job for job in self.jobs() if job['next_attempt_at'] <= now]
+
+    def build_message(self, job: dict, sender_email: str) -> EmailMessage:
+        msg = EmailMessage()
+        msg['Subject'] = job['subject']
+        msg['From'] = sender_email
+        msg['To'] = ', '.join(job['recipients'])
+        msg.set_content(job['body'])
+        for filename in job['attachments']:
+            path = os.path.join(self.root, job['id'], filename)
+            try:
+                with open(path, 'rb') as f:
+                    msg.add_attachment(f.read(), maintype=XLSX_MIME[0], subtype=XLSX_MIME[1], filename=filename)
+            except FileNotFoundError:
+                raise PermanentEmailError(f"Attachment {filename} is missing from the spool.")
+        return msg
+
+    def complete(self, job: dict):
+        shutil.rmtree(os.path.join(self.root, job['id']), ignore_errors=True)
+
+    def defer(self, job: dict, error: str) -> bool:
+        """Records a failed attempt; returns True when the job was given up and moved to failed/."""
+        job['attempts'] += 1
+        job['last_error'] = error
+        job['next_attempt_at'] = time.time() + retry_delay(job['attempts'])
+        if job['attempts'] >= MAX_ATTEMPTS:
+            self.fail(job, error)
+            return True
+        self._write_job(os.path.join(self.root, job['id']), job)
+        return False
+
+    def fail(self, job: dict, error: str):
+        job['last_error'] = error
+        job_dir = os.path.join(self.root, job['id'])
+        self._write_job(job_dir, job)
+        os.replace(job_dir, os.path.join(self.failed_dir, job['id']))
+
+
+class SpoolSender(threading.Thread):
+    """
+    Background sender. submit() hands a message to the thread, which spools it and delivers everything due.
+    on_sent(job) / on_failed(job, error, final) are called from this thread.
+    """
+
+    def __init__(self, spool: EmailSpool, config_provider, on_sent=None, on_failed=None,
+                 poll_seconds: float = POLL_SECONDS):
+        super().__init__(name="SpoolSender", daemon=True)
+        self.spool = spool
+        self.config_provider = config_provider
+        self.on_sent = on_sent or (lambda job: None)
+        self.on_failed = on_failed or (lambda job, error, final: None)
+        self.poll_seconds = poll_seconds
+        self.connections_opened = 0
+        self._incoming = queue.Queue()
+        self._wake = threading.Event()
+        self._running = True
+
+    def submit(self, subject: str, recipients: list, body: str, attachments: dict, meta: dict = None) -> str:
+        job_id = f"{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}"
+        self._incoming.put((job_id, subject, recipients, body, attachments, meta))
+        self.wake()
+        return job_id
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+
+    def run(self):
+        while self._running:
+            self._wake.clear()
+            self._spool_incoming()
+            try:
+                self.process_due()
+            except Exception:
+                print(f"SpoolSender: Unexpected error:\n{traceback.format_exc()}")
+            self._wake.wait(self.poll_seconds)
+
+    def _spool_incoming(self):
+        while True:
+            try:
+                job_id, subject, recipients, body, attachments, meta = self._incoming.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                self.spool.enqueue(subject, recipients, body, attachments, meta, job_id=job_id)
+            except Exception as e:
+                self.on_failed({'id': job_id, 'subject': subject, 'recipients': recipients, 'meta': meta or {}},
+                               f"Could not prepare the report attachments: {e}", True)
+
+    def process_due(self) -> int:
+        """Sends every due job over one SMTP session; returns the number delivered."""
+        jobs = self.spool.due_jobs()
+        if not jobs:
+            return 0
+        try:
+            config = self.config_provider()
+            server = open_smtp(config)
+            self.connections_opened += 1
+        except Exception as e:
+            for job in jobs:
+                self.on_failed(job, str(e), self.spool.defer(job, str(e)))
+            return 0
+
+        sent = 0
+        try:
+            for job in jobs:
+                try:
+                    try:
+                        self._send(server, job, config)
+                    except smtplib.SMTPServerDisconnected:
+                        server = open_smtp(config)  # the server dropped an idle or long session; one reconnect
+                        self.connections_opened += 1
+                        self._send(server, job, config)
+                except (PermanentEmailError, smtplib.SMTPRecipientsRefused) as e:
+                    self.spool.fail(job, str(e))
+                    self.on_failed(job, str(e), True)
+                except smtplib.SMTPResponseException as e:
+                    error = f"{e.smtp_code} {e.smtp_error!r}"
+                    if 500 <= e.smtp_code < 600:
+                        self.spool.fail(job, error)
+                        self.on_failed(job, error, True)
+                    else:
+                        self.on_failed(job, error, self.spool.defer(job, error))
+                except Exception as e:
+                    self.on_failed(job, str(e), self.spool.defer(job, str(e)))
+                else:
+                    self.spool.complete(job)
+                    sent += 1
+                    self.on_sent(job)
+        finally:
+            try:
+                server.quit()
+            except Exception:
+                pass
+        return sent
+
+    def _send(self, server, job: dict, config: dict):
+        msg = self.spool.build_message(job, config['sender_email'])
+        server.send_message(msg, from_addr=config['sender_email'], to_addrs=job['recipients'])
+
+
+def settings_email_config() -> dict:
+    """SMTP settings from the app's QSettings, read fresh for each batch."""
+    settings = QSettings("MyCompany", "FGInventoryApp")
+    return {"sender_email": settings.value("email/sender_email", ""),
+            "sender_password": settings.value("email/sender_password", ""),
+            "smtp_server": settings.value("email/smtp_server", ""),
+            "smtp_port": settings.value("email/smtp_port", 0, type=int),
+            "smtp_security": settings.value("email/smtp_security", "")}
+
+
+def report_email_body(filenames) -> str:
+    return f'Please find the attached Excel report(s): {", ".join(filenames)}.\n\nThis is an automated message.'
+
+
+if QT_AVAILABLE:
+    class EmailService(QObject):
+        """GUI-side face of the sender: per-job callbacks are run on the GUI thread."""
+        job_sent = pyqtSignal(dict)
+        job_failed = pyqtSignal(dict, str, bool)
+
+        def __init__(self):
+            super().__init__()
+            spool_dir = QSettings("MyCompany", "FGInventoryApp").value(SPOOL_DIR_SETTING_KEY, "") or DEFAULT_SPOOL_DIR
+            self.sender = SpoolSender(EmailSpool(spool_dir), settings_email_config, self.job_sent.emit,
+                                      self.job_failed.emit)
+            self._callbacks = {}
+            self.job_sent.connect(self._on_job_sent)
+            self.job_failed.connect(self._on_job_failed)
+            self.sender.start()
+
+        def submit(self, subject: str, recipients: list, body: str, attachments: dict, on_sent=None,
+                   on_failed=None) -> str:
+            """Queues a report; on_sent(job) / on_failed(job, error, final) run on the GUI thread."""
+            job_id = self.sender.submit(subject, recipients, body, attachments)
+            self._callbacks[job_id] = (on_sent, on_failed)
+            return job_id
+
+        def pending_count(self) -> int:
+            return len(self.sender.spool.jobs())
+
+        def _on_job_sent(self, job: dict):
+            on_sent, _ = self._callbacks.pop(job['id'], (None, None))
+            print(f"EmailService: Sent '{job['subject']}' to {', '.join(job['recipients'])}.")
+            if on_sent:
+                on_sent(job)
+
+        def _on_job_failed(self, job: dict, error: str, final: bool):
+            print(f"EmailService: '{job['subject']}' {'failed' if final else 'will be retried'}: {error}")
+            callbacks = self._callbacks.pop(job['id'], (None, None)) if final else self._callbacks.get(job['id'])
+            if callbacks and callbacks[1]:
+                callbacks[1](job, error, final)
+
+
+_service = None
+
+
+def email_service():
+    """The process-wide email service, started on first use (which also resumes anything left in the spool)."""
+    global _service
+    if _service is None:
+        _service = EmailService()
+    return _service
+
+
+def queue_report_email(parent, log_audit_trail, subject: str, attachments: dict, recipient_email: str,
+                       audit_action: str, report_name: str) -> str:
+    """
+    Hands a report page's workbooks ({filename: {sheet name: DataFrame}}) to the background email queue and tells
+    the user. The audit entry is written once the message has been sent; a final failure is shown on parent.
+    """
+    from excel_export import DataFrameSheet
+
+    recipients = [email.strip() for email in recipient_email.split(',') if email.strip()]
+    sheets = {filename: [DataFrameSheet(sheet_name, df) for sheet_name, df in df_dict.items()]
+              for filename, df_dict in attachments.items()}
+
+    def on_sent(job):
+        log_audit_trail(audit_action, f"User emailed {report_name} to '{recipient_email}'.")
+
+    def on_failed(job, error, final):
+        if final:
+            msg_box = QMessageBox(parent)
+            msg_box.setIcon(QMessageBox.Icon.Critical)
+            msg_box.setWindowTitle("Email Error")
+            msg_box.setText(f"<b>The {report_name} could not be sent to {recipient_email}.</b>")
+            msg_box.setDetailedText(error)
+            msg_box.exec()
+
+    job_id = email_service().submit(subject, recipients, report_email_body(attachments), sheets, on_sent, on_failed)
+    QMessageBox.information(parent, "Email Queued",
+                            f"The {report_name} has been queued for {recipient_email} and will be sent in the "
+                            f"background. Delivery is retried automatically if the mail server is unreachable.")
+    return job_id
@@ -0,0 +1,227 @@
+"""
+Streaming .xlsx writer shared by the inventory, audit and endorsement exports and the emailed reports.
+
+Workbooks are written with openpyxl in write-only mode, so rows go straight to the zip stream instead of
+being held as cell objects. A sheet is either an in-memory DataFrame or a query streamed from a server-side
+cursor. Column widths are sized from the first SAMPLE_ROWS rows (write-only sheets need them before the
+first row) and quantity columns get the '#,##0.00' format of the old per-page _format_excel_sheet helpers.
+
+Exports to a path write a temporary file next to the target and replace it at the end, so a cancelled or
+failed export never leaves a truncated workbook and a file still open in Excel is reported once, at the end.
+"""
+import itertools
+import os
+import tempfile
+import traceback
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+from PyQt6.QtCore import QObject, QThread, pyqtSignal, Qt
+from PyQt6.QtWidgets import QProgressDialog
+from sqlalchemy import text
+
+SAMPLE_ROWS = 500
+STREAM_BATCH = 2000  # rows fetched per round trip from a server-side cursor
+PROGRESS_EVERY = 5000
+MIN_WIDTH, MAX_WIDTH = 10, 50
+QTY_FORMAT = '#,##0.00'
+HEADER_FONT = Font(bold=True)
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def default_number_columns(headers) -> list:
+    """Quantity-like columns, as the page helpers picked them ('QTY' or 'BALANCE' in the header)."""
+    return [h for h in headers if 'QTY' in str(h).upper() or 'BALANCE' in str(h).upper()]
+
+
+class ExportSheet(ABC):
+    """A named sheet; open() yields (headers, row iterator). total_rows is optional and only feeds progress."""
+
+    def __init__(self, name: str, number_columns=None, total_rows: int = None):
+        self.name = name[:31]  # Excel's sheet-name limit
+        self.number_columns = number_columns
+        self.total_rows = total_rows
+
+    @abstractmethod
+    def open(self):
+        """A context manager yielding (headers, row iterator); subclasses decorate it with @contextmanager."""
+
+
+class DataFrameSheet(ExportSheet):
+    def __init__(self, name: str, df, number_columns=None):
+        super().__init__(name, number_columns, len(df))
+        self.df = df
+
+    @contextmanager
+    def open(self):
+        df = self.df.astype(object).where(self.df.notna(), None)
+        yield list(df.columns), df.itertuples(index=False, name=None)
+
+
+class QuerySheet(ExportSheet):
+    """Rows streamed from a query over a server-side cursor; exclude_columns are dropped from the output."""
+
+    def __init__(self, name: str, engine, query: str, params: dict = None, exclude_columns=(), number_columns=None,
+                 total_rows: int = None):
+        super().__init__(name, number_columns, total_rows)
+        self.engine = engine
+        self.query = query
+        self.params = params or {}
+        self.exclude_columns = set(exclude_columns)
+
+    @contextmanager
+    def open(self):
+        with self.engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=STREAM_BATCH).execute(
+                text(self.query), self.params)
+            keys = list(result.keys())
+            keep = [i for i, k in enumerate(keys) if k not in self.exclude_columns]
+            rows = (tuple(row[i] for i in keep) for row in result) if len(keep) < len(keys) else (
+                tuple(row) for row in result)
+            try:
+                yield [keys[i] for i in keep], rows
+            finally:
+                result.close()
+
+
+def _sampled_widths(headers, sample) -> list:
+    widths = []
+    for i, header in enumerate(headers):
+        longest = max((len(str(row[i])) for row in sample if row[i] is not None), default=0)
+        widths.append(min(MAX_WIDTH, max(MIN_WIDTH, longest + 2, len(str(header)) + 2)))
+    return widths
+
+
+def _write_sheet(wb, sheet: ExportSheet, report):
+    ws = wb.create_sheet(sheet.name)
+    written = 0
+    with sheet.open() as (headers, rows):
+        rows = iter(rows)
+        sample = list(itertools.islice(rows, SAMPLE_ROWS))
+        for i, width in enumerate(_sampled_widths(headers, sample), 1):
+            ws.column_dimensions[get_column_letter(i)].width = width
+
+        header_cells = []
+        for header in headers:
+            cell = WriteOnlyCell(ws, value=str(header))
+            cell.font = HEADER_FONT
+            header_cells.append(cell)
+        ws.append(header_cells)
+
+        number_columns = default_number_columns(headers) if sheet.number_columns is None else sheet.number_columns
+        formatted = [i for i, h in enumerate(headers) if h in number_columns]
+        for row in itertools.chain(sample, rows):
+            if formatted:
+                row = list(row)
+                for i in formatted:
+                    if row[i] is not None:
+                        cell = WriteOnlyCell(ws, value=row[i])
+                        cell.number_format = QTY_FORMAT
+                        row[i] = cell
+            ws.append(row)
+            written += 1
+            if written % PROGRESS_EVERY == 0:
+                report(written)
+    report(written)
+    return written
+
+
+def write_workbook(target, sheets: list, progress=None, is_cancelled=None) -> dict:
+    """
+    Writes the sheets to target (a path or a binary file object) and returns {sheet name: rows written}.
+    progress(percent, message) and is_cancelled() are optional; a cancelled export raises ExportCancelled.
+    """
+    progress = progress or (lambda percent, message: None)
+    is_cancelled = is_cancelled or (lambda: False)
+    wb = Workbook(write_only=True)
+    counts = {}
+    for index, sheet in enumerate(sheets):
+        def report(written, index=index, sheet=sheet):
+            if is_cancelled():
+                raise ExportCancelled()
+            share = min(1.0, written / sheet.total_rows) if sheet.total_rows else 0.0
+            progress(int((index + share) * 95 / len(sheets)), f"{sheet.name}: {written:,} row(s) written")
+
+        counts[sheet.name] = _write_sheet(wb, sheet, report)
+
+    progress(96, "Saving workbook...")
+    if not isinstance(target, (str, os.PathLike)):
+        wb.save(target)
+        return counts
+    directory = os.path.dirname(os.path.abspath(target))
+    fd, tmp_path = tempfile.mkstemp(suffix='.xlsx', dir=directory)
+    os.close(fd)
+    try:
+        wb.save(tmp_path)
+        os.replace(tmp_path, target)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    progress(100, "Done.")
+    return counts
+
+
+class ExcelExportWorker(QObject):
+    progress = pyqtSignal(int, str)
+    finished = pyqtSignal(str, dict)
+    error = pyqtSignal(str, str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, path: str, sheets: list):
+        super().__init__()
+        self.path = path
+        self.sheets = sheets
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        try:
+            counts = write_workbook(self.path, self.sheets, self.progress.emit, lambda: self._cancelled)
+            self.finished.emit(self.path, counts)
+        except ExportCancelled:
+            self.cancelled.emit()
+        except PermissionError:
+            self.error.emit("Failed to save file. Check if the file is open in Excel.", traceback.format_exc())
+        except Exception as e:
+            self.error.emit(f"Failed to save file: {e}", traceback.format_exc())
+
+
+def start_excel_export(parent, path: str, sheets: list, on_finished, on_error):
+    """
+    Runs the export on a background thread behind a cancellable progress dialog.
+    on_finished(path, {sheet: rows}) / on_error(message, traceback) are called on the GUI thread; a cancelled
+    export calls neither.
+    """
+    dialog = QProgressDialog("Preparing export...", "Cancel", 0, 100, parent)
+    dialog.setWindowTitle("Exporting to Excel")
+    dialog.setWindowModality(Qt.WindowModality.NonModal)
+    dialog.setMinimumDuration(300)
+    dialog.setAutoClose(False)
+    dialog.setAutoReset(False)
+
+    thread = QThread(parent)
+    worker = thread.worker = ExcelExportWorker(path, sheets)  # keep the worker alive as long as its thread
+    worker.moveToThread(thread)
+    thread.started.connect(worker.run)
+    worker.progress.connect(lambda percent, message: (dialog.setValue(percent), dialog.setLabelText(message)))
+    dialog.canceled.connect(worker.cancel, Qt.ConnectionType.DirectConnection)
+    worker.finished.connect(on_finished)
+    worker.error.connect(on_error)
+    worker.finished.connect(thread.quit)
+    worker.error.connect(thread.quit)
+    worker.cancelled.connect(thread.quit)
+    thread.finished.connect(dialog.close)
+    thread.finished.connect(worker.deleteLater)
+    thread.finished.connect(thread.deleteLater)
+    thread.start()
+    return thread
+
@@ -5,12 +5,6 @@ import traceback
 from datetime import datetime
 import qtawesome as fa
 
-# --- Email Imports ---
-from email.message import EmailMessage
-from io import BytesIO
-import smtplib
-import ssl
-
 # --- PyQt6 Imports ---
 from PyQt6.QtCore import Qt, QObject, pyqtSignal, QThread, QDate, QSize, QSettings, QTimer, QPoint
 from PyQt6.QtGui import QColor, QAction
@@ -19,13 +13,18 @@ from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QTableWidget, QTableWidgetIte
                              QPushButton, QLineEdit, QAbstractItemView, QDateEdit,
                              QGroupBox, QFileDialog, QTabWidget, QGridLayout,
                              QProgressBar, QDialog, QFormLayout, QDialogButtonBox,
-                             QSpinBox, QApplication, QMainWindow, QComboBox, QMenu)
+                             QSpinBox, QApplication, QMainWindow, QComboBox, QMenu, QCheckBox)
 
 # --- SQLAlchemy and OpenPyXL Imports ---
 from sqlalchemy import text, create_engine
 from sqlalchemy.engine import Engine
-from openpyxl.utils import get_column_letter
-from openpyxl.worksheet.worksheet import Worksheet
+from excel_export import DataFrameSheet, start_excel_export
+from email_spool import queue_report_email
+
+from inventory_summary import build_inventory_summary
+from period_archive import with_archive
+from report_queries import failed_inventory, failed_monthly, inventory_export, failed_monthly_export
+from scheduled_reports import offer_cached_report
 
 # --- UI CONSTANTS ---
 PRIMARY_ACCENT_COLOR = "#007bff"
@@ -138,71 +137,8 @@ class DateRangeDialog(QDialog):
         return self.start_date_edit.date(), self.end_date_edit.date()
 
 
-def send_email_with_excel(attachments, email_config):
-    sender_email = email_config.get('sender_email')
-    sender_password = email_config.get('sender_password')
-    smtp_server = email_config.get('smtp_server')
-    smtp_port = email_config.get('smtp_port')
-    recipient_email = email_config.get('recipient_email')
-    subject = email_config.get('subject')
-    if not all([sender_email, sender_password, smtp_server, smtp_port, recipient_email]):
-        raise ValueError("Incomplete email settings. Please configure them in the Settings menu.")
-    recipients = [email.strip() for email in recipient_email.split(',')]
-    msg = EmailMessage()
-    msg['Subject'] = subject
-    msg['From'] = sender_email
-    msg['To'] = ', '.join(recipients)
-    body = f'Please find the attached Excel report(s): {", ".join(attachments.keys())}.\n\nThis is an automated message.'
-    msg.set_content(body)
-    for filename, df_dict in attachments.items():
-        excel_buffer = BytesIO()
-        with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-            for sheet_name, df in df_dict.items():
-                df.to_excel(writer, sheet_name=sheet_name, index=False)
-        excel_buffer.seek(0)
-        msg.add_attachment(excel_buffer.read(), maintype='application',
-                           subtype='vnd.openxmlformats-officedocument.spreadsheetml.sheet', filename=filename)
-    context = ssl.create_default_context()
-    smtp_port_int = int(smtp_port)
-    if smtp_port_int == 465:
-        with smtplib.SMTP_SSL(smtp_server, smtp_port_int, context=context) as server:
-            server.login(sender_email, sender_password)
-            server.send_message(msg, from_addr=sender_email, to_addrs=recipients)
-    else:
-        with smtplib.SMTP(smtp_server, smtp_port_int) as server:
-            server.starttls(context=context)
-            server.login(sender_email, sender_password)
-            server.send_message(msg, from_addr=sender_email, to_addrs=recipients)
-
-
-class EmailWorker(QObject):
-    finished = pyqtSignal()
-    error = pyqtSignal(str, str)
-    success = pyqtSignal(str)
-
-    def __init__(self, attachments, email_config, log_func, log_action, recipient):
-        super().__init__()
-        self.attachments = attachments
-        self.email_config = email_config
-        self.log_audit_trail = log_func
-        self.log_action = log_action
-        self.recipient = recipient
-
-    def run(self):
-        try:
-            send_email_with_excel(self.attachments, self.email_config)
-            self.log_audit_trail(self.log_action, f"User emailed report to '{self.recipient}'.")
-            self.success.emit(f"The report has been successfully sent to {self.recipient}.")
-        except ValueError as e:
-            self.error.emit("Email Configuration Error", str(e))
-        except Exception:
-            self.error.emit("Network/SMTP Error", traceback.format_exc())
-        finally:
-            self.finished.emit()
-
-
 class FailedInventoryWorker(QObject):
-    finished = pyqtSignal(pd.DataFrame)
+    finished = pyqtSignal(pd.DataFrame, dict)
     error = pyqtSignal(str, str)
 
     def __init__(self, engine: Engine, product_filter: str, lot_filter: str, as_of_date: str):
@@ -214,71 +150,8 @@ class FailedInventoryWorker(QObject):
 
     def run(self):
         try:
-            params = {'as_of_date': self.as_of_date}
-            product_filter_raw_clause = ""
-            if self.product_filter:
-                product_filter_raw_clause = "AND UPPER(TRIM(product_code)) LIKE :product_search"
-                params['product_search'] = f"%{self.product_filter}%"
-            lot_filter_raw_clause = ""
-            if self.lot_filter:
-                lot_filter_raw_clause = "AND UPPER(TRIM(lot_number)) LIKE :lot_search"
-                params['lot_search'] = f"%{self.lot_filter}%"
-            query_str = f"""
-                WITH all_failed_tx AS (
-                    SELECT
-                        UPPER(TRIM(product_code)) AS product_code, UPPER(TRIM(lot_number)) AS lot_number,
-                        COALESCE(CAST(qty AS NUMERIC), 0) AS quantity_in, 0.0 AS quantity_out,
-                        production_date AS transaction_date, UPPER(TRIM(location)) as location,
-                        COALESCE(UPPER(TRIM(bag_number)), UPPER(TRIM(box_number)), '') as bag_box_number,
-                        'BEGINV' as transaction_type
-                    FROM beg_invfailed1
-                    WHERE product_code IS NOT NULL AND TRIM(product_code) <> '' AND lot_number IS NOT NULL AND TRIM(lot_number) <> ''
-                      {product_filter_raw_clause} {lot_filter_raw_clause}
-                    UNION ALL
-                    SELECT
-                        UPPER(TRIM(ft.product_code)) AS product_code, UPPER(TRIM(ft.lot_number)) AS lot_number,
-                        COALESCE(CAST(ft.quantity_in AS NUMERIC), 0) AS quantity_in,
-                        COALESCE(CAST(ft.quantity_out AS NUMERIC), 0) AS quantity_out,
-                        ft.transaction_date, UPPER(TRIM(ft.warehouse)) as location,
-                        COALESCE(qcf.bag_no, '') as bag_box_number, ft.transaction_type
-                    FROM failed_transactions ft
-                    LEFT JOIN qcf_endorsements_primary qcf ON ft.source_ref_no = qcf.system_ref_no
-                    WHERE ft.product_code IS NOT NULL AND TRIM(ft.product_code) <> '' AND ft.lot_number IS NOT NULL AND TRIM(ft.lot_number) <> ''
-                      AND ft.transaction_date <= :as_of_date
-                      {product_filter_raw_clause.replace('product_code', 'ft.product_code')}
-                      {lot_filter_raw_clause.replace('lot_number', 'ft.lot_number')}
-                ),
-                ranked_lot_details AS (
-                    SELECT lot_number, location, bag_box_number,
-                        ROW_NUMBER() OVER (
-                            PARTITION BY lot_number ORDER BY
-                                CASE WHEN bag_box_number IS NOT NULL AND bag_box_number <> '' THEN 0 ELSE 1 END,
-                                transaction_date DESC NULLS LAST,
-                                CASE WHEN transaction_type = 'BEGINV' THEN 1 ELSE 0 END
-                        ) as rn
-                    FROM all_failed_tx
-                ),
-                lot_summary AS (
-                    SELECT lot_number, MAX(product_code) AS product_code,
-                        CASE WHEN MAX(product_code) LIKE '%-%' THEN 'DC' ELSE 'MB' END AS fg_type,
-                        COALESCE(SUM(quantity_in), 0) - COALESCE(SUM(quantity_out), 0) AS current_balance
-                    FROM all_failed_tx
-                    GROUP BY lot_number
-                    HAVING (COALESCE(SUM(quantity_in), 0) - COALESCE(SUM(quantity_out), 0)) != 0
-                )
-                SELECT s.product_code, s.lot_number, s.current_balance, d.location, d.bag_box_number, s.fg_type
-                FROM lot_summary s
-                JOIN ranked_lot_details d ON s.lot_number = d.lot_number AND d.rn = 1
-                WHERE d.location IS NOT NULL
-                ORDER BY s.product_code, s.lot_number;
-            """
-            with self.engine.connect() as conn:
-                results = conn.execute(text(query_str), params).mappings().all()
-            df = pd.DataFrame(results) if results else pd.DataFrame(
-                columns=['product_code', 'lot_number', 'current_balance', 'location', 'bag_box_number', 'fg_type'])
-            if not df.empty:
-                df['current_balance'] = pd.to_numeric(df['current_balance'])
-            self.finished.emit(df)
+            df = failed_inventory(self.engine, self.as_of_date, self.product_filter, self.lot_filter)
+            self.finished.emit(df, build_inventory_summary(df))
         except Exception:
             self.error.emit("Database query failed.", traceback.format_exc())
 
@@ -287,42 +160,48 @@ class FailedTransactionHistoryWorker(QObject):
     finished = pyqtSignal(pd.DataFrame)
     error = pyqtSignal(str, str)
 
-    def __init__(self, engine: Engine, lot_number: str, as_of_date: str):
+    def __init__(self, engine: Engine, lot_number: str, as_of_date: str, include_archived: bool = False):
         super().__init__()
         self.engine = engine
         self.lot_number = lot_number
         self.as_of_date = as_of_date
+        self.include_archived = include_archived
 
     def run(self):
         try:
-            query = text("""
-                SELECT
-                    production_date AS transaction_date,
-                    'BEGINV' AS transaction_type,
-                    COALESCE(CAST(qty AS NUMERIC), 0) AS quantity_in,
-                    0.0 AS quantity_out,
-                    location,
-                    'N/A' as source_ref_no
-                FROM beg_invfailed1
-                WHERE UPPER(TRIM(lot_number)) = :lot_number
-
-                UNION ALL
-
-                SELECT
-                    ft.transaction_date,
-                    ft.transaction_type,
-                    COALESCE(CAST(ft.quantity_in AS NUMERIC), 0) AS quantity_in,
-                    COALESCE(CAST(ft.quantity_out AS NUMERIC), 0) AS quantity_out,
-                    ft.warehouse AS location,
-                    ft.source_ref_no
-                FROM failed_transactions ft
-                WHERE UPPER(TRIM(ft.lot_number)) = :lot_number
-                  AND ft.transaction_date <= :as_of_date
-
-                ORDER BY transaction_date;
-            """)
             params = {'lot_number': self.lot_number, 'as_of_date': self.as_of_date}
             with self.engine.connect() as conn:
+                beginv = with_archive(conn, 'beg_invfailed1', ('production_date', 'lot_number', 'qty', 'location'),
+                                      self.include_archived)
+                ledger = with_archive(conn, 'failed_transactions',
+                                      ('transaction_date', 'transaction_type', 'lot_number', 'quantity_in',
+                                       'quantity_out', 'warehouse', 'source_ref_no'), self.include_archived)
+                query = text(f"""
+                    SELECT
+                        production_date AS transaction_date,
+                        'BEGINV' AS transaction_type,
+                        COALESCE(CAST(qty AS NUMERIC), 0) AS quantity_in,
+                        0.0 AS quantity_out,
+                        location,
+                        'N/A' as source_ref_no
+                    FROM {beginv} b
+                    WHERE UPPER(TRIM(lot_number)) = :lot_number
+
+                    UNION ALL
+
+                    SELECT
+                        ft.transaction_date,
+                        ft.transaction_type,
+                        COALESCE(CAST(ft.quantity_in AS NUMERIC), 0) AS quantity_in,
+                        COALESCE(CAST(ft.quantity_out AS NUMERIC), 0) AS quantity_out,
+                        ft.warehouse AS location,
+                        ft.source_ref_no
+                    FROM {ledger} ft
+                    WHERE UPPER(TRIM(ft.lot_number)) = :lot_number
+                      AND ft.transaction_date <= :as_of_date
+
+                    ORDER BY transaction_date;
+                """)
                 results = conn.execute(query, params).mappings().all()
 
             df = pd.DataFrame(results) if results else pd.DataFrame()
@@ -347,6 +226,10 @@ class TransactionHistoryDialog(QDialog):
 
         layout = QVBoxLayout(self)
         layout.addWidget(QLabel(f"<b>History for Lot:</b> {self.lot_number}", objectName="PageHeader"))
+        self.archived_check = QCheckBox("Include archived movements")
+        self.archived_check.setToolTip("Also show the movements of closed periods moved to the archive.")
+        self.archived_check.toggled.connect(self.fetch_transactions)
+        layout.addWidget(self.archived_check)
 
         self.history_table = QTableWidget()
         self.setup_table()
@@ -374,8 +257,9 @@ class TransactionHistoryDialog(QDialog):
 
     def fetch_transactions(self):
         self._show_loading_state("Fetching transaction history...")
+        self.archived_check.setEnabled(False)
         self.worker_thread = QThread()
-        self.worker = self.worker_class(self.engine, self.lot_number, self.as_of_date)
+        self.worker = self.worker_class(self.engine, self.lot_number, self.as_of_date, self.archived_check.isChecked())
         self.worker.moveToThread(self.worker_thread)
         self.worker_thread.started.connect(self.worker.run)
         self.worker.finished.connect(self._display_history)
@@ -386,6 +270,7 @@ class TransactionHistoryDialog(QDialog):
         self.worker_thread.start()
 
     def _display_history(self, df: pd.DataFrame):
+        self.archived_check.setEnabled(True)
         self.history_table.setRowCount(0)
         if df.empty:
             self._show_loading_state("No transactions found for this lot.")
@@ -405,6 +290,7 @@ class TransactionHistoryDialog(QDialog):
                 self.history_table.setItem(i, col_idx, item)
 
     def _on_fetch_error(self, title, message):
+        self.archived_check.setEnabled(True)
         show_error_message(self, title, "Could not fetch lot history.", message)
         self._show_loading_state("Error fetching data.")
 
@@ -428,54 +314,7 @@ class FailedMonthlyReportWorker(QObject):
 
     def run(self):
         try:
-            params = {'start_date': self.start_date, 'end_date': self.end_date}
-            query_str = f"""
-                WITH period_failed_tx AS (
-                    SELECT
-                        UPPER(TRIM(product_code)) AS product_code, UPPER(TRIM(lot_number)) AS lot_number,
-                        COALESCE(CAST(qty AS NUMERIC), 0) AS quantity_in, 0.0 AS quantity_out,
-                        production_date AS transaction_date, UPPER(TRIM(location)) as location,
-                        COALESCE(UPPER(TRIM(bag_number)), UPPER(TRIM(box_number)), '') as bag_box_number
-                    FROM beg_invfailed1
-                    WHERE product_code IS NOT NULL AND TRIM(product_code) <> '' AND lot_number IS NOT NULL AND TRIM(lot_number) <> ''
-                      AND production_date BETWEEN :start_date AND :end_date
-                    UNION ALL
-                    SELECT
-                        UPPER(TRIM(ft.product_code)) AS product_code, UPPER(TRIM(ft.lot_number)) AS lot_number,
-                        COALESCE(CAST(ft.quantity_in AS NUMERIC), 0) AS quantity_in,
-                        COALESCE(CAST(ft.quantity_out AS NUMERIC), 0) AS quantity_out,
-                        ft.transaction_date, UPPER(TRIM(ft.warehouse)) as location,
-                        COALESCE(qcf.bag_no, '') as bag_box_number
-                    FROM failed_transactions ft
-                    LEFT JOIN qcf_endorsements_primary qcf ON ft.source_ref_no = qcf.system_ref_no
-                    WHERE ft.product_code IS NOT NULL AND TRIM(ft.product_code) <> '' AND ft.lot_number IS NOT NULL AND TRIM(ft.lot_number) <> ''
-                      AND ft.transaction_date BETWEEN :start_date AND :end_date
-                ),
-                lot_details AS (
-                    SELECT DISTINCT ON (lot_number) lot_number, location, bag_box_number
-                    FROM period_failed_tx
-                    ORDER BY lot_number, transaction_date DESC
-                ),
-                lot_summary AS (
-                    SELECT
-                        lot_number, MAX(product_code) AS product_code,
-                        COALESCE(SUM(quantity_in), 0) - COALESCE(SUM(quantity_out), 0) AS net_quantity
-                    FROM period_failed_tx
-                    GROUP BY lot_number
-                    HAVING (COALESCE(SUM(quantity_in), 0) - COALESCE(SUM(quantity_out), 0)) != 0
-                )
-                SELECT s.product_code, s.lot_number, s.net_quantity, d.location, d.bag_box_number
-                FROM lot_summary s
-                LEFT JOIN lot_details d ON s.lot_number = d.lot_number
-                ORDER BY s.product_code, s.lot_number;
-            """
-            with self.engine.connect() as conn:
-                results = conn.execute(text(query_str), params).mappings().all()
-            df = pd.DataFrame(results) if results else pd.DataFrame(
-                columns=['product_code', 'lot_number', 'net_quantity', 'location', 'bag_box_number'])
-            if not df.empty:
-                df['net_quantity'] = pd.to_numeric(df['net_quantity'])
-            self.finished.emit(df)
+            self.finished.emit(failed_monthly(self.engine, self.start_date, self.end_date))
         except Exception:
             self.error.emit("Failed Monthly Report query failed.", traceback.format_exc())
 
@@ -483,7 +322,7 @@ class FailedMonthlyReportWorker(QObject):
 class FailedDashboardWidget(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.data_df = pd.DataFrame()
+        self.summary = build_inventory_summary(pd.DataFrame())
         self.init_ui()
         self.setStyleSheet(self._get_dashboard_styles())
 
@@ -541,37 +380,24 @@ class FailedDashboardWidget(QWidget):
         grid_layout.addWidget(contribution_group, 1, 0)
         main_layout.addLayout(grid_layout)
 
-    def update_dashboard(self, df: pd.DataFrame):
-        is_empty = df.empty
-        positive_balance_df = df[df['current_balance'] > 0] if not is_empty else pd.DataFrame()
-
-        overall_balance = df['current_balance'].sum() if not is_empty else 0.0
-
-        self.total_lots_label.findChild(QLabel, "ValueLabel").setText("0" if is_empty else f"{len(df):,}")
-        self.total_products_label.findChild(QLabel, "ValueLabel").setText(
-            "0" if is_empty else f"{df['product_code'].nunique():,}")
-        self.overall_balance_label.findChild(QLabel, "ValueLabel").setText(f"{overall_balance:,.2f}")
-
-        self.contribution_table.setRowCount(0)
-        if positive_balance_df.empty:
-            return
-
-        positive_total = positive_balance_df['current_balance'].sum()
-        if positive_total <= 0:
-            return
-
-        summary = positive_balance_df.groupby('product_code')['current_balance'].sum().nlargest(10).reset_index()
-        summary['percentage'] = (summary['current_balance'] / positive_total) * 100
-        self.contribution_table.setRowCount(len(summary))
-        for i, row in summary.iterrows():
-            self.contribution_table.setItem(i, 0, QTableWidgetItem(str(row['product_code'])))
-            balance_item = QTableWidgetItem(f"{row['current_balance']:,.2f}")
+    def update_dashboard(self, summary: dict):
+        """Renders a summary produced by build_inventory_summary(); no per-lot work happens here."""
+        self.summary = summary
+        self.total_lots_label.findChild(QLabel, "ValueLabel").setText(f"{summary['total_lots']:,}")
+        self.total_products_label.findChild(QLabel, "ValueLabel").setText(f"{summary['unique_products']:,}")
+        self.overall_balance_label.findChild(QLabel, "ValueLabel").setText(f"{summary['overall_balance']:,.2f}")
+
+        top_products = summary['top_products']
+        self.contribution_table.setRowCount(len(top_products))
+        for i, (product_code, balance, percentage) in enumerate(top_products):
+            self.contribution_table.setItem(i, 0, QTableWidgetItem(product_code))
+            balance_item = QTableWidgetItem(f"{balance:,.2f}")
             balance_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
             self.contribution_table.setItem(i, 1, balance_item)
-            percent_item = QTableWidgetItem(f"{row['percentage']:.1f}%")
+            percent_item = QTableWidgetItem(f"{percentage:.1f}%")
             percent_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
             self.contribution_table.setItem(i, 2, percent_item)
-            progress_bar = QProgressBar(maximum=100, value=int(row['percentage']), textVisible=False)
+            progress_bar = QProgressBar(maximum=100, value=int(percentage), textVisible=False)
             self.contribution_table.setCellWidget(i, 3, progress_bar)
 
 
@@ -584,8 +410,6 @@ class FailedInventoryReportPage(QWidget):
         self.good_inventory_page = good_inventory_page
         self.inventory_thread: QThread | None = None;
         self.inventory_worker: FailedInventoryWorker | None = None
-        self.email_thread: QThread | None = None;
-        self.email_worker: EmailWorker | None = None
         self.current_inventory_df = pd.DataFrame();
         self.is_calculating = False
         self.failed_monthly_report_thread: QThread | None = None;
@@ -754,7 +578,7 @@ class FailedInventoryReportPage(QWidget):
         self.is_calculating = True;
         self.set_controls_enabled(False);
         self._show_loading_state(self.inventory_table, "Calculating failed inventory balance...");
-        self.dashboard_widget.update_dashboard(pd.DataFrame());
+        self.dashboard_widget.update_dashboard(build_inventory_summary(pd.DataFrame()));
         QApplication.processEvents()
         date_str = self.date_picker.date().toString(Qt.DateFormat.ISODate);
         product_filter_clean = self.product_code_input.text().strip().upper();
@@ -785,10 +609,10 @@ class FailedInventoryReportPage(QWidget):
                                                 'set_controls_enabled'): self.good_inventory_page.set_controls_enabled(
             enabled)
 
-    def _on_inventory_finished(self, df: pd.DataFrame):
+    def _on_inventory_finished(self, df: pd.DataFrame, summary: dict):
         try:
             self.current_inventory_df = df.copy(); self._display_inventory(df); self.dashboard_widget.update_dashboard(
-                df)
+                summary)
         finally:
             self.set_controls_enabled(True)
 
@@ -796,59 +620,38 @@ class FailedInventoryReportPage(QWidget):
         try:
             show_error_message(self, "Calculation Error", error_message, detailed_traceback); self._show_loading_state(
                 self.inventory_table, "Error during calculation."); self.dashboard_widget.update_dashboard(
-                pd.DataFrame())
+                build_inventory_summary(pd.DataFrame()))
         finally:
             self.set_controls_enabled(True)
 
-    def _on_email_error(self, title: str, details: str):
-        self.set_controls_enabled(True); show_error_message(self, title,
-                                                            "Failed to send email. Please check your settings and connection.",
-                                                            details)
-
-    def _on_email_success(self, message: str):
-        self.set_controls_enabled(True); QMessageBox.information(self, "Email Sent", message)
-
     def _show_loading_state(self, table: QTableWidget, message: str):
         table.setRowCount(1); table.setSpan(0, 0, 1, table.columnCount()); loading_item = QTableWidgetItem(
             message); loading_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter); table.setItem(0, 0, loading_item)
 
-    def _format_excel_sheet(self, worksheet: Worksheet, df: pd.DataFrame):
-        qty_col_name = next((col for col in df.columns if 'QTY' in col.upper() or 'BALANCE' in col.upper()), None)
-        if qty_col_name and not df.empty: qty_col_idx = df.columns.get_loc(
-            qty_col_name) + 1; qty_col_letter = get_column_letter(qty_col_idx); [cell.number_format for cell in
-                                                                                 worksheet[qty_col_letter][1:] if
-                                                                                 setattr(cell, 'number_format',
-                                                                                         '#,##0.00')]
-        for i, col in enumerate(df.columns, 1):
-            if not df.empty: column_letter = get_column_letter(i); max_length = max(df[col].astype(str).map(len).max(),
-                                                                                    len(col)) + 2;
-            worksheet.column_dimensions[column_letter].width = max_length
-
     def _export_to_excel(self):
         if self.current_inventory_df.empty: QMessageBox.information(self, "Export Failed", "No data to export."); return
         default_filename = f"FG_Inventory_Report_FAILED_{datetime.now():%Y-%m-%d}.xlsx";
         filepath, _ = QFileDialog.getSaveFileName(self, "Save Report", default_filename, "Excel Files (*.xlsx)")
         if filepath:
-            try:
-                export_df = self.current_inventory_df.rename(
-                    columns={'product_code': 'PRODUCT_CODE', 'lot_number': 'LOT_NUMBER', 'current_balance': 'QTY',
-                             'bag_box_number': 'BAG/BOX_NUMBER', 'location': 'LOCATION'});
-                final_cols = ['PRODUCT_CODE', 'LOT_NUMBER', 'BAG/BOX_NUMBER', 'QTY', 'LOCATION'];
-                df_mb = export_df[export_df['fg_type'] == 'MB'][final_cols].copy();
-                df_dc = export_df[export_df['fg_type'] == 'DC'][final_cols].copy()
-                with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-                    if not df_mb.empty: df_mb.to_excel(writer, index=False,
-                                                       sheet_name='FG FAILED MB'); self._format_excel_sheet(
-                        writer.sheets['FG FAILED MB'], df_mb)
-                    if not df_dc.empty: df_dc.to_excel(writer, index=False,
-                                                       sheet_name='FG FAILED DC'); self._format_excel_sheet(
-                        writer.sheets['FG FAILED DC'], df_dc)
-                filename = os.path.basename(filepath);
-                self.log_audit_trail("EXPORT_FAILED_INVENTORY",
-                                     f"User exported failed inventory report to '{filename}'.");
-                QMessageBox.information(self, "Export Successful", f"Data exported to:\n{filename}")
-            except Exception:
-                show_error_message(self, "Export Error", "Failed to save file.", traceback.format_exc())
+            sheets = [DataFrameSheet(name, df) for name, df in
+                      inventory_export(self.current_inventory_df, 'FG FAILED MB', 'FG FAILED DC').items()]
+            self._start_export(filepath, sheets, "EXPORT_FAILED_INVENTORY", "User exported failed inventory report",
+                               "Data exported to")
+
+    def _start_export(self, filepath: str, sheets: list, audit_action: str, audit_text: str, success_text: str):
+        """Writes the sheets on a background thread; the audit entry and message follow once the file is saved."""
+
+        def on_error(message, details):
+            show_error_message(self, "Export Error", message, details)
+
+        start_excel_export(self, filepath, sheets,
+                           lambda path, counts: self._on_export_saved(path, audit_action, audit_text, success_text),
+                           on_error)
+
+    def _on_export_saved(self, path: str, audit_action: str, audit_text: str, success_text: str):
+        filename = os.path.basename(path);
+        self.log_audit_trail(audit_action, f"{audit_text} to '{filename}'.");
+        QMessageBox.information(self, "Export Successful", f"{success_text}:\n{filename}")
 
     def _open_settings_dialog(self):
         dialog = SettingsDialog(self); dialog.exec()
@@ -862,6 +665,13 @@ class FailedInventoryReportPage(QWidget):
                                                          "The start date cannot be after the end date."); return
             start_date_str = start_date.toString(Qt.DateFormat.ISODate);
             end_date_str = end_date.toString(Qt.DateFormat.ISODate)
+            if offer_cached_report(self, 'failed_monthly', {'start_date': start_date_str, 'end_date': end_date_str},
+                                   f"Failed_Monthly_Transaction_Report_{datetime.now():%Y-%m-%d}.xlsx",
+                                   lambda path: self._on_export_saved(
+                                       path, "FAILED_MONTHLY_REPORT_EXPORT",
+                                       "User exported precomputed failed monthly report",
+                                       "Failed Monthly Report exported to")):
+                return
             self.set_controls_enabled(False);
             self.log_audit_trail("FAILED_MONTHLY_REPORT_START",
                                  f"User initiated failed monthly report for {start_date_str} to {end_date_str}");
@@ -880,31 +690,14 @@ class FailedInventoryReportPage(QWidget):
         self.set_controls_enabled(True)
         if df.empty: QMessageBox.information(self, "Report Complete",
                                              "No failed transactions found for the selected date range."); return
-
-        def get_remark(quantity):
-            return "Net consumption from prior inventory" if quantity < 0 else "Net increase in inventory"
-
-        df['remarks'] = df['net_quantity'].apply(get_remark)
         default_filename = f"Failed_Monthly_Transaction_Report_{datetime.now():%Y-%m-%d}.xlsx";
         filepath, _ = QFileDialog.getSaveFileName(self, "Save Failed Monthly Report", default_filename,
                                                   "Excel Files (*.xlsx)")
         if filepath:
-            try:
-                export_df = df.rename(
-                    columns={'product_code': 'PROD_CODE', 'lot_number': 'LOTNUMBER', 'net_quantity': 'QTY',
-                             'location': 'LOCATION', 'bag_box_number': 'BAG_NUMBER', 'remarks': 'REMARKS'});
-                final_cols = ['PROD_CODE', 'LOTNUMBER', 'QTY', 'LOCATION', 'BAG_NUMBER', 'REMARKS'];
-                export_df = export_df[final_cols]
-                with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-                    export_df.to_excel(writer, index=False, sheet_name='Failed Monthly Transactions');
-                    self._format_excel_sheet(writer.sheets['Failed Monthly Transactions'], export_df)
-                filename = os.path.basename(filepath);
-                self.log_audit_trail("FAILED_MONTHLY_REPORT_EXPORT",
-                                     f"User exported failed monthly report to '{filename}'.");
-                QMessageBox.information(self, "Export Successful", f"Failed Monthly Report exported to:\n{filename}")
-            except Exception:
-                show_error_message(self, "Export Error", "Failed to save the failed monthly report file.",
-                                   traceback.format_exc())
+            sheets = [DataFrameSheet(name, sheet_df) for name, sheet_df in failed_monthly_export(df).items()]
+            self._start_export(filepath, sheets,
+                               "FAILED_MONTHLY_REPORT_EXPORT", "User exported failed monthly report",
+                               "Failed Monthly Report exported to")
 
     def _reset_failed_monthly_report_thread_state(self):
         if self.failed_monthly_report_worker: self.failed_monthly_report_worker.deleteLater(); self.failed_monthly_report_worker = None
@@ -923,49 +716,18 @@ class FailedInventoryReportPage(QWidget):
                     email_config["recipient_email"]]) or not settings.value(
             "email/sender_password"): QMessageBox.warning(self, "Configuration Needed",
                                                           "Email settings are incomplete. Please use the 'Settings' button to configure them first."); self._open_settings_dialog(); return
-        export_df = self.current_inventory_df.rename(
-            columns={'product_code': 'PRODUCT_CODE', 'lot_number': 'LOT_NUMBER', 'current_balance': 'QTY',
-                     'bag_box_number': 'BAG/BOX_NUMBER', 'location': 'LOCATION'});
-        final_cols = ['PRODUCT_CODE', 'LOT_NUMBER', 'BAG/BOX_NUMBER', 'QTY', 'LOCATION'];
-        df_mb = export_df[export_df['fg_type'] == 'MB'][final_cols].copy();
-        df_dc = export_df[export_df['fg_type'] == 'DC'][final_cols].copy();
-        df_to_email = {}
-        if not df_mb.empty: df_to_email['FG FAILED MB'] = df_mb
-        if not df_dc.empty: df_to_email['FG FAILED DC'] = df_dc
+        df_to_email = inventory_export(self.current_inventory_df, 'FG FAILED MB', 'FG FAILED DC')
         if not df_to_email: QMessageBox.warning(self, "Email Failed", "No data to include in the email."); return
         filename = f"FG_Inventory_Report_FAILED_{datetime.now():%Y-%m-%d}.xlsx";
         attachments = {filename: df_to_email};
         as_of_date_str = self.date_picker.date().toString("yyyy-MM-dd");
-        email_config['subject'] = f"FG FAILED Inventory Report as of {as_of_date_str}";
-        self.set_controls_enabled(False);
-        self.email_thread = QThread();
-        self.email_worker = EmailWorker(attachments=attachments, email_config=email_config,
-                                        log_func=self.log_audit_trail, log_action="EMAIL_FAILED_INVENTORY",
-                                        recipient=email_config['recipient_email'])
-        self.email_worker.moveToThread(self.email_thread);
-        self.email_thread.started.connect(self.email_worker.run);
-        self.email_worker.finished.connect(self.email_thread.quit);
-        self.email_worker.finished.connect(self.email_worker.deleteLater);
-        self.email_thread.finished.connect(self.email_thread.deleteLater);
-        self.email_worker.error.connect(self._on_email_error);
-        self.email_worker.success.connect(self._on_email_success);
-        self.email_thread.start()
+        queue_report_email(self, self.log_audit_trail, f"FG FAILED Inventory Report as of {as_of_date_str}",
+                           attachments, email_config['recipient_email'], "EMAIL_FAILED_INVENTORY",
+                           "failed inventory report")
 
     def _prepare_report_sheets(self, df: pd.DataFrame, report_status: str) -> dict:
-        if df.empty: return {}
         status_upper = report_status.upper();
-        export_df = df.rename(
-            columns={'product_code': 'PRODUCT_CODE', 'lot_number': 'LOT_NUMBER', 'current_balance': 'QTY',
-                     'bag_box_number': 'BAG/BOX_NUMBER', 'location': 'LOCATION'});
-        final_cols = ['PRODUCT_CODE', 'LOT_NUMBER', 'BAG/BOX_NUMBER', 'QTY', 'LOCATION']
-        if 'fg_type' not in export_df.columns: export_df['fg_type'] = export_df['PRODUCT_CODE'].apply(
-            lambda x: 'DC' if isinstance(x, str) and '-' in x else 'MB')
-        df_mb = export_df[export_df['fg_type'] == 'MB'][final_cols].copy();
-        df_dc = export_df[export_df['fg_type'] == 'DC'][final_cols].copy();
-        sheet_dict = {}
-        if not df_mb.empty: sheet_dict[f'FG MB {status_upper}'] = df_mb
-        if not df_dc.empty: sheet_dict[f'FG DC {status_upper}'] = df_dc
-        return sheet_dict
+        return inventory_export(df, f'FG MB {status_upper}', f'FG DC {status_upper}')
 
     def _export_and_email_combined_report(self):
         if not self.good_inventory_page: QMessageBox.warning(self, "Error",
@@ -994,25 +756,13 @@ class FailedInventoryReportPage(QWidget):
         if not attachments: QMessageBox.warning(self, "Email Failed",
                                                 "No data to include in the email after filtering."); return
         as_of_date_str = self.date_picker.date().toString("yyyy-MM-dd");
-        email_config['subject'] = f"COMBINED Inventory Report (Passed & Failed) as of {as_of_date_str}";
-        self.set_controls_enabled(False)
-        self.email_thread = QThread();
-        self.email_worker = EmailWorker(attachments=attachments, email_config=email_config,
-                                        log_func=self.log_audit_trail, log_action="EMAIL_COMBINED_INVENTORY",
-                                        recipient=email_config['recipient_email'])
-        self.email_worker.moveToThread(self.email_thread);
-        self.email_thread.started.connect(self.email_worker.run);
-        self.email_worker.finished.connect(self.email_thread.quit);
-        self.email_worker.finished.connect(self.email_worker.deleteLater);
-        self.email_thread.finished.connect(self.email_thread.deleteLater);
-        self.email_worker.error.connect(self._on_email_error);
-        self.email_worker.success.connect(self._on_email_success);
-        self.email_thread.start()
+        queue_report_email(self, self.log_audit_trail,
+                           f"COMBINED Inventory Report (Passed & Failed) as of {as_of_date_str}", attachments,
+                           email_config['recipient_email'], "EMAIL_COMBINED_INVENTORY", "combined inventory report")
 
     def closeEvent(self, event):
         if self.inventory_thread and self.inventory_thread.isRunning(): self.inventory_thread.quit(); self.inventory_thread.wait(
             2000)
-        if self.email_thread and self.email_thread.isRunning(): self.email_thread.quit(); self.email_thread.wait(2000)
         if self.failed_monthly_report_thread and self.failed_monthly_report_thread.isRunning(): self.failed_monthly_report_thread.quit(); self.failed_monthly_report_thread.wait(
             2000)
         event.accept()
@@ -1,5 +1,5 @@
+import os
 import sys
-import re
 from datetime import datetime, date
 from decimal import Decimal, InvalidOperation
 from typing import Any
@@ -20,15 +20,21 @@ import qtawesome as fa
 # --- Database Imports ---
 from sqlalchemy import text, inspect
 
+from completion import attach_prefix_query_completer
+from document_counters import next_document_number
+from endorsement_store import FG_TABLES, SaveBatch, endorsement_batch
+from ledger import LedgerRow, LedgerWriter
+from lot_ranges import LotRangeError, LotRangeTooSmall, split_lots
+from product_master import register_products
+from reference_data import bind_reference_combo, invalidate_reference
+from soft_delete import restore_document, soft_delete_document
+
 # --- EXTERNAL DEPENDENCY ADDITION (for Excel Export) ---
 try:
-    import pandas as pd
-    import os
+    from excel_export import QuerySheet, start_excel_export
 
     EXCEL_EXPORT_AVAILABLE = True
 except ImportError:
-    pd = None
-    os = None
     EXCEL_EXPORT_AVAILABLE = False
 
 # --- CONSTANTS ---
@@ -204,6 +210,7 @@ class ManageListDialog(QDialog):
                             text(
                                 f"INSERT INTO {self.table_name} ({self.column_name}) VALUES (:v) ON CONFLICT ({self.column_name}) DO NOTHING"),
                             {"v": value})
+                    invalidate_reference(self.table_name)
                     self._load_items()
                 except Exception as e:
                     QMessageBox.critical(self, "DB Error", f"Could not add item: {e}")
@@ -216,6 +223,7 @@ class ManageListDialog(QDialog):
                 with self.engine.connect() as conn, conn.begin():
                     conn.execute(text(f"DELETE FROM {self.table_name} WHERE id = :id"),
                                  {"id": item.data(Qt.ItemDataRole.UserRole)})
+                invalidate_reference(self.table_name)
                 self._load_items()
             except Exception as e:
                 QMessageBox.critical(self, "DB Error", f"Could not remove item: {e}")
@@ -449,6 +457,7 @@ class FGEndorsementPage(QWidget):
         self.product_code_combo = QComboBox(editable=True, insertPolicy=QComboBox.InsertPolicy.NoInsert)
         self.product_code_combo.lineEdit().setPlaceholderText("TYPE OR SELECT PRODUCT CODE")
         self.lot_number_edit = UpperCaseLineEdit()
+        attach_prefix_query_completer(self.lot_number_edit, self.engine, 'production_lots')
         self.is_lot_range_check = QCheckBox("Calculate lots from a range")
         set_combo_box_uppercase(self.product_code_combo)
 
@@ -684,7 +693,7 @@ class FGEndorsementPage(QWidget):
         """Shows the date range dialog and initiates the export process."""
         if not EXCEL_EXPORT_AVAILABLE:
             QMessageBox.critical(self, "Export Error",
-                                 "Cannot export: Dependencies (pandas/openpyxl) not found. Please install them.")
+                                 "Cannot export: Dependency (openpyxl) not found. Please install it.")
             return
 
         dialog = DateRangeDialog(self)
@@ -692,119 +701,88 @@ class FGEndorsementPage(QWidget):
             start_date, end_date = dialog.get_dates()
             self._export_to_excel(start_date, end_date)
 
-    def _get_export_data(self, start_date: date, end_date: date, search_term: str):
-        """Retrieves primary, secondary, and excess data for the given date range and search filter."""
-        search_filter = f"%{search_term}%"
+    def _export_sheets(self, start_date: date, end_date: date, search_term: str):
+        """
+        Counts the matching primary records and builds the three export sheets. Each sheet streams its rows
+        from the database while the workbook is written, so nothing is loaded up front.
+        """
+        params = {'start_date': start_date, 'end_date': end_date, 'st': f"%{search_term}%"}
 
         # Base filter applied to the primary table
-        base_filter_clause = """
-            AND date_endorsed BETWEEN :start_date AND :end_date
-            AND is_deleted IS NOT TRUE 
+        primary_filter = """
+            FROM fg_endorsements_primary
+            WHERE date_endorsed BETWEEN :start_date AND :end_date
+            AND is_deleted IS NOT TRUE
             AND (system_ref_no ILIKE :st OR form_ref_no ILIKE :st OR product_code ILIKE :st OR lot_number ILIKE :st)
         """
-
-        primary_query = f"""
-            SELECT * FROM fg_endorsements_primary 
-            WHERE 1=1 {base_filter_clause}
-            ORDER BY date_endorsed DESC
-        """
-
-        try:
-            with self.engine.connect() as conn:
-                params = {'start_date': start_date, 'end_date': end_date, 'st': search_filter}
-
-                # 1. Fetch Primary Data
-                primary_res = conn.execute(text(primary_query), params).mappings().all()
-
-                if not primary_res:
-                    return None
-
-                ref_nos = tuple(row['system_ref_no'] for row in primary_res)
-
-                # 2. Fetch Secondary (Breakdown) Data
-                secondary_query = text("""
-                    SELECT * FROM fg_endorsements_secondary 
-                    WHERE system_ref_no IN :ref_list
-                    ORDER BY system_ref_no, lot_number
-                """)
-                secondary_res = conn.execute(secondary_query, {'ref_list': ref_nos}).mappings().all()
-
-                # 3. Fetch Excess Data
-                excess_query = text("""
-                    SELECT * FROM fg_endorsements_excess 
-                    WHERE system_ref_no IN :ref_list
-                    ORDER BY system_ref_no, lot_number
-                """)
-                excess_res = conn.execute(excess_query, {'ref_list': ref_nos}).mappings().all()
-
-            return {
-                'Primary': primary_res,
-                'Breakdown': secondary_res,
-                'Excess': excess_res
-            }
-
-        except Exception as e:
-            QMessageBox.critical(self, "DB Export Error", f"Failed to retrieve data for export: {e}")
-            return None
+        with self.engine.connect() as conn:
+            primary_count = conn.execute(text(f"SELECT COUNT(*) {primary_filter}"), params).scalar_one()
+        if not primary_count:
+            return 0, []
+
+        # Simple cleanup: internal ID columns are left out of every sheet
+        hidden = ('id', 'is_deleted')
+        sheets = [
+            QuerySheet('Primary_Endorsements', self.engine,
+                       f"SELECT * {primary_filter} ORDER BY date_endorsed DESC", params, hidden, [], primary_count),
+            QuerySheet('Lot_Breakdown', self.engine, f"""
+                SELECT * FROM fg_endorsements_secondary
+                WHERE system_ref_no IN (SELECT system_ref_no {primary_filter})
+                ORDER BY system_ref_no, lot_number""", params, hidden, []),
+            QuerySheet('Excess_Quantities', self.engine, f"""
+                SELECT * FROM fg_endorsements_excess
+                WHERE system_ref_no IN (SELECT system_ref_no {primary_filter})
+                ORDER BY system_ref_no, lot_number""", params, hidden, []),
+        ]
+        return primary_count, sheets
 
     def _export_to_excel(self, start_date: date, end_date: date):
-        """Converts retrieved data to DataFrames and saves them to a multi-sheet Excel file."""
+        """Streams the primary, breakdown and excess records for the range into a multi-sheet Excel file."""
         current_search = self.search_edit.text()
 
         self.show_notification(f"Preparing data for export ({start_date} to {end_date})...", 'info', 5000)
 
-        export_data = self._get_export_data(start_date, end_date, current_search)
+        try:
+            primary_count, sheets = self._export_sheets(start_date, end_date, current_search)
+        except Exception as e:
+            QMessageBox.critical(self, "DB Export Error", f"Failed to retrieve data for export: {e}")
+            return
 
-        if export_data is None:
+        if not primary_count:
             QMessageBox.information(self, "Export Complete", "No records found matching the criteria for export.")
             self.show_notification("No records found for export.", 'warning', 3000)
             return
 
         # 1. Ask user for file location
         default_filename = f"FG_Endorsements_{start_date.strftime('%Y%m%d')}_to_{end_date.strftime('%Y%m%d')}.xlsx"
-        # QFileDialog imported above
         file_path, _ = QFileDialog.getSaveFileName(self, "Save Export File", default_filename, "Excel Files (*.xlsx)")
 
         if not file_path:
             self.show_notification("Export cancelled by user.", 'warning', 3000)
             return
 
-        try:
-            # 2. Convert to DataFrames
-            df_primary = pd.DataFrame(export_data['Primary'])
-            df_breakdown = pd.DataFrame(export_data['Breakdown'])
-            df_excess = pd.DataFrame(export_data['Excess'])
-
-            # Simple cleanup: remove internal ID columns
-            for df in [df_primary, df_breakdown, df_excess]:
-                if 'id' in df.columns:
-                    df.drop(columns=['id'], inplace=True, errors='ignore')
-                if 'is_deleted' in df.columns:
-                    df.drop(columns=['is_deleted'], inplace=True, errors='ignore')
-
-            # 3. Write to Excel (Multi-Sheet)
-            with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
-                df_primary.to_excel(writer, sheet_name='Primary_Endorsements', index=False)
-                df_breakdown.to_excel(writer, sheet_name='Lot_Breakdown', index=False)
-                df_excess.to_excel(writer, sheet_name='Excess_Quantities', index=False)
-
+        # 2. Write in the background; the audit entry and folder follow once the file is saved
+        def on_finished(path, counts):
             self.log_audit_trail("EXPORT_FG_ENDORSEMENT",
-                                 f"Exported {len(df_primary)} FG Endorsement records to Excel.")
-            self.show_notification(f"Successfully exported {len(df_primary)} primary records to Excel.", 'success',
+                                 f"Exported {primary_count} FG Endorsement records to Excel.")
+            self.show_notification(f"Successfully exported {primary_count} primary records to Excel.", 'success',
                                    8000)
 
             # Optional: Open the file location (OS dependent)
             if os.name == 'nt':  # Windows
-                os.startfile(os.path.dirname(file_path))
+                os.startfile(os.path.dirname(path))
             elif sys.platform == 'darwin':  # macOS
-                os.system(f'open "{os.path.dirname(file_path)}"')
+                os.system(f'open "{os.path.dirname(path)}"')
             else:  # Linux/other
-                os.system(f'xdg-open "{os.path.dirname(file_path)}"')
+                os.system(f'xdg-open "{os.path.dirname(path)}"')
 
-        except Exception as e:
-            QMessageBox.critical(self, "Export Failed", f"An error occurred while writing the Excel file: {e}")
+        def on_error(message, details):
+            print(details)
+            QMessageBox.critical(self, "Export Failed", f"An error occurred while writing the Excel file: {message}")
             self.show_notification("Excel export failed.", 'error', 8000)
 
+        start_excel_export(self, file_path, sheets, on_finished, on_error)
+
     # --- NEW EXPORT METHODS END HERE ---
 
     # ... (rest of the FGEndorsementPage class methods remain unchanged,
@@ -817,7 +795,7 @@ class FGEndorsementPage(QWidget):
             return
 
         is_update = self.current_editing_ref is not None
-        sys_ref_no = self.current_editing_ref if is_update else self._generate_system_ref_no()
+        sys_ref_no = self.current_editing_ref  # new endorsements are numbered inside the save transaction
 
         primary_data = {
             "system_ref_no": sys_ref_no, "form_ref_no": self.form_ref_no_edit.text().strip(),
@@ -833,71 +811,40 @@ class FGEndorsementPage(QWidget):
 
         try:
             with self.engine.connect() as conn, conn.begin():
-                if is_update:
-                    conn.execute(text("DELETE FROM fg_endorsements_secondary WHERE system_ref_no = :ref"),
-                                 {"ref": sys_ref_no})
-                    conn.execute(text("DELETE FROM fg_endorsements_excess WHERE system_ref_no = :ref"),
-                                 {"ref": sys_ref_no})
-                    update_sql = text(
-                        "UPDATE fg_endorsements_primary SET form_ref_no=:form_ref_no, date_endorsed=:date_endorsed, category=:category, product_code=:product_code, lot_number=:lot_number, quantity_kg=:quantity_kg, weight_per_lot=:weight_per_lot, bag_no=:bag_no, status=:status, endorsed_by=:endorsed_by, remarks=:remarks, location=:location, edited_by=:edited_by, edited_on=:edited_on WHERE system_ref_no = :system_ref_no")
-                    conn.execute(update_sql, primary_data)
-                    self.log_audit_trail("UPDATE_FG_ENDORSEMENT", f"Updated endorsement: {sys_ref_no}")
-                else:
-                    insert_sql = text(
-                        "INSERT INTO fg_endorsements_primary (system_ref_no, form_ref_no, date_endorsed, category, product_code, lot_number, quantity_kg, weight_per_lot, bag_no, status, endorsed_by, remarks, location, encoded_by, encoded_on, edited_by, edited_on) VALUES (:system_ref_no, :form_ref_no, :date_endorsed, :category, :product_code, :lot_number, :quantity_kg, :weight_per_lot, :bag_no, :status, :endorsed_by, :remarks, :location, :encoded_by, :encoded_on, :edited_by, :edited_on)")
-                    conn.execute(insert_sql, primary_data)
-                    self.log_audit_trail("CREATE_FG_ENDORSEMENT", f"Created endorsement: {sys_ref_no}")
+                if not is_update:
+                    sys_ref_no = primary_data["system_ref_no"] = self._generate_system_ref_no(conn)
+                new_products = register_products(conn, [primary_data["product_code"]])
 
-                sql_template = "INSERT INTO {table} (system_ref_no, lot_number, quantity_kg, product_code, status, bag_no, endorsed_by) VALUES (:system_ref_no, :lot_number, :quantity_kg, :product_code, :status, :bag_no, :endorsed_by)"
                 common_details = {"product_code": primary_data["product_code"], "status": primary_data["status"],
                                   "bag_no": primary_data["bag_no"], "endorsed_by": primary_data["endorsed_by"]}
                 breakdown_lots, excess_lots = self.preview_data.get('breakdown', []), self.preview_data.get('excess',
                                                                                                             [])
-                if breakdown_lots: conn.execute(text(sql_template.format(table="fg_endorsements_secondary")),
-                                                [{'system_ref_no': sys_ref_no, **lot_data, **common_details} for
-                                                 lot_data in breakdown_lots])
-                if excess_lots: conn.execute(text(sql_template.format(table="fg_endorsements_excess")),
-                                             [{'system_ref_no': sys_ref_no, **lot_data, **common_details} for lot_data
-                                              in excess_lots])
-
+                lots = {table: [{'system_ref_no': sys_ref_no, 'lot_number': lot_data['lot_number'],
+                                 'quantity_kg': lot_data['quantity_kg'], **common_details} for lot_data in table_lots]
+                        for table, table_lots in (("fg_endorsements_secondary", breakdown_lots),
+                                                  ("fg_endorsements_excess", excess_lots))}
+                transaction_records = [LedgerRow(
+                    transaction_date=primary_data["date_endorsed"],
+                    transaction_type="FG_ENDORSEMENT",
+                    source_ref_no=sys_ref_no,
+                    product_code=primary_data["product_code"],
+                    lot_number=lot_data['lot_number'],
+                    bag_box_number=primary_data["bag_no"],
+                    quantity_in=lot_data['quantity_kg'],
+                    warehouse=primary_data["location"],
+                    encoded_by=self.username,
+                    remarks=f"FG Endorsement via form: {primary_data['form_ref_no']}"
+                ) for lot_data in breakdown_lots + excess_lots]
+
+                batch = endorsement_batch(conn, FG_TABLES, primary_data, lots, {"transactions": transaction_records},
+                                          is_update)
                 if is_update:
-                    conn.execute(text(
-                        "DELETE FROM transactions WHERE transaction_type = 'FG_ENDORSEMENT' AND source_ref_no = :ref"),
-                        {"ref": sys_ref_no})
-
-                transaction_records = []
-                all_lots = self.preview_data.get('breakdown', []) + self.preview_data.get('excess', [])
-                for lot_data in all_lots:
-                    # --- FIX: Add bag_box_number to the transaction record ---
-                    transaction_records.append({
-                        "transaction_date": primary_data["date_endorsed"],
-                        "transaction_type": "FG_ENDORSEMENT",
-                        "source_ref_no": sys_ref_no,
-                        "product_code": primary_data["product_code"],
-                        "lot_number": lot_data['lot_number'],
-                        "bag_box_number": primary_data["bag_no"],  # <-- THIS LINE IS ADDED
-                        "quantity_in": lot_data['quantity_kg'],
-                        "quantity_out": 0,
-                        "unit": "KG.",
-                        "warehouse": primary_data["location"],
-                        "encoded_by": self.username,
-                        "remarks": f"FG Endorsement via form: {primary_data['form_ref_no']}"
-                    })
-
-                if transaction_records:
-                    # --- FIX: Update the INSERT statement to include the new column ---
-                    conn.execute(text("""
-                        INSERT INTO transactions (
-                            transaction_date, transaction_type, source_ref_no, product_code, 
-                            lot_number, bag_box_number, quantity_in, quantity_out, unit, warehouse, 
-                            encoded_by, remarks
-                        ) VALUES (
-                            :transaction_date, :transaction_type, :source_ref_no, :product_code, 
-                            :lot_number, :bag_box_number, :quantity_in, :quantity_out, :unit, :warehouse, 
-                            :encoded_by, :remarks
-                        )
-                    """), transaction_records)
+                    self.log_audit_trail("UPDATE_FG_ENDORSEMENT", f"Updated endorsement: {sys_ref_no}", batch=batch)
+                else:
+                    self.log_audit_trail("CREATE_FG_ENDORSEMENT", f"Created endorsement: {sys_ref_no}", batch=batch)
+                batch.execute()
 
+            if new_products: invalidate_reference('products')
             message = f"Endorsement {sys_ref_no} {'updated' if is_update else 'saved'} successfully."
             self.show_notification(message, 'success')
 
@@ -927,13 +874,7 @@ class FGEndorsementPage(QWidget):
                                 f"Delete endorsement <b>{sys_ref_no}</b>?") == QMessageBox.StandardButton.Yes:
             try:
                 with self.engine.connect() as conn, conn.begin():
-                    conn.execute(
-                        text("UPDATE fg_endorsements_primary SET is_deleted = TRUE WHERE system_ref_no = :ref"),
-                        {"ref": sys_ref_no})
-
-                    conn.execute(text(
-                        "DELETE FROM transactions WHERE transaction_type = 'FG_ENDORSEMENT' AND source_ref_no = :ref"),
-                        {"ref": sys_ref_no})
+                    soft_delete_document(conn, 'FG', sys_ref_no, self.username)
 
                     self.log_audit_trail("DELETE_FG_ENDORSEMENT",
                                          f"Soft-deleted endorsement and its inventory transactions: {sys_ref_no}")
@@ -954,42 +895,27 @@ class FGEndorsementPage(QWidget):
                                 f"Restore endorsement <b>{sys_ref_no}</b>?") == QMessageBox.StandardButton.Yes:
             try:
                 with self.engine.connect() as conn, conn.begin():
-                    conn.execute(
-                        text("UPDATE fg_endorsements_primary SET is_deleted = FALSE WHERE system_ref_no = :ref"),
-                        {"ref": sys_ref_no})
-
-                    primary_data_res = conn.execute(text(
-                        "SELECT date_endorsed, product_code, location, form_ref_no FROM fg_endorsements_primary WHERE system_ref_no = :ref"),
-                        {"ref": sys_ref_no}).mappings().one()
-                    breakdown_lots = conn.execute(text(
-                        "SELECT lot_number, quantity_kg FROM fg_endorsements_secondary WHERE system_ref_no = :ref"),
-                        {"ref": sys_ref_no}).mappings().all()
-                    excess_lots = conn.execute(
-                        text("SELECT lot_number, quantity_kg FROM fg_endorsements_excess WHERE system_ref_no = :ref"),
-                        {"ref": sys_ref_no}).mappings().all()
-
-                    transaction_records = []
-                    all_lots = breakdown_lots + excess_lots
-                    for lot_data in all_lots:
-                        transaction_records.append({
-                            "transaction_date": primary_data_res["date_endorsed"], "transaction_type": "FG_ENDORSEMENT",
-                            "source_ref_no": sys_ref_no, "product_code": primary_data_res["product_code"],
-                            "lot_number": lot_data['lot_number'], "quantity_in": lot_data['quantity_kg'],
-                            "quantity_out": 0, "unit": "KG.", "warehouse": primary_data_res["location"],
-                            "encoded_by": self.username,
-                            "remarks": f"RESTORED - FG Endorsement via form: {primary_data_res['form_ref_no']}"
-                        })
-
-                    if transaction_records:
-                        conn.execute(text("""
-                            INSERT INTO transactions (
-                                transaction_date, transaction_type, source_ref_no, product_code, lot_number, 
-                                quantity_in, quantity_out, unit, warehouse, encoded_by, remarks
-                            ) VALUES (
-                                :transaction_date, :transaction_type, :source_ref_no, :product_code, :lot_number, 
-                                :quantity_in, :quantity_out, :unit, :warehouse, :encoded_by, :remarks
-                            )
-                        """), transaction_records)
+                    if not restore_document(conn, 'FG', sys_ref_no, self.username):
+                        # Deleted before deleted_ledger_rows existed: rebuild its ledger rows
+                        primary_data_res = conn.execute(text(
+                            "SELECT date_endorsed, product_code, location, form_ref_no FROM fg_endorsements_primary WHERE system_ref_no = :ref"),
+                            {"ref": sys_ref_no}).mappings().one()
+                        breakdown_lots = conn.execute(text(
+                            "SELECT lot_number, quantity_kg FROM fg_endorsements_secondary WHERE system_ref_no = :ref"),
+                            {"ref": sys_ref_no}).mappings().all()
+                        excess_lots = conn.execute(
+                            text("SELECT lot_number, quantity_kg FROM fg_endorsements_excess WHERE system_ref_no = :ref"),
+                            {"ref": sys_ref_no}).mappings().all()
+
+                        ledger = LedgerWriter()
+                        for lot_data in breakdown_lots + excess_lots:
+                            ledger.add('transactions', LedgerRow(
+                                transaction_date=primary_data_res["date_endorsed"], transaction_type="FG_ENDORSEMENT",
+                                source_ref_no=sys_ref_no, product_code=primary_data_res["product_code"],
+                                lot_number=lot_data['lot_number'], quantity_in=lot_data['quantity_kg'],
+                                warehouse=primary_data_res["location"], encoded_by=self.username,
+                                remarks=f"RESTORED - FG Endorsement via form: {primary_data_res['form_ref_no']}"))
+                        ledger.to_batch(SaveBatch(conn)).execute()
 
                     self.log_audit_trail("RESTORE_FG_ENDORSEMENT",
                                          f"Restored endorsement and its inventory transactions: {sys_ref_no}")
@@ -1276,52 +1202,14 @@ class FGEndorsementPage(QWidget):
             return None
 
     def _perform_lot_calculation(self, total_qty, weight_per_lot, lot_input, is_range, excess_handling_method):
-        total_qty, weight_per_lot = Decimal(str(total_qty)), Decimal(str(weight_per_lot))
-        num_full_lots = int(total_qty // weight_per_lot)
-        excess_qty = total_qty % weight_per_lot
-        breakdown_data, excess_data = [], []
-        range_end_lot = None
-        calculated_lots = [lot_input.upper()] * num_full_lots
-        if is_range:
-            range_info = self._parse_lot_range(lot_input, num_full_lots)
-            if range_info is None: return None
-            calculated_lots = range_info['lots']
-            range_end_lot = range_info['end_lot']
-        if calculated_lots:
-            breakdown_data = [{'lot_number': lot, 'quantity_kg': weight_per_lot} for lot in calculated_lots]
-        if excess_qty > 0:
-            if is_range and excess_handling_method == 'ASSIGN_TO_LAST_IN_RANGE':
-                # This case should merge with the last lot in breakdown_data, not be separate
-                if breakdown_data:
-                    breakdown_data[-1]['quantity_kg'] += excess_qty
-                else:  # Should not happen if there are lots, but as a fallback
-                    excess_data.append({'lot_number': range_end_lot, 'quantity_kg': excess_qty})
-            else:
-                last_lot = calculated_lots[-1] if calculated_lots else lot_input.upper()
-                match = re.match(r'^(\d+)([A-Z]*)$', last_lot)
-
-                # Determine the next sequential lot number for the excess
-                if match:
-                    last_num = int(match.group(1))
-                    suffix = match.group(2)
-                    num_len = len(match.group(1))
-                    if is_range:
-                        # If it was a range, the new excess lot should follow the entire original range
-                        end_match = re.match(r'^(\d+)([A-Z]*)$', range_end_lot)
-                        if end_match:
-                            last_num = int(end_match.group(1))
-
-                    excess_lot_number = f"{str(last_num + 1).zfill(num_len)}{suffix}"
-                else:
-                    excess_lot_number = f"{last_lot}-EXCESS"  # Fallback if lot format is non-numeric
-
-                excess_data.append({'lot_number': excess_lot_number, 'quantity_kg': excess_qty})
-
-        # Recalculate totals in case ASSIGN_TO_LAST_IN_RANGE was used
-        if is_range and excess_handling_method == 'ASSIGN_TO_LAST_IN_RANGE' and breakdown_data:
-            return {"breakdown": breakdown_data, "excess": []}
-
-        return {"breakdown": breakdown_data, "excess": excess_data}
+        try:
+            return split_lots(total_qty, weight_per_lot, lot_input, is_range, excess_handling_method)
+        except LotRangeTooSmall as e:
+            QMessageBox.warning(self, "Lot Range Too Small",
+                                f"The provided range has {e.available} lots, but {e.needed} are required. Please adjust.")
+        except LotRangeError as e:
+            QMessageBox.critical(self, "Lot Range Error", f"Could not parse lot range '{lot_input}': {e}")
+        return None
 
     def _preview_endorsement(self):
         self._clear_form_previews()
@@ -1477,70 +1365,31 @@ class FGEndorsementPage(QWidget):
         self._load_remarks();
         self._load_locations()
 
-    def _load_dropdown_data(self, combo: QComboBox, query_str: str, make_upper: bool = False):
+    def _load_dropdown_data(self, combo: QComboBox, reference_key: str):
         try:
-            with self.engine.connect() as conn:
-                result = conn.execute(text(query_str)).scalars().all()
-            current_text = combo.currentText();
-            combo.blockSignals(True);
-            combo.clear()
-            combo.addItems([""] + [r.upper() if make_upper else r for r in result])
-            combo.blockSignals(False)
-            if combo.isEditable():
-                combo.setCurrentText(current_text)
-            else:
-                combo.setCurrentIndex(combo.findText(current_text) if combo.findText(current_text) != -1 else 0)
+            bind_reference_combo(combo, self.engine, reference_key)
         except Exception as e:
             QMessageBox.critical(self, "Dropdown Load Error", f"Could not load data: {e}")
 
     def _load_product_codes(self):
-        self._load_dropdown_data(self.product_code_combo,
-                                 "SELECT DISTINCT prod_code FROM legacy_production WHERE prod_code IS NOT NULL AND prod_code != '' ORDER BY prod_code",
-                                 True)
+        self._load_dropdown_data(self.product_code_combo, 'product_codes')
 
     def _load_endorsers(self):
-        self._load_dropdown_data(self.endorsed_by_combo, "SELECT name FROM endorsers ORDER BY name")
+        self._load_dropdown_data(self.endorsed_by_combo, 'endorsers')
 
     def _load_remarks(self):
-        self._load_dropdown_data(self.remarks_combo, "SELECT remark_text FROM endorsement_remarks ORDER BY remark_text")
+        self._load_dropdown_data(self.remarks_combo, 'endorsement_remarks')
 
     def _load_locations(self):
-        self._load_dropdown_data(self.location_combo, "SELECT name FROM warehouses ORDER BY name")
+        self._load_dropdown_data(self.location_combo, 'warehouses')
 
     def _manage_list(self, table, column, title, callback):
         ManageListDialog(self, self.engine, table, column, title).exec()
         callback()
         self.show_notification(f"{title.replace('Manage ', '')} list updated and reloaded.", 'info')
 
-    def _generate_system_ref_no(self):
-        prefix = f"FGE-{datetime.now().strftime('%Y%m%d')}-"
-        with self.engine.connect() as conn:
-            last_ref = conn.execute(text(
-                "SELECT system_ref_no FROM fg_endorsements_primary WHERE system_ref_no LIKE :p ORDER BY id DESC LIMIT 1"),
-                {"p": f"{prefix}%"}).scalar_one_or_none()
-            return f"{prefix}{int(last_ref.split('-')[-1]) + 1 if last_ref else 1:04d}"
-
-    def _parse_lot_range(self, lot_input, num_lots_needed):
-        try:
-            parts = [s.strip().upper() for s in lot_input.split('-')];
-            if len(parts) != 2: raise ValueError("Lot range must contain exactly one hyphen.")
-            start_str, end_str = parts
-            start_match = re.match(r'^(\d+)([A-Z]*)$', start_str);
-            end_match = re.match(r'^(\d+)([A-Z]*)$', end_str)
-            if not start_match or not end_match or start_match.group(2) != end_match.group(2): raise ValueError(
-                "Format invalid or suffixes mismatch. Expected: '100A-105A'.")
-            start_num, end_num, suffix, num_len = int(start_match.group(1)), int(end_match.group(1)), start_match.group(
-                2), len(start_match.group(1))
-            if start_num > end_num: raise ValueError("Start lot cannot be greater than end lot.")
-            if end_num - start_num + 1 < num_lots_needed:
-                QMessageBox.warning(self, "Lot Range Too Small",
-                                    f"The provided range has {end_num - start_num + 1} lots, but {num_lots_needed} are required. Please adjust.")
-                return None
-            lots = [f"{str(start_num + i).zfill(num_len)}{suffix}" for i in range(num_lots_needed)]
-            return {'lots': lots, 'end_lot': end_str}
-        except Exception as e:
-            QMessageBox.critical(self, "Lot Range Error", f"Could not parse lot range '{lot_input}': {e}");
-            return None
+    def _generate_system_ref_no(self, conn):
+        return next_document_number(conn, 'FGE')
 
     # --- MODIFIED: Generalized table population logic ---
     def _populate_records_table(self, table: QTableWidget, data: list, headers: list):
@@ -0,0 +1,181 @@
+"""
+Compiled layouts for the DR, RRF and RR forms.
+
+Everything on a form that does not depend on the record (letterhead, titles, field labels, column headers,
+signature blocks, table styles and the DR footer) is built once per thread and reused by every document, so
+print_documents only creates the paragraphs for the variable cells. Paragraph markup parsing and table
+wrapping were the bulk of per-document cost.
+
+Templates are kept per thread because reportlab flowables carry their last layout on the instance while
+a story is being built; two threads must never lay out the same Paragraph at once. Pool workers are
+single-threaded processes and simply compile their own copy.
+"""
+import threading
+
+from reportlab.lib import colors
+from reportlab.lib.units import inch
+from reportlab.platypus import Paragraph, Table, TableStyle
+
+from document_resources import stylesheet
+
+DR_PAGE_SIZE = (8.5 * inch, 6.5 * inch)
+FORM_PAGE_SIZE = (8.5 * inch, 5.5 * inch)
+SIGNATURE_SUB_TEXT = "Signature Over Printed Name"
+
+_local = threading.local()
+
+
+class DeliveryReceiptTemplate:
+    """Static parts of the Delivery Receipt; the footer is fully static and wrapped once."""
+    doc_type = 'DR'
+    left_margin = 0.25 * inch
+    bottom_margin = 1.8 * inch
+    frame_width = DR_PAGE_SIZE[0] - 2 * left_margin
+
+    def __init__(self):
+        styles = self.styles = stylesheet(self.doc_type)
+        self.letterhead = Paragraph(
+            "<b>MASTERBATCH PHILIPPINES INC.</b><br/><font size='9'>24 Diamond Road Caloocan Industrial Subdivision, Bo. Kaybiga, Caloocan City, Philippines</font><br/><font size='9'>Tel. Nos.: 8935-9579 / 7758-1207 Telefax: 8374-7085</font><br/><font size='9'>TIN NO.: 238-034-470-000</font>",
+            styles['CustomerData'])
+        self.title = Paragraph("DELIVERY RECEIPT", styles['DRTitle'])
+        self.label_no = Paragraph("No.:", styles['DRLabel'])
+        self.label_date = Paragraph("Delivery Date:", styles['DRLabel'])
+        self.label_po = Paragraph("PO No.:", styles['DRLabel'])
+        self.label_terms = Paragraph("Terms of Payment:", styles['DRLabel'])
+        self.item_header = [Paragraph(h, styles['ItemHeader'])
+                            for h in ("QUANTITY", "UNIT", "DESCRIPTION", "UNIT PRICE", "AMOUNT")]
+        self.nothing_follows = Paragraph("******************** NOTHING FOLLOWS ********************",
+                                         styles['NothingFollows'])
+        self.top_style = TableStyle([('VALIGN', (0, 0), (-1, -1), 'TOP')])
+        self.middle_style = TableStyle([('VALIGN', (0, 0), (-1, -1), 'MIDDLE')])
+        self.items_style = TableStyle(
+            [('VALIGN', (0, 0), (-1, -1), 'TOP'), ('LINEBELOW', (0, 0), (-1, 0), 1, colors.black),
+             ('LEFTPADDING', (0, 0), (-1, -1), 4), ('RIGHTPADDING', (0, 0), (-1, -1), 4)])
+
+        received_by_text = "Received the above items in good order and condition.<br/><br/>By: _____________________________<br/><font size=8>Signature over printed Name/Date</font>"
+        important_text = "IMPORTANT: Merchandise described in this Delivery Receipt remains the property of MASTERBATCH PHILIPPINES, INC. until fully paid. Interest of 18% per annum is to be charged on all overdue accounts. An additional sum equal to 25% of the amount will be charged by the vendor or attorney's fees and cost of collection in case of suit. Parties expressly submit themselves to the jurisdiction of the courts of MANILA in any legal action arising from the transaction."
+        self.footer_table = Table([[Paragraph(received_by_text, styles['Footerby']),
+                                    Paragraph("Delivery Time In: ________________", styles['FooterText']),
+                                    Paragraph("Delivery Time Out: ________________", styles['FooterText'])],
+                                   [Paragraph(important_text, styles['ImportantText']), '', '']],
+                                  colWidths=[3.0 * inch, 2.5 * inch, 2.5 * inch], rowHeights=[0.8 * inch, None])
+        self.footer_table.setStyle(TableStyle(
+            [('VALIGN', (0, 0), (-1, 0), 'TOP'), ('SPAN', (0, 1), (2, 1)), ('TOPPADDING', (0, 1), (-1, 1), 10)]))
+        self.footer_table.wrap(self.frame_width, self.bottom_margin)
+
+    def draw_page(self, canvas, doc):
+        canvas.saveState()
+        self.footer_table.drawOn(canvas, doc.leftMargin, 0.25 * inch)
+        canvas.restoreState()
+
+
+class _SignedFormTemplate:
+    """Shared compilation for the RRF/RR layouts: letterhead, column headers and the signature footer."""
+    doc_type = ''
+    letterhead_text = ''
+    column_headers = ()
+    header_style_name = 'MainStyleCenter'
+    footer_labels = ()
+    signature_line = ''
+    signature_col_width = 0.0
+
+    def __init__(self):
+        styles = self.styles = stylesheet(self.doc_type)
+        self.letterhead = Paragraph(self.letterhead_text, styles['MainStyle'])
+        self.item_header = [Paragraph(f'<b>{h}</b>', styles[self.header_style_name]) for h in self.column_headers]
+        self.nothing_follows = Paragraph("***** NOTHING FOLLOWS *****", styles['MainStyleCenter'])
+        self.header_style = TableStyle([('VALIGN', (0, 0), (-1, -1), 'TOP')])
+        self.footer_style = TableStyle(
+            [('VALIGN', (0, 0), (-1, -1), 'BOTTOM'), ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+             ('LEFTPADDING', (0, 0), (-1, -1), 0), ('RIGHTPADDING', (0, 0), (-1, -1), 0)])
+        # one instance per cell: a flowable must not be laid out twice inside the same table
+        self.footer_label_row = [Paragraph(label, styles['Footer']) for label in self.footer_labels]
+        self.footer_line_row = [Paragraph(self.signature_line, styles['FooterSig']) for _ in self.footer_labels]
+        self.footer_sub_row = [Paragraph(SIGNATURE_SUB_TEXT, styles['FooterSub']) for _ in self.footer_labels]
+        self.blank_signatures = [Paragraph("<br/>", styles['FooterSig']) for _ in self.footer_labels]
+
+    def signature_name(self, name) -> Paragraph:
+        return Paragraph(f"<br/>{(name or '').upper()}", self.styles['FooterSig'])
+
+    def header_table(self, right_paragraph: Paragraph, col_widths: list) -> Table:
+        return Table([[self.letterhead, right_paragraph]], colWidths=col_widths, style=self.header_style)
+
+    def footer_table(self, names: dict) -> Table:
+        """names maps a footer column index to the printed name bound into that signature cell."""
+        name_row = [self.signature_name(names[i]) if i in names else self.blank_signatures[i]
+                    for i in range(len(self.footer_labels))]
+        table = Table([self.footer_label_row, name_row, self.footer_line_row, self.footer_sub_row],
+                      colWidths=[self.signature_col_width] * len(self.footer_labels),
+                      rowHeights=[0.15 * inch, 0.25 * inch, 0.05 * inch, 0.15 * inch])
+        table.setStyle(self.footer_style)
+        return table
+
+    @staticmethod
+    def draw_page(canvas, doc, header_table, footer_table):
+        # both tables were wrapped by the generator to size the margins; only drawing is left per page
+        canvas.saveState()
+        page_width, page_height = doc.pagesize
+        header_table.drawOn(canvas, doc.leftMargin, page_height - header_table._height - (0.2 * inch))
+        footer_table.drawOn(canvas, doc.leftMargin, 0.2 * inch)
+        canvas.restoreState()
+
+
+class RrfTemplate(_SignedFormTemplate):
+    doc_type = 'RRF'
+    letterhead_text = """<font name='LucidaSans-Bold' size='14'>MASTERBATCH PHILIPPINES INC.</font><br/><font size='9'>24 Diamond Road, Caloocan Industrial Subd., Bo. Kaybiga Caloocan City</font><br/><font size='9'>Tel. Nos.: 8935-93-75 | 8935-9376 | 7738-1207</font>"""
+    column_headers = ("Quantity", "Unit", "Product Code", "Lot Number", "Reference #")
+    footer_labels = ("Prepared by:", "Checked by:", "Approved by:", "Received by:")
+    signature_line = "_" * 28
+    signature_col_width = 1.9 * inch
+
+    def __init__(self):
+        super().__init__()
+        self.details_style = TableStyle(
+            [('GRID', (0, 0), (-1, -1), 0.5, colors.black), ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+             ('LEFTPADDING', (0, 0), (-1, -1), 5), ('SPAN', (1, 0), (1, 1))])
+        self.items_base_style = [('LINEBELOW', (0, 0), (-1, 0), 1, colors.black), ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+                                 ('LEFTPADDING', (0, 0), (-1, -1), 3), ('RIGHTPADDING', (0, 0), (-1, -1), 3)]
+
+
+class ReceivingReportTemplate(_SignedFormTemplate):
+    doc_type = 'RR'
+    letterhead_text = """<font name='LucidaSans-Bold' size='12'>MASTERBATCH PHILIPPINES INC.</font><br/><font size='8'>24 Diamond Road, Caloocan Industrial Subd., Bo. Kaybiga Caloocan City</font><br/><font size='8'>Tel. Nos.: 8935-93-75 | 8935-93-76 | 7738-1207</font>"""
+    column_headers = ("Product Code", "Lot no.", "Quantity (kg)", "Status", "Location")
+    header_style_name = 'MainStyleBoldCenter'
+    footer_labels = ("Received and checked by:", "Reported by:", "Noted by:")
+    signature_line = "_" * 25
+    signature_col_width = 2.6 * inch
+
+    def __init__(self):
+        super().__init__()
+        self.details_style = TableStyle(
+            [('GRID', (0, 0), (-1, -1), 0.5, colors.black), ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+             ('LEFTPADDING', (0, 0), (-1, -1), 5), ('SPAN', (1, 1), (1, 1))])
+        self.items_base_style = [('VALIGN', (0, 0), (-1, -1), 'MIDDLE'), ('LEFTPADDING', (0, 0), (-1, -1), 3),
+                                 ('RIGHTPADDING', (0, 0), (-1, -1), 3),
+                                 ('LINEBELOW', (0, 0), (-1, 0), 0.5, colors.black),
+                                 ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey)]
+
+
+TEMPLATE_CLASSES = {'DR': DeliveryReceiptTemplate, 'RRF': RrfTemplate, 'RR': ReceivingReportTemplate}
+
+
+def form_template(doc_type: str):
+    """Returns this thread's compiled template for 'DR', 'RRF' or 'RR', compiling it on first use."""
+    templates = getattr(_local, 'templates', None)
+    if templates is None:
+        templates = _local.templates = {}
+    template = templates.get(doc_type)
+    if template is None:
+        template = templates[doc_type] = TEMPLATE_CLASSES[doc_type]()
+    return template
+
+
+def warm_up_templates():
+    for doc_type in TEMPLATE_CLASSES:
+        form_template(doc_type)
+
+
+def clear_templates():
+    """Drops this thread's compiled templates (benchmarks only)."""
+    _local.templates = {}
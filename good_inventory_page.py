@@ -5,12 +5,6 @@ import traceback
 from datetime import datetime
 import qtawesome as fa
 
-# --- Email Imports ---
-from email.message import EmailMessage
-from io import BytesIO
-import smtplib
-import ssl
-
 # --- PyQt6 Imports ---
 from PyQt6.QtCore import Qt, QObject, pyqtSignal, QThread, QDate, QSize, QSettings, QPoint
 from PyQt6.QtGui import QColor, QAction
@@ -19,13 +13,19 @@ from PyQt6.QtWidgets import (QApplication, QWidget, QVBoxLayout, QTableWidget,
                              QLabel, QPushButton, QLineEdit, QAbstractItemView,
                              QDateEdit, QGroupBox, QFileDialog, QTabWidget,
                              QGridLayout, QProgressBar, QComboBox, QDialog,
-                             QFormLayout, QDialogButtonBox, QSpinBox, QMenu)
+                             QFormLayout, QDialogButtonBox, QSpinBox, QMenu, QCheckBox)
 
 # --- SQLAlchemy and OpenPyXL Imports ---
 from sqlalchemy import create_engine, text
 from sqlalchemy.engine import Engine
-from openpyxl.utils import get_column_letter
-from openpyxl.worksheet.worksheet import Worksheet
+from excel_export import DataFrameSheet, start_excel_export
+from email_spool import queue_report_email
+
+from inventory_summary import build_inventory_summary
+from period_archive import with_archive
+from report_queries import (good_inventory, net_endorsements, inventory_export, monthly_summary_export,
+                            endorsement_summary_export)
+from scheduled_reports import offer_cached_report
 
 # --- UI CONSTANTS ---
 PRIMARY_ACCENT_COLOR = "#007bff"
@@ -55,7 +55,7 @@ class UpperCaseLineEdit(QLineEdit):
 
 
 class InventoryWorker(QObject):
-    finished = pyqtSignal(pd.DataFrame)
+    finished = pyqtSignal(pd.DataFrame, dict)
     error = pyqtSignal(str, str)
 
     def __init__(self, engine: Engine, product_filter: str, lot_filter: str, as_of_date: str, fg_type_filter: str):
@@ -68,53 +68,8 @@ class InventoryWorker(QObject):
 
     def run(self):
         try:
-            params = {'as_of_date': self.as_of_date}
-            date_filter_clause = "AND t.transaction_date <= :as_of_date"
-            product_filter_clause = ""
-            if self.product_filter:
-                product_filter_clause = "AND s.product_code ILIKE :product_search"
-                params['product_search'] = f"%{self.product_filter}%"
-            lot_filter_clause = ""
-            if self.lot_filter:
-                lot_filter_clause = "AND s.lot_number ILIKE :lot_search"
-                params['lot_search'] = f"%{self.lot_filter}%"
-            fg_type_clause = ""
-            if self.fg_type_filter in ["MB", "DC"]:
-                fg_type_clause = "AND s.fg_type = :fg_type"
-                params['fg_type'] = self.fg_type_filter
-            query_str = f"""
-                WITH all_tx AS (
-                    SELECT UPPER(TRIM(product_code)) AS product_code, UPPER(TRIM(lot_number)) AS lot_number, COALESCE(UPPER(TRIM(fg_type)), CASE WHEN product_code LIKE '%-%' THEN 'DC' ELSE 'MB' END) AS fg_type, COALESCE(CAST(qty AS NUMERIC), 0) AS quantity_in, 0.0 AS quantity_out, location
-                    FROM beginv_sheet1 WHERE product_code IS NOT NULL AND TRIM(product_code) <> '' AND lot_number IS NOT NULL AND TRIM(lot_number) <> ''
-                    UNION ALL
-                    SELECT UPPER(TRIM(t.product_code)) AS product_code, UPPER(TRIM(t.lot_number)) AS lot_number, CASE WHEN t.product_code LIKE '%-%' THEN 'DC' ELSE 'MB' END AS fg_type, COALESCE(CAST(t.quantity_in AS NUMERIC), 0) AS quantity_in, COALESCE(CAST(t.quantity_out AS NUMERIC), 0) AS quantity_out, t.warehouse as location
-                    FROM transactions t WHERE t.product_code IS NOT NULL AND TRIM(t.product_code) <> '' AND t.lot_number IS NOT NULL AND TRIM(t.lot_number) <> '' {date_filter_clause}
-                ),
-                lot_details_source AS (
-                    ( SELECT DISTINCT ON (t.lot_number) t.lot_number, t.warehouse AS location, COALESCE(fg_b.bag_no, qcf_b.bag_no, '') AS bag_box_number, 0 as priority FROM transactions t
-                        LEFT JOIN (SELECT DISTINCT ON (system_ref_no) system_ref_no, bag_no FROM fg_endorsements_primary ORDER BY system_ref_no, bag_no) fg_b ON t.source_ref_no = fg_b.system_ref_no
-                        LEFT JOIN (SELECT DISTINCT ON (system_ref_no) system_ref_no, bag_no FROM qcf_endorsements_primary ORDER BY system_ref_no, bag_no) qcf_b ON t.source_ref_no = qcf_b.system_ref_no
-                        WHERE t.transaction_date <= :as_of_date ORDER BY t.lot_number, t.transaction_date DESC )
-                    UNION ALL
-                    ( SELECT DISTINCT ON (b.lot_number) b.lot_number, b.location, COALESCE(b.bag_number, b.box_number, '') as bag_box_number, 1 as priority FROM beginv_sheet1 b
-                        WHERE b.lot_number IS NOT NULL AND TRIM(b.lot_number) <> '' ORDER BY b.lot_number )
-                ),
-                lot_details AS (SELECT DISTINCT ON (lot_number) lot_number, location, bag_box_number FROM lot_details_source ORDER BY lot_number, priority ASC),
-                lot_summary AS (
-                    SELECT lot_number, MAX(product_code) AS product_code, MAX(fg_type) AS fg_type, COALESCE(SUM(quantity_in), 0) - COALESCE(SUM(quantity_out), 0) AS current_balance
-                    FROM all_tx GROUP BY lot_number HAVING (COALESCE(SUM(quantity_in), 0) - COALESCE(SUM(quantity_out), 0)) != 0
-                )
-                SELECT s.product_code, s.lot_number, s.current_balance, d.location, d.bag_box_number, s.fg_type
-                FROM lot_summary s LEFT JOIN lot_details d ON s.lot_number = d.lot_number
-                WHERE 1=1 {product_filter_clause} {lot_filter_clause} {fg_type_clause} ORDER BY s.product_code, s.lot_number;
-            """
-            with self.engine.connect() as conn:
-                results = conn.execute(text(query_str), params).mappings().all()
-            df = pd.DataFrame(results) if results else pd.DataFrame(
-                columns=['product_code', 'lot_number', 'current_balance', 'location', 'bag_box_number', 'fg_type'])
-            if not df.empty:
-                df['current_balance'] = pd.to_numeric(df['current_balance'])
-            self.finished.emit(df)
+            df = good_inventory(self.engine, self.as_of_date, self.product_filter, self.lot_filter, self.fg_type_filter)
+            self.finished.emit(df, build_inventory_summary(df))
         except Exception:
             self.error.emit("Database query failed.", traceback.format_exc())
 
@@ -123,24 +78,29 @@ class TransactionHistoryWorker(QObject):
     finished = pyqtSignal(pd.DataFrame)
     error = pyqtSignal(str, str)
 
-    def __init__(self, engine: Engine, lot_number: str, as_of_date: str):
+    def __init__(self, engine: Engine, lot_number: str, as_of_date: str, include_archived: bool = False):
         super().__init__()
         self.engine = engine
         self.lot_number = lot_number
         self.as_of_date = as_of_date
+        self.include_archived = include_archived
 
     def run(self):
         try:
-            query = text("""
-                SELECT '1900-01-01'::date AS transaction_date, 'BEGINV' AS transaction_type, COALESCE(CAST(qty AS NUMERIC), 0) AS quantity_in, 0.0 AS quantity_out, location, 'N/A' as source_ref_no
-                FROM beginv_sheet1 WHERE UPPER(TRIM(lot_number)) = :lot_number
-                UNION ALL
-                SELECT t.transaction_date, t.transaction_type, COALESCE(CAST(t.quantity_in AS NUMERIC), 0) AS quantity_in, COALESCE(CAST(t.quantity_out AS NUMERIC), 0) AS quantity_out, t.warehouse AS location, t.source_ref_no
-                FROM transactions t WHERE UPPER(TRIM(t.lot_number)) = :lot_number AND t.transaction_date <= :as_of_date
-                ORDER BY transaction_date;
-            """)
             params = {'lot_number': self.lot_number, 'as_of_date': self.as_of_date}
             with self.engine.connect() as conn:
+                beginv = with_archive(conn, 'beginv_sheet1', ('lot_number', 'qty', 'location'), self.include_archived)
+                ledger = with_archive(conn, 'transactions', ('transaction_date', 'transaction_type', 'lot_number',
+                                                             'quantity_in', 'quantity_out', 'warehouse',
+                                                             'source_ref_no'), self.include_archived)
+                query = text(f"""
+                    SELECT '1900-01-01'::date AS transaction_date, 'BEGINV' AS transaction_type, COALESCE(CAST(qty AS NUMERIC), 0) AS quantity_in, 0.0 AS quantity_out, location, 'N/A' as source_ref_no
+                    FROM {beginv} b WHERE UPPER(TRIM(lot_number)) = :lot_number
+                    UNION ALL
+                    SELECT t.transaction_date, t.transaction_type, COALESCE(CAST(t.quantity_in AS NUMERIC), 0) AS quantity_in, COALESCE(CAST(t.quantity_out AS NUMERIC), 0) AS quantity_out, t.warehouse AS location, t.source_ref_no
+                    FROM {ledger} t WHERE UPPER(TRIM(t.lot_number)) = :lot_number AND t.transaction_date <= :as_of_date
+                    ORDER BY transaction_date;
+                """)
                 results = conn.execute(query, params).mappings().all()
             df = pd.DataFrame(results) if results else pd.DataFrame()
             self.finished.emit(df)
@@ -163,45 +123,7 @@ class MonthlyReportWorker(QObject):
 
     def run(self):
         try:
-            params = {'start_date': self.start_date, 'end_date': self.end_date}
-            query_str = f"""
-                WITH all_endorsements AS (
-                    -- FG Endorsements (Passed - Treated as Positive Quantity)
-                    SELECT
-                        UPPER(TRIM(product_code)) as product_code,
-                        COALESCE(CAST("QTY" AS NUMERIC), 0) as net_qty, -- Attempting uppercase QTY
-                        remarks
-                    FROM fg_endorsements_primary
-                    WHERE endorsement_date BETWEEN :start_date AND :end_date
-                    UNION ALL
-                    -- QCF Endorsements (Failed - Treated as Negative Quantity)
-                    SELECT
-                        UPPER(TRIM(product_code)) as product_code,
-                        -1 * COALESCE(CAST("QTY" AS NUMERIC), 0) as net_qty, -- Attempting uppercase QTY
-                        remarks
-                    FROM qcf_endorsements_primary
-                    WHERE endorsement_date BETWEEN :start_date AND :end_date
-                )
-                SELECT
-                    product_code,
-                    SUM(net_qty) as net_quantity,
-                    -- Aggregate all unique non-empty remarks from both FG and QCF endorsements
-                    STRING_AGG(DISTINCT NULLIF(TRIM(remarks), ''), '; ' ORDER BY product_code) AS remarks
-                FROM all_endorsements
-                GROUP BY product_code
-                HAVING SUM(net_qty) != 0 -- Only show products that had a net movement
-                ORDER BY product_code;
-            """
-            with self.engine.connect() as conn:
-                results = conn.execute(text(query_str), params).mappings().all()
-
-            df = pd.DataFrame(results) if results else pd.DataFrame(
-                columns=['product_code', 'net_quantity', 'remarks'])
-
-            if not df.empty:
-                df['net_quantity'] = pd.to_numeric(df['net_quantity'])
-
-            self.finished.emit(df)
+            self.finished.emit(net_endorsements(self.engine, self.start_date, self.end_date))
         except Exception:
             self.error.emit("Monthly Report query failed.", traceback.format_exc())
 
@@ -222,41 +144,8 @@ class EndorsementSummaryWorker(QObject):
 
     def run(self):
         try:
-            query = text("""
-                WITH all_endorsements AS (
-                    -- FG Endorsements (Passed - Treated as Positive Quantity)
-                    SELECT
-                        UPPER(TRIM(product_code)) as product_code,
-                        COALESCE(CAST("QTY" AS NUMERIC), 0) as net_qty, -- Attempting uppercase QTY
-                        remarks
-                    FROM fg_endorsements_primary
-                    WHERE endorsement_date BETWEEN :start_date AND :end_date
-                    UNION ALL
-                    -- QCF Endorsements (Failed - Treated as Negative Quantity)
-                    SELECT
-                        UPPER(TRIM(product_code)) as product_code,
-                        -1 * COALESCE(CAST("QTY" AS NUMERIC), 0) as net_qty, -- Attempting uppercase QTY
-                        remarks
-                    FROM qcf_endorsements_primary
-                    WHERE endorsement_date BETWEEN :start_date AND :end_date
-                )
-                SELECT
-                    product_code,
-                    SUM(net_qty) as total_qty,
-                    -- Aggregate all unique non-empty remarks
-                    STRING_AGG(DISTINCT NULLIF(TRIM(remarks), ''), '; ' ORDER BY product_code) as aggregated_remarks
-                FROM all_endorsements
-                GROUP BY product_code
-                HAVING SUM(net_qty) != 0 
-                ORDER BY product_code;
-            """)
-            params = {'start_date': self.start_date, 'end_date': self.end_date}
-            with self.engine.connect() as conn:
-                results = conn.execute(query, params).mappings().all()
-            df = pd.DataFrame(results) if results else pd.DataFrame()
-
-            if not df.empty:
-                df['total_qty'] = pd.to_numeric(df['total_qty'])
+            df = net_endorsements(self.engine, self.start_date, self.end_date)
+            df = df.rename(columns={'net_quantity': 'total_qty', 'remarks': 'aggregated_remarks'})
 
             self.finished.emit(df)
         except Exception:
@@ -276,6 +165,10 @@ class TransactionHistoryDialog(QDialog):
         self.setStyleSheet(parent.styleSheet() if parent else "")
         layout = QVBoxLayout(self)
         layout.addWidget(QLabel(f"<b>History for Lot:</b> {self.lot_number}", objectName="PageHeader"))
+        self.archived_check = QCheckBox("Include archived movements")
+        self.archived_check.setToolTip("Also show the movements of closed periods moved to the archive.")
+        self.archived_check.toggled.connect(self.fetch_transactions)
+        layout.addWidget(self.archived_check)
         self.history_table = QTableWidget()
         self.setup_table()
         layout.addWidget(self.history_table, 1)
@@ -299,8 +192,10 @@ class TransactionHistoryDialog(QDialog):
 
     def fetch_transactions(self):
         self._show_loading_state("Fetching transaction history...")
+        self.archived_check.setEnabled(False)
         self.worker_thread = QThread()
-        self.worker = TransactionHistoryWorker(self.engine, self.lot_number, self.as_of_date)
+        self.worker = TransactionHistoryWorker(self.engine, self.lot_number, self.as_of_date,
+                                               self.archived_check.isChecked())
         self.worker.moveToThread(self.worker_thread)
         self.worker_thread.started.connect(self.worker.run)
         self.worker.finished.connect(self._display_history)
@@ -311,6 +206,7 @@ class TransactionHistoryDialog(QDialog):
         self.worker_thread.start()
 
     def _display_history(self, df: pd.DataFrame):
+        self.archived_check.setEnabled(True)
         self.history_table.setRowCount(0)
         if df.empty: self._show_loading_state("No transactions found for this lot."); return
         df['running_balance'] = (df['quantity_in'].astype(float) - df['quantity_out'].astype(float)).cumsum()
@@ -327,6 +223,7 @@ class TransactionHistoryDialog(QDialog):
                 self.history_table.setItem(i, col_idx, item)
 
     def _on_fetch_error(self, title, message):
+        self.archived_check.setEnabled(True)
         show_error_message(self, title, "Could not fetch lot history.", message)
         self._show_loading_state("Error fetching data.")
 
@@ -421,50 +318,10 @@ class DateRangeDialog(QDialog):
         return self.start_date_edit.date(), self.end_date_edit.date()
 
 
-def send_email_with_excel(attachments, email_config):
-    sender_email = email_config.get('sender_email');
-    sender_password = email_config.get('sender_password');
-    smtp_server = email_config.get('smtp_server');
-    smtp_port = email_config.get('smtp_port');
-    recipient_email = email_config.get('recipient_email');
-    subject = email_config.get('subject')
-    if not all([sender_email, sender_password, smtp_server, smtp_port, recipient_email]): raise ValueError(
-        "Incomplete email settings. Please configure them in the Settings menu.")
-    recipients = [email.strip() for email in recipient_email.split(',')];
-    msg = EmailMessage();
-    msg['Subject'] = subject;
-    msg['From'] = sender_email;
-    msg['To'] = ', '.join(recipients)
-    attached_files = list(attachments.keys());
-    body = f'Please find the attached Excel report(s): {", ".join(attached_files)}.\n\nThis is an automated message.';
-    msg.set_content(body)
-    for filename, df_dict in attachments.items():
-        excel_buffer = BytesIO()
-        with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-            for sheet_name, df in df_dict.items(): df.to_excel(writer, sheet_name=sheet_name, index=False)
-        excel_buffer.seek(0)
-        msg.add_attachment(excel_buffer.read(), maintype='application',
-                           subtype='vnd.openxmlformats-officedocument.spreadsheetml.sheet', filename=filename)
-    context = ssl.create_default_context();
-    smtp_port_int = int(smtp_port)
-    if smtp_port_int == 465:
-        with smtplib.SMTP_SSL(smtp_server, smtp_port_int, context=context) as server:
-            server.login(sender_email, sender_password);
-            server.send_message(msg, from_addr=sender_email,
-                                to_addrs=recipients)
-    else:
-        with smtplib.SMTP(smtp_server, smtp_port_int) as server:
-            server.starttls(context=context);
-            server.login(sender_email, sender_password);
-            server.send_message(msg,
-                                from_addr=sender_email,
-                                to_addrs=recipients)
-
-
 class DashboardWidget(QWidget):
     def __init__(self):
         super().__init__()
-        self.data_df = pd.DataFrame()
+        self.summary = build_inventory_summary(pd.DataFrame())
         self.init_ui()
         self.setStyleSheet(self._get_dashboard_styles())
 
@@ -555,45 +412,29 @@ class DashboardWidget(QWidget):
         layout.setRowStretch(4, 1);
         return group
 
-    def update_dashboard(self, df: pd.DataFrame):
-        self.data_df = df;
-        is_empty = df.empty;
-        positive_balance_df = df[df['current_balance'] > 0] if not is_empty else pd.DataFrame();
-        overall_balance = df['current_balance'].sum() if not is_empty else 0.0
-        self.total_lots_label.findChild(QLabel, "ValueLabel").setText("0" if is_empty else f"{len(df):,}");
-        self.total_products_label.findChild(QLabel, "ValueLabel").setText(
-            "0" if is_empty else f"{df['product_code'].nunique():,}");
-        self.overall_balance_label.findChild(QLabel, "ValueLabel").setText(f"{overall_balance:,.2f}")
-        self.lot_stats['max_lot'].setText(
-            "N/A" if positive_balance_df.empty else f"{positive_balance_df['current_balance'].max():,.2f}");
-        self.lot_stats['min_lot'].setText(
-            "N/A" if positive_balance_df.empty else f"{positive_balance_df['current_balance'].min():,.2f}");
-        self.lot_stats['avg_lot'].setText(
-            "N/A" if positive_balance_df.empty else f"{positive_balance_df['current_balance'].mean():,.2f}");
-        self.lot_stats['median_lot'].setText(
-            "N/A" if positive_balance_df.empty else f"{positive_balance_df['current_balance'].median():,.2f}")
-        self.contribution_table.setRowCount(0);
-        self.location_table.setRowCount(0)
-        if not positive_balance_df.empty:
-            positive_total = positive_balance_df['current_balance'].sum();
-            self._populate_summary_table(positive_balance_df, self.contribution_table, 'product_code', positive_total,
-                                         10);
-            self._populate_summary_table(positive_balance_df, self.location_table, 'location', positive_total, 5)
-
-    def _populate_summary_table(self, df, table_widget, group_by_col, total_val, top_n):
-        if df.empty or total_val <= 0: return
-        summary = df.groupby(group_by_col)['current_balance'].sum().nlargest(top_n).reset_index();
-        summary['percentage'] = (summary['current_balance'] / total_val) * 100
-        table_widget.setRowCount(len(summary))
-        for i, row in summary.iterrows():
-            table_widget.setItem(i, 0, QTableWidgetItem(str(row[group_by_col])));
-            balance_item = QTableWidgetItem(f"{row['current_balance']:,.2f}");
+    def update_dashboard(self, summary: dict):
+        """Renders a summary produced by build_inventory_summary(); no per-lot work happens here."""
+        self.summary = summary
+        self.total_lots_label.findChild(QLabel, "ValueLabel").setText(f"{summary['total_lots']:,}");
+        self.total_products_label.findChild(QLabel, "ValueLabel").setText(f"{summary['unique_products']:,}");
+        self.overall_balance_label.findChild(QLabel, "ValueLabel").setText(f"{summary['overall_balance']:,.2f}")
+        for key in ('max_lot', 'min_lot', 'avg_lot', 'median_lot'):
+            value = summary[key]
+            self.lot_stats[key].setText("N/A" if value is None else f"{value:,.2f}")
+        self._populate_summary_table(self.contribution_table, summary['top_products'])
+        self._populate_summary_table(self.location_table, summary['top_locations'])
+
+    def _populate_summary_table(self, table_widget, rows):
+        table_widget.setRowCount(len(rows))
+        for i, (label, balance, percentage) in enumerate(rows):
+            table_widget.setItem(i, 0, QTableWidgetItem(label));
+            balance_item = QTableWidgetItem(f"{balance:,.2f}");
             balance_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter);
             table_widget.setItem(i, 1, balance_item);
-            percent_item = QTableWidgetItem(f"{row['percentage']:.1f}%");
+            percent_item = QTableWidgetItem(f"{percentage:.1f}%");
             percent_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter);
             table_widget.setItem(i, 2, percent_item);
-            progress_bar = QProgressBar(maximum=100, value=int(row['percentage']), textVisible=False);
+            progress_bar = QProgressBar(maximum=100, value=int(percentage), textVisible=False);
             table_widget.setCellWidget(i, 3, progress_bar)
 
 
@@ -745,7 +586,7 @@ class GoodInventoryPage(QWidget):
         if self.inventory_thread and self.inventory_thread.isRunning(): return
         self.set_controls_enabled(False);
         self._show_loading_state(self.inventory_table, "Calculating inventory balance...");
-        self.dashboard_widget.update_dashboard(pd.DataFrame());
+        self.dashboard_widget.update_dashboard(build_inventory_summary(pd.DataFrame()));
         date_str = self.date_picker.date().toString(Qt.DateFormat.ISODate);
         filters = f"Date: {date_str}, Type: {self.fg_type_combo.currentText()}, Prod: '{self.product_code_input.text()}', Lot: '{self.lot_number_input.text()}'";
         self.log_audit_trail("CALCULATE_GOOD_INVENTORY", f"User calculated good inventory with filters: {filters}");
@@ -769,19 +610,17 @@ class GoodInventoryPage(QWidget):
         self.inventory_thread = None;
         self.inventory_worker = None
 
-    def _on_inventory_finished(self, df: pd.DataFrame):
+    def _on_inventory_finished(self, df: pd.DataFrame, summary: dict):
         self.current_inventory_df = df.copy();
         self._display_inventory(df);
-        self.dashboard_widget.update_dashboard(
-            df);
+        self.dashboard_widget.update_dashboard(summary);
         self.set_controls_enabled(True)
 
     def _on_calculation_error(self, error_message: str, detailed_traceback: str):
         show_error_message(self, "Calculation Error", error_message, detailed_traceback);
         self._show_loading_state(
             self.inventory_table, "Error during calculation.");
-        self.dashboard_widget.update_dashboard(
-            pd.DataFrame());
+        self.dashboard_widget.update_dashboard(build_inventory_summary(pd.DataFrame()));
         self.set_controls_enabled(True)
 
     def _show_loading_state(self, table: QTableWidget, message: str):
@@ -814,52 +653,30 @@ class GoodInventoryPage(QWidget):
         prefix = f"Filtered Total ({len(df)} lots)" if is_filtered else f"Overall Total ({len(df)} lots)";
         self.total_balance_label.setText(f"{prefix}: {total_balance:,.2f} kg")
 
-    def _format_excel_sheet(self, worksheet: Worksheet, df: pd.DataFrame):
-        # Determine which column holds the quantity data for formatting
-        qty_col_header = next((col for col in df.columns if 'QTY' in col.upper()), None)
-
-        if qty_col_header and not df.empty:
-            # Find the column index (1-based for openpyxl)
-            qty_col_idx = df.columns.get_loc(qty_col_header) + 1
-            qty_col_letter = get_column_letter(qty_col_idx)
-
-            # Apply number format to all quantity cells (excluding header row)
-            for cell in worksheet[qty_col_letter][1:]:
-                cell.number_format = '#,##0.00'
-
-        # Auto-size columns based on content length
-        for i, col in enumerate(df.columns, 1):
-            if not df.empty:
-                column_letter = get_column_letter(i)
-                # Calculate max length, minimum of 10, maximum of 50
-                max_length = min(50,
-                                 max(10, df[col].astype(str).map(len).max() if not df[col].empty else 10, len(col) + 2))
-                worksheet.column_dimensions[column_letter].width = max_length
-
     def _export_to_excel(self):
         if self.current_inventory_df.empty: QMessageBox.information(self, "Export Failed", "No data to export."); return
         default_filename = f"FG_Inventory_Report_PASSED_{datetime.now():%Y-%m-%d}.xlsx";
         filepath, _ = QFileDialog.getSaveFileName(self, "Save Report", default_filename, "Excel Files (*.xlsx)")
         if filepath:
-            try:
-                export_df = self.current_inventory_df.rename(
-                    columns={'product_code': 'PRODUCT_CODE', 'lot_number': 'LOT_NUMBER', 'current_balance': 'QTY',
-                             'bag_box_number': 'BAG/BOX_NUMBER', 'location': 'LOCATION'});
-                final_cols = ['PRODUCT_CODE', 'LOT_NUMBER', 'BAG/BOX_NUMBER', 'QTY', 'LOCATION'];
-                df_mb = export_df[export_df['fg_type'] == 'MB'][final_cols].copy();
-                df_dc = export_df[export_df['fg_type'] == 'DC'][final_cols].copy()
-                with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-                    if not df_mb.empty:
-                        df_mb.to_excel(writer, index=False, sheet_name='FG MB PASSED')
-                        self._format_excel_sheet(writer.sheets['FG MB PASSED'], df_mb)
-                    if not df_dc.empty:
-                        df_dc.to_excel(writer, index=False, sheet_name='FG DC PASSED')
-                        self._format_excel_sheet(writer.sheets['FG DC PASSED'], df_dc)
-                filename = os.path.basename(filepath);
-                self.log_audit_trail("EXPORT_GOOD_INVENTORY", f"User exported good inventory report to '{filename}'.");
-                QMessageBox.information(self, "Export Successful", f"Data exported to:\n{filename}")
-            except Exception:
-                show_error_message(self, "Export Error", "Failed to save file.", traceback.format_exc())
+            sheets = [DataFrameSheet(name, df) for name, df in
+                      inventory_export(self.current_inventory_df, 'FG MB PASSED', 'FG DC PASSED').items()]
+            self._start_export(filepath, sheets, "EXPORT_GOOD_INVENTORY", "User exported good inventory report",
+                               "Data exported to")
+
+    def _start_export(self, filepath: str, sheets: list, audit_action: str, audit_text: str, success_text: str):
+        """Writes the sheets on a background thread; the audit entry and message follow once the file is saved."""
+
+        def on_error(message, details):
+            show_error_message(self, "Export Error", message, details)
+
+        start_excel_export(self, filepath, sheets,
+                           lambda path, counts: self._on_export_saved(path, audit_action, audit_text, success_text),
+                           on_error)
+
+    def _on_export_saved(self, path: str, audit_action: str, audit_text: str, success_text: str):
+        filename = os.path.basename(path);
+        self.log_audit_trail(audit_action, f"{audit_text} to '{filename}'.");
+        QMessageBox.information(self, "Export Successful", f"{success_text}:\n{filename}")
 
     def set_controls_enabled(self, enabled: bool):
         widgets_to_toggle = [self.lot_number_input, self.product_code_input, self.refresh_button, self.date_picker,
@@ -878,6 +695,13 @@ class GoodInventoryPage(QWidget):
                                                          "The start date cannot be after the end date."); return
             start_date_str = start_date.toString(Qt.DateFormat.ISODate);
             end_date_str = end_date.toString(Qt.DateFormat.ISODate);
+            if offer_cached_report(self, 'monthly_summary', {'start_date': start_date_str, 'end_date': end_date_str},
+                                   f"Monthly_Product_Summary_Report_{datetime.now():%Y-%m-%d}.xlsx",
+                                   lambda path: self._on_export_saved(
+                                       path, "MONTHLY_SUMMARY_EXPORT",
+                                       "User exported precomputed monthly product summary (net endorsement)",
+                                       "Monthly Product Summary exported to")):
+                return
 
             # --- ADVICE ON PERMISSION ERROR ---
             QMessageBox.information(self, "File Save Note",
@@ -911,29 +735,11 @@ class GoodInventoryPage(QWidget):
                                                   "Excel Files (*.xlsx)")
 
         if filepath:
-            try:
-                # Renaming columns based on new product summary structure (using Net Endorsement data)
-                export_df = df.rename(
-                    columns={'product_code': 'PROD_CODE',
-                             'net_quantity': 'QTY (Net Endorsement Change)',
-                             'remarks': 'ENDORSEMENT REMARKS'});
-
-                # Enforce required column order
-                final_cols = ['PROD_CODE', 'QTY (Net Endorsement Change)', 'ENDORSEMENT REMARKS'];
-                export_df = export_df[final_cols]
-
-                with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-                    export_df.to_excel(writer, index=False, sheet_name='Monthly Endorsement Net');
-                    self._format_excel_sheet(writer.sheets['Monthly Endorsement Net'], export_df)
-
-                filename = os.path.basename(filepath);
-                self.log_audit_trail("MONTHLY_SUMMARY_EXPORT",
-                                     f"User exported monthly product summary (net endorsement) to '{filename}'.");
-                QMessageBox.information(self, "Export Successful", f"Monthly Product Summary exported to:\n{filename}")
-            except Exception:
-                show_error_message(self, "Export Error",
-                                   "Failed to save the monthly report file. Check if the file is open.",
-                                   traceback.format_exc())
+            sheets = [DataFrameSheet(name, sheet_df) for name, sheet_df in monthly_summary_export(df).items()]
+            self._start_export(filepath, sheets,
+                               "MONTHLY_SUMMARY_EXPORT",
+                               "User exported monthly product summary (net endorsement)",
+                               "Monthly Product Summary exported to")
 
     def _reset_monthly_report_thread_state(self):
         if self.monthly_report_worker: self.monthly_report_worker.deleteLater(); self.monthly_report_worker = None
@@ -957,33 +763,18 @@ class GoodInventoryPage(QWidget):
                                                                                                       "Configuration Needed",
                                                                                                       "Email settings are incomplete. Please use the 'Settings' button to configure them first."); self._open_settings_dialog(); return
         try:
-            export_df = self.current_inventory_df.rename(
-                columns={'product_code': 'PRODUCT_CODE', 'lot_number': 'LOT_NUMBER', 'current_balance': 'QTY',
-                         'bag_box_number': 'BAG/BOX_NUMBER', 'location': 'LOCATION'});
-            final_cols = ['PRODUCT_CODE', 'LOT_NUMBER', 'BAG/BOX_NUMBER', 'QTY', 'LOCATION'];
-            df_mb = export_df[export_df['fg_type'] == 'MB'][final_cols].copy();
-            df_dc = export_df[export_df['fg_type'] == 'DC'][final_cols].copy();
-            df_dict = {};
-            if not df_mb.empty: df_dict['FG MB PASSED'] = df_mb
-            if not df_dc.empty: df_dict['FG DC PASSED'] = df_dc
+            df_dict = inventory_export(self.current_inventory_df, 'FG MB PASSED', 'FG DC PASSED')
             if not df_dict: QMessageBox.warning(self, "Email Failed",
                                                 "No data to include in the email after filtering."); return
             filename = f"FG_Inventory_Report_PASSED_{datetime.now():%Y-%m-%d}.xlsx";
             attachments = {filename: df_dict};
             as_of_date_str = self.date_picker.date().toString("yyyy-MM-dd");
-            email_config['subject'] = f"FG Inventory Report as of {as_of_date_str}";
-            self.set_controls_enabled(False);
-            QApplication.processEvents();
-            send_email_with_excel(attachments, email_config);
-            self.log_audit_trail("EMAIL_GOOD_INVENTORY",
-                                 f"User emailed good inventory report to '{email_config['recipient_email']}'.");
-            QMessageBox.information(self, "Email Sent",
-                                    f"The report has been successfully sent to {email_config['recipient_email']}.")
+            queue_report_email(self, self.log_audit_trail, f"FG Inventory Report as of {as_of_date_str}",
+                               attachments, email_config['recipient_email'], "EMAIL_GOOD_INVENTORY",
+                               "good inventory report")
         except Exception as e:
-            show_error_message(self, "Email Error", "Failed to send email. Please check your settings and connection.",
+            show_error_message(self, "Email Error", "Failed to queue the email report.",
                                f"Error details:\n\n{traceback.format_exc()}")
-        finally:
-            self.set_controls_enabled(True)
 
     def _export_and_email_combined_report(self):
         if not self.failed_inventory_page: QMessageBox.warning(self, "Error",
@@ -1004,46 +795,20 @@ class GoodInventoryPage(QWidget):
                                                                                                       "Email settings are incomplete. Please use the 'Settings' button to configure them first."); self._open_settings_dialog(); return
         try:
             attachments = {};
-            if not passed_df.empty:
-                passed_export_df = passed_df.rename(
-                    columns={'product_code': 'PRODUCT_CODE', 'lot_number': 'LOT_NUMBER', 'current_balance': 'QTY',
-                             'location': 'LOCATION', 'bag_box_number': 'BAG/BOX_NUMBER'});
-                final_cols_passed = ['PRODUCT_CODE', 'LOT_NUMBER', 'BAG/BOX_NUMBER', 'QTY', 'LOCATION'];
-                df_mb_passed = passed_export_df[passed_export_df['fg_type'] == 'MB'][final_cols_passed].copy();
-                df_dc_passed = passed_export_df[passed_export_df['fg_type'] == 'DC'][final_cols_passed].copy();
-                passed_dict = {};
-                if not df_mb_passed.empty: passed_dict['FG MB PASSED'] = df_mb_passed
-                if not df_dc_passed.empty: passed_dict['FG DC PASSED'] = df_dc_passed
-                if passed_dict: attachments[f"FG_Inventory_Report_PASSED_{datetime.now():%Y-%m-%d}.xlsx"] = passed_dict
-            if not failed_df.empty:
-                failed_export_df = failed_df.rename(
-                    columns={'product_code': 'PRODUCT_CODE', 'lot_number': 'LOT_NUMBER', 'current_balance': 'QTY',
-                             'bag_box_number': 'BAG/BOX_NUMBER', 'location': 'LOCATION'});
-                final_cols_failed = ['PRODUCT_CODE', 'LOT_NUMBER', 'BAG/BOX_NUMBER', 'QTY', 'LOCATION'];
-                df_mb_failed = failed_export_df[failed_export_df['fg_type'] == 'MB'][final_cols_failed].copy();
-                df_dc_failed = failed_export_df[failed_export_df['fg_type'] == 'DC'][final_cols_failed].copy();
-                failed_dict = {};
-                if not df_mb_failed.empty: failed_dict['FG FAILED MB'] = df_mb_failed
-                if not df_dc_failed.empty: failed_dict['FG FAILED DC'] = df_dc_failed
-                if failed_dict: attachments[f"FG_Inventory_Report_FAILED_{datetime.now():%Y-%m-%d}.xlsx"] = failed_dict
+            passed_dict = inventory_export(passed_df, 'FG MB PASSED', 'FG DC PASSED')
+            if passed_dict: attachments[f"FG_Inventory_Report_PASSED_{datetime.now():%Y-%m-%d}.xlsx"] = passed_dict
+            failed_dict = inventory_export(failed_df, 'FG FAILED MB', 'FG FAILED DC')
+            if failed_dict: attachments[f"FG_Inventory_Report_FAILED_{datetime.now():%Y-%m-%d}.xlsx"] = failed_dict
             if not attachments: QMessageBox.warning(self, "Email Failed",
                                                     "No data to include in the email after filtering."); return
             as_of_date_str = self.date_picker.date().toString("yyyy-MM-dd");
-            email_config['subject'] = f"COMBINED Inventory Report (Passed & Failed) as of {as_of_date_str}";
-            self.set_controls_enabled(False)
-            if self.failed_inventory_page: self.failed_inventory_page.set_controls_enabled(False)
-            QApplication.processEvents();
-            send_email_with_excel(attachments, email_config);
-            self.log_audit_trail("EMAIL_COMBINED_INVENTORY",
-                                 f"User emailed combined inventory report to '{email_config['recipient_email']}'.");
-            QMessageBox.information(self, "Email Sent",
-                                    f"The combined report has been successfully sent to {email_config['recipient_email']}.")
+            queue_report_email(self, self.log_audit_trail,
+                               f"COMBINED Inventory Report (Passed & Failed) as of {as_of_date_str}", attachments,
+                               email_config['recipient_email'], "EMAIL_COMBINED_INVENTORY",
+                               "combined inventory report")
         except Exception as e:
-            show_error_message(self, "Email Error", "Failed to send combined email.",
+            show_error_message(self, "Email Error", "Failed to queue the combined email.",
                                f"Error details:\n\n{traceback.format_exc()}")
-        finally:
-            self.set_controls_enabled(True)
-            if self.failed_inventory_page: self.failed_inventory_page.set_controls_enabled(True)
 
     def _handle_endorsement_summary_request(self):
         dialog = DateRangeDialog(self)
@@ -1053,6 +818,13 @@ class GoodInventoryPage(QWidget):
                                                          "The start date cannot be after the end date."); return
             start_date_str = start_date.toString(Qt.DateFormat.ISODate);
             end_date_str = end_date.toString(Qt.DateFormat.ISODate)
+            if offer_cached_report(self, 'endorsement_summary', {'start_date': start_date_str, 'end_date': end_date_str},
+                                   f"Endorsement_Summary_Report_{datetime.now():%Y-%m-%d}.xlsx",
+                                   lambda path: self._on_export_saved(
+                                       path, "ENDORSEMENT_SUMMARY_EXPORT",
+                                       "User exported precomputed endorsement summary",
+                                       "Endorsement Summary Report exported to")):
+                return
             self.set_controls_enabled(False);
             self.log_audit_trail("ENDORSEMENT_SUMMARY_START",
                                  f"User initiated endorsement summary for {start_date_str} to {end_date_str}")
@@ -1075,33 +847,10 @@ class GoodInventoryPage(QWidget):
         filepath, _ = QFileDialog.getSaveFileName(self, "Save Endorsement Summary", default_filename,
                                                   "Excel Files (*.xlsx)")
         if filepath:
-            try:
-                # Define the target Quantity header
-                QTY_COL_HEADER = 'TOTAL_QTY (Net: Passed - Failed)'
-
-                # 1. Rename columns precisely as requested
-                export_df = df.rename(
-                    columns={'product_code': 'PRODUCT_CODE',
-                             'total_qty': QTY_COL_HEADER,
-                             'aggregated_remarks': 'REMARKS'})
-
-                # 2. Select and enforce the required column order: Product, Qty, Remarks
-                export_df = export_df[['PRODUCT_CODE', QTY_COL_HEADER, 'REMARKS']]
-
-                with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-                    export_df.to_excel(writer, index=False, sheet_name='Endorsement Summary');
-
-                    # Ensure formatting is applied, searching for the key "QTY" in the header
-                    self._format_excel_sheet(writer.sheets['Endorsement Summary'], export_df)
-
-                filename = os.path.basename(filepath);
-                self.log_audit_trail("ENDORSEMENT_SUMMARY_EXPORT",
-                                     f"User exported endorsement summary to '{filename}'.");
-                QMessageBox.information(self, "Export Successful",
-                                        f"Endorsement Summary Report exported to:\n{filename}")
-            except Exception:
-                show_error_message(self, "Export Error", "Failed to save the endorsement summary file.",
-                                   traceback.format_exc())
+            sheets = [DataFrameSheet(name, sheet_df) for name, sheet_df in endorsement_summary_export(df).items()]
+            self._start_export(filepath, sheets,
+                               "ENDORSEMENT_SUMMARY_EXPORT", "User exported endorsement summary",
+                               "Endorsement Summary Report exported to")
 
 
 if __name__ == '__main__':
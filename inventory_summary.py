@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+# Number of rows shown in each dashboard contribution table.
+TOP_PRODUCTS = 10
+TOP_LOCATIONS = 5
+
+
+def _top_contributors(keys: np.ndarray, balances: np.ndarray, total: float, top_n: int) -> list:
+    """Sums balances per key and returns the top_n as (label, balance, percentage) tuples."""
+    if keys.size == 0 or total <= 0:
+        return []
+    codes, uniques = pd.factorize(keys, use_na_sentinel=False)
+    sums = np.bincount(codes, weights=balances, minlength=len(uniques))
+    top_n = min(top_n, sums.size)
+    # argpartition keeps this O(n) regardless of how many distinct keys there are
+    top_idx = np.argpartition(-sums, top_n - 1)[:top_n]
+    top_idx = top_idx[np.argsort(-sums[top_idx], kind='stable')]
+    return [(str(uniques[i]), float(sums[i]), float(sums[i] / total * 100)) for i in top_idx]
+
+
+def build_inventory_summary(df: pd.DataFrame) -> dict:
+    """
+    Computes the dashboard metrics for an inventory DataFrame with 'product_code', 'location'
+    and 'current_balance' columns. Intended to run in the worker thread so the GUI only has to
+    render a handful of pre-formatted rows.
+    """
+    summary = {
+        'total_lots': 0, 'unique_products': 0, 'overall_balance': 0.0,
+        'max_lot': None, 'min_lot': None, 'avg_lot': None, 'median_lot': None,
+        'top_products': [], 'top_locations': [],
+    }
+    if df is None or df.empty:
+        return summary
+
+    balances = df['current_balance'].to_numpy(dtype=float)
+    summary['total_lots'] = int(balances.size)
+    summary['unique_products'] = int(df['product_code'].nunique())
+    summary['overall_balance'] = float(balances.sum())
+
+    positive_mask = balances > 0
+    positive = balances[positive_mask]
+    if positive.size == 0:
+        return summary
+
+    summary['max_lot'] = float(positive.max())
+    summary['min_lot'] = float(positive.min())
+    summary['avg_lot'] = float(positive.mean())
+    summary['median_lot'] = float(np.median(positive))
+
+    positive_total = float(positive.sum())
+    summary['top_products'] = _top_contributors(
+        df['product_code'].to_numpy()[positive_mask], positive, positive_total, TOP_PRODUCTS)
+    if 'location' in df.columns:
+        locations = df['location'].to_numpy()[positive_mask]
+        # groupby() drops missing keys; keep that behaviour for the location table
+        valid = pd.notna(locations)
+        summary['top_locations'] = _top_contributors(
+            locations[valid], positive[valid], positive_total, TOP_LOCATIONS)
+    return summary
@@ -0,0 +1,149 @@
+"""
+Write side of the inventory ledgers: transactions (passed stock) and failed_transactions (failed stock).
+
+Every page that moves stock describes its ledger rows as LedgerRow objects and hands them to a LedgerWriter
+instead of building INSERT statements of its own:
+- LedgerRow checks and normalises a row as it is built (required fields, dates, quantities as Decimal, trimmed
+  text), so every page writes the same column set the same way;
+- LedgerWriter collects a save's rows per table and adds them to a SaveBatch as one insert per table, or, for
+  rows that replace what a document wrote before (replace()), as a diff that only touches the rows that changed.
+Being the single write path, this is where write-side caching, rollups or balance upkeep belong; the
+movement_daily rollup itself is kept by triggers on both tables (movement_rollup.py), so it needs nothing here.
+"""
+from dataclasses import dataclass, fields
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+LEDGERS = ('transactions', 'failed_transactions')
+
+# Ledger columns that don't move stock: a change to them alone leaves the ledger rows alone on replace().
+LEDGER_UNCOMPARED = ('source_ref_no', 'encoded_by', 'encoded_on', 'remarks')
+
+
+class LedgerError(ValueError):
+    pass
+
+
+def _quantity(value, name: str) -> Decimal:
+    if value is None or value == '':
+        return Decimal(0)
+    try:
+        quantity = value if isinstance(value, Decimal) else Decimal(str(value).replace(',', ''))
+    except InvalidOperation:
+        raise LedgerError(f"{name} is not a number: {value!r}") from None
+    if not quantity.is_finite() or quantity < 0:
+        raise LedgerError(f"{name} must be a non-negative number, got {value!r}")
+    return quantity
+
+
+def _date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str) and value.strip():
+        try:
+            return date.fromisoformat(value.strip()[:10])
+        except ValueError:
+            pass
+    raise LedgerError(f"transaction_date is not a date: {value!r}")
+
+
+def _text(value):
+    if value is None:
+        return None
+    return value.strip() if isinstance(value, str) else str(value)
+
+
+@dataclass(slots=True)
+class LedgerRow:
+    """One ledger row; keyword-built, validated and normalised on construction."""
+    transaction_date: date
+    transaction_type: str
+    source_ref_no: str
+    product_code: str
+    lot_number: str = None
+    quantity_in: Decimal = Decimal(0)
+    quantity_out: Decimal = Decimal(0)
+    unit: str = 'KG.'
+    warehouse: str = None
+    bag_box_number: str = None
+    encoded_by: str = None
+    encoded_on: datetime = None
+    remarks: str = None
+
+    def __post_init__(self):
+        self.transaction_date = _date(self.transaction_date)
+        for name in ('transaction_type', 'source_ref_no', 'product_code', 'lot_number', 'unit', 'warehouse',
+                     'bag_box_number', 'encoded_by', 'remarks'):
+            setattr(self, name, _text(getattr(self, name)))
+        if not self.transaction_type:
+            raise LedgerError("transaction_type is required")
+        if not self.product_code:
+            raise LedgerError(f"product_code is required ({self.transaction_type} {self.source_ref_no})")
+        self.quantity_in = _quantity(self.quantity_in, 'quantity_in')
+        self.quantity_out = _quantity(self.quantity_out, 'quantity_out')
+
+
+COLUMNS = tuple(f.name for f in fields(LedgerRow))
+# Always written; the rest only when some row of the table sets them, so the database defaults (encoded_on) and
+# the pages' reduced test schemas keep working.
+REQUIRED_COLUMNS = ('transaction_date', 'transaction_type', 'source_ref_no', 'product_code', 'lot_number',
+                    'quantity_in', 'quantity_out', 'unit')
+
+
+def ledger_dicts(rows) -> list:
+    """The rows as dicts with one column set, ready for SaveBatch.insert_rows() / sync_rows()."""
+    rows = list(rows)
+    columns = [c for c in COLUMNS
+               if c in REQUIRED_COLUMNS or any(getattr(row, c) is not None for row in rows)]
+    return [{c: getattr(row, c) for c in columns} for row in rows]
+
+
+class LedgerWriter:
+    """The ledger rows of one save, by table. to_batch() adds them to a SaveBatch; execute that batch to write."""
+
+    def __init__(self):
+        self._rows = {}  # table -> [LedgerRow]
+        self._replaced = {}  # table -> (scope, params) of the stored rows the new ones replace
+
+    def __bool__(self):
+        return any(self._rows.values()) or bool(self._replaced)
+
+    def add(self, table: str, row: LedgerRow):
+        if table not in LEDGERS:
+            raise LedgerError(f"Not a ledger table: {table}")
+        if not isinstance(row, LedgerRow):
+            raise LedgerError(f"Expected a LedgerRow, got {type(row).__name__}")
+        self._rows.setdefault(table, []).append(row)
+
+    def extend(self, table: str, rows):
+        for row in rows:
+            self.add(table, row)
+
+    def replace(self, source_ref_no: str, tables=LEDGERS, types=None):
+        """
+        The rows added to tables replace the stored rows of source_ref_no there (only those of the given
+        transaction types, if any); a table with no rows added has them deleted.
+        """
+        type_params = {f"type_{i}": t for i, t in enumerate(types or ())}
+        type_filter = f" AND transaction_type IN ({', '.join(':' + k for k in type_params)})" if types else ""
+        params = {"ref": source_ref_no, **type_params}
+        for table in tables:
+            if table not in LEDGERS:
+                raise LedgerError(f"Not a ledger table: {table}")
+            self._replaced[table] = (f"source_ref_no = :ref{type_filter}", params)
+
+    def rows(self, table: str) -> list:
+        return ledger_dicts(self._rows.get(table, []))
+
+    def to_batch(self, batch):
+        """Replaced tables are diffed against their stored rows (see SaveBatch.sync_rows); others only inserted."""
+        for table in LEDGERS:
+            rows = self.rows(table)
+            if table in self._replaced:
+                scope, params = self._replaced[table]
+                batch.sync_rows(table, rows, scope, params, ignore=LEDGER_UNCOMPARED)
+            else:
+                batch.insert_rows(table, rows)
+        return batch
@@ -0,0 +1,232 @@
+"""
+Lot-number ranges ("100A-150A") for every page that breaks quantities down into lots, and a vectorised
+DataFrame expansion for the beginning-inventory sheets.
+
+The pages historically disagreed on a few details (where ASSIGN_TO_LAST_IN_RANGE excess goes, which lot the
+NEW_LOT excess number follows, whether a lot may carry a letter prefix); split_lots() keeps each caller's
+behaviour behind keyword switches instead of picking one. Qt-free: errors are raised as LotRangeError and
+the pages decide how to show them.
+
+tests/test_lot_ranges.py checks the vectorised expansion against the per-row one and, run directly, benchmarks
+the two on a 100k-row beginning inventory sheet.
+"""
+import re
+from decimal import Decimal
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+NEW_LOT, ASSIGN_TO_LAST_IN_RANGE, RETAIN_ORIGINAL_LOT = 'NEW_LOT', 'ASSIGN_TO_LAST_IN_RANGE', 'RETAIN_ORIGINAL_LOT'
+
+LOT_RE = re.compile(r'^(\d+)([A-Z]*)$')
+PREFIXED_LOT_RE = re.compile(r'^([A-Z]*?)(\d+)([A-Z]*?)$')
+PREFIXED_TAIL_RE = re.compile(r'([A-Z]*?)(\d+)([A-Z]*?)$')
+
+
+class LotRangeError(ValueError):
+    pass
+
+
+class LotRangeTooSmall(LotRangeError):
+    def __init__(self, available: int, needed: int):
+        super().__init__(f"The provided range has {available} lots, but {needed} are required.")
+        self.available, self.needed = available, needed
+
+
+class LotRange(NamedTuple):
+    prefix: str
+    start: int
+    end: int
+    width: int
+    suffix: str
+    end_lot: str
+
+    @property
+    def size(self) -> int:
+        return self.end - self.start + 1
+
+    def lots(self, count: int = None) -> list:
+        """The first count lots of the range (all of them by default), zero-padded to the start lot's width."""
+        count = self.size if count is None else count
+        return [f"{self.prefix}{str(self.start + i).zfill(self.width)}{self.suffix}" for i in range(count)]
+
+
+def parse_lot_range(lot_input: str, allow_prefix: bool = False) -> LotRange:
+    """Parses '100A-105A' (or 'X100A-X105A' with allow_prefix); raises LotRangeError."""
+    parts = [s.strip().upper() for s in lot_input.split('-')]
+    if len(parts) != 2:
+        raise LotRangeError("Lot range must contain exactly one hyphen.")
+    start_str, end_str = parts
+    if allow_prefix:
+        start_match, end_match = PREFIXED_LOT_RE.match(start_str), PREFIXED_LOT_RE.match(end_str)
+        if not start_match or not end_match or start_match.groups()[::2] != end_match.groups()[::2]:
+            raise LotRangeError("Format invalid or prefixes/suffixes mismatch.")
+        prefix, start_num, suffix = start_match.groups()
+        end_num = end_match.group(2)
+    else:
+        start_match, end_match = LOT_RE.match(start_str), LOT_RE.match(end_str)
+        if not start_match or not end_match or start_match.group(2) != end_match.group(2):
+            raise LotRangeError("Format invalid or suffixes mismatch. Expected: '100A-105A'.")
+        prefix, (start_num, suffix), end_num = '', start_match.groups(), end_match.group(1)
+    if int(start_num) > int(end_num):
+        raise LotRangeError("Start lot cannot be greater than end lot.")
+    return LotRange(prefix, int(start_num), int(end_num), len(start_num), suffix, end_str)
+
+
+def expand_lot_range(lot_input: str, allow_prefix: bool = False) -> list:
+    return parse_lot_range(lot_input, allow_prefix).lots()
+
+
+def lot_sequence(start_lot: str, count: int) -> list:
+    """count consecutive lots starting at a single lot number ('1234AA' -> 1234AA, 1235AA, ...)."""
+    match = LOT_RE.match(start_lot.strip().upper())
+    if not match:
+        raise LotRangeError(f"Invalid format for a single starting lot: '{start_lot}'. Expected '1234' or '1234AA'.")
+    return LotRange('', int(match.group(1)), int(match.group(1)) + count - 1, len(match.group(1)),
+                    match.group(2), '').lots(count)
+
+
+def next_lot_number(lot: str, after: str = None, allow_prefix: bool = False) -> str:
+    """
+    The lot number following lot, keeping its width and suffix. With after (a range end lot) the number
+    continues from after instead. Non-numeric lots get an '-EXCESS' suffix.
+    """
+    if allow_prefix:
+        match = PREFIXED_TAIL_RE.search(lot)
+        if not match:
+            return f"{lot}-EXCESS"
+        prefix, num_part, suffix = match.groups()
+        return f"{prefix}{str(int(num_part) + 1).zfill(len(num_part))}{suffix}"
+    match = LOT_RE.match(lot)
+    if not match:
+        return f"{lot}-EXCESS"
+    last_num = int(match.group(1))
+    if after:
+        end_match = LOT_RE.match(after)
+        if end_match:
+            last_num = int(end_match.group(1))
+    return f"{str(last_num + 1).zfill(len(match.group(1)))}{match.group(2)}"
+
+
+def split_lots(total_qty, weight_per_lot, lot_input: str, is_range: bool, excess_handling: str = NEW_LOT, *,
+               merge_assigned_excess: bool = True, number_excess_after_range: bool = True,
+               excess_into_empty_breakdown: bool = False, allow_prefix: bool = False) -> dict:
+    """
+    Breaks total_qty into full lots of weight_per_lot plus an excess; returns
+    {'breakdown': [{'lot_number', 'quantity_kg'}], 'excess': [...]} with Decimal quantities.
+
+    excess_handling:
+      NEW_LOT                  excess gets the next lot number (after the range end if number_excess_after_range,
+                               otherwise after the last full lot);
+      ASSIGN_TO_LAST_IN_RANGE  (ranges) excess is added to the last full lot if merge_assigned_excess, otherwise
+                               listed separately under the range's end lot;
+      RETAIN_ORIGINAL_LOT      (single lots) excess keeps the entered lot number.
+    excess_into_empty_breakdown puts a NEW_LOT excess into the breakdown when there are no full lots.
+    Raises LotRangeError / LotRangeTooSmall.
+    """
+    total_qty, weight_per_lot = Decimal(str(total_qty)), Decimal(str(weight_per_lot))
+    num_full_lots = int(total_qty // weight_per_lot)
+    excess_qty = total_qty % weight_per_lot
+    lot_upper = lot_input.upper()
+    range_end_lot = None
+    lots = [lot_upper] * num_full_lots
+    if is_range:
+        lot_range = parse_lot_range(lot_input, allow_prefix)
+        if lot_range.size < num_full_lots:
+            raise LotRangeTooSmall(lot_range.size, num_full_lots)
+        lots, range_end_lot = lot_range.lots(num_full_lots), lot_range.end_lot
+    breakdown = [{'lot_number': lot, 'quantity_kg': weight_per_lot} for lot in lots]
+    excess = []
+    if excess_qty > 0:
+        if is_range and excess_handling == ASSIGN_TO_LAST_IN_RANGE:
+            if merge_assigned_excess and breakdown:
+                breakdown[-1]['quantity_kg'] += excess_qty
+            else:
+                excess.append({'lot_number': range_end_lot, 'quantity_kg': excess_qty})
+        elif not is_range and excess_handling == RETAIN_ORIGINAL_LOT:
+            excess.append({'lot_number': lot_upper, 'quantity_kg': excess_qty})
+        else:
+            base_lot = lots[-1] if lots else lot_upper
+            after = range_end_lot if is_range and number_excess_after_range else None
+            target = breakdown if excess_into_empty_breakdown and not breakdown else excess
+            target.append({'lot_number': next_lot_number(base_lot, after, allow_prefix), 'quantity_kg': excess_qty})
+    return {'breakdown': breakdown, 'excess': excess}
+
+
+def fill_lots(lot_list: list, target_qty, weight_per_lot) -> list:
+    """Full lots of weight_per_lot along lot_list, remainder on the next lot (delivery/RRF breakdowns)."""
+    target_qty, weight_per_lot = Decimal(str(target_qty)), Decimal(str(weight_per_lot))
+    num_full_lots, remainder_qty = int(target_qty // weight_per_lot), target_qty % weight_per_lot
+    needed = num_full_lots + (1 if remainder_qty > 0 else 0)
+    if len(lot_list) < needed:
+        raise LotRangeTooSmall(len(lot_list), needed)
+    items = [{'lot_number': lot_list[i], 'quantity_kg': weight_per_lot} for i in range(num_full_lots)]
+    if remainder_qty > 0:
+        items.append({'lot_number': lot_list[num_full_lots], 'quantity_kg': remainder_qty})
+    return items
+
+
+# --- Beginning-inventory sheets ---
+def split_range_evenly(lot_number: str, total_qty):
+    """
+    Per-row rule of the beginning-inventory sheets: '8048X-8051X' with QTY 200 -> four lots of 50.00.
+    Digits and letters are collected from anywhere in each end, numbers are not zero-padded and letters are
+    compared case-sensitively. Returns [(lot, qty)] or None when the value is not an expandable range.
+    """
+    if '-' not in lot_number or lot_number.endswith('-'):
+        return None
+    parts = lot_number.split('-')
+    if len(parts) != 2:
+        return None
+    start_lot, end_lot = parts[0].strip(), parts[1].strip()
+    start_num, start_suffix = ''.join(filter(str.isdigit, start_lot)), ''.join(filter(str.isalpha, start_lot))
+    end_num, end_suffix = ''.join(filter(str.isdigit, end_lot)), ''.join(filter(str.isalpha, end_lot))
+    if start_suffix != end_suffix or not start_num or not end_num or int(start_num) > int(end_num):
+        return None
+    start_num, end_num = int(start_num), int(end_num)
+    qty_per_item = round(float(total_qty) / (end_num - start_num + 1), 2)
+    return [(f"{n}{start_suffix}", qty_per_item) for n in range(start_num, end_num + 1)]
+
+
+def expand_lot_ranges(df: pd.DataFrame, lot_col: str = 'LOT_NUMBER', qty_col: str = 'QTY') -> pd.DataFrame:
+    """
+    Vectorised split_range_evenly() over a sheet: range rows are exploded into one row per lot with the
+    quantity split evenly, every other column is carried over, row order is kept and all quantities are
+    rounded to 2 decimals. Lot numbers come back as strings, as the per-row tools produced them.
+    """
+    if df.empty:
+        return df.copy()
+    lots = df[lot_col].astype(str).reset_index(drop=True)
+    qty = df[qty_col].astype(float).to_numpy()
+
+    parts = lots.str.split('-')
+    candidate = (lots.str.contains('-', regex=False) & ~lots.str.endswith('-') & (parts.str.len() == 2)).to_numpy()
+    # str.get(): a sheet without ranges has no second part at all, and an all-NaN column has no .str
+    start = parts.str.get(0).fillna('').astype(str).str.strip().where(candidate, '')
+    end = parts.str.get(1).fillna('').astype(str).str.strip().where(candidate, '')
+    start_digits, end_digits = start.str.replace(r'\D+', '', regex=True), end.str.replace(r'\D+', '', regex=True)
+    start_letters = start.str.replace(r'[\W\d_]+', '', regex=True)
+    end_letters = end.str.replace(r'[\W\d_]+', '', regex=True)
+    valid = candidate & (start_letters == end_letters).to_numpy() & (start_digits != '').to_numpy() & (
+            end_digits != '').to_numpy()
+    start_num = pd.to_numeric(start_digits.where(valid, '0')).to_numpy(dtype=np.int64)
+    end_num = pd.to_numeric(end_digits.where(valid, '0')).to_numpy(dtype=np.int64)
+    valid &= start_num <= end_num
+
+    counts = np.where(valid, end_num - start_num + 1, 1)
+    row_idx = np.repeat(np.arange(len(df)), counts)
+    offsets = np.arange(len(row_idx)) - np.repeat(np.cumsum(counts) - counts, counts)
+    expanded = valid[row_idx]
+
+    out = df.iloc[row_idx].reset_index(drop=True)
+    out_lots = lots.to_numpy(dtype=object)[row_idx]
+    if expanded.any():
+        numbers = (start_num[row_idx][expanded] + offsets[expanded]).astype(str).astype(object)
+        out_lots[expanded] = numbers + start_letters.to_numpy(dtype=object)[row_idx][expanded]
+    out[lot_col] = out_lots
+    per_lot = qty[row_idx] / counts[row_idx]
+    # builtin round() so half-cent cases round exactly as the per-row tools did
+    out[qty_col] = np.fromiter((round(v, 2) for v in per_lot.tolist()), dtype=float, count=len(per_lot))
+    return out
+
@@ -1,6 +1,7 @@
 import sys
 import os
 import re
+import multiprocessing
 from datetime import datetime, date
 from decimal import Decimal
 import socket
@@ -20,13 +21,24 @@ except ImportError:
 
 from sqlalchemy import text, create_engine
 
+from completion import ensure_prefix_indexes
+from dashboard import DashboardDataWorker
+from dashboard_data import DashboardDataService, EMPTY_KPIS, build_chart_data
+from document_counters import ensure_document_counters
+from ledger_partitions import ensure_ledger_tables
+from movement_rollup import ensure_movement_rollup
+from product_master import ensure_products, register_products
+from reference_data import ensure_reference_versions, invalidate_reference
+from soft_delete import ensure_soft_delete
+from email_spool import email_service
+
 try:
     import qtawesome as fa
 except ImportError:
     print("FATAL ERROR: The 'qtawesome' library is required. Please install it using: pip install qtawesome")
     sys.exit(1)
 
-from PyQt6.QtCore import (Qt, pyqtSignal, QSize, QEvent, QTimer, QThread, QObject, QPropertyAnimation, QRect, QPointF)
+from PyQt6.QtCore import (Qt, pyqtSignal, QSize, QEvent, QTimer, QThread, QObject, QPropertyAnimation, QRect)
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QLabel, QLineEdit, QPushButton,
                              QMessageBox, QVBoxLayout, QHBoxLayout, QStackedWidget,
                              QFrame, QStatusBar, QDialog, QGridLayout, QGroupBox,
@@ -35,10 +47,9 @@ from PyQt6.QtGui import QFont, QIcon, QPainter, QPen, QColor, QPainterPath
 
 # --- NEW: Charting Library Import ---
 try:
-    from PyQt6.QtCharts import (
-        QChart, QChartView, QLineSeries,
-        QValueAxis, QBarCategoryAxis, QHorizontalBarSeries, QBarSeries, QBarSet
-    )
+    from PyQt6.QtCharts import QChartView
+
+    from dashboard_charts import DashboardCharts, chart_animations_enabled
 
     CHARTS_AVAILABLE = True
 except ImportError:
@@ -641,6 +652,7 @@ class SyncWorker(QObject):
                             prod_color=EXCLUDED.prod_color,
                             last_synced_on=NOW()
                     """), recs)
+                    register_products(conn, (r["code"] for r in recs))
 
             self.progress.emit(100)
             final_msg = f"Production sync complete.\n{len(recs)} records processed."
@@ -1062,9 +1074,11 @@ class DashboardPage(QWidget):
         self.engine = db_engine
         self.username = username
         self.log_audit_trail = log_audit_trail_func
+        self.data_service = DashboardDataService(db_engine)
+        self.data_thread: QThread | None = None
+        self.data_worker: DashboardDataWorker | None = None
         self._setup_ui()
         # Initial data load is handled by refresh_page call from main window
-        # self.refresh_page() # This can be removed if main window always calls it
 
     def _setup_ui(self):
         main_layout = QVBoxLayout(self)
@@ -1078,7 +1092,7 @@ class DashboardPage(QWidget):
         instruction_label.setStyleSheet("font-style: italic; color: #555;")
 
         self.refresh_button = QPushButton(fa.icon('fa5s.sync-alt'), " Refresh Data")
-        self.refresh_button.clicked.connect(self.refresh_page)
+        self.refresh_button.clicked.connect(lambda: self.refresh_page(force=True))
 
         top_header_layout.addWidget(header)
         top_header_layout.addWidget(instruction_label, 1, Qt.AlignmentFlag.AlignCenter)
@@ -1125,6 +1139,12 @@ class DashboardPage(QWidget):
 
         main_layout.addLayout(content_grid, 1)
 
+        # Charts are created once and updated in place on every refresh.
+        self.charts = DashboardCharts(
+            self.flow_chart_view, self.volume_chart_view, self.top_products_chart_view,
+            AppStyles.SUCCESS_COLOR, AppStyles.DESTRUCTIVE_COLOR, AppStyles.PRIMARY_ACCENT_COLOR,
+            animations=chart_animations_enabled()) if CHARTS_AVAILABLE else None
+
     def _create_chart_view_or_placeholder(self, chart_type: str) -> QWidget:
         if CHARTS_AVAILABLE:
             chart_view = QChartView()
@@ -1138,12 +1158,29 @@ class DashboardPage(QWidget):
             placeholder.setStyleSheet("border: 1px dashed #ccc; color: #555;")
             return placeholder
 
-    def refresh_page(self):
-        """Public method to refresh all data on the dashboard."""
-        self._clear_kpis()
-        self._load_data()
+    def refresh_page(self, force: bool = False):
+        """Public method to refresh all data on the dashboard. The query runs on a worker thread."""
+        if self.data_thread and self.data_thread.isRunning(): return
+        self.refresh_button.setEnabled(False)
+        self.data_thread = QThread()
+        self.data_worker = DashboardDataWorker(self.data_service, force)
+        self.data_worker.moveToThread(self.data_thread)
+        self.data_thread.started.connect(self.data_worker.run)
+        self.data_worker.finished.connect(self._load_data)
+        self.data_worker.error.connect(self._on_data_error)
+        self.data_worker.finished.connect(self.data_thread.quit)
+        self.data_worker.error.connect(self.data_thread.quit)
+        self.data_thread.finished.connect(self.data_worker.deleteLater)
+        self.data_thread.finished.connect(self.data_thread.deleteLater)
+        self.data_thread.finished.connect(self._reset_thread_state)
+        self.data_thread.start()
         self.log_audit_trail("REFRESH_DASHBOARD", "User refreshed the analytics dashboard.")
 
+    def _reset_thread_state(self):
+        self.data_thread = None
+        self.data_worker = None
+        self.refresh_button.setEnabled(True)
+
     def _clear_kpis(self):
         """Clears old KPI widgets before repopulating."""
         while self.kpi_layout.count():
@@ -1151,10 +1188,16 @@ class DashboardPage(QWidget):
             if child.widget():
                 child.widget().deleteLater()
 
-    def _load_data(self):
-        """Loads all data and updates widgets."""
-        self._load_recent_activity()
-        kpi_data = self._fetch_kpi_data()
+    def _on_data_error(self, error_message: str, detailed_traceback: str):
+        print(f"Error fetching dashboard data: {detailed_traceback}")
+        QMessageBox.critical(self, "Database Error", error_message)
+        self._load_data({'kpi': dict(EMPTY_KPIS), 'charts': build_chart_data({})})
+
+    def _load_data(self, data: dict):
+        """Updates all widgets from a snapshot produced by DashboardDataService."""
+        self._clear_kpis()
+        self._load_recent_activity(data.get('recent_activity', []))
+        kpi_data = data['kpi']
 
         self.kpi_layout.addWidget(
             KPIWidget("Total Stock (KG)", f"{kpi_data['total_stock']:,.2f}", 'fa5s.weight',
@@ -1175,240 +1218,25 @@ class DashboardPage(QWidget):
             KPIWidget("Failed Transactions (30d)", f"{kpi_data['failed_tx_30d']:,}", 'fa5s.exclamation-triangle',
                       AppStyles.DESTRUCTIVE_COLOR), 1, 2)
 
-        if CHARTS_AVAILABLE:
-            self._create_flow_chart()
-            self._create_volume_barchart()
-            self._create_top_products_chart()
-
-    def _fetch_kpi_data(self):
-        """Fetches all KPI data in a single, efficient query."""
-        try:
-            with self.engine.connect() as conn:
-                summary_query = text("""
-                    WITH current_stock_calc AS (
-                        -- Beginning Inventory
-                        SELECT
-                            product_code,
-                            qty AS balance
-                        FROM beginv_sheet1
-                        WHERE product_code IS NOT NULL AND TRIM(product_code) <> ''
-
-                        UNION ALL
-
-                        -- Transactions
-                        SELECT
-                            product_code,
-                            (quantity_in - quantity_out) AS balance
-                        FROM transactions
-                        WHERE product_code IS NOT NULL AND TRIM(product_code) <> ''
-                    )
-                    SELECT 
-                        (SELECT COALESCE(SUM(balance), 0) FROM current_stock_calc) as total_stock,
-                        (SELECT COUNT(id) FROM transactions WHERE EXTRACT(YEAR FROM transaction_date) = EXTRACT(YEAR FROM NOW())) as total_tx_ytd,
-                        (SELECT COALESCE(SUM(quantity_in), 0) FROM transactions WHERE EXTRACT(YEAR FROM transaction_date) = EXTRACT(YEAR FROM NOW())) as total_in_ytd,
-                        (SELECT COALESCE(SUM(quantity_out), 0) FROM transactions WHERE EXTRACT(YEAR FROM transaction_date) = EXTRACT(YEAR FROM NOW())) as total_out_ytd,
-                        (SELECT COUNT(DISTINCT product_code) FROM current_stock_calc WHERE balance > 0) as unique_products,
-                        (SELECT COUNT(id) FROM failed_transactions WHERE transaction_date >= NOW() - INTERVAL '30 days') as failed_count;
-                """)
-                result = conn.execute(summary_query).mappings().one()
-
-            return {
-                'total_stock': Decimal(result['total_stock'] or 0),
-                'total_in_ytd': Decimal(result['total_in_ytd'] or 0),
-                'total_out_ytd': Decimal(result['total_out_ytd'] or 0),
-                'total_transactions_ytd': int(result['total_tx_ytd'] or 0),
-                'unique_products': int(result['unique_products'] or 0),
-                'failed_tx_30d': int(result['failed_count'] or 0),
-            }
-        except Exception as e:
-            QMessageBox.critical(self, "Database Error", f"Failed to fetch KPI data: {e}")
-            print(f"Error fetching KPI data: {e}")
-            return {key: 0 for key in
-                    ['total_stock', 'total_in_ytd', 'total_out_ytd', 'total_transactions_ytd', 'unique_products',
-                     'failed_tx_30d']}
-
-    def _load_recent_activity(self):
-        try:
-            with self.engine.connect() as conn:
-                query = text("""
-                    SELECT transaction_date, transaction_type, source_ref_no, product_code, 
-                           quantity_in, quantity_out, remarks
-                    FROM transactions ORDER BY transaction_date DESC, id DESC LIMIT 20
-                """)
-                results = conn.execute(query).mappings().all()
-
-            self.activity_table.setRowCount(len(results))
-            for row_idx, record in enumerate(results):
-                self.activity_table.setItem(row_idx, 0, QTableWidgetItem(str(record['transaction_date'])))
-                self.activity_table.setItem(row_idx, 1, QTableWidgetItem(record['transaction_type']))
-                self.activity_table.setItem(row_idx, 2, QTableWidgetItem(record['source_ref_no']))
-                self.activity_table.setItem(row_idx, 3, QTableWidgetItem(record['product_code'] or 'N/A'))
-                in_qty = Decimal(record.get('quantity_in', 0) or 0)
-                out_qty = Decimal(record.get('quantity_out', 0) or 0)
-                in_item = QTableWidgetItem(f"{in_qty:,.2f}");
-                out_item = QTableWidgetItem(f"{out_qty:,.2f}")
-                in_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
-                out_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
-                self.activity_table.setItem(row_idx, 4, in_item)
-                self.activity_table.setItem(row_idx, 5, out_item)
-                self.activity_table.setItem(row_idx, 6, QTableWidgetItem(record.get('remarks', '') or ''))
-        except Exception as e:
-            QMessageBox.critical(self, "Database Error", f"Failed to load recent activity: {e}")
-            self.activity_table.setRowCount(0)
-
-    def _create_flow_chart(self):
-        series_in = QLineSeries();
-        series_in.setName("Stock IN")
-        series_out = QLineSeries();
-        series_out.setName("Stock OUT")
-        series_net = QLineSeries();
-        series_net.setName("Net Flow")
-
-        series_in.setPen(QPen(QColor(AppStyles.SUCCESS_COLOR), 3))
-        series_out.setPen(QPen(QColor(AppStyles.DESTRUCTIVE_COLOR), 3))
-        net_pen = QPen(QColor(AppStyles.PRIMARY_ACCENT_COLOR), 2);
-        net_pen.setStyle(Qt.PenStyle.DashLine);
-        series_net.setPen(net_pen)
-
-        series_in.hovered.connect(self._handle_series_hover);
-        series_out.hovered.connect(self._handle_series_hover);
-        series_net.hovered.connect(self._handle_series_hover)
-
-        query = text("""
-            SELECT to_char(transaction_date, 'YYYY-MM') AS month, SUM(quantity_in) AS total_in, SUM(quantity_out) AS total_out
-            FROM transactions WHERE transaction_date >= date_trunc('month', NOW()) - INTERVAL '11 months'
-            GROUP BY month ORDER BY month;
-        """)
-        categories, max_val = [], 0
-        try:
-            with self.engine.connect() as conn:
-                results = conn.execute(query).mappings().all()
-            for i, row in enumerate(results):
-                categories.append(datetime.strptime(row['month'], '%Y-%m').strftime('%b-%y'))
-                qty_in = float(row['total_in'] or 0);
-                qty_out = float(row['total_out'] or 0)
-                series_in.append(i, qty_in);
-                series_out.append(i, qty_out);
-                series_net.append(i, qty_in - qty_out)
-                max_val = max(max_val, qty_in, qty_out)
-        except Exception as e:
-            QMessageBox.critical(self, "Chart Error", f"Error fetching line chart data: {e}")
-
-        chart = QChart();
-        chart.addSeries(series_in);
-        chart.addSeries(series_out);
-        chart.addSeries(series_net)
-        chart.setAnimationOptions(QChart.AnimationOption.SeriesAnimations)
-        axis_x = QBarCategoryAxis();
-        axis_x.append(categories);
-        chart.addAxis(axis_x, Qt.AlignmentFlag.AlignBottom)
-        axis_y = QValueAxis();
-        axis_y.setLabelFormat("%.0f kg");
-        axis_y.setRange(0, (max_val * 1.1) if max_val > 0 else 10)
-        chart.addAxis(axis_y, Qt.AlignmentFlag.AlignLeft)
-        series_in.attachAxis(axis_x);
-        series_in.attachAxis(axis_y);
-        series_out.attachAxis(axis_x);
-        series_out.attachAxis(axis_y);
-        series_net.attachAxis(axis_x);
-        series_net.attachAxis(axis_y)
-        chart.legend().setVisible(True);
-        chart.legend().setAlignment(Qt.AlignmentFlag.AlignBottom)
-        self.flow_chart_view.setChart(chart)
-
-    def _handle_series_hover(self, point: QPointF, state: bool):
-        if state:
-            series = self.sender()
-            self.flow_chart_view.setToolTip(f"{series.name()}: {point.y():,.2f} kg")
-        else:
-            self.flow_chart_view.setToolTip("")
-
-    def _create_volume_barchart(self):
-        series = QHorizontalBarSeries()
-        query = text(
-            "SELECT transaction_type, COUNT(id) as tx_count FROM transactions GROUP BY transaction_type ORDER BY tx_count ASC;")
-        categories, max_val = [], 0
-        try:
-            with self.engine.connect() as conn:
-                results = conn.execute(query).mappings().all()
-            bar_set = QBarSet("Count")
-            for row in results:
-                categories.append(row['transaction_type']);
-                count = int(row['tx_count']);
-                bar_set.append(count);
-                max_val = max(max_val, count)
-            series.append(bar_set)
-        except Exception as e:
-            QMessageBox.critical(self, "Chart Error", f"Error fetching bar chart data: {e}")
-
-        chart = QChart();
-        chart.addSeries(series);
-        chart.setAnimationOptions(QChart.AnimationOption.SeriesAnimations)
-        axis_y = QBarCategoryAxis();
-        axis_y.append(categories);
-        chart.addAxis(axis_y, Qt.AlignmentFlag.AlignLeft)
-        axis_x = QValueAxis();
-        axis_x.setRange(0, (max_val * 1.1) if max_val > 0 else 10);
-        chart.addAxis(axis_x, Qt.AlignmentFlag.AlignBottom)
-        series.attachAxis(axis_x);
-        series.attachAxis(axis_y)
-        chart.legend().setVisible(False)
-        self.volume_chart_view.setChart(chart)
-
-    def _create_top_products_chart(self):
-        series = QBarSeries()
-        query = text("""
-            WITH current_stock_calc AS (
-                -- Beginning Inventory
-                SELECT
-                    product_code,
-                    qty AS balance
-                FROM beginv_sheet1
-                WHERE product_code IS NOT NULL AND TRIM(product_code) <> ''
-
-                UNION ALL
-
-                -- Transactions
-                SELECT
-                    product_code,
-                    (quantity_in - quantity_out) AS balance
-                FROM transactions
-                WHERE product_code IS NOT NULL AND TRIM(product_code) <> ''
-            )
-            SELECT product_code, SUM(balance) as stock_balance 
-            FROM current_stock_calc 
-            GROUP BY product_code 
-            HAVING SUM(balance) > 0.001
-            ORDER BY stock_balance DESC 
-            LIMIT 10;
-        """)
-        categories, max_val = [], 0
-        try:
-            with self.engine.connect() as conn:
-                results = conn.execute(query).mappings().all()
-            bar_set = QBarSet("Stock (kg)")
-            for row in results:
-                categories.append(row['product_code']);
-                balance = float(row['stock_balance']);
-                bar_set.append(balance);
-                max_val = max(max_val, balance)
-            series.append(bar_set)
-        except Exception as e:
-            QMessageBox.critical(self, "Chart Error", f"Error fetching top products data: {e}")
-
-        chart = QChart();
-        chart.addSeries(series);
-        chart.setAnimationOptions(QChart.AnimationOption.SeriesAnimations)
-        axis_x = QBarCategoryAxis();
-        axis_x.append(categories);
-        chart.addAxis(axis_x, Qt.AlignmentFlag.AlignBottom)
-        axis_y = QValueAxis();
-        axis_y.setRange(0, (max_val * 1.1) if max_val > 0 else 10);
-        chart.addAxis(axis_y, Qt.AlignmentFlag.AlignLeft)
-        series.attachAxis(axis_x);
-        series.attachAxis(axis_y)
-        chart.legend().setVisible(False)
-        self.top_products_chart_view.setChart(chart)
+        if self.charts is not None:
+            self.charts.update(data['charts'])
+
+    def _load_recent_activity(self, results: list):
+        self.activity_table.setRowCount(len(results))
+        for row_idx, record in enumerate(results):
+            self.activity_table.setItem(row_idx, 0, QTableWidgetItem(str(record['transaction_date'])))
+            self.activity_table.setItem(row_idx, 1, QTableWidgetItem(record['transaction_type']))
+            self.activity_table.setItem(row_idx, 2, QTableWidgetItem(record['source_ref_no']))
+            self.activity_table.setItem(row_idx, 3, QTableWidgetItem(record['product_code'] or 'N/A'))
+            in_qty = Decimal(str(record.get('quantity_in', 0) or 0))
+            out_qty = Decimal(str(record.get('quantity_out', 0) or 0))
+            in_item = QTableWidgetItem(f"{in_qty:,.2f}");
+            out_item = QTableWidgetItem(f"{out_qty:,.2f}")
+            in_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+            out_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+            self.activity_table.setItem(row_idx, 4, in_item)
+            self.activity_table.setItem(row_idx, 5, out_item)
+            self.activity_table.setItem(row_idx, 6, QTableWidgetItem(record.get('remarks', '') or ''))
 
 
 # --- END OF DASHBOARD WIDGETS ---
@@ -1427,71 +1255,11 @@ def initialize_database():
                 connection.execute(text(
                     "CREATE TABLE IF NOT EXISTS qc_audit_trail (id SERIAL PRIMARY KEY, timestamp TIMESTAMP, username TEXT, action_type TEXT, details TEXT, hostname TEXT, ip_address TEXT, mac_address TEXT);"))
 
-                # --- Central Transactions Table for Inventory ---
-                connection.execute(text("""
-                    CREATE TABLE IF NOT EXISTS transactions (
-                        id SERIAL PRIMARY KEY,
-                        transaction_date DATE NOT NULL,
-                        transaction_type VARCHAR(50) NOT NULL,
-                        source_ref_no VARCHAR(50),
-                        product_code VARCHAR(50) NOT NULL,
-                        lot_number VARCHAR(50),
-                        bag_box_number VARCHAR(50),
-                        quantity_in NUMERIC(15, 6) DEFAULT 0,
-                        quantity_out NUMERIC(15, 6) DEFAULT 0,
-                        unit VARCHAR(20),
-                        warehouse VARCHAR(50),
-                        encoded_by VARCHAR(50),
-                        encoded_on TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                        remarks TEXT
-                    );
-                """))
-                connection.execute(text("""
-                    DO $$ BEGIN
-                        IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name='transactions' AND column_name='bag_box_number') THEN
-                            ALTER TABLE transactions ADD COLUMN bag_box_number VARCHAR(50);
-                        END IF;
-                    END $$;
-                """))
-                connection.execute(
-                    text("CREATE INDEX IF NOT EXISTS idx_transactions_product_code ON transactions (product_code);"))
-                connection.execute(
-                    text("CREATE INDEX IF NOT EXISTS idx_transactions_lot_number ON transactions (lot_number);"))
-                connection.execute(
-                    text("CREATE INDEX IF NOT EXISTS idx_transactions_source_ref_no ON transactions (source_ref_no);"))
+                # --- Inventory ledgers: transactions and failed_transactions, partitioned by year ---
+                ensure_ledger_tables(connection)
 
-                # --- FAILED Transactions Table ---
-                connection.execute(text("""
-                    CREATE TABLE IF NOT EXISTS failed_transactions (
-                        id SERIAL PRIMARY KEY,
-                        transaction_date DATE NOT NULL,
-                        transaction_type VARCHAR(50) NOT NULL,
-                        source_ref_no VARCHAR(50),
-                        product_code VARCHAR(50) NOT NULL,
-                        lot_number VARCHAR(50),
-                        bag_box_number VARCHAR(50),
-                        quantity_in NUMERIC(15, 6) DEFAULT 0,
-                        quantity_out NUMERIC(15, 6) DEFAULT 0,
-                        unit VARCHAR(20),
-                        warehouse VARCHAR(50),
-                        encoded_by VARCHAR(50),
-                        encoded_on TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                        remarks TEXT
-                    );
-                """))
-                connection.execute(text("""
-                    DO $$ BEGIN
-                        IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name='failed_transactions' AND column_name='bag_box_number') THEN
-                            ALTER TABLE failed_transactions ADD COLUMN bag_box_number VARCHAR(50);
-                        END IF;
-                    END $$;
-                """))
-                connection.execute(text(
-                    "CREATE INDEX IF NOT EXISTS idx_failed_transactions_product_code ON failed_transactions (product_code);"))
-                connection.execute(text(
-                    "CREATE INDEX IF NOT EXISTS idx_failed_transactions_lot_number ON failed_transactions (lot_number);"))
-                connection.execute(text(
-                    "CREATE INDEX IF NOT EXISTS idx_failed_transactions_source_ref_no ON failed_transactions (source_ref_no);"))
+                # --- Daily movement rollup (maintained by triggers on both ledgers) ---
+                ensure_movement_rollup(connection)
 
                 # --- (The rest of your function remains exactly the same) ---
 
@@ -1521,6 +1289,9 @@ def initialize_database():
                 """))
                 connection.execute(text(
                     "CREATE INDEX IF NOT EXISTS idx_legacy_production_lot_number ON legacy_production (lot_number);"))
+                connection.execute(text(
+                    "CREATE INDEX IF NOT EXISTS idx_legacy_production_prod_date ON legacy_production (prod_date);"))
+                ensure_prefix_indexes(connection)
 
                 # --- Beginning Inventory Table (beginv_sheet1) ---
                 connection.execute(text("""
@@ -1625,6 +1396,11 @@ def initialize_database():
                 # --- Receiving Report Tables ---
                 connection.execute(text(
                     "CREATE TABLE IF NOT EXISTS receiving_reports_primary (id SERIAL PRIMARY KEY, rr_no TEXT NOT NULL UNIQUE, receive_date DATE NOT NULL, receive_from TEXT, pull_out_form_no TEXT, received_by TEXT, reported_by TEXT, remarks TEXT, encoded_by TEXT, encoded_on TIMESTAMP, edited_by TEXT, edited_on TIMESTAMP, is_deleted BOOLEAN NOT NULL DEFAULT FALSE);"))
+                connection.execute(text("""
+                    DO $$ BEGIN
+                        IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name='receiving_reports_primary' AND column_name='is_printed') THEN ALTER TABLE receiving_reports_primary ADD COLUMN is_printed BOOLEAN NOT NULL DEFAULT FALSE; END IF;
+                    END $$;
+                """))
                 connection.execute(text(
                     "CREATE TABLE IF NOT EXISTS receiving_reports_items (id SERIAL PRIMARY KEY, rr_no TEXT NOT NULL, material_code TEXT, lot_no TEXT, quantity_kg NUMERIC(15, 6), status TEXT, location TEXT, remarks TEXT, FOREIGN KEY (rr_no) REFERENCES receiving_reports_primary (rr_no) ON DELETE CASCADE);"))
 
@@ -1711,6 +1487,7 @@ def initialize_database():
                 connection.execute(text("""
                     DO $$ BEGIN
                         IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name='rrf_primary' AND column_name='is_deleted') THEN ALTER TABLE rrf_primary ADD COLUMN is_deleted BOOLEAN NOT NULL DEFAULT FALSE; END IF;
+                        IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name='rrf_primary' AND column_name='is_printed') THEN ALTER TABLE rrf_primary ADD COLUMN is_printed BOOLEAN NOT NULL DEFAULT FALSE; END IF;
                     END $$;
                 """))
                 connection.execute(text(
@@ -1811,6 +1588,16 @@ def initialize_database():
                     "INSERT INTO customers (name, deliver_to, address) VALUES (:name, :deliver_to, :address) ON CONFLICT (name) DO NOTHING;"),
                     customer_data)
 
+                # --- Reference-data versions (dropdown cache invalidation) and the products master ---
+                ensure_reference_versions(connection)
+                ensure_products(connection)
+
+                # --- Document number counters (FGE/QC refs, RR, RRF, REQ, DR) ---
+                ensure_document_counters(connection)
+
+                # --- Recycle table for the ledger rows of soft-deleted documents ---
+                ensure_soft_delete(connection)
+
         print("Database initialized successfully.")
     except Exception as e:
         if 'QApplication' in sys.modules:
@@ -2000,10 +1787,14 @@ class ModernMainWindow(QMainWindow):
         else:
             return 11
 
-    def log_audit_trail(self, action_type, details):
+    def log_audit_trail(self, action_type, details, batch=None):
+        """With batch (an endorsement_store.SaveBatch) the entry is written by, and commits with, that save."""
         try:
             log_query = text(
                 "INSERT INTO qc_audit_trail (timestamp, username, action_type, details, hostname, ip_address, mac_address) VALUES (NOW(), :u, :a, :d, :h, :i, :m)")
+            if batch is not None:
+                batch.add(log_query, {"u": self.username, "a": action_type, "d": details, **self.workstation_info})
+                return
             with engine.connect() as connection:
                 with connection.begin(): connection.execute(log_query,
                                                             {"u": self.username, "a": action_type, "d": details,
@@ -2065,6 +1856,7 @@ class ModernMainWindow(QMainWindow):
 
         # ** LINK THEM TOGETHER **
         self.good_inventory_page.failed_inventory_page = self.failed_inventory_report_page
+        email_service()  # start the report email sender; resumes anything left in the spool
         self.failed_inventory_report_page.good_inventory_page = self.good_inventory_page
 
         # Add all pages to Stacked Widget in the correct order
@@ -2486,6 +2278,7 @@ class ModernMainWindow(QMainWindow):
 
     def on_sync_finished(self, success, message):
         self.loading_dialog.close();
+        invalidate_reference('products');
         self.btn_sync_prod.setEnabled(True);
         QMessageBox.information(self, "Sync Result",
                                 message) if success else QMessageBox.critical(
@@ -2493,6 +2286,7 @@ class ModernMainWindow(QMainWindow):
 
     def on_customer_sync_finished(self, success, message):
         self.loading_dialog.close();
+        invalidate_reference('customers');
         self.btn_sync_customers.setEnabled(True);
         QMessageBox.information(self,
                                 "Sync Result",
@@ -2659,6 +2453,9 @@ class ModernMainWindow(QMainWindow):
 
 
 if __name__ == "__main__":
+    # The frozen (PyInstaller) exe is re-launched as each print_documents worker process; without this the
+    # workers start the whole application again instead of running the render job.
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     initialize_database()
     login_window = LoginWindow()
@@ -1,6 +1,5 @@
 import sys
 import traceback
-import re
 from datetime import datetime, date
 from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 from typing import List, Dict, Any, Mapping, Set
@@ -21,6 +20,13 @@ import qtawesome as fa
 # --- Database Imports ---
 from sqlalchemy import text, inspect, Engine
 
+from completion import attach_prefix_query_completer
+from endorsement_store import SaveBatch
+from ledger import LedgerRow, LedgerWriter
+from lot_ranges import LotRangeError, expand_lot_range
+from reference_data import bind_reference_combo, invalidate_reference
+from soft_delete import restore_document, soft_delete_document
+
 # --- UI CONSTANTS (Aligned with AppStyles for visual consistency) ---
 PRIMARY_ACCENT_COLOR = '#007bff'
 PRIMARY_ACCENT_HOVER = '#e9f0ff'
@@ -39,6 +45,8 @@ COLOR_SECONDARY = '#d35400'
 COLOR_MANAGEMENT = '#7d3c98'
 COLOR_DEFAULT = '#34495e'
 
+RECENT_FORM_ID_LOTS = 2000  # latest production lots whose form IDs fill the Prod'n Form ID dropdown
+
 
 # --- Helper Function for Formatting Quantities ---
 def format_float_with_commas(value: Any, decimals: int = 2) -> str:
@@ -150,6 +158,7 @@ class ManageListDialog(QDialog):
                             text(
                                 f"INSERT INTO {self.table_name} ({self.column_name}) VALUES (:v) ON CONFLICT ({self.column_name}) DO NOTHING"),
                             {"v": value})
+                    invalidate_reference(self.table_name)
                     self._load_items()
                     self.accept()
                 except Exception as e:
@@ -163,6 +172,7 @@ class ManageListDialog(QDialog):
                 with self.engine.connect() as conn, conn.begin():
                     conn.execute(text(f"DELETE FROM {self.table_name} WHERE id = :id"),
                                  {"id": item.data(Qt.ItemDataRole.UserRole)})
+                invalidate_reference(self.table_name)
                 self._load_items()
                 self.accept()
             except Exception as e:
@@ -266,14 +276,7 @@ class AddItemDialog(QDialog):
 
     def _load_warehouses(self):
         try:
-            with self.engine.connect() as conn:
-                results = conn.execute(text("SELECT name FROM warehouses ORDER BY name")).scalars().all()
-            current_text = self.warehouse_combo.currentText()
-            self.warehouse_combo.blockSignals(True)
-            self.warehouse_combo.clear()
-            self.warehouse_combo.addItems([""] + results)
-            self.warehouse_combo.setCurrentText(current_text)
-            self.warehouse_combo.blockSignals(False)
+            bind_reference_combo(self.warehouse_combo, self.engine, 'warehouses')
         except Exception as e:
             QMessageBox.critical(self, "DB Error", f"Could not load warehouses: {e}")
 
@@ -408,25 +411,8 @@ class OutgoingFormPage(QWidget):
     def _parse_lot_range(self, lot_input):
         """Helper method to parse lot ranges (e.g., '100A-105A') into a list of individual lot numbers."""
         try:
-            parts = [s.strip().upper() for s in lot_input.split('-')]
-            if len(parts) != 2:
-                raise ValueError("Lot range must contain exactly one hyphen.")
-            start_str, end_str = parts
-            start_match = re.match(r'^(\d+)([A-Z]*)$', start_str)
-            end_match = re.match(r'^(\d+)([A-Z]*)$', end_str)
-            if not start_match or not end_match or start_match.group(2) != end_match.group(2):
-                raise ValueError("Format invalid or suffixes mismatch. Expected: '100A-105A'.")
-
-            start_num = int(start_match.group(1))
-            end_num = int(end_match.group(1))
-            suffix = start_match.group(2)
-            num_len = len(start_match.group(1))
-
-            if start_num > end_num:
-                raise ValueError("Start lot cannot be greater than end lot.")
-
-            return [f"{str(i).zfill(num_len)}{suffix}" for i in range(start_num, end_num + 1)]
-        except Exception as e:
+            return expand_lot_range(lot_input)
+        except LotRangeError as e:
             QMessageBox.critical(self, "Lot Range Error", f"Could not parse lot range '{lot_input}':\n{e}")
             return None
 
@@ -607,6 +593,8 @@ class OutgoingFormPage(QWidget):
         primary_layout = QGridLayout(primary_group)
         self.production_form_id_combo = QComboBox()
         self.production_form_id_combo.setEditable(True)
+        self.production_form_id_combo.setInsertPolicy(QComboBox.InsertPolicy.NoInsert)
+        attach_prefix_query_completer(self.production_form_id_combo, self.engine, 'production_form_ids')
         self.fetch_details_btn = QPushButton(fa.icon('fa5s.database', color=COLOR_SECONDARY), "Fetch Details")
         self.fetch_details_btn.setObjectName("SecondaryButton")
         self.ref_no_edit = UpperCaseLineEdit()
@@ -893,19 +881,17 @@ class OutgoingFormPage(QWidget):
                         "INSERT INTO outgoing_records_items (primary_id, prod_id, product_code, lot_used, quantity_required_kg, new_lot_details, status, box_number, remaining_quantity, quantity_produced, warehouse) VALUES (:primary_id, :prod_id, :product_code, :lot_used, :quantity_required_kg, :new_lot_details, :status, :box_number, :remaining_quantity, :quantity_produced, :warehouse)")
                     conn.execute(items_sql, items_data)
 
-                conn.execute(text("DELETE FROM transactions WHERE source_ref_no LIKE :ref"),
-                             {"ref": f"OF-{primary_id}-%"})
-                conn.execute(text("DELETE FROM failed_transactions WHERE source_ref_no LIKE :ref"),
-                             {"ref": f"OF-{primary_id}-%"})
-
-                transaction_records, failed_transaction_records = [], []
+                batch = SaveBatch(conn)
+                batch.add("DELETE FROM transactions WHERE source_ref_no LIKE :ref", {"ref": f"OF-{primary_id}-%"})
+                batch.add("DELETE FROM failed_transactions WHERE source_ref_no LIKE :ref", {"ref": f"OF-{primary_id}-%"})
+                ledger = LedgerWriter()
 
                 for idx, item in enumerate(items_data):
                     qty_req = item.get('quantity_required_kg', 0)
                     if not qty_req > 0: continue
 
                     source_ref_no = f"OF-{primary_id}-{idx + 1}"
-                    target_list = transaction_records if item.get('status') == 'PASSED' else failed_transaction_records
+                    target_table = 'transactions' if item.get('status') == 'PASSED' else 'failed_transactions'
 
                     if item.get('quantity_produced', '').strip().upper() == 'COMPLETION':
                         lot_used_input, new_lot_input = item['lot_used'], item['new_lot_details']
@@ -924,19 +910,17 @@ class OutgoingFormPage(QWidget):
                             Decimal('0.0001'), rounding=ROUND_HALF_UP)
 
                         for lot in lots_to_debit:
-                            target_list.append(
-                                {"transaction_date": primary_data["date_out"], "transaction_type": "REPROCESSING-OUT",
-                                 "source_ref_no": source_ref_no, "product_code": item["product_code"],
-                                 "lot_number": lot, "quantity_in": 0, "quantity_out": qty_per_debit, "unit": "KG.",
-                                 "warehouse": item["warehouse"], "encoded_by": self.username,
-                                 "remarks": f"Consumed for new lot(s) {new_lot_input}"})
+                            ledger.add(target_table, LedgerRow(
+                                transaction_date=primary_data["date_out"], transaction_type="REPROCESSING-OUT",
+                                source_ref_no=source_ref_no, product_code=item["product_code"], lot_number=lot,
+                                quantity_out=qty_per_debit, warehouse=item["warehouse"], encoded_by=self.username,
+                                remarks=f"Consumed for new lot(s) {new_lot_input}"))
                         for lot in new_lots_to_credit:
-                            target_list.append(
-                                {"transaction_date": primary_data["date_out"], "transaction_type": "REPROCESSING-IN",
-                                 "source_ref_no": source_ref_no, "product_code": item["product_code"],
-                                 "lot_number": lot, "quantity_in": qty_per_credit, "quantity_out": 0, "unit": "KG.",
-                                 "warehouse": item["warehouse"], "encoded_by": self.username,
-                                 "remarks": f"Produced from old lot(s) {lot_used_input}"})
+                            ledger.add(target_table, LedgerRow(
+                                transaction_date=primary_data["date_out"], transaction_type="REPROCESSING-IN",
+                                source_ref_no=source_ref_no, product_code=item["product_code"], lot_number=lot,
+                                quantity_in=qty_per_credit, warehouse=item["warehouse"], encoded_by=self.username,
+                                remarks=f"Produced from old lot(s) {lot_used_input}"))
                     else:
                         lot_used_input = item['lot_used']
                         if not lot_used_input: continue
@@ -949,19 +933,13 @@ class OutgoingFormPage(QWidget):
                                                                                                 rounding=ROUND_HALF_UP)
 
                         for lot in lots_to_debit:
-                            target_list.append(
-                                {"transaction_date": primary_data["date_out"], "transaction_type": "OUTGOING_FORM",
-                                 "source_ref_no": source_ref_no, "product_code": item["product_code"],
-                                 "lot_number": lot, "quantity_in": 0, "quantity_out": qty_per_lot, "unit": "KG.",
-                                 "warehouse": item["warehouse"], "encoded_by": self.username,
-                                 "remarks": f"Outgoing for: {primary_data['activity']}"})
-
-                if transaction_records: conn.execute(text(
-                    """INSERT INTO transactions (transaction_date, transaction_type, source_ref_no, product_code, lot_number, quantity_in, quantity_out, unit, warehouse, encoded_by, remarks) VALUES (:transaction_date, :transaction_type, :source_ref_no, :product_code, :lot_number, :quantity_in, :quantity_out, :unit, :warehouse, :encoded_by, :remarks)"""),
-                    transaction_records)
-                if failed_transaction_records: conn.execute(text(
-                    """INSERT INTO failed_transactions (transaction_date, transaction_type, source_ref_no, product_code, lot_number, quantity_in, quantity_out, unit, warehouse, encoded_by, remarks) VALUES (:transaction_date, :transaction_type, :source_ref_no, :product_code, :lot_number, :quantity_in, :quantity_out, :unit, :warehouse, :encoded_by, :remarks)"""),
-                    failed_transaction_records)
+                            ledger.add(target_table, LedgerRow(
+                                transaction_date=primary_data["date_out"], transaction_type="OUTGOING_FORM",
+                                source_ref_no=source_ref_no, product_code=item["product_code"], lot_number=lot,
+                                quantity_out=qty_per_lot, warehouse=item["warehouse"], encoded_by=self.username,
+                                remarks=f"Outgoing for: {primary_data['activity']}"))
+
+                ledger.to_batch(batch).execute()
 
                 self._save_new_combobox_entries(conn, primary_data, items_data)
                 self.log_audit_trail(log_action,
@@ -1049,8 +1027,12 @@ class OutgoingFormPage(QWidget):
                     text("SELECT name FROM outgoing_releasers ORDER BY name")).scalars().all()
                 self.qty_produced_options_cache = conn.execute(
                     text("SELECT value FROM outgoing_qty_produced_options ORDER BY value")).scalars().all()
-                prod_ids_from_db = conn.execute(text(
-                    "SELECT DISTINCT prod_id FROM legacy_production WHERE prod_id IS NOT NULL AND prod_id != ''")).scalars().all()
+                # Only the forms of the latest lots go in the dropdown; the completer searches all of them.
+                prod_ids_from_db = conn.execute(text("""
+                    SELECT DISTINCT prod_id FROM (
+                        SELECT prod_id FROM legacy_production WHERE prod_date IS NOT NULL
+                        ORDER BY prod_date DESC LIMIT :recent_lots) recent
+                    WHERE prod_id IS NOT NULL AND prod_id != ''"""), {"recent_lots": RECENT_FORM_ID_LOTS}).scalars().all()
 
             def sort_key(item):
                 try:
@@ -1205,13 +1187,7 @@ class OutgoingFormPage(QWidget):
         if reply == QMessageBox.StandardButton.Yes:
             try:
                 with self.engine.connect() as conn, conn.begin():
-                    conn.execute(text(
-                        "UPDATE outgoing_records_primary SET is_deleted = TRUE, edited_by = :user, edited_on = NOW() WHERE id = :id"),
-                        {"id": primary_id, "user": self.username})
-                    conn.execute(text("DELETE FROM transactions WHERE source_ref_no LIKE :ref"),
-                                 {"ref": f"OF-{primary_id}-%"})
-                    conn.execute(text("DELETE FROM failed_transactions WHERE source_ref_no LIKE :ref"),
-                                 {"ref": f"OF-{primary_id}-%"})
+                    soft_delete_document(conn, 'OUTGOING', primary_id, self.username)
                 self.log_audit_trail("DELETE_OUTGOING_FORM",
                                      f"Soft-deleted form {prod_id} and its inventory transactions")
                 QMessageBox.information(self, "Success", f"Form {prod_id} has been moved to Deleted Records.")
@@ -1231,74 +1207,67 @@ class OutgoingFormPage(QWidget):
         if reply == QMessageBox.StandardButton.Yes:
             try:
                 with self.engine.connect() as conn, conn.begin():
-                    conn.execute(text(
-                        "UPDATE outgoing_records_primary SET is_deleted = FALSE, edited_by = :user, edited_on = NOW() WHERE id = :id"),
-                        {"id": primary_id, "user": self.username})
-                    primary_data = conn.execute(text("SELECT * FROM outgoing_records_primary WHERE id = :id"),
-                                                {"id": primary_id}).mappings().one()
-                    items_data = conn.execute(text("SELECT * FROM outgoing_records_items WHERE primary_id = :id"),
-                                              {"id": primary_id}).mappings().all()
-
-                    transaction_records, failed_transaction_records = [], []
-                    for idx, item in enumerate(items_data):
-                        qty_req = item.get('quantity_required_kg', 0)
-                        if not qty_req > 0: continue
-
-                        source_ref_no = f"OF-{primary_id}-{idx + 1}"
-                        target_list = transaction_records if item.get(
-                            'status') == 'PASSED' else failed_transaction_records
-
-                        if item.get('quantity_produced', '').strip().upper() == 'COMPLETION':
-                            lot_used_input, new_lot_input = item['lot_used'], item['new_lot_details']
-                            if not all([lot_used_input, new_lot_input]): continue
-
-                            lots_to_debit = self._parse_lot_range(lot_used_input) if '-' in lot_used_input else [
-                                lot_used_input]
-                            new_lots_to_credit = self._parse_lot_range(new_lot_input) if '-' in new_lot_input else [
-                                new_lot_input]
-                            if lots_to_debit is None or new_lots_to_credit is None: continue
-
-                            qty_per_debit = (Decimal(qty_req) / Decimal(len(lots_to_debit))).quantize(Decimal('0.0001'),
-                                                                                                      rounding=ROUND_HALF_UP)
-                            qty_per_credit = (Decimal(qty_req) / Decimal(len(new_lots_to_credit))).quantize(
-                                Decimal('0.0001'), rounding=ROUND_HALF_UP)
-
-                            for lot in lots_to_debit: target_list.append(
-                                {"transaction_date": primary_data["date_out"], "transaction_type": "REPROCESSING-OUT",
-                                 "source_ref_no": source_ref_no, "product_code": item["product_code"],
-                                 "lot_number": lot, "quantity_in": 0, "quantity_out": qty_per_debit, "unit": "KG.",
-                                 "warehouse": item["warehouse"], "encoded_by": self.username,
-                                 "remarks": f"RESTORED - Consumed for new lot(s) {new_lot_input}"})
-                            for lot in new_lots_to_credit: target_list.append(
-                                {"transaction_date": primary_data["date_out"], "transaction_type": "REPROCESSING-IN",
-                                 "source_ref_no": source_ref_no, "product_code": item["product_code"],
-                                 "lot_number": lot, "quantity_in": qty_per_credit, "quantity_out": 0, "unit": "KG.",
-                                 "warehouse": item["warehouse"], "encoded_by": self.username,
-                                 "remarks": f"RESTORED - Produced from old lot(s) {lot_used_input}"})
-                        else:
-                            lot_used_input = item['lot_used']
-                            if not lot_used_input: continue
-
-                            lots_to_debit = self._parse_lot_range(lot_used_input) if '-' in lot_used_input else [
-                                lot_used_input]
-                            if lots_to_debit is None: continue
-
-                            qty_per_lot = (Decimal(qty_req) / Decimal(len(lots_to_debit))).quantize(Decimal('0.0001'),
-                                                                                                    rounding=ROUND_HALF_UP)
-
-                            for lot in lots_to_debit: target_list.append(
-                                {"transaction_date": primary_data["date_out"], "transaction_type": "OUTGOING_FORM",
-                                 "source_ref_no": source_ref_no, "product_code": item["product_code"],
-                                 "lot_number": lot, "quantity_in": 0, "quantity_out": qty_per_lot, "unit": "KG.",
-                                 "warehouse": item["warehouse"], "encoded_by": self.username,
-                                 "remarks": f"RESTORED - Outgoing for: {primary_data['activity']}"})
-
-                    if transaction_records: conn.execute(text(
-                        """INSERT INTO transactions (transaction_date, transaction_type, source_ref_no, product_code, lot_number, quantity_in, quantity_out, unit, warehouse, encoded_by, remarks) VALUES (:transaction_date, :transaction_type, :source_ref_no, :product_code, :lot_number, :quantity_in, :quantity_out, :unit, :warehouse, :encoded_by, :remarks)"""),
-                        transaction_records)
-                    if failed_transaction_records: conn.execute(text(
-                        """INSERT INTO failed_transactions (transaction_date, transaction_type, source_ref_no, product_code, lot_number, quantity_in, quantity_out, unit, warehouse, encoded_by, remarks) VALUES (:transaction_date, :transaction_type, :source_ref_no, :product_code, :lot_number, :quantity_in, :quantity_out, :unit, :warehouse, :encoded_by, :remarks)"""),
-                        failed_transaction_records)
+                    if not restore_document(conn, 'OUTGOING', primary_id, self.username):
+                        # Deleted before deleted_ledger_rows existed: rebuild its ledger rows
+                        primary_data = conn.execute(text("SELECT * FROM outgoing_records_primary WHERE id = :id"),
+                                                    {"id": primary_id}).mappings().one()
+                        items_data = conn.execute(text("SELECT * FROM outgoing_records_items WHERE primary_id = :id"),
+                                                  {"id": primary_id}).mappings().all()
+
+                        ledger = LedgerWriter()
+                        for idx, item in enumerate(items_data):
+                            qty_req = item.get('quantity_required_kg', 0)
+                            if not qty_req > 0: continue
+
+                            source_ref_no = f"OF-{primary_id}-{idx + 1}"
+                            target_table = 'transactions' if item.get('status') == 'PASSED' else 'failed_transactions'
+
+                            if item.get('quantity_produced', '').strip().upper() == 'COMPLETION':
+                                lot_used_input, new_lot_input = item['lot_used'], item['new_lot_details']
+                                if not all([lot_used_input, new_lot_input]): continue
+
+                                lots_to_debit = self._parse_lot_range(lot_used_input) if '-' in lot_used_input else [
+                                    lot_used_input]
+                                new_lots_to_credit = self._parse_lot_range(new_lot_input) if '-' in new_lot_input else [
+                                    new_lot_input]
+                                if lots_to_debit is None or new_lots_to_credit is None: continue
+
+                                qty_per_debit = (Decimal(qty_req) / Decimal(len(lots_to_debit))).quantize(Decimal('0.0001'),
+                                                                                                          rounding=ROUND_HALF_UP)
+                                qty_per_credit = (Decimal(qty_req) / Decimal(len(new_lots_to_credit))).quantize(
+                                    Decimal('0.0001'), rounding=ROUND_HALF_UP)
+
+                                for lot in lots_to_debit:
+                                    ledger.add(target_table, LedgerRow(
+                                        transaction_date=primary_data["date_out"], transaction_type="REPROCESSING-OUT",
+                                        source_ref_no=source_ref_no, product_code=item["product_code"], lot_number=lot,
+                                        quantity_out=qty_per_debit, warehouse=item["warehouse"], encoded_by=self.username,
+                                        remarks=f"RESTORED - Consumed for new lot(s) {new_lot_input}"))
+                                for lot in new_lots_to_credit:
+                                    ledger.add(target_table, LedgerRow(
+                                        transaction_date=primary_data["date_out"], transaction_type="REPROCESSING-IN",
+                                        source_ref_no=source_ref_no, product_code=item["product_code"], lot_number=lot,
+                                        quantity_in=qty_per_credit, warehouse=item["warehouse"], encoded_by=self.username,
+                                        remarks=f"RESTORED - Produced from old lot(s) {lot_used_input}"))
+                            else:
+                                lot_used_input = item['lot_used']
+                                if not lot_used_input: continue
+
+                                lots_to_debit = self._parse_lot_range(lot_used_input) if '-' in lot_used_input else [
+                                    lot_used_input]
+                                if lots_to_debit is None: continue
+
+                                qty_per_lot = (Decimal(qty_req) / Decimal(len(lots_to_debit))).quantize(Decimal('0.0001'),
+                                                                                                        rounding=ROUND_HALF_UP)
+
+                                for lot in lots_to_debit:
+                                    ledger.add(target_table, LedgerRow(
+                                        transaction_date=primary_data["date_out"], transaction_type="OUTGOING_FORM",
+                                        source_ref_no=source_ref_no, product_code=item["product_code"], lot_number=lot,
+                                        quantity_out=qty_per_lot, warehouse=item["warehouse"], encoded_by=self.username,
+                                        remarks=f"RESTORED - Outgoing for: {primary_data['activity']}"))
+
+                        ledger.to_batch(SaveBatch(conn)).execute()
 
                 self.log_audit_trail("RESTORE_OUTGOING_FORM", f"Restored form {prod_id} and its inventory transactions")
                 QMessageBox.information(self, "Success", f"Form {prod_id} has been restored.")
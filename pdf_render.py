@@ -0,0 +1,144 @@
+"""
+Shared painting of reportlab-generated PDFs onto a QPrinter (preview dialog or physical printer).
+
+QPrintPreviewDialog re-emits paintRequested on every zoom, page-setup or navigation change. Rasterising each
+page at full printer resolution on every repaint is what made the preview sluggish, so:
+  * preview repaints use a low DPI and are served from an LRU cache keyed by (document digest, page, dpi);
+  * the full DPI raster is only produced when the painter targets a real printer;
+  * an optional vector path (printing/vector_output setting) draws each page as SVG via QSvgRenderer,
+    so no raster is created at all.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+import fitz  # PyMuPDF
+from PyQt6.QtCore import QByteArray, QRectF, QSettings
+from PyQt6.QtGui import QImage, QPainter, QPaintEngine
+from PyQt6.QtPrintSupport import QPrinter
+
+try:
+    from PyQt6.QtSvg import QSvgRenderer
+
+    SVG_AVAILABLE = True
+except ImportError:
+    SVG_AVAILABLE = False
+
+PREVIEW_DPI = 120
+DEFAULT_PRINT_DPI = 300
+MAX_CACHED_PAGES = 48
+VECTOR_OUTPUT_SETTING_KEY = "printing/vector_output"
+
+
+def vector_output_enabled() -> bool:
+    enabled = QSettings("MyCompany", "FGInventoryApp").value(VECTOR_OUTPUT_SETTING_KEY, False, type=bool)
+    return enabled and SVG_AVAILABLE
+
+
+class PdfRenderCache:
+    """LRU cache of rendered pages plus the open fitz documents they came from."""
+
+    def __init__(self, max_pages: int = MAX_CACHED_PAGES):
+        self.max_pages = max_pages
+        self._lock = threading.Lock()
+        self._pages: OrderedDict = OrderedDict()
+        self._documents: dict = {}
+
+    @staticmethod
+    def document_key(pdf_buffer) -> str:
+        return hashlib.sha1(pdf_buffer.getbuffer()).hexdigest()
+
+    def _document(self, key: str, pdf_buffer) -> fitz.Document:
+        doc = self._documents.get(key)
+        if doc is None:
+            doc = fitz.open(stream=bytes(pdf_buffer.getbuffer()), filetype="pdf")
+            self._documents[key] = doc
+        return doc
+
+    def page_count(self, key: str, pdf_buffer) -> int:
+        with self._lock:
+            return self._document(key, pdf_buffer).page_count
+
+    def page_image(self, key: str, pdf_buffer, page_index: int, dpi: int, store: bool = True) -> QImage:
+        cache_key = (key, page_index, dpi)
+        with self._lock:
+            image = self._pages.get(cache_key)
+            if image is not None:
+                self._pages.move_to_end(cache_key)
+                return image
+            zoom = dpi / 72.0  # PDF standard DPI is 72
+            pix = self._document(key, pdf_buffer)[page_index].get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            # copy() detaches the QImage from the pixmap's sample buffer, which fitz frees with the Pixmap
+            image = QImage(pix.samples, pix.width, pix.height, pix.stride, QImage.Format.Format_RGB888).copy()
+            if not store:
+                return image
+            self._pages[cache_key] = image
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+            return image
+
+    def page_svg(self, key: str, pdf_buffer, page_index: int) -> bytes:
+        cache_key = (key, page_index, 'svg')
+        with self._lock:
+            svg = self._pages.get(cache_key)
+            if svg is None:
+                svg = self._document(key, pdf_buffer)[page_index].get_svg_image().encode('utf-8')
+                self._pages[cache_key] = svg
+                while len(self._pages) > self.max_pages:
+                    self._pages.popitem(last=False)
+            else:
+                self._pages.move_to_end(cache_key)
+            return svg
+
+    def discard(self, key: str):
+        """Drops every cached page of a document and closes it."""
+        with self._lock:
+            for cache_key in [k for k in self._pages if k[0] == key]:
+                del self._pages[cache_key]
+            doc = self._documents.pop(key, None)
+        if doc is not None:
+            doc.close()
+
+
+PDF_RENDER_CACHE = PdfRenderCache()
+
+
+def _is_preview_painter(painter: QPainter) -> bool:
+    # QPrintPreviewWidget records pages through a picture-based paint engine; real printers never do.
+    return painter.paintEngine() is not None and painter.paintEngine().type() == QPaintEngine.Type.Picture
+
+
+def paint_pdf(printer: QPrinter, pdf_buffer, print_dpi: int = DEFAULT_PRINT_DPI,
+              cache: PdfRenderCache = PDF_RENDER_CACHE) -> str:
+    """
+    Paints every page of pdf_buffer onto printer. Returns the document key so callers can discard() it
+    once the preview dialog is closed. Raises RuntimeError if the printer cannot be painted on.
+    """
+    key = cache.document_key(pdf_buffer)
+    painter = QPainter()
+    if not painter.begin(printer):
+        raise RuntimeError("Could not initialize painter.")
+    try:
+        target = printer.pageRect(QPrinter.Unit.DevicePixel)
+        is_preview = _is_preview_painter(painter)
+        use_vector = vector_output_enabled()
+        dpi = PREVIEW_DPI if is_preview else print_dpi
+        for i in range(cache.page_count(key, pdf_buffer)):
+            if i > 0:
+                printer.newPage()
+            if use_vector:
+                renderer = QSvgRenderer(QByteArray(cache.page_svg(key, pdf_buffer, i)))
+                renderer.render(painter, QRectF(target))
+            else:
+                # full-resolution print rasters are used once, so only preview renders are kept
+                image = cache.page_image(key, pdf_buffer, i, dpi, store=is_preview)
+                painter.drawImage(target.toRect(), image, image.rect())
+    finally:
+        painter.end()
+    return key
+
+
+def release_pdf(pdf_buffer, cache: PdfRenderCache = PDF_RENDER_CACHE):
+    """Frees the cached renders of pdf_buffer; call once its preview dialog has closed."""
+    if pdf_buffer is not None:
+        cache.discard(cache.document_key(pdf_buffer))
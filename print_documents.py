@@ -0,0 +1,413 @@
+"""
+Module-level reportlab generators for the Delivery Receipt (DR), Return/Replacement Form (RRF) and
+Receiving Report for Returned Goods (RR), plus the batch pipeline that renders many documents in a process pool
+and merges them into a single spool PDF.
+
+The static parts of each layout come from form_templates; the generators only bind record data into the
+variable cells. Everything here is Qt-free and picklable so it can run inside ProcessPoolExecutor workers;
+the pages in product_delivery.py, rrf.py and receiving_report.py call the same functions for single-document
+previews.
+"""
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import fitz  # PyMuPDF
+import qrcode
+from reportlab.lib import colors
+from reportlab.lib.units import inch
+from reportlab.platypus import (SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image as ReportLabImage)
+from sqlalchemy import text
+
+from document_resources import warm_up
+from form_templates import DR_PAGE_SIZE, FORM_PAGE_SIZE, form_template, warm_up_templates
+
+DOC_DR, DOC_RRF, DOC_RR = 'DR', 'RRF', 'RR'
+
+# Upper bound on generator processes; reportlab is CPU-bound and each worker holds its own font/style cache.
+MAX_PRINT_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+
+
+# --- Generators ---
+def build_delivery_receipt_pdf(primary_data: dict, items_data: list, alias_map: dict) -> io.BytesIO:
+    """Builds the DR form. alias_map maps product_code -> {alias_code, description} (see fetch_alias_map)."""
+    tpl = form_template(DOC_DR)
+    styles = tpl.styles
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=DR_PAGE_SIZE, topMargin=0.25 * inch, bottomMargin=tpl.bottom_margin,
+                            leftMargin=tpl.left_margin, rightMargin=tpl.left_margin)
+    qr_img = qrcode.make(primary_data['dr_no']);
+    qr_buffer = io.BytesIO()
+    qr_img.save(qr_buffer, format='PNG');
+    qr_buffer.seek(0)
+    reportlab_qr = ReportLabImage(qr_buffer, width=0.8 * inch, height=0.8 * inch)
+    Story = []
+    right_header_top_table = Table([[tpl.title, reportlab_qr]], colWidths=[2.0 * inch, 1.2 * inch],
+                                   style=tpl.top_style)
+    right_header_data = [[right_header_top_table], [Table(
+        [[tpl.label_no, Paragraph(primary_data['dr_no'], styles['DRNumber'])],
+         [tpl.label_date, Paragraph(primary_data['delivery_date'], styles['DRData'])],
+         [tpl.label_po, Paragraph(primary_data['po_no'], styles['DRData'])],
+         [tpl.label_terms, '']], colWidths=[1.1 * inch, 1.8 * inch], style=tpl.middle_style)]]
+    right_header_table = Table(right_header_data, rowHeights=[0.4 * inch, 0.8 * inch], style=tpl.top_style)
+    header_table = Table([[tpl.letterhead, right_header_table]], colWidths=[4.8 * inch, 3.2 * inch],
+                         style=tpl.top_style)
+    Story.append(header_table);
+    Story.append(Spacer(1, 0.1 * inch))
+    address_html = primary_data.get('address', '').replace('\n', '<br/>')
+    customer_info_text = f"<font size=9>Customer's Name/Address</font><br/><b>Charge to: &nbsp;&nbsp;&nbsp;{primary_data['charge_to']}</b><br/><b>Deliver to: &nbsp;&nbsp;{primary_data['deliver_to']}</b><br/><b>Address: &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;{address_html}</b>"
+    Story.append(Paragraph(customer_info_text, styles['CustomerData2']));
+    Story.append(Spacer(1, 0.15 * inch))
+    table_data = [tpl.item_header]
+    for item_row in items_data:
+        item = dict(item_row)
+        desc_parts = []
+        alias_info = alias_map.get(item.get('product_code', ''))
+        if alias_info:
+            first_line = f"{alias_info['alias_code']} {alias_info['description']}".strip()
+        else:
+            desc1 = item.get('description_1', '').strip()
+            desc2 = item.get('description_2', '').strip()
+            if desc1 or desc2:
+                first_line = desc1 + (" " + desc2 if desc2 else "")
+            else:
+                first_line = f"{item.get('product_code', '')} {item.get('product_color', '')}".strip()
+
+        if first_line: desc_parts.append(first_line)
+        no_packing_str = str(item.get('no_of_packing', '0') or '0')
+        try:
+            if float(no_packing_str) > 0: desc_parts.append(
+                f"{no_packing_str} Bag(s) by {item.get('weight_per_pack')} KG.")
+        except (ValueError, TypeError):
+            pass
+        if lot1 := item.get('lot_no_1'): desc_parts.append(lot1)
+        if lot2 := item.get('lot_no_2'): desc_parts.append(lot2)
+        if lot3 := item.get('lot_no_3'): desc_parts.append(lot3)
+        if attachments := item.get('attachments'):
+            attachment_lines = [line.strip() for line in attachments.split('\n') if line.strip()]
+            desc_parts.extend(attachment_lines)
+        desc = "<br/>".join(p for p in desc_parts if p)
+        unit_price_val, quantity_val = item.get('unit_price'), item.get('quantity')
+
+        unit_price_str = f"{float(unit_price_val):,.2f}" if unit_price_val is not None else ""
+        quantity_str = f"{float(quantity_val):,.2f}" if quantity_val is not None else ""
+        amount_str = ""
+        if unit_price_val is not None and quantity_val is not None:
+            try:
+                amount = float(unit_price_val) * float(quantity_val);
+                amount_str = f"{amount:,.2f}"
+            except (ValueError, TypeError):
+                amount_str = ""
+        table_data.append(
+            [Paragraph(quantity_str, styles['ItemTextRight']), Paragraph(item.get('unit', ''), styles['ItemText']),
+             Paragraph(desc, styles['ItemDesc']), Paragraph(unit_price_str, styles['ItemTextRight']),
+             Paragraph(amount_str, styles['ItemTextRight'])])
+    items_table = Table(table_data, colWidths=[1.0 * inch, 0.5 * inch, 4.0 * inch, 1.2 * inch, 1.3 * inch],
+                        repeatRows=1)
+    items_table.setStyle(tpl.items_style)
+    Story.append(items_table);
+    Story.append(Spacer(1, 0.1 * inch))
+    Story.append(tpl.nothing_follows)
+    doc.build(Story, onFirstPage=tpl.draw_page, onLaterPages=tpl.draw_page)
+    buffer.seek(0)
+    return buffer
+
+
+def build_rrf_pdf(primary_data: dict, items_data: list) -> io.BytesIO:
+    """Builds the Return/Replacement Form."""
+    tpl = form_template(DOC_RRF)
+    styles = tpl.styles
+    buffer = io.BytesIO();
+    page_width, page_height = FORM_PAGE_SIZE
+    header_right_text = f"""<font name='LucidaSans-Bold' size='14'>RETURN/REPLACEMENT FORM</font><br/><br/><font name='LucidaSans-Bold' size='14'>RRF No.: {primary_data['rrf_no']}</font>"""
+    header_table = tpl.header_table(Paragraph(header_right_text, styles['MainStyleRight']), [4.5 * inch, 3.1 * inch])
+    footer_table = tpl.footer_table({0: primary_data.get('prepared_by')})
+    _, header_height = header_table.wrap(page_width, page_height);
+    _, footer_height = footer_table.wrap(page_width, page_height)
+    doc = SimpleDocTemplate(buffer, pagesize=(page_width, page_height), leftMargin=0.3 * inch,
+                            rightMargin=0.3 * inch, topMargin=header_height + 0.3 * inch,
+                            bottomMargin=footer_height + 0.2 * inch)
+    page_template_drawer = partial(tpl.draw_page, header_table=header_table, footer_table=footer_table)
+    Story = []
+    details_data = [[Paragraph(f"<b>Supplier / Customer:</b> {primary_data['customer_name']}", styles['MainStyle']),
+                     Paragraph(f"<b>Date:</b> {primary_data['rrf_date']}", styles['MainStyle'])],
+                    [Paragraph(f"<b>Material Type:</b> {primary_data['material_type']}", styles['MainStyle']), ""]]
+    details_table = Table(details_data, colWidths=[5.4 * inch, 2.5 * inch], rowHeights=[0.25 * inch, 0.25 * inch])
+    details_table.setStyle(tpl.details_style);
+    Story.append(details_table)
+    MAX_PDF_ROWS = 10;
+    H_ROW = 0.25 * inch;
+    D_ROW = 0.22 * inch
+    items_tbl_data, row_heights, styles_dyn = [tpl.item_header], [H_ROW], list(tpl.items_base_style)
+    lines_used = 0
+    for item in items_data:
+        if lines_used >= MAX_PDF_ROWS: break
+        qty = item.get('quantity', 0);
+        # Apply comma formatting to PDF quantity display
+        display_qty = f"{float(qty):,.2f}" if qty else "0.00"
+        items_tbl_data.append([Paragraph(display_qty, styles['MainStyleRight']),
+                               Paragraph(str(item.get('unit', '')), styles['MainStyle']),
+                               Paragraph(str(item.get('product_code', '')), styles['MainStyle']),
+                               Paragraph(str(item.get('lot_number', '')), styles['MainStyle']),
+                               Paragraph(str(item.get('reference_number', '')), styles['MainStyle'])]);
+        row_heights.append(D_ROW);
+        lines_used += 1
+        if remarks := item.get('remarks', '').strip():
+            if lines_used >= MAX_PDF_ROWS: continue
+            remark_idx = len(items_tbl_data);
+            items_tbl_data.append(
+                [Paragraph(f"<i><b>Remarks:</b> {remarks}</i>", styles['RemarkStyle']), '', '', '', '']);
+            row_heights.append(D_ROW);
+            lines_used += 1;
+            styles_dyn.append(('SPAN', (0, remark_idx), (-1, remark_idx)))
+    if lines_used < MAX_PDF_ROWS:
+        nf_idx = len(items_tbl_data);
+        items_tbl_data.append([tpl.nothing_follows, '', '', '', '']);
+        row_heights.append(D_ROW);
+        styles_dyn.append(('SPAN', (0, nf_idx), (-1, nf_idx)));
+        lines_used += 1
+    while lines_used < MAX_PDF_ROWS: items_tbl_data.append([''] * 5); row_heights.append(D_ROW); lines_used += 1
+    items_table = Table(items_tbl_data, colWidths=[1.1 * inch, 0.6 * inch, 1.8 * inch, 2.4 * inch, 2.0 * inch],
+                        rowHeights=row_heights)
+    items_table.setStyle(TableStyle(styles_dyn));
+    Story.append(items_table)
+    doc.build(Story, onFirstPage=page_template_drawer, onLaterPages=page_template_drawer)
+    buffer.seek(0);
+    return buffer
+
+
+def build_receiving_report_pdf(primary_data: dict, items_data: list) -> io.BytesIO:
+    """Builds the Receiving Report for Returned Goods."""
+    tpl = form_template(DOC_RR)
+    styles = tpl.styles
+    buffer = io.BytesIO()
+    page_width, page_height = FORM_PAGE_SIZE
+
+    header_right_text = f"""<font name='LucidaSans-Bold' size='12'>RECEIVING REPORT</font><br/><font name='LucidaSans-Bold' size='12'>FOR RETURNED GOODS</font><br/><br/><font name='LucidaSans-Bold' size='11'>RRRG No.: {primary_data['rr_no']}</font>"""
+    header_table = tpl.header_table(Paragraph(header_right_text, styles['MainStyleBoldRight']),
+                                    [4.8 * inch, 2.8 * inch])
+    footer_table = tpl.footer_table({0: primary_data.get('received_by'), 1: primary_data.get('reported_by')})
+
+    _, header_height = header_table.wrap(page_width, page_height)
+    _, footer_height = footer_table.wrap(page_width, page_height)
+    doc = SimpleDocTemplate(buffer, pagesize=(page_width, page_height), leftMargin=0.3 * inch,
+                            rightMargin=0.3 * inch, topMargin=header_height + 0.3 * inch,
+                            bottomMargin=footer_height + 0.25 * inch)
+    Story = []
+
+    details_data = [
+        [Paragraph(f"<b>Received From:</b> {primary_data['receive_from']}", styles['MainStyle']),
+         Paragraph(f"<b>Date Received:</b> {primary_data['receive_date']}", styles['MainStyle'])],
+        [Paragraph(f"<b>Pull Out Form#:</b> {primary_data['pull_out_form_no']}", styles['MainStyle']), ""]]
+    details_table = Table(details_data, colWidths=[5.4 * inch, 2.5 * inch])
+    details_table.setStyle(tpl.details_style)
+    Story.append(details_table)
+
+    MAX_CONTENT_ROWS = 10
+    items_tbl_data = [tpl.item_header]
+    row_heights = [0.25 * inch]
+
+    styles_dyn = list(tpl.items_base_style)
+
+    for item in items_data:
+        if len(items_tbl_data) > MAX_CONTENT_ROWS: break
+        qty_val = item.get('quantity_kg', 0)
+
+        # --- QTY FORMATTING MODIFICATION START ---
+        try:
+            # Need to handle case where quantity_kg might be a string (from entry form) containing commas
+            qty_float = float(str(qty_val).replace(',', ''))
+            qty_str = f"{qty_float:,.2f}"  # Format with comma
+        except (ValueError, TypeError):
+            qty_str = "0.00"
+        # --- QTY FORMATTING MODIFICATION END ---
+
+        items_tbl_data.append([Paragraph(str(item.get('material_code', '')), styles['MainStyle']),
+                               Paragraph(str(item.get('lot_no', '')), styles['MainStyle']),
+                               Paragraph(qty_str, styles['MainStyleRight']),
+                               Paragraph(str(item.get('status', '')), styles['MainStyleCenter']),
+                               Paragraph(str(item.get('location', '')), styles['MainStyleCenter'])])
+        row_heights.append(0.22 * inch)
+
+    remarks_text = primary_data.get('remarks', '').strip()
+    if remarks_text:
+        if len(items_tbl_data) <= MAX_CONTENT_ROWS:
+            remark_idx = len(items_tbl_data)
+            remark_para = Paragraph(f"<b>Remarks:</b> {remarks_text}", styles['RemarkStyle'])
+            items_tbl_data.append([remark_para, '', '', '', ''])
+            row_heights.append(0.5 * inch)
+            styles_dyn.extend(
+                [('SPAN', (0, remark_idx), (-1, remark_idx)), ('VALIGN', (0, remark_idx), (-1, remark_idx), 'TOP'),
+                 ('TOPPADDING', (0, remark_idx), (-1, remark_idx), 5)])
+
+    if len(items_tbl_data) <= MAX_CONTENT_ROWS:
+        nf_idx = len(items_tbl_data)
+        items_tbl_data.append([tpl.nothing_follows, '', '', '', ''])
+        row_heights.append(0.22 * inch)
+        styles_dyn.append(('SPAN', (0, nf_idx), (-1, nf_idx)))
+
+    while len(items_tbl_data) <= MAX_CONTENT_ROWS:
+        items_tbl_data.append([''] * len(tpl.item_header))
+        row_heights.append(0.22 * inch)
+
+    styles_dyn.append(('LINEBELOW', (0, len(items_tbl_data) - 1), (-1, len(items_tbl_data) - 1), 0.5, colors.black))
+
+    items_table = Table(items_tbl_data, colWidths=[2.0 * inch, 2.0 * inch, 1.2 * inch, 1.3 * inch, 1.4 * inch],
+                        rowHeights=row_heights)
+    items_table.setStyle(TableStyle(styles_dyn))
+    Story.append(items_table)
+
+    doc.build(Story, onFirstPage=partial(tpl.draw_page, header_table=header_table, footer_table=footer_table))
+    buffer.seek(0)
+    return buffer
+
+
+# --- Data loading (shared by single and batch printing) ---
+def fetch_alias_map(conn, product_codes) -> dict:
+    """One query for every product alias used by a set of DR items."""
+    codes = sorted({pc for pc in product_codes if pc})
+    if not codes:
+        return {}
+    rows = conn.execute(text("SELECT product_code, alias_code, description FROM product_aliases "
+                             "WHERE product_code = ANY(:codes)"), {"codes": codes}).mappings().all()
+    aliases = {}
+    for row in rows:
+        aliases.setdefault(row['product_code'], {'alias_code': row['alias_code'], 'description': row['description']})
+    return aliases
+
+
+def delivery_print_data(primary) -> dict:
+    return {"dr_no": primary.get('dr_no'),
+            "delivery_date": primary['delivery_date'].strftime("%m/%d/%Y") if primary.get('delivery_date') else '',
+            "charge_to": primary.get('customer_name', '') or '', "deliver_to": primary.get('deliver_to', '') or '',
+            "address": primary.get('address', '') or '', "po_no": primary.get('po_no', '') or '',
+            "terms": primary.get('terms', '') or ''}
+
+
+def rrf_print_data(primary) -> dict:
+    return {"rrf_no": primary.get('rrf_no'),
+            "rrf_date": primary['rrf_date'].strftime("%m/%d/%y") if primary.get('rrf_date') else '',
+            "customer_name": primary.get('customer_name'),
+            "material_type": primary.get('material_type'), "prepared_by": primary.get('prepared_by')}
+
+
+def receiving_report_print_data(primary) -> dict:
+    return {"rr_no": primary.get('rr_no'),
+            "receive_date": primary['receive_date'].strftime("%m/%d/%y") if primary.get('receive_date') else '',
+            "receive_from": primary.get('receive_from'),
+            "pull_out_form_no": primary.get('pull_out_form_no'),
+            "received_by": primary.get('received_by'),
+            "reported_by": primary.get('reported_by'),
+            "remarks": primary.get('remarks')}
+
+
+# (primary table, items table, key column, items ORDER BY, print-data builder)
+DOCUMENT_SOURCES = {
+    DOC_DR: ('product_delivery_primary', 'product_delivery_items', 'dr_no', 'id', delivery_print_data),
+    DOC_RRF: ('rrf_primary', 'rrf_items', 'rrf_no', 'id', rrf_print_data),
+    DOC_RR: ('receiving_reports_primary', 'receiving_reports_items', 'rr_no', 'id', receiving_report_print_data),
+}
+
+
+def load_print_jobs(conn, doc_type: str, doc_nos: list) -> list:
+    """
+    Loads everything needed to render doc_nos with two queries (three for DRs, which also need aliases)
+    and returns picklable (doc_type, doc_no, primary_data, items_data, alias_map) jobs in doc_nos order.
+    """
+    primary_table, items_table, key, order_by, to_print_data = DOCUMENT_SOURCES[doc_type]
+    primaries = {r[key]: r for r in conn.execute(
+        text(f"SELECT * FROM {primary_table} WHERE {key} = ANY(:nos)"), {"nos": list(doc_nos)}).mappings().all()}
+    items_by_doc = {}
+    for item in conn.execute(text(f"SELECT * FROM {items_table} WHERE {key} = ANY(:nos) ORDER BY {key}, {order_by}"),
+                             {"nos": list(doc_nos)}).mappings().all():
+        items_by_doc.setdefault(item[key], []).append(dict(item))
+    alias_map = {}
+    if doc_type == DOC_DR:
+        alias_map = fetch_alias_map(conn, [i.get('product_code') for items in items_by_doc.values() for i in items])
+    return [(doc_type, no, to_print_data(primaries[no]), items_by_doc.get(no, []), alias_map)
+            for no in doc_nos if no in primaries]
+
+
+# --- Batch pipeline ---
+def _init_print_worker():
+    warm_up()
+    warm_up_templates()
+
+
+def render_print_job(job: tuple) -> bytes:
+    doc_type, _doc_no, primary_data, items_data, alias_map = job
+    if doc_type == DOC_DR:
+        buffer = build_delivery_receipt_pdf(primary_data, items_data, alias_map)
+    elif doc_type == DOC_RRF:
+        buffer = build_rrf_pdf(primary_data, items_data)
+    else:
+        buffer = build_receiving_report_pdf(primary_data, items_data)
+    return buffer.getvalue()
+
+
+def render_spool_pdf(jobs: list, max_workers: int = MAX_PRINT_WORKERS, progress_callback=None) -> io.BytesIO:
+    """
+    Renders every job (see load_print_jobs) in a process pool and merges the results, in job order,
+    into one spool PDF. progress_callback(done, total) is called as documents complete. The workers re-launch the
+    executable, so a frozen build needs multiprocessing.freeze_support() at the top of its entry point (main.py).
+    """
+    spool = fitz.open()
+    if len(jobs) <= 1 or max_workers <= 1:
+        rendered = []
+        for done, job in enumerate(jobs, 1):
+            rendered.append(render_print_job(job))
+            if progress_callback: progress_callback(done, len(jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(jobs)), initializer=_init_print_worker) as pool:
+            rendered = []
+            for done, pdf_bytes in enumerate(pool.map(render_print_job, jobs, chunksize=4), 1):
+                rendered.append(pdf_bytes)
+                if progress_callback: progress_callback(done, len(jobs))
+    for pdf_bytes in rendered:
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as part:
+            spool.insert_pdf(part)
+    out = io.BytesIO(spool.tobytes(garbage=3, deflate=True))
+    spool.close()
+    return out
+
+
+if __name__ == "__main__":
+    # Per-document generation benchmark: cold (fonts, styles and form layouts rebuilt for every document, as
+    # the pages used to do) versus warm (shared document_resources registry and compiled form_templates).
+    import time
+    from datetime import date
+
+    from document_resources import clear_caches
+    from form_templates import clear_templates
+
+    SAMPLE_JOBS = [
+        (DOC_DR, '100001', {"dr_no": '100001', "delivery_date": date.today().strftime("%m/%d/%Y"),
+                            "charge_to": 'SAMPLE CUSTOMER', "deliver_to": 'SAMPLE CUSTOMER',
+                            "address": '24 Diamond Road\nCaloocan City', "po_no": 'PO-1', "terms": '30 DAYS'},
+         [{'product_code': 'PC-0001', 'quantity': 500, 'unit': 'KG', 'no_of_packing': 20, 'weight_per_pack': 25,
+           'lot_no_1': '1234AA-1240AA', 'unit_price': 10.5}] * 4, {}),
+        (DOC_RRF, '15000', {"rrf_no": '15000', "rrf_date": date.today().strftime("%m/%d/%y"),
+                            "customer_name": 'SAMPLE CUSTOMER', "material_type": 'FG', "prepared_by": 'admin'},
+         [{'quantity': 100, 'unit': 'KG', 'product_code': 'PC-0001', 'lot_number': '1234AA',
+           'reference_number': 'DR-100001', 'remarks': ''}] * 5, {}),
+        (DOC_RR, 'RR-0001', {"rr_no": 'RR-0001', "receive_date": date.today().strftime("%m/%d/%y"),
+                             "receive_from": 'SAMPLE CUSTOMER', "pull_out_form_no": 'POF-1', "received_by": 'qc',
+                             "reported_by": 'wh', "remarks": 'Sample'},
+         [{'material_code': 'PC-0001', 'lot_no': '1234AA', 'quantity_kg': 100, 'status': 'OK', 'location': 'A1'}] * 5,
+         {}),
+    ]
+    ROUNDS = 20
+
+    for label, cold in (("cold", True), ("warm", False)):
+        for job in SAMPLE_JOBS:
+            if not cold:
+                render_print_job(job)  # first call pays the one-off registry cost
+            started = time.perf_counter()
+            for _ in range(ROUNDS):
+                if cold:
+                    clear_caches()
+                    clear_templates()
+                render_print_job(job)
+            elapsed_ms = (time.perf_counter() - started) / ROUNDS * 1000
+            print(f"{job[0]:>3} {label}: {elapsed_ms:7.2f} ms/document")
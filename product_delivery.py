@@ -16,72 +16,49 @@
 # REVISED - Revamped Lot Breakdown Tool for better UX: DR dropdown, auto lot calculation, and save functionality.
 
 import sys
-import io
 import re
 from datetime import datetime, date
-from decimal import Decimal, InvalidOperation, ROUND_DOWN
-from functools import partial
+from decimal import Decimal, InvalidOperation
 import math
 import socket
 import uuid
-import numpy as np
-from pandas.core import frame
-
-# --- Camera & QR Code Imports (NEW) ---
-try:
-    import cv2
-    from pyzbar.pyzbar import decode
-
-    CAMERA_AVAILABLE = True
-except ImportError:
-    CAMERA_AVAILABLE = False
-    print("WARNING: 'opencv-python' or 'pyzbar' not found. Camera features will be disabled.")
-    print("Install with: pip install opencv-python pyzbar numpy")
-
-# --- ReportLab Imports ---
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
-from reportlab.lib.pagesizes import letter, landscape
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import (SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Frame, KeepInFrame,
-                                Image as ReportLabImage)
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 
-# --- PyQt6 Imports ---
-# --- PyQt6 Imports ---
-# --- ReportLab & PyMuPDF Imports ---
-import fitz  # <-- MAKE SURE THIS IS PRESENT
-from reportlab.lib import colors
-# ...
+# --- Camera & QR Code Scanning ---
+from qr_scanner import CAMERA_AVAILABLE, CAMERA_SOURCE_SETTING_KEY, CameraThread, display_fps_for
+
+# --- PDF Imports ---
+from pdf_render import paint_pdf, release_pdf
+from print_documents import DOC_DR, build_delivery_receipt_pdf, fetch_alias_map
+from batch_print import BatchPrintDialog
+from dispatch_scan import DISPATCH_STATUS, DispatchManifestPanel
+from lot_ranges import LotRangeError, LotRangeTooSmall, expand_lot_range, lot_sequence, fill_lots
 
 # --- PyQt6 Imports ---
-from PyQt6.QtCore import Qt, QDate, QSize, QSizeF, QDateTime, QRect, QRegularExpression, QThread, pyqtSignal, QTimer # No QBuffer, QIODevice, QRectF
+from PyQt6.QtCore import Qt, QDate, QSize, QSizeF, QDateTime, QTimer, QSettings # No QBuffer, QIODevice, QRectF
 # from PyQt6.QtPdf import QPdfDocument  # <-- REMOVE THIS
 # ...
-from PyQt6.QtGui import (QDoubleValidator, QPainter, QPageSize, QColor, QIntValidator, QImage, # Make sure QImage is here
-                         QRegularExpressionValidator, QFont, QPixmap)
-# ...
-#...
 from PyQt6.QtWidgets import (QApplication, QWidget, QVBoxLayout, QTabWidget, QFormLayout, QLineEdit, QDateEdit,
                              QPushButton, QTableWidget, QTableWidgetItem, QComboBox,
                              QAbstractItemView, QHeaderView, QMessageBox, QHBoxLayout, QLabel,
                              QGroupBox, QMenu, QGridLayout, QDialog, QDialogButtonBox,
-                             QPlainTextEdit, QSplitter, QCheckBox, QInputDialog, QStyle, QMainWindow)
-from PyQt6.QtGui import (QDoubleValidator, QPainter, QPageSize, QColor, QIntValidator, QImage,
-                         QRegularExpressionValidator, QFont, QPixmap)
+                             QPlainTextEdit, QSplitter, QCheckBox, QInputDialog, QMainWindow)
+from PyQt6.QtGui import QDoubleValidator, QPageSize, QColor, QIntValidator, QImage, QFont, QPixmap
 from PyQt6.QtPrintSupport import QPrinter, QPrintPreviewDialog
 
 # --- Database Imports ---
 from sqlalchemy import create_engine, text
 
+from completion import attach_prefix_query_completer
+from document_counters import ensure_document_counters, next_document_number, preview_document_number
+from endorsement_store import SaveBatch
+from ledger import LedgerRow, LedgerWriter
+from product_master import product_descriptions
+from reference_data import bind_reference_combo, invalidate_reference, reference_values
+from soft_delete import restore_document, soft_delete_document
+
 # --- Icon Library Import ---
 import qtawesome as fa
 
-# --- QR Code Import ---
-import qrcode
-
 # --- Configuration & Styles (MODIFIED) ---
 BUTTON_COLOR = '#1e74a8'  # Primary action color
 ICON_COLOR = BUTTON_COLOR
@@ -119,63 +96,6 @@ DELETE_BUTTON_STYLE = """
 """
 
 
-class CameraThread(QThread):
-    """
-    A QThread that captures video from the camera, detects QR codes,
-    and emits signals with the frame and any detected data.
-    """
-    frame_ready = pyqtSignal(QImage)
-    qr_code_detected = pyqtSignal(str)
-    camera_error = pyqtSignal(str)
-
-    def __init__(self, camera_index=0, parent=None):
-        super().__init__(parent)
-        self.camera_index = camera_index
-        self._is_running = True
-
-    def run(self):
-        print("CameraThread: Starting...")
-        cap = cv2.VideoCapture(self.camera_index, cv2.CAP_DSHOW)
-
-        if not cap.isOpened():
-            self.camera_error.emit(f"Could not open camera index {self.camera_index}.")
-            return
-
-        while self._is_running:
-            ret, frame = cap.read()
-            if not ret:
-                self._is_running = False
-                break
-
-            try:
-                decoded_objects = decode(frame)
-                if decoded_objects:
-                    qr_data = decoded_objects[0].data.decode('utf-8')
-                    self.qr_code_detected.emit(qr_data)
-            except Exception as e:
-                print(f"CameraThread: Error during QR decoding: {e}")
-
-            if self._is_running:
-                try:
-                    rgb_image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    h, w, ch = rgb_image.shape
-                    bytes_per_line = ch * w
-                    qt_image = QImage(rgb_image.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
-                    self.frame_ready.emit(qt_image.copy())
-                except Exception as e:
-                    print(f"CameraThread: Error converting frame: {e}")
-
-            self.msleep(10)
-
-        print("CameraThread: Releasing camera...")
-        cap.release()
-        print("CameraThread: Finished.")
-
-    def stop(self):
-        print("CameraThread: Stop requested.")
-        self._is_running = False
-
-
 class FloatLineEdit(QLineEdit):
     """ A QLineEdit for float values, formatted to 2 decimal places, supporting comma separation. """
 
@@ -218,7 +138,7 @@ class UpperCaseLineEdit(QLineEdit):
 
 
 class StandardItemEntryDialog(QDialog):
-    def __init__(self, db_engine, units, prod_codes, item_data=None, parent=None):
+    def __init__(self, db_engine, units, item_data=None, parent=None):
         super().__init__(parent)
         self.engine = db_engine
         self.setWindowTitle("Enter Item Details (Standard)")
@@ -231,7 +151,7 @@ class StandardItemEntryDialog(QDialog):
         self.unit_edit = QComboBox(editable=True);
         self.unit_edit.addItems(units)
         self.product_code_edit = QComboBox(editable=True);
-        self.product_code_edit.addItems(prod_codes)
+        bind_reference_combo(self.product_code_edit, db_engine, 'product_codes', blank=False)
         self.product_color_edit = QComboBox(editable=True)
         self.no_packing_edit = QLineEdit("0");
         self.no_packing_edit.setValidator(QIntValidator(0, 9999))
@@ -300,7 +220,7 @@ class StandardItemEntryDialog(QDialog):
 
 
 class TerumoItemEntryDialog(QDialog):
-    def __init__(self, db_engine, units, prod_codes, item_data=None, parent=None):
+    def __init__(self, db_engine, units, item_data=None, parent=None):
         super().__init__(parent)
         self.engine = db_engine
         self.setWindowTitle("Enter Item Details (Terumo)")
@@ -312,7 +232,7 @@ class TerumoItemEntryDialog(QDialog):
         self.unit_edit = QComboBox(editable=True);
         self.unit_edit.addItems(units)
         self.product_code_edit = QComboBox(editable=True);
-        self.product_code_edit.addItems(prod_codes)
+        bind_reference_combo(self.product_code_edit, db_engine, 'product_codes', blank=False)
         self.product_color_edit = QComboBox(editable=True)
         self.no_packing_edit = QLineEdit("0");
         self.no_packing_edit.setValidator(QIntValidator(0, 9999))
@@ -321,6 +241,8 @@ class TerumoItemEntryDialog(QDialog):
         self.lot_no_1_edit = UpperCaseLineEdit()
         self.lot_no_2_edit = UpperCaseLineEdit()
         self.lot_no_3_edit = UpperCaseLineEdit()
+        for lot_edit in (self.lot_no_1_edit, self.lot_no_2_edit, self.lot_no_3_edit):
+            attach_prefix_query_completer(lot_edit, db_engine, 'production_lots')
         self.attachments_edit = QPlainTextEdit()
         self.description_1_edit = QLineEdit()
         self.description_2_edit = QLineEdit()
@@ -428,7 +350,7 @@ class ProductDeliveryPage(QWidget):
         self.total_records, self.total_pages = 0, 1
         self.printer, self.current_pdf_buffer = QPrinter(), None
         self.breakdown_preview_data = []  # Initialize as a list for accumulation
-        self.unit_list, self.prod_code_list = [], []
+        self.unit_list = []
 
         self.workstation_details = self._get_workstation_details()
         self.prepared_by_string = f"{self.workstation_details['mac']} | {self.workstation_details['ip']} | {self.username.upper()}"
@@ -437,30 +359,11 @@ class ProductDeliveryPage(QWidget):
         self._load_all_records()
 
     def _get_special_descriptions(self, product_code):
-        mapping = {
-            "OA14430E": ("PL00X814MB", "MASTERBATCH ORANGE OA14430E"),
-            "TA14363E": ("PL00X816MB", "MASTERBATCH GRAY TA14363E"),
-            "GA14433E": ("PL00X818MB", "MASTERBATCH GREEN GA14433E"),
-            "BA14432E": ("PL00X822MB", "MASTERBATCH BLUE BA14432E"),
-            "YA14431E": ("PL00X620MB", "MASTERBATCH YELLOW YA14431E"),
-            "WA14429E": ("PL00X800MB", "MASTERBATCH WHITE WA14429E"),
-        }
-        if product_code in mapping:
-            ter1, ter2 = mapping[product_code]
-            return {"ter1": ter1, "ter2": ter2}
-        mapping_other = {
-            "WA12282E": ("RITESEAL88", "WHITE(CODE: WA12282E)"), "BA12556E": ("RITESEAL88", "BLUE(CODE: BA12556E)"),
-            "WA15151E": ("RITESEAL88", "NATURAL(CODE: WA15151E)"), "WA7997E": ("RITESEAL88", "NATURAL(CODE: WA7997E)"),
-            "WA15229E": ("RITESEAL88", "NATURAL(CODE: WA15229E)"),
-            "WA15218E": ("RITESEAL88", "NATURAL(CODE: WA15229E)"),
-            "AD-17248E": ("L-4", "DISPERSING AGENT(CODE: AD-17248E)"), "DU-W17246E": ("R104", "(CODE: DU-W17246E)"),
-            "DU-W16441E": ("R104", "(CODE: DU-W16441E)"), "DU-LL16541E": ("LLPDE", "(CODE: DU-LL16541E)"),
-            "BA17070E": ("RITESEAL88", "BLUE(CODE: BA17070E)"),
-        }
-        if product_code in mapping_other:
-            ter1, ter2 = mapping_other[product_code]
-            return {"ter1": ter1, "ter2": ter2}
-        return {"ter1": "", "ter2": ""}
+        try:
+            return product_descriptions(self.engine, product_code)
+        except Exception as e:
+            print(f"Error fetching product descriptions: {e}")
+            return {"ter1": "", "ter2": ""}
 
     def _get_workstation_details(self):
         try:
@@ -566,7 +469,10 @@ class ProductDeliveryPage(QWidget):
             self.toggle_camera_btn.setEnabled(False)
             self.toggle_camera_btn.setText("Stopping...")
         else:
-            self.camera_thread = CameraThread(camera_index=0)
+            source = QSettings("MyCompany", "FGInventoryApp").value(CAMERA_SOURCE_SETTING_KEY, 0)
+            self.camera_thread = CameraThread(camera_index=source,
+                                              display_size=self.camera_view_label.contentsRect().size(),
+                                              display_fps=display_fps_for(self.camera_view_label))
             self.camera_thread.frame_ready.connect(self._update_camera_view)
             self.camera_thread.qr_code_detected.connect(self._handle_qr_code)
             self.camera_thread.camera_error.connect(self._show_camera_error)
@@ -589,8 +495,14 @@ class ProductDeliveryPage(QWidget):
 
     def _update_camera_view(self, image: QImage):
         self.camera_view_label.setPixmap(QPixmap.fromImage(image))
+        if hasattr(self, 'camera_thread') and self.camera_thread:
+            self.camera_thread.set_display_size(self.camera_view_label.contentsRect().size())
 
     def _handle_qr_code(self, data: str):
+        if self.batch_mode_check.isChecked():
+            # batch session: keep the camera running and collect every distinct DR
+            self._add_to_manifest(data)
+            return
         if self.scanner_input.text() != data:
             print(f"QR Code Detected: {data}")
             self.scanner_input.setText(data)
@@ -649,8 +561,11 @@ class ProductDeliveryPage(QWidget):
         scan_control_layout = QHBoxLayout()
         self.toggle_camera_btn = QPushButton(fa.icon('fa5s.play', color=ICON_COLOR), "Start Camera")
         self.toggle_camera_btn.setStyleSheet(LIGHT_BUTTON_STYLE)
+        self.batch_mode_check = QCheckBox("Batch Dispatch Mode (keep scanning)")
+        self.batch_mode_check.setToolTip("Collect many DRs into a manifest and commit them in one step.")
         scan_control_layout.addStretch()
         scan_control_layout.addWidget(self.toggle_camera_btn)
+        scan_control_layout.addWidget(self.batch_mode_check)
         scan_control_layout.addStretch()
         camera_layout.addLayout(scan_control_layout)
         layout.addWidget(camera_group, 1)
@@ -676,6 +591,11 @@ class ProductDeliveryPage(QWidget):
             self.camera_view_label.setText(
                 "Could not import OpenCV or PyZBar.\n\nPlease install them using:\npip install opencv-python pyzbar numpy")
         layout.addWidget(scan_group)
+        self.dispatch_panel = DispatchManifestPanel(self.engine, self.username, self.log_audit_trail)
+        self.dispatch_panel.setVisible(False)
+        self.dispatch_panel.committed.connect(self._on_dispatch_committed)
+        self.batch_mode_check.toggled.connect(self.dispatch_panel.setVisible)
+        layout.addWidget(self.dispatch_panel, 1)
         log_group = QGroupBox("Recently Scanned (This Session)")
         log_layout = QVBoxLayout(log_group)
         self.scanner_log_table = QTableWidget()
@@ -698,6 +618,24 @@ class ProductDeliveryPage(QWidget):
     def _clear_scanner_log(self):
         self.scanner_log_table.setRowCount(0)
 
+    def _add_to_manifest(self, dr_no: str):
+        if self.dispatch_panel.add_scan(dr_no):
+            self.scanner_status_label.setText(f"<font color='blue'>Status: DR #{dr_no.upper()} added to manifest.</font>")
+        else:
+            self.scanner_status_label.setText(f"<font color='orange'>Status: DR #{dr_no.upper()} is already in the manifest.</font>")
+        self.scanner_input.clear()
+
+    def _on_dispatch_committed(self, dr_nos: list):
+        scan_time = QDateTime.currentDateTime().toString("hh:mm:ss AP")
+        for dr_no in dr_nos:
+            self.scanner_log_table.insertRow(0)
+            self.scanner_log_table.setItem(0, 0, QTableWidgetItem(scan_time))
+            self.scanner_log_table.setItem(0, 1, QTableWidgetItem(dr_no))
+            self.scanner_log_table.setItem(0, 2, QTableWidgetItem(DISPATCH_STATUS))
+        self.scanner_status_label.setText(f"<font color='green'>Status: {len(dr_nos)} DR(s) dispatched.</font>")
+        if self.tab_widget.tabText(self.tab_widget.currentIndex()) == "Delivery Tracking":
+            self._load_tracking_data()
+
     def _setup_lot_breakdown_tab(self, tab):
         layout = QVBoxLayout(tab)
         main_splitter = QSplitter(Qt.Orientation.Horizontal)
@@ -813,9 +751,11 @@ class ProductDeliveryPage(QWidget):
         self.update_btn = QPushButton(fa.icon('fa5s.pencil-alt', color=ICON_COLOR), "Load Selected for Update")
         self.delete_btn = QPushButton(fa.icon('fa5s.trash-alt', color='#e63946'), "Delete Selected")
         self.delete_btn.setObjectName("DeleteButton")
+        batch_print_btn = QPushButton(fa.icon('fa5s.print', color=ICON_COLOR), "Batch Print...")
         top_layout.addWidget(refresh_btn)
         top_layout.addWidget(self.update_btn)
         top_layout.addWidget(self.delete_btn)
+        top_layout.addWidget(batch_print_btn)
         layout.addLayout(top_layout)
         self.records_table = QTableWidget(editTriggers=QAbstractItemView.EditTrigger.NoEditTriggers,
                                           alternatingRowColors=False,
@@ -844,6 +784,7 @@ class ProductDeliveryPage(QWidget):
         refresh_btn.clicked.connect(self._load_all_records)
         self.update_btn.clicked.connect(self._load_record_for_update)
         self.delete_btn.clicked.connect(self._delete_record)
+        batch_print_btn.clicked.connect(self._open_batch_print)
         self.records_table.doubleClicked.connect(self._load_record_for_update)
         self.records_table.customContextMenuRequested.connect(self._show_records_table_context_menu)
         self.records_table.itemSelectionChanged.connect(self._on_record_selection_changed)
@@ -1127,9 +1068,9 @@ class ProductDeliveryPage(QWidget):
             return
         dr_type = self.dr_type_combo.currentText()
         if dr_type == "Terumo DR":
-            dialog = TerumoItemEntryDialog(self.engine, self.unit_list, self.prod_code_list, parent=self)
+            dialog = TerumoItemEntryDialog(self.engine, self.unit_list, parent=self)
         else:
-            dialog = StandardItemEntryDialog(self.engine, self.unit_list, self.prod_code_list, parent=self)
+            dialog = StandardItemEntryDialog(self.engine, self.unit_list, parent=self)
         if dialog.exec():
             item_data = dialog.get_item_data()
             if 'lot_numbers_text' in item_data:
@@ -1150,10 +1091,10 @@ class ProductDeliveryPage(QWidget):
         current_data = self._get_item_data_from_row(selected[0].row())
         dr_type = self.dr_type_combo.currentText()
         if dr_type == "Terumo DR":
-            dialog = TerumoItemEntryDialog(self.engine, self.unit_list, self.prod_code_list, item_data=current_data,
+            dialog = TerumoItemEntryDialog(self.engine, self.unit_list, item_data=current_data,
                                            parent=self)
         else:
-            dialog = StandardItemEntryDialog(self.engine, self.unit_list, self.prod_code_list, item_data=current_data,
+            dialog = StandardItemEntryDialog(self.engine, self.unit_list, item_data=current_data,
                                              parent=self)
         if dialog.exec():
             item_data = dialog.get_item_data()
@@ -1257,16 +1198,8 @@ class ProductDeliveryPage(QWidget):
 
     def _load_combobox_data(self):
         try:
-            with self.engine.connect() as conn:
-                customers = conn.execute(
-                    text("SELECT name FROM customers WHERE is_deleted IS NOT TRUE ORDER BY name")).scalars().all()
-                self.unit_list = conn.execute(text("SELECT name FROM units ORDER BY name")).scalars().all()
-                self.prod_code_list = conn.execute(text(
-                    "SELECT DISTINCT prod_code FROM legacy_production WHERE prod_code IS NOT NULL AND prod_code != '' ORDER BY prod_code")).scalars().all()
-            current_customer = self.customer_combo.currentText()
-            self.customer_combo.clear()
-            self.customer_combo.addItems([""] + customers)
-            if current_customer in customers: self.customer_combo.setCurrentText(current_customer)
+            bind_reference_combo(self.customer_combo, self.engine, 'customers')
+            self.unit_list = reference_values(self.engine, 'units')
         except Exception as e:
             QMessageBox.critical(self, "DB Error", f"Could not load combobox data: {e}")
 
@@ -1279,6 +1212,7 @@ class ProductDeliveryPage(QWidget):
                 with self.engine.connect() as conn, conn.begin():
                     conn.execute(text("INSERT INTO units (name) VALUES (:name) ON CONFLICT (name) DO NOTHING"),
                                  {"name": unit_name})
+                invalidate_reference('units')
                 QMessageBox.information(self, "Success", f"Unit '{unit_name}' has been added.")
                 self.log_audit_trail("ADD_UNIT", f"Added new unit: {unit_name}")
                 self._load_combobox_data()
@@ -1289,10 +1223,7 @@ class ProductDeliveryPage(QWidget):
         if not self.customer_combo.currentText() or self.items_table.rowCount() == 0:
             QMessageBox.warning(self, "Input Error", "Customer and at least one item are required.")
             return
-        dr_no = self.current_editing_dr_no or self.dr_no_edit.text()
-        if not dr_no:
-            QMessageBox.warning(self, "Input Error", "Cannot save record without a valid DR Number.")
-            return
+        dr_no = self.current_editing_dr_no  # new DRs are numbered inside the save transaction
         primary_data = {"dr_no": dr_no, "dr_type": self.dr_type_combo.currentText(),
                         "delivery_date": self.delivery_date_edit.date().toPyDate(),
                         "customer_name": self.customer_combo.currentText(),
@@ -1303,9 +1234,11 @@ class ProductDeliveryPage(QWidget):
                         "encoded_by": self.username, "encoded_on": datetime.now(), "edited_by": self.username,
                         "edited_on": datetime.now()}
         items_data = [self._get_item_data_from_row(row) for row in range(self.items_table.rowCount())]
-        for item in items_data: item['dr_no'] = dr_no
         try:
             with self.engine.connect() as conn, conn.begin():
+                if not self.current_editing_dr_no:
+                    dr_no = primary_data['dr_no'] = next_document_number(conn, 'DR')
+                for item in items_data: item['dr_no'] = dr_no
                 if self.current_editing_dr_no:
                     del primary_data['encoded_by'], primary_data['encoded_on']
                     update_query = text(
@@ -1439,35 +1372,7 @@ class ProductDeliveryPage(QWidget):
             if ok and password == 'Itadmin':
                 try:
                     with self.engine.connect() as conn, conn.begin():
-                        primary_data = conn.execute(
-                            text("SELECT delivery_date FROM product_delivery_primary WHERE dr_no = :dr"),
-                            {"dr": dr_no}).mappings().one()
-                        breakdown_data = conn.execute(text(
-                            "SELECT lot_number, product_code, quantity_kg FROM product_delivery_lot_breakdown WHERE dr_no = :dr"),
-                            {"dr": dr_no}).mappings().all()
-
-                        conn.execute(text(
-                            "UPDATE product_delivery_primary SET is_deleted = TRUE, edited_by = :u, edited_on = :n WHERE dr_no = :dr"),
-                            {"u": self.username, "n": datetime.now(), "dr": dr_no})
-                        conn.execute(text(
-                            "DELETE FROM transactions WHERE source_ref_no = :dr AND transaction_type = 'DELIVERY'"),
-                            {"dr": dr_no})
-                        reversal_transactions = []
-                        for item in breakdown_data:
-                            reversal_transactions.append({
-                                "date": primary_data['delivery_date'], "type": "DELIVERY_DELETED (RETURN)",
-                                "ref": dr_no,
-                                "pcode": item['product_code'], "lot": item['lot_number'],
-                                "qty_in": item['quantity_kg'],
-                                "qty_out": 0,
-                                "unit": "KG.", "user": self.username,
-                                "encoded_on": datetime.now(),
-                                "remarks": f"Stock returned on deletion of DR {dr_no}"
-                            })
-                        if reversal_transactions:
-                            conn.execute(text("""INSERT INTO transactions (transaction_date, transaction_type, source_ref_no, product_code, lot_number, quantity_in, quantity_out, unit, encoded_by, encoded_on, remarks)
-                                                 VALUES (:date, :type, :ref, :pcode, :lot, :qty_in, :qty_out, :unit, :user, :encoded_on, :remarks)"""),
-                                         reversal_transactions)
+                        soft_delete_document(conn, 'DR', dr_no, self.username)
 
                     self.log_audit_trail("DELETE_DELIVERY",
                                          f"Soft-deleted DR: {dr_no} and reversed inventory transactions.")
@@ -1486,34 +1391,23 @@ class ProductDeliveryPage(QWidget):
                                 f"Restore DR No: <b>{dr_no}</b>?") == QMessageBox.StandardButton.Yes:
             try:
                 with self.engine.connect() as conn, conn.begin():
-                    primary_data = conn.execute(
-                        text("SELECT delivery_date FROM product_delivery_primary WHERE dr_no = :dr"),
-                        {"dr": dr_no}).mappings().one()
-                    breakdown_data = conn.execute(
-                        text(
-                            "SELECT lot_number, product_code, quantity_kg FROM product_delivery_lot_breakdown WHERE dr_no = :dr"),
-                        {"dr": dr_no}).mappings().all()
-
-                    conn.execute(text(
-                        "UPDATE product_delivery_primary SET is_deleted = FALSE, edited_by = :u, edited_on = :n WHERE dr_no = :dr"),
-                        {"u": self.username, "n": datetime.now(), "dr": dr_no})
-                    conn.execute(text(
-                        "DELETE FROM transactions WHERE source_ref_no = :dr AND transaction_type LIKE '%DELETED%'"),
-                        {"dr": dr_no})
-                    original_transactions = []
-                    for item in breakdown_data:
-                        original_transactions.append({
-                            "date": primary_data['delivery_date'], "type": "DELIVERY", "ref": dr_no,
-                            "pcode": item['product_code'],
-                            "lot": item['lot_number'], "qty_in": 0, "qty_out": item['quantity_kg'], "unit": "KG.",
-                            "user": self.username,
-                            "encoded_on": datetime.now(),
-                            "remarks": f"Delivery for DR {dr_no} (Restored)"
-                        })
-                    if original_transactions:
-                        conn.execute(text("""INSERT INTO transactions (transaction_date, transaction_type, source_ref_no, product_code, lot_number, quantity_in, quantity_out, unit, encoded_by, encoded_on, remarks)
-                                             VALUES (:date, :type, :ref, :pcode, :lot, :qty_in, :qty_out, :unit, :user, :encoded_on, :remarks)"""),
-                                     original_transactions)
+                    if not restore_document(conn, 'DR', dr_no, self.username):
+                        # Deleted before deleted_ledger_rows existed: rebuild its transactions
+                        primary_data = conn.execute(
+                            text("SELECT delivery_date FROM product_delivery_primary WHERE dr_no = :dr"),
+                            {"dr": dr_no}).mappings().one()
+                        breakdown_data = conn.execute(
+                            text(
+                                "SELECT lot_number, product_code, quantity_kg FROM product_delivery_lot_breakdown WHERE dr_no = :dr"),
+                            {"dr": dr_no}).mappings().all()
+                        ledger = LedgerWriter()
+                        for item in breakdown_data:
+                            ledger.add('transactions', LedgerRow(
+                                transaction_date=primary_data['delivery_date'], transaction_type="DELIVERY",
+                                source_ref_no=dr_no, product_code=item['product_code'], lot_number=item['lot_number'],
+                                quantity_out=item['quantity_kg'], encoded_by=self.username, encoded_on=datetime.now(),
+                                remarks=f"Delivery for DR {dr_no} (Restored)"))
+                        ledger.to_batch(SaveBatch(conn)).execute()
 
                 self.log_audit_trail("RESTORE_DELIVERY", f"Restored DR: {dr_no}")
                 QMessageBox.information(self, "Success", f"DR {dr_no} has been restored.")
@@ -1642,14 +1536,10 @@ class ProductDeliveryPage(QWidget):
         table.hideColumn(len(headers) - 1)
 
     def _get_next_dr_number(self):
+        """Preview for the entry form; the number itself is allocated when the DR is saved."""
         try:
             with self.engine.connect() as conn:
-                start_num_str = conn.execute(text(
-                    "SELECT setting_value FROM app_settings WHERE setting_key = 'DR_SEQUENCE_START'")).scalar_one_or_none()
-                start_num = int(start_num_str) if start_num_str and start_num_str.isdigit() else 100001
-                max_existing_dr = conn.execute(
-                    text("SELECT MAX(CAST(dr_no AS BIGINT)) FROM product_delivery_primary")).scalar_one_or_none() or 0
-                return str(max(max_existing_dr + 1, start_num))
+                return preview_document_number(conn, 'DR')
         except Exception as e:
             print(f"DB Warning (can be ignored on first run): Could not generate DR number: {e}")
             return "100001"
@@ -1822,33 +1712,18 @@ class ProductDeliveryPage(QWidget):
                 QMessageBox.warning(self, "Input Error",
                                     f"Invalid format for a single starting lot number: '{lot_input}'.\nExpected format is like '1234' or '1234AA'. No hyphens allowed.")
                 return None
-            start_match = re.match(r'^(\d+)([A-Z]*)$', lot_input.upper())
-            if start_match:
-                start_num, suffix, num_len = int(start_match.group(1)), start_match.group(2), len(start_match.group(1))
-                lot_list = [f"{str(start_num + i).zfill(num_len)}{suffix}" for i in range(num_lots)]
-            else:
-                return None
-        num_full_lots = int(target_qty // weight_per_lot)
-        remainder_qty = target_qty % weight_per_lot
-        breakdown_items = [{'lot_number': lot_list[i], 'quantity_kg': weight_per_lot} for i in range(num_full_lots)]
-        if remainder_qty > 0:
-            breakdown_items.append({'lot_number': lot_list[num_full_lots], 'quantity_kg': remainder_qty})
-        return breakdown_items
+            lot_list = lot_sequence(lot_input, num_lots)
+        try:
+            return fill_lots(lot_list, target_qty, weight_per_lot)
+        except LotRangeTooSmall as e:
+            QMessageBox.warning(self, "Mismatch Error",
+                                f"The quantity needs {e.needed} lots but only {e.available} lot numbers were generated.")
+            return None
 
     def _parse_lot_range(self, lot_input):
         try:
-            parts = [s.strip().upper() for s in lot_input.split('-')]
-            if len(parts) != 2: raise ValueError("Lot range must contain exactly one hyphen.")
-            start_str, end_str = parts
-            start_match = re.match(r'^(\d+)([A-Z]*)$', start_str)
-            end_match = re.match(r'^(\d+)([A-Z]*)$', end_str)
-            if not start_match or not end_match or start_match.group(2) != end_match.group(2):
-                raise ValueError("Format invalid or suffixes mismatch. Expected: '100A-105A'.")
-            start_num, end_num, suffix, num_len = int(start_match.group(1)), int(end_match.group(1)), start_match.group(
-                2), len(start_match.group(1))
-            if start_num > end_num: raise ValueError("Start lot cannot be greater than end lot.")
-            return [f"{str(start_num + i).zfill(num_len)}{suffix}" for i in range(end_num - start_num + 1)]
-        except Exception as e:
+            return expand_lot_range(lot_input)
+        except LotRangeError as e:
             QMessageBox.critical(self, "Lot Range Error", f"Could not parse lot range '{lot_input}': {e}")
             return None
 
@@ -1986,9 +1861,6 @@ class ProductDeliveryPage(QWidget):
                 conn.execute(
                     text("DELETE FROM product_delivery_lot_breakdown WHERE dr_no = :dr_no"),
                     delete_params)
-                conn.execute(
-                    text("DELETE FROM transactions WHERE source_ref_no = :dr_no AND transaction_type = 'DELIVERY'"),
-                    delete_params)
 
                 insert_data = [
                     {
@@ -2004,21 +1876,17 @@ class ProductDeliveryPage(QWidget):
                         "INSERT INTO product_delivery_lot_breakdown (dr_no, product_code, lot_number, quantity_kg) VALUES (:dr_no, :product_code, :lot_number, :quantity_kg)"),
                         insert_data)
 
-                transactions = []
+                # Replaces the DR's DELIVERY rows; only lots that changed are rewritten
+                ledger = LedgerWriter()
                 current_time = datetime.now()
                 for item in items_to_save:
-                    transactions.append({
-                        "date": primary_data['delivery_date'], "type": "DELIVERY", "ref": dr_no,
-                        "pcode": item['product_code'],
-                        "lot": item['lot_number'], "qty_in": 0, "qty_out": item['quantity_kg'], "unit": "KG.",
-                        "user": self.username,
-                        "encoded_on": current_time,
-                        "remarks": f"Delivery for DR {dr_no}"
-                    })
-                if transactions:
-                    conn.execute(text("""INSERT INTO transactions (transaction_date, transaction_type, source_ref_no, product_code, lot_number, quantity_in, quantity_out, unit, encoded_by, encoded_on, remarks)
-                                         VALUES (:date, :type, :ref, :pcode, :lot, :qty_in, :qty_out, :unit, :user, :encoded_on, :remarks)"""),
-                                 transactions)
+                    ledger.add('transactions', LedgerRow(
+                        transaction_date=primary_data['delivery_date'], transaction_type="DELIVERY", source_ref_no=dr_no,
+                        product_code=item['product_code'], lot_number=item['lot_number'],
+                        quantity_out=item['quantity_kg'], encoded_by=self.username, encoded_on=current_time,
+                        remarks=f"Delivery for DR {dr_no}"))
+                ledger.replace(dr_no, ('transactions',), ('DELIVERY',))
+                ledger.to_batch(SaveBatch(conn)).execute()
 
                 self.log_audit_trail("SAVE_LOT_BREAKDOWN",
                                      f"Saved/Replaced entire breakdown for DR: {dr_no}")
@@ -2249,8 +2117,11 @@ class ProductDeliveryPage(QWidget):
         if not dr_no:
             self.scanner_status_label.setText("<font color='orange'>Status: Input is empty.</font>")
             return
+        if self.batch_mode_check.isChecked():
+            self._add_to_manifest(dr_no)
+            return
         self.scanner_status_label.setText(f"<font color='blue'>Status: Verifying DR #{dr_no}...</font>")
-        status_to_set = "Out for Delivery"
+        status_to_set = DISPATCH_STATUS
         try:
             with self.engine.connect() as conn:
                 with conn.begin():
@@ -2335,7 +2206,9 @@ class ProductDeliveryPage(QWidget):
         preview = QPrintPreviewDialog(self.printer, self)
         preview.paintRequested.connect(self._handle_paint_request)
         preview.resize(1000, 800)
-        if preview.exec():
+        accepted = preview.exec()
+        release_pdf(self.current_pdf_buffer)
+        if accepted:
             try:
                 with self.engine.connect() as conn, conn.begin():
                     conn.execute(text(
@@ -2346,181 +2219,23 @@ class ProductDeliveryPage(QWidget):
             except Exception as e:
                 QMessageBox.critical(self, "Database Error", f"Could not mark record as printed: {e}")
 
-    def _draw_dr_page_template(self, canvas, doc, footer_table):
-        canvas.saveState()
-        page_width, page_height = doc.pagesize
-        footer_w, footer_h = footer_table.wrapOn(canvas, doc.width, doc.bottomMargin)
-        footer_table.drawOn(canvas, doc.leftMargin, 0.25 * inch)
-        canvas.restoreState()
+    def _open_batch_print(self):
+        BatchPrintDialog(self.engine, self.username, self.log_audit_trail, DOC_DR, self).exec()
+        self._load_all_records()
 
     def _generate_reportlab_pdf(self, primary_data, items_data):
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=(8.5 * inch, 6.5 * inch), topMargin=0.25 * inch,
-                                bottomMargin=1.8 * inch, leftMargin=0.25 * inch, rightMargin=0.25 * inch)
-        qr_img = qrcode.make(primary_data['dr_no']);
-        qr_buffer = io.BytesIO()
-        qr_img.save(qr_buffer, format='PNG');
-        qr_buffer.seek(0)
-        reportlab_qr = ReportLabImage(qr_buffer, width=0.8 * inch, height=0.8 * inch)
-        try:
-            # IMPORTANT: Ensure 'arial.ttf' and 'arialbd.ttf' are in the same directory as your script
-            pdfmetrics.registerFont(TTFont('Arial', 'arial.ttf'));
-            pdfmetrics.registerFont(TTFont('Arial-Bold', 'arialbd.ttf'))
-            FONT_NORMAL, FONT_BOLD = 'Arial', 'Arial-Bold'
-        except Exception:
-            print("Arial font not found. Falling back to Helvetica.")
-            FONT_NORMAL, FONT_BOLD = 'Helvetica', 'Helvetica-Bold'
-        styles = getSampleStyleSheet()
-        styles.add(ParagraphStyle(name='DRTitle', fontName=FONT_BOLD, fontSize=14, alignment=TA_LEFT))
-        styles.add(ParagraphStyle(name='DRLabel', fontName=FONT_NORMAL, fontSize=10, alignment=TA_LEFT))
-        styles.add(ParagraphStyle(name='DRNumber', fontName=FONT_BOLD, fontSize=16, alignment=TA_LEFT))
-        styles.add(ParagraphStyle(name='DRData', fontName=FONT_NORMAL, fontSize=10, alignment=TA_LEFT))
-        styles.add(ParagraphStyle(name='CustomerData', fontName=FONT_BOLD, fontSize=12, leading=12))
-        styles.add(ParagraphStyle(name='CustomerData2', fontName=FONT_BOLD, fontSize=10, leading=12))
-        styles.add(ParagraphStyle(name='ItemHeader', fontName=FONT_BOLD, fontSize=9, alignment=TA_CENTER))
-        styles.add(ParagraphStyle(name='ItemText', fontName=FONT_NORMAL, fontSize=10, alignment=TA_CENTER))
-        styles.add(ParagraphStyle(name='ItemTextRight', parent=styles['ItemText'], alignment=TA_RIGHT))
-        styles.add(ParagraphStyle(name='ItemDesc', fontName=FONT_BOLD, fontSize=10, leading=11))
-        styles.add(ParagraphStyle(name='NothingFollows', fontName=FONT_BOLD, fontSize=9, alignment=TA_CENTER))
-        styles.add(ParagraphStyle(name='FooterText', fontName=FONT_NORMAL, fontSize=9))
-        styles.add(ParagraphStyle(name='Footerby', fontName=FONT_NORMAL, fontSize=9, alignment=TA_LEFT, leading=10))
-        styles.add(ParagraphStyle(name='ImportantText', fontName=FONT_NORMAL, fontSize=7, leading=8))
-        received_by_text = "Received the above items in good order and condition.<br/><br/>By: _____________________________<br/><font size=8>Signature over printed Name/Date</font>"
-        important_text = "IMPORTANT: Merchandise described in this Delivery Receipt remains the property of MASTERBATCH PHILIPPINES, INC. until fully paid. Interest of 18% per annum is to be charged on all overdue accounts. An additional sum equal to 25% of the amount will be charged by the vendor or attorney's fees and cost of collection in case of suit. Parties expressly submit themselves to the jurisdiction of the courts of MANILA in any legal action arising from the transaction."
-        full_footer_data = [[Paragraph(received_by_text, styles['Footerby']),
-                             Paragraph("Delivery Time In: ________________", styles['FooterText']),
-                             Paragraph("Delivery Time Out: ________________", styles['FooterText'])],
-                            [Paragraph(important_text, styles['ImportantText']), '', '']]
-        full_footer_table = Table(full_footer_data, colWidths=[3.0 * inch, 2.5 * inch, 2.5 * inch],
-                                  rowHeights=[0.8 * inch, None])
-        full_footer_table.setStyle(TableStyle(
-            [('VALIGN', (0, 0), (-1, 0), 'TOP'), ('SPAN', (0, 1), (2, 1)), ('TOPPADDING', (0, 1), (-1, 1), 10)]))
-        Story = []
-        left_header_text = "<b>MASTERBATCH PHILIPPINES INC.</b><br/><font size='9'>24 Diamond Road Caloocan Industrial Subdivision, Bo. Kaybiga, Caloocan City, Philippines</font><br/><font size='9'>Tel. Nos.: 8935-9579 / 7758-1207 Telefax: 8374-7085</font><br/><font size='9'>TIN NO.: 238-034-470-000</font>"
-        left_header = Paragraph(left_header_text, styles['CustomerData'])
-
-        right_header_top_table = Table([[Paragraph("DELIVERY RECEIPT", styles['DRTitle']), reportlab_qr]],
-                                       colWidths=[2.0 * inch, 1.2 * inch], style=[('VALIGN', (0, 0), (-1, -1), 'TOP')])
-
-        right_header_data = [[right_header_top_table], [Table(
-            [[Paragraph("No.:", styles['DRLabel']), Paragraph(primary_data['dr_no'], styles['DRNumber'])],
-             [Paragraph("Delivery Date:", styles['DRLabel']),
-              Paragraph(primary_data['delivery_date'], styles['DRData'])],
-             [Paragraph("PO No.:", styles['DRLabel']), Paragraph(primary_data['po_no'], styles['DRData'])],
-             [Paragraph("Terms of Payment:", styles['DRLabel']), '']], colWidths=[1.1 * inch, 1.8 * inch],
-            style=[('VALIGN', (0, 0), (-1, -1), 'MIDDLE')])]]
-        right_header_table = Table(right_header_data, rowHeights=[0.4 * inch, 0.8 * inch]);
-        right_header_table.setStyle(TableStyle([('VALIGN', (0, 0), (-1, -1), 'TOP')]))
-        header_table = Table([[left_header, right_header_table]], colWidths=[4.8 * inch, 3.2 * inch],
-                             style=[('VALIGN', (0, 0), (-1, -1), 'TOP')])
-        Story.append(header_table);
-        Story.append(Spacer(1, 0.1 * inch))
-        address_html = primary_data.get('address', '').replace('\n', '<br/>')
-        customer_info_text = f"<font size=9>Customer's Name/Address</font><br/><b>Charge to: &nbsp;&nbsp;&nbsp;{primary_data['charge_to']}</b><br/><b>Deliver to: &nbsp;&nbsp;{primary_data['deliver_to']}</b><br/><b>Address: &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;{address_html}</b>"
-        Story.append(Paragraph(customer_info_text, styles['CustomerData2']));
-        Story.append(Spacer(1, 0.15 * inch))
-        table_data = [[Paragraph("QUANTITY", styles['ItemHeader']), Paragraph("UNIT", styles['ItemHeader']),
-                       Paragraph("DESCRIPTION", styles['ItemHeader']), Paragraph("UNIT PRICE", styles['ItemHeader']),
-                       Paragraph("AMOUNT", styles['ItemHeader'])]]
-        for item_row in items_data:
-            item = dict(item_row)
-            desc_parts = []
-            with self.engine.connect() as conn:
-                alias_info = conn.execute(
-                    text("SELECT alias_code, description FROM product_aliases WHERE product_code = :pc"),
-                    {"pc": item.get('product_code', '')}).mappings().first()
-            if alias_info:
-                first_line = f"{alias_info['alias_code']} {alias_info['description']}".strip()
-            else:
-                desc1 = item.get('description_1', '').strip()
-                desc2 = item.get('description_2', '').strip()
-                if desc1 or desc2:
-                    first_line = desc1 + (" " + desc2 if desc2 else "")
-                else:
-                    first_line = f"{item.get('product_code', '')} {item.get('product_color', '')}".strip()
-
-            if first_line: desc_parts.append(first_line)
-            no_packing_str = str(item.get('no_of_packing', '0') or '0')
-            try:
-                if float(no_packing_str) > 0: desc_parts.append(
-                    f"{no_packing_str} Bag(s) by {item.get('weight_per_pack')} KG.")
-            except (ValueError, TypeError):
-                pass
-            if lot1 := item.get('lot_no_1'): desc_parts.append(lot1)
-            if lot2 := item.get('lot_no_2'): desc_parts.append(lot2)
-            if lot3 := item.get('lot_no_3'): desc_parts.append(lot3)
-            if attachments := item.get('attachments'):
-                attachment_lines = [line.strip() for line in attachments.split('\n') if line.strip()]
-                desc_parts.extend(attachment_lines)
-            desc = "<br/>".join(p for p in desc_parts if p)
-            unit_price_val, quantity_val = item.get('unit_price'), item.get('quantity')
-
-            unit_price_str = f"{float(unit_price_val):,.2f}" if unit_price_val is not None else ""
-            quantity_str = f"{float(quantity_val):,.2f}" if quantity_val is not None else ""
-            amount_str = ""
-            if unit_price_val is not None and quantity_val is not None:
-                try:
-                    amount = float(unit_price_val) * float(quantity_val);
-                    amount_str = f"{amount:,.2f}"
-                except (ValueError, TypeError):
-                    amount_str = ""
-            table_data.append(
-                [Paragraph(quantity_str, styles['ItemTextRight']), Paragraph(item.get('unit', ''), styles['ItemText']),
-                 Paragraph(desc, styles['ItemDesc']), Paragraph(unit_price_str, styles['ItemTextRight']),
-                 Paragraph(amount_str, styles['ItemTextRight'])])
-        items_table = Table(table_data, colWidths=[1.0 * inch, 0.5 * inch, 4.0 * inch, 1.2 * inch, 1.3 * inch],
-                            repeatRows=1)
-        items_table.setStyle(TableStyle(
-            [('VALIGN', (0, 0), (-1, -1), 'TOP'), ('LINEBELOW', (0, 0), (-1, 0), 1, colors.black),
-             ('LEFTPADDING', (0, 0), (-1, -1), 4), ('RIGHTPADDING', (0, 0), (-1, -1), 4)]))
-        Story.append(items_table);
-        Story.append(Spacer(1, 0.1 * inch))
-        Story.append(Paragraph("******************** NOTHING FOLLOWS ********************", styles['NothingFollows']))
-        page_template_drawer = partial(self._draw_dr_page_template, footer_table=full_footer_table)
-        doc.build(Story, onFirstPage=page_template_drawer, onLaterPages=page_template_drawer)
-        buffer.seek(0)
-        return buffer
+        with self.engine.connect() as conn:
+            alias_map = fetch_alias_map(conn, [dict(item).get('product_code') for item in items_data])
+        return build_delivery_receipt_pdf(primary_data, items_data, alias_map)
 
     def _handle_paint_request(self, printer: QPrinter):
         if not self.current_pdf_buffer:
             return
-
-        painter = QPainter()
-        if not painter.begin(printer):
-            QMessageBox.critical(self, "Print Error", "Could not initialize painter.")
-            return
-
         try:
-            self.current_pdf_buffer.seek(0)
-            pdf_doc = fitz.open(stream=self.current_pdf_buffer, filetype="pdf")
-
-            # Use a high DPI for crisp, high-quality rendering. 600 is excellent for most printers.
-            dpi = 600
-            zoom = dpi / 72.0  # PDF standard DPI is 72
-            mat = fitz.Matrix(zoom, zoom)
-
-            # Get the printer's drawing area in pixels
-            page_rect_pixels = printer.pageRect(QPrinter.Unit.DevicePixel)
-
-            for i, page in enumerate(pdf_doc):
-                if i > 0:
-                    printer.newPage()
-
-                # Render the PDF page to a high-resolution pixmap (image)
-                pix = page.get_pixmap(matrix=mat, alpha=False)
-
-                # Convert the pixmap to a QImage
-                image = QImage(pix.samples, pix.width, pix.height, pix.stride, QImage.Format.Format_RGB888)
-
-                # Draw the high-resolution image onto the printer's page
-                painter.drawImage(page_rect_pixels.toRect(), image, image.rect())
-
-            pdf_doc.close()
+            # Previews come from the render cache; the 600 DPI raster is only produced for the real printer.
+            paint_pdf(printer, self.current_pdf_buffer, print_dpi=600)
         except Exception as e:
             QMessageBox.critical(self, "Print Error", f"An error occurred during printing: {e}")
-        finally:
-            painter.end()
-
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
@@ -2542,6 +2257,8 @@ if __name__ == "__main__":
             conn.execute(text("CREATE TABLE legacy_production (prod_code TEXT, prod_color TEXT);"))
             conn.execute(
                 text("CREATE TABLE product_aliases (product_code TEXT UNIQUE, alias_code TEXT, description TEXT);"))
+            conn.execute(text(
+                "CREATE TABLE products (product_code TEXT PRIMARY KEY, fg_type TEXT, description TEXT, alias_code TEXT);"))
             conn.execute(text(
                 "CREATE TABLE delivery_tracking (dr_no TEXT UNIQUE, status TEXT, scanned_by TEXT, scanned_on TIMESTAMP);"))
             conn.execute(text("CREATE TABLE app_settings (setting_key TEXT UNIQUE, setting_value TEXT);"))
@@ -2552,6 +2269,7 @@ if __name__ == "__main__":
             conn.execute(text("INSERT INTO units (name) VALUES ('KG.'), ('PCS');"))
             conn.execute(text(
                 "INSERT INTO legacy_production (prod_code, prod_color) VALUES ('PROD-A', 'RED'), ('PROD-A', 'BLUE'), ('PROD-B', 'GREEN');"))
+            conn.execute(text("INSERT INTO products (product_code, fg_type) VALUES ('PROD-A', 'DC'), ('PROD-B', 'DC');"))
             conn.execute(
                 text("INSERT INTO app_settings (setting_key, setting_value) VALUES ('DR_SEQUENCE_START', '200001');"))
 
@@ -2592,6 +2310,7 @@ if __name__ == "__main__":
                 VALUES ('2024-05-01', 'DELIVERY', '100001', 'PROD-A', 'LOT100A', 20.0, 'KG.'),
                        ('2024-05-01', 'DELIVERY', '100001', 'PROD-A', 'LOT100B', 80.0, 'KG.');
             """))
+            ensure_document_counters(conn)
 
             conn.commit()
 
@@ -0,0 +1,134 @@
+"""
+The products master table: one row per finished-goods product code with its FG type (MB/DC), description and
+alias code.
+
+The product dropdowns used to list SELECT DISTINCT prod_code over legacy_production, i.e. sort and dedupe every
+lot ever produced on each load. products holds each code once, keyed and prefix-indexed, and is kept current by
+the production DBF sync and the FG endorsement save through register_products().
+
+The alias code / description pairs printed on Terumo and RITESEAL delivery items (formerly hard-coded in
+ProductDeliveryPage._get_special_descriptions) live here too; see product_descriptions().
+"""
+from sqlalchemy import text
+
+from reference_data import bump_reference_version, reference_values
+
+PRODUCTS_DDL = """
+    CREATE TABLE IF NOT EXISTS products (
+        product_code TEXT PRIMARY KEY,
+        fg_type VARCHAR(10),
+        description TEXT,
+        alias_code TEXT,
+        created_on TIMESTAMP NOT NULL DEFAULT NOW()
+    );
+"""
+
+PRODUCT_INDEXES = [
+    # LIKE 'ABC%' prefix searches for autocomplete; the primary key covers exact lookups.
+    "CREATE INDEX IF NOT EXISTS idx_products_code_prefix ON products (product_code text_pattern_ops);",
+    "CREATE INDEX IF NOT EXISTS idx_products_alias_code ON products (alias_code) WHERE alias_code IS NOT NULL;",
+]
+
+# product code -> (alias code, description) shown as description 1 / 2 on delivery items.
+SPECIAL_DESCRIPTIONS = {
+    "OA14430E": ("PL00X814MB", "MASTERBATCH ORANGE OA14430E"),
+    "TA14363E": ("PL00X816MB", "MASTERBATCH GRAY TA14363E"),
+    "GA14433E": ("PL00X818MB", "MASTERBATCH GREEN GA14433E"),
+    "BA14432E": ("PL00X822MB", "MASTERBATCH BLUE BA14432E"),
+    "YA14431E": ("PL00X620MB", "MASTERBATCH YELLOW YA14431E"),
+    "WA14429E": ("PL00X800MB", "MASTERBATCH WHITE WA14429E"),
+    "WA12282E": ("RITESEAL88", "WHITE(CODE: WA12282E)"), "BA12556E": ("RITESEAL88", "BLUE(CODE: BA12556E)"),
+    "WA15151E": ("RITESEAL88", "NATURAL(CODE: WA15151E)"), "WA7997E": ("RITESEAL88", "NATURAL(CODE: WA7997E)"),
+    "WA15229E": ("RITESEAL88", "NATURAL(CODE: WA15229E)"),
+    "WA15218E": ("RITESEAL88", "NATURAL(CODE: WA15229E)"),
+    "AD-17248E": ("L-4", "DISPERSING AGENT(CODE: AD-17248E)"), "DU-W17246E": ("R104", "(CODE: DU-W17246E)"),
+    "DU-W16441E": ("R104", "(CODE: DU-W16441E)"), "DU-LL16541E": ("LLPDE", "(CODE: DU-LL16541E)"),
+    "BA17070E": ("RITESEAL88", "BLUE(CODE: BA17070E)"),
+}
+
+FG_TYPE_SQL = "CASE WHEN {code} LIKE '%-%' THEN 'DC' ELSE 'MB' END"
+
+
+def fg_type_for(product_code: str) -> str:
+    """Same rule as the inventory reports: codes with a dash are DC, the rest MB."""
+    return 'DC' if '-' in product_code else 'MB'
+
+
+def normalize_code(product_code) -> str:
+    return str(product_code or '').strip().upper()
+
+
+def ensure_products(connection):
+    """Creates and seeds products. Run in a transaction, after legacy_production and product_aliases exist."""
+    connection.execute(text(PRODUCTS_DDL))
+    for ddl in PRODUCT_INDEXES:
+        connection.execute(text(ddl))
+
+    changed = 0
+    if connection.execute(text("SELECT NOT EXISTS (SELECT 1 FROM products)")).scalar():
+        # One-off backfill from the production history; afterwards the sync only adds new codes.
+        changed += connection.execute(text(f"""
+            INSERT INTO products (product_code, fg_type)
+            SELECT code, {FG_TYPE_SQL.format(code='code')}
+            FROM (SELECT DISTINCT UPPER(TRIM(prod_code)) AS code FROM legacy_production
+                  WHERE prod_code IS NOT NULL AND TRIM(prod_code) <> '') p
+            ON CONFLICT (product_code) DO NOTHING;
+        """)).rowcount
+
+    codes = list(SPECIAL_DESCRIPTIONS)
+    changed += connection.execute(text("""
+        INSERT INTO products (product_code, fg_type, description, alias_code)
+        SELECT * FROM UNNEST(CAST(:codes AS TEXT[]), CAST(:fg_types AS TEXT[]), CAST(:descriptions AS TEXT[]),
+                             CAST(:aliases AS TEXT[]))
+        ON CONFLICT (product_code) DO UPDATE SET description = EXCLUDED.description, alias_code = EXCLUDED.alias_code
+        WHERE products.description IS DISTINCT FROM EXCLUDED.description
+           OR products.alias_code IS DISTINCT FROM EXCLUDED.alias_code;
+    """), {"codes": codes, "fg_types": [fg_type_for(code) for code in codes],
+           "descriptions": [SPECIAL_DESCRIPTIONS[code][1] for code in codes],
+           "aliases": [SPECIAL_DESCRIPTIONS[code][0] for code in codes]}).rowcount
+    # Aliases maintained in product_aliases fill the products that have none yet.
+    changed += connection.execute(text(f"""
+        INSERT INTO products (product_code, fg_type, description, alias_code)
+        SELECT UPPER(TRIM(product_code)), {FG_TYPE_SQL.format(code='product_code')}, description, alias_code
+        FROM product_aliases WHERE product_code IS NOT NULL AND TRIM(product_code) <> ''
+        ON CONFLICT (product_code) DO UPDATE SET
+            description = COALESCE(products.description, EXCLUDED.description),
+            alias_code = COALESCE(products.alias_code, EXCLUDED.alias_code)
+        WHERE products.alias_code IS NULL AND (EXCLUDED.alias_code IS NOT NULL
+                                               OR (products.description IS NULL AND EXCLUDED.description IS NOT NULL));
+    """)).rowcount
+    # Only a seed that changed something invalidates the lists cached on the other workstations.
+    if changed:
+        bump_reference_version(connection, 'products')
+
+
+def register_products(connection, product_codes) -> int:
+    """
+    Adds the codes not yet in products, in one statement, inside the caller's transaction. The dropdown version
+    is bumped only when a code was new, so routine saves don't make every workstation reload the list.
+    """
+    codes = sorted({normalize_code(code) for code in product_codes} - {''})
+    if not codes:
+        return 0
+    added = connection.execute(text(f"""
+        INSERT INTO products (product_code, fg_type)
+        SELECT code, {FG_TYPE_SQL.format(code='code')} FROM UNNEST(CAST(:codes AS TEXT[])) AS t(code)
+        ON CONFLICT (product_code) DO NOTHING
+        RETURNING product_code;
+    """), {"codes": codes}).scalars().all()
+    if added:
+        bump_reference_version(connection, 'products')
+    return len(added)
+
+
+_descriptions = (None, {})  # (reference list it was built from, {code: (alias, description)})
+
+
+def product_descriptions(engine, product_code) -> dict:
+    """{'ter1': alias code, 'ter2': description} for a delivery item, empty strings when the product has none."""
+    global _descriptions
+    rows = reference_values(engine, 'product_aliases')
+    if _descriptions[0] is not rows:
+        _descriptions = (rows, {code: (alias, description) for code, alias, description in rows})
+    alias, description = _descriptions[1].get(normalize_code(product_code), ("", ""))
+    return {"ter1": alias or "", "ter2": description or ""}
@@ -1,5 +1,4 @@
 import sys
-import re
 from datetime import datetime, date
 from decimal import Decimal, InvalidOperation
 import traceback
@@ -17,6 +16,13 @@ from PyQt6.QtGui import QDoubleValidator
 # --- SQLAlchemy Imports ---
 from sqlalchemy import text, create_engine, inspect
 
+from document_counters import ensure_document_counters, next_document_number
+from endorsement_store import QCE_TABLES, SaveBatch, endorsement_batch
+from ledger import LedgerRow, LedgerWriter
+from lot_ranges import LotRangeError, expand_lot_range, next_lot_number
+from reference_data import bind_reference_combo, invalidate_reference
+from soft_delete import restore_document, soft_delete_document
+
 # --- Icon Library Import ---
 import qtawesome as fa
 
@@ -50,7 +56,7 @@ def create_db_engine():
         return engine
 
 
-def log_audit_trail_func(event, details):
+def log_audit_trail_func(event, details, batch=None):
     """Mock audit trail logging function."""
     now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     print(f"[AUDIT] {now} | User: {USERNAME} | Event: {event} | Details: {details}")
@@ -59,6 +65,7 @@ def log_audit_trail_func(event, details):
 def setup_mock_schema(engine):
     """Sets up a minimal mock schema for standalone testing."""
     with engine.connect() as conn:
+        ensure_document_counters(conn)
         conn.execute(text("""
             CREATE TABLE qce_endorsements_primary (
                 id INTEGER PRIMARY KEY, system_ref_no TEXT UNIQUE, form_ref_no TEXT, product_code TEXT, 
@@ -94,6 +101,8 @@ def setup_mock_schema(engine):
         conn.execute(text("INSERT INTO qce_endorsers (name) VALUES ('JOHN DOE') ON CONFLICT DO NOTHING;"))
         conn.execute(text("INSERT INTO legacy_production (prod_code) VALUES ('P100') ON CONFLICT DO NOTHING;"))
         conn.execute(text("INSERT INTO legacy_production (prod_code) VALUES ('P200') ON CONFLICT DO NOTHING;"))
+        conn.execute(text("CREATE TABLE products (product_code TEXT PRIMARY KEY, fg_type TEXT);"))
+        conn.execute(text("INSERT INTO products (product_code, fg_type) VALUES ('P100', 'MB'), ('P200', 'MB');"))
         conn.commit()
 
 
@@ -630,27 +639,19 @@ class QCExcessEndorsementPage(QWidget):
                 with self.engine.connect() as conn, conn.begin():
                     conn.execute(text(f"INSERT INTO {table_name} (name) VALUES (:name) ON CONFLICT (name) DO NOTHING"),
                                  {"name": new_item_text})
+                invalidate_reference(table_name)
                 self._load_combobox_data();
                 combo_to_update.setCurrentText(new_item_text)
             except Exception as e:
                 QMessageBox.critical(self, "Database Error", f"Could not add new record: {e}")
 
     def _load_combobox_data(self):
-        queries = {"endorsed_by_combo": "SELECT name FROM qce_endorsers ORDER BY name",
-                   "received_by_combo": "SELECT name FROM qce_receivers ORDER BY name",
-                   "bag_number_combo": "SELECT name FROM qce_bag_numbers ORDER BY name",
-                   "box_number_combo": "SELECT name FROM qce_box_numbers ORDER BY name",
-                   "remarks_combo": "SELECT name FROM qce_remarks ORDER BY name",
-                   "product_code_combo": "SELECT DISTINCT prod_code FROM legacy_production WHERE prod_code IS NOT NULL AND prod_code != '' ORDER BY prod_code"}
+        reference_keys = {"endorsed_by_combo": "qce_endorsers", "received_by_combo": "qce_receivers",
+                          "bag_number_combo": "qce_bag_numbers", "box_number_combo": "qce_box_numbers",
+                          "remarks_combo": "qce_remarks", "product_code_combo": "product_codes"}
         try:
-            with self.engine.connect() as conn:
-                for combo_name, query in queries.items():
-                    combo = getattr(self, combo_name)
-                    current_text = combo.currentText();
-                    items = conn.execute(text(query)).scalars().all();
-                    combo.clear();
-                    combo.addItems([""] + items)
-                    if current_text in items: combo.setCurrentText(current_text)
+            for combo_name, key in reference_keys.items():
+                bind_reference_combo(getattr(self, combo_name), self.engine, key)
         except Exception as e:
             if "no such table" not in str(e).lower():
                 QMessageBox.critical(self, "DB Error", f"Could not load dropdown data: {e}")
@@ -761,21 +762,12 @@ class QCExcessEndorsementPage(QWidget):
             excess_qty = total_qty - total_from_lots
 
             if excess_qty > 0:
-                last_full_lot = lot_list[-1]
-                match_last = re.match(r'^(\d+)([A-Z]*)$', last_full_lot)
-                if match_last:
-                    excess_lot_number = f"{str(int(match_last.group(1)) + 1).zfill(len(match_last.group(1)))}{match_last.group(2)}"
-                else:
-                    excess_lot_number = f"{last_full_lot}-EXCESS"
+                excess_lot_number = next_lot_number(lot_list[-1])
         else:
             # Simple excess, no range generation
             lot_list = []
             excess_qty = total_qty
-            match = re.match(r'^(\d+)([A-Z]*)$', lot_input.upper())
-            if match:
-                excess_lot_number = f"{str(int(match.group(1)) + 1).zfill(len(match.group(1)))}{match.group(2)}"
-            else:
-                excess_lot_number = f"{lot_input.upper()}-EXCESS" if lot_input else "EXCESS"
+            excess_lot_number = next_lot_number(lot_input.upper()) if lot_input else "EXCESS"
 
         return {"lots": lot_list, "excess_qty": excess_qty, "weight_per_lot": weight_per_lot,
                 "excess_lot_number": excess_lot_number}
@@ -784,7 +776,7 @@ class QCExcessEndorsementPage(QWidget):
         if not self.preview_data: QMessageBox.warning(self, "Preview Required",
                                                       "Please 'Preview Breakdown' before saving."); return
         is_update = self.current_editing_ref_no is not None
-        sys_ref_no = self.current_editing_ref_no if is_update else self._generate_ref_no()
+        sys_ref_no = self.current_editing_ref_no  # new endorsements are numbered inside the save transaction
         primary_data = {"system_ref_no": sys_ref_no, "form_ref_no": self.form_ref_no_edit.text().strip(),
                         "product_code": self.product_code_combo.currentText(),
                         "lot_number": self.lot_number_edit.text().strip(), "quantity_kg": self.quantity_edit.value(),
@@ -798,36 +790,25 @@ class QCExcessEndorsementPage(QWidget):
                         "encoded_on": datetime.now(), "edited_by": self.username, "edited_on": datetime.now()}
         try:
             with self.engine.connect() as conn, conn.begin():
+                if not is_update:
+                    sys_ref_no = primary_data["system_ref_no"] = self._generate_ref_no(conn)
+                lot_details = {k: primary_data[k] for k in ['bag_number', 'box_number', 'remarks']}
+                lots = {"qce_endorsements_secondary": [
+                    {'system_ref_no': sys_ref_no, 'lot_number': lot, 'quantity_kg': self.preview_data['weight_per_lot'],
+                     **lot_details} for lot in self.preview_data.get('lots') or []]}
+                if self.preview_data.get('excess_qty') > 0 and self.preview_data.get('excess_lot_number'):
+                    lots["qce_endorsements_excess"] = [
+                        {'system_ref_no': sys_ref_no, 'lot_number': self.preview_data['excess_lot_number'],
+                         'quantity_kg': self.preview_data['excess_qty'], **lot_details}]
+                batch = endorsement_batch(conn, QCE_TABLES, primary_data, lots,
+                                          self._inventory_transactions(primary_data, self.preview_data), is_update)
                 if is_update:
-                    conn.execute(text("DELETE FROM qce_endorsements_secondary WHERE system_ref_no = :ref"),
-                                 {"ref": sys_ref_no})
-                    conn.execute(text("DELETE FROM qce_endorsements_excess WHERE system_ref_no = :ref"),
-                                 {"ref": sys_ref_no})
-                    conn.execute(text(
-                        """UPDATE qce_endorsements_primary SET form_ref_no=:form_ref_no, product_code=:product_code, lot_number=:lot_number, quantity_kg=:quantity_kg, weight_per_lot=:weight_per_lot, status=:status, bag_number=:bag_number, box_number=:box_number, remarks=:remarks, date_endorsed=:date_endorsed, endorsed_by=:endorsed_by, date_received=:date_received, received_by=:received_by, edited_by=:edited_by, edited_on=:edited_on WHERE system_ref_no = :system_ref_no"""),
-                        primary_data)
                     action_text = "updated";
-                    self.log_audit_trail("UPDATE_QC_EXCESS", f"Updated QC Excess: {sys_ref_no}")
+                    self.log_audit_trail("UPDATE_QC_EXCESS", f"Updated QC Excess: {sys_ref_no}", batch=batch)
                 else:
-                    conn.execute(text(
-                        """INSERT INTO qce_endorsements_primary (system_ref_no, form_ref_no, product_code, lot_number, quantity_kg, weight_per_lot, status, bag_number, box_number, remarks, date_endorsed, endorsed_by, date_received, received_by, encoded_by, encoded_on, edited_by, edited_on) VALUES (:system_ref_no, :form_ref_no, :product_code, :lot_number, :quantity_kg, :weight_per_lot, :status, :bag_number, :box_number, :remarks, :date_endorsed, :endorsed_by, :date_received, :received_by, :encoded_by, :encoded_on, :edited_by, :edited_on)"""),
-                        primary_data)
                     action_text = "saved";
-                    self.log_audit_trail("CREATE_QC_EXCESS", f"Created QC Excess: {sys_ref_no}")
-                if self.preview_data.get('lots'):
-                    conn.execute(text(
-                        "INSERT INTO qce_endorsements_secondary (system_ref_no, lot_number, quantity_kg, bag_number, box_number, remarks) VALUES (:system_ref_no, :lot_number, :quantity_kg, :bag_number, :box_number, :remarks)"),
-                        [{'system_ref_no': sys_ref_no, 'lot_number': lot,
-                          'quantity_kg': self.preview_data['weight_per_lot'],
-                          **{k: primary_data[k] for k in ['bag_number', 'box_number', 'remarks']}} for lot in
-                         self.preview_data['lots']])
-                if self.preview_data.get('excess_qty') > 0 and self.preview_data.get('excess_lot_number'):
-                    conn.execute(text(
-                        "INSERT INTO qce_endorsements_excess (system_ref_no, lot_number, quantity_kg, bag_number, box_number, remarks) VALUES (:system_ref_no, :lot_number, :quantity_kg, :bag_number, :box_number, :remarks)"),
-                        [{'system_ref_no': sys_ref_no, 'lot_number': self.preview_data['excess_lot_number'],
-                          'quantity_kg': self.preview_data['excess_qty'],
-                          **{k: primary_data[k] for k in ['bag_number', 'box_number', 'remarks']}}])
-                self._create_inventory_transactions(conn, primary_data, self.preview_data)
+                    self.log_audit_trail("CREATE_QC_EXCESS", f"Created QC Excess: {sys_ref_no}", batch=batch)
+                batch.execute()
             QMessageBox.information(self, "Success", f"QC Excess Endorsement {sys_ref_no} {action_text} successfully.")
             self._clear_form();
             self._refresh_all_data_views();
@@ -836,35 +817,26 @@ class QCExcessEndorsementPage(QWidget):
             QMessageBox.critical(self, "Database Error", f"An error occurred: {e}");
             traceback.print_exc()
 
-    def _create_inventory_transactions(self, conn, primary_data, preview_data):
+    def _inventory_transactions(self, primary_data, preview_data):
+        """{ledger table: LedgerRows}: passed excess goes into FG stock, failed excess into failed stock."""
         sys_ref_no = primary_data['system_ref_no']
-        conn.execute(text("DELETE FROM transactions WHERE source_ref_no = :ref"), {"ref": sys_ref_no})
-        conn.execute(text("DELETE FROM failed_transactions WHERE source_ref_no = :ref"), {"ref": sys_ref_no})
         all_new_lots = ([{'lot_number': lot, 'quantity_kg': preview_data['weight_per_lot']} for lot in
                          preview_data['lots']] if preview_data.get('lots') else []) + ([{'lot_number': preview_data[
             'excess_lot_number'], 'quantity_kg': preview_data['excess_qty']}] if preview_data.get('excess_qty',
                                                                                                   0) > 0 and preview_data.get(
             'excess_lot_number') else [])
         if primary_data["status"] == "Passed":
-            if all_new_lots: conn.execute(text(
-                """INSERT INTO transactions (transaction_date, transaction_type, source_ref_no, product_code, lot_number, quantity_in, quantity_out, unit, warehouse, encoded_by, remarks) VALUES (:transaction_date, :transaction_type, :source_ref_no, :product_code, :lot_number, :quantity_in, 0, 'KG.', NULL, :encoded_by, :remarks)"""),
-                [{"transaction_date": primary_data["date_endorsed"],
-                  "transaction_type": "QC_EXCESS_IN_TO_FG", "source_ref_no": sys_ref_no,
-                  "product_code": primary_data["product_code"],
-                  "lot_number": lot["lot_number"], "quantity_in": lot["quantity_kg"],
-                  "encoded_by": self.username,
-                  "remarks": f"Excess passed QC. QCE No: {sys_ref_no}"} for lot in
-                 all_new_lots])
+            table, tx_type, outcome = "transactions", "QC_EXCESS_IN_TO_FG", "passed"
         elif primary_data["status"] == "Failed":
-            if all_new_lots: conn.execute(text(
-                """INSERT INTO failed_transactions (transaction_date, transaction_type, source_ref_no, product_code, lot_number, quantity_in, quantity_out, unit, warehouse, encoded_by, remarks) VALUES (:transaction_date, :transaction_type, :source_ref_no, :product_code, :lot_number, :quantity_in, 0, 'KG.', NULL, :encoded_by, :remarks)"""),
-                [{"transaction_date": primary_data["date_endorsed"],
-                  "transaction_type": "QC_EXCESS_IN_TO_FAILED", "source_ref_no": sys_ref_no,
-                  "product_code": primary_data["product_code"],
-                  "lot_number": lot["lot_number"], "quantity_in": lot["quantity_kg"],
-                  "encoded_by": self.username,
-                  "remarks": f"Excess failed QC. QCE No: {sys_ref_no}"} for lot in
-                 all_new_lots])
+            table, tx_type, outcome = "failed_transactions", "QC_EXCESS_IN_TO_FAILED", "failed"
+        else:
+            return {}
+        return {table: [LedgerRow(transaction_date=primary_data["date_endorsed"],
+                                  transaction_type=tx_type, source_ref_no=sys_ref_no,
+                                  product_code=primary_data["product_code"],
+                                  lot_number=lot["lot_number"], quantity_in=lot["quantity_kg"],
+                                  encoded_by=self.username,
+                                  remarks=f"Excess {outcome} QC. QCE No: {sys_ref_no}") for lot in all_new_lots]}
 
     def _load_all_records(self):
         search = f"%{self.search_edit.text()}%";
@@ -970,11 +942,7 @@ class QCExcessEndorsementPage(QWidget):
                                 f"Are you sure you want to delete endorsement <b>{ref_no}</b>? This will permanently delete its inventory records.") == QMessageBox.StandardButton.Yes:
             try:
                 with self.engine.connect() as conn, conn.begin():
-                    conn.execute(text(
-                        "UPDATE qce_endorsements_primary SET is_deleted = TRUE, edited_by = :user, edited_on = :now WHERE system_ref_no = :ref"),
-                        {"ref": ref_no, "user": self.username, "now": datetime.now()})
-                    conn.execute(text("DELETE FROM transactions WHERE source_ref_no = :ref"), {"ref": ref_no})
-                    conn.execute(text("DELETE FROM failed_transactions WHERE source_ref_no = :ref"), {"ref": ref_no})
+                    soft_delete_document(conn, 'QCE', ref_no, self.username)
                 self.log_audit_trail("DELETE_QC_EXCESS",
                                      f"Soft-deleted QC Excess: {ref_no} and deleted its inventory transactions.")
                 QMessageBox.information(self, "Success", f"Endorsement {ref_no} has been deleted.")
@@ -991,19 +959,23 @@ class QCExcessEndorsementPage(QWidget):
                                 f"Are you sure you want to restore endorsement <b>{ref_no}</b>?") == QMessageBox.StandardButton.Yes:
             try:
                 with self.engine.connect() as conn, conn.begin():
-                    primary_data = conn.execute(
-                        text("SELECT * FROM qce_endorsements_primary WHERE system_ref_no = :ref"),
-                        {"ref": ref_no}).mappings().one()
-                    secondary_data = conn.execute(
-                        text("SELECT * FROM qce_endorsements_secondary WHERE system_ref_no = :ref"),
-                        {"ref": ref_no}).mappings().all()
-                    excess_data = conn.execute(text("SELECT * FROM qce_endorsements_excess WHERE system_ref_no = :ref"),
-                                               {"ref": ref_no}).mappings().all()
-                    preview_data = self._generate_preview_for_restore(primary_data, secondary_data, excess_data)
-                    conn.execute(text(
-                        "UPDATE qce_endorsements_primary SET is_deleted = FALSE, edited_by = :user, edited_on = :now WHERE system_ref_no = :ref"),
-                        {"ref": ref_no, "user": self.username, "now": datetime.now()})
-                    self._create_inventory_transactions(conn, primary_data, preview_data)
+                    if not restore_document(conn, 'QCE', ref_no, self.username):
+                        # Deleted before deleted_ledger_rows existed: rebuild its ledger rows
+                        primary_data = conn.execute(
+                            text("SELECT * FROM qce_endorsements_primary WHERE system_ref_no = :ref"),
+                            {"ref": ref_no}).mappings().one()
+                        secondary_data = conn.execute(
+                            text("SELECT * FROM qce_endorsements_secondary WHERE system_ref_no = :ref"),
+                            {"ref": ref_no}).mappings().all()
+                        excess_data = conn.execute(
+                            text("SELECT * FROM qce_endorsements_excess WHERE system_ref_no = :ref"),
+                            {"ref": ref_no}).mappings().all()
+                        preview_data = self._generate_preview_for_restore(primary_data, secondary_data, excess_data)
+                        ledger = LedgerWriter()
+                        for table, rows in self._inventory_transactions(primary_data, preview_data).items():
+                            ledger.extend(table, rows)
+                        ledger.replace(ref_no, tuple(QCE_TABLES.ledger))
+                        ledger.to_batch(SaveBatch(conn)).execute()
                 self.log_audit_trail("RESTORE_QC_EXCESS", f"Restored QC Excess: {ref_no}")
                 QMessageBox.information(self, "Success", f"Endorsement {ref_no} has been restored.")
                 self._refresh_all_data_views()
@@ -1019,44 +991,13 @@ class QCExcessEndorsementPage(QWidget):
         return {"lots": lots, "excess_qty": excess_qty, "weight_per_lot": Decimal(str(primary_data['weight_per_lot'])),
                 "excess_lot_number": excess_lot_number}
 
-    def _generate_ref_no(self):
-        prefix = f"QCE-{datetime.now().strftime('%y%m')}-"
-        with self.engine.connect() as conn:
-            try:
-                last_ref = conn.execute(text(
-                    "SELECT system_ref_no FROM qce_endorsements_primary WHERE system_ref_no LIKE :p ORDER BY id DESC LIMIT 1"),
-                    {"p": f"{prefix}%"}).scalar_one_or_none()
-                next_seq = int(last_ref.split('-')[-1]) + 1 if last_ref else 1
-            except Exception:
-                next_seq = 1
-            return f"{prefix}{next_seq:04d}"
-
-    # --- FIX IS HERE: Corrected Lot Range Parsing ---
+    def _generate_ref_no(self, conn):
+        return next_document_number(conn, 'QCE')
+
     def _parse_lot_range(self, lot_input: str):
         try:
-            parts = [s.strip().upper() for s in lot_input.split('-')]
-            if len(parts) != 2:
-                raise ValueError("Lot range must contain exactly one hyphen.")
-
-            start_str, end_str = parts
-            start_match = re.match(r'^(\d+)([A-Z]*)$', start_str)
-            end_match = re.match(r'^(\d+)([A-Z]*)$', end_str)
-
-            if not start_match or not end_match:
-                raise ValueError("Lot format must be numeric with an optional text suffix (e.g., 1234AA).")
-            if start_match.group(2) != end_match.group(2):
-                raise ValueError("Start and end lot suffixes must match.")
-
-            start_num = int(start_match.group(1))
-            end_num = int(end_match.group(1))
-            suffix = start_match.group(2)
-            num_len = len(start_match.group(1))
-
-            if start_num > end_num:
-                raise ValueError("Start lot number cannot be greater than the end lot number.")
-
-            return [f"{str(i).zfill(num_len)}{suffix}" for i in range(start_num, end_num + 1)]
-        except Exception as e:
+            return expand_lot_range(lot_input)
+        except LotRangeError as e:
             QMessageBox.critical(self, "Lot Range Error", f"Could not parse lot range '{lot_input}':\n{e}")
             return None
 
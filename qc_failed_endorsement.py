@@ -1,5 +1,4 @@
 import sys
-import re
 import traceback
 from datetime import datetime, date
 from decimal import Decimal, InvalidOperation
@@ -18,6 +17,13 @@ from PyQt6.QtGui import QDoubleValidator
 # --- Database Imports ---
 from sqlalchemy import create_engine, text
 
+from document_counters import ensure_document_counters, next_document_number
+from endorsement_store import QCF_TABLES, SaveBatch, endorsement_batch
+from ledger import LedgerRow, LedgerWriter
+from lot_ranges import LotRangeError, LotRangeTooSmall, split_lots
+from reference_data import bind_reference_combo, invalidate_reference
+from soft_delete import restore_document, soft_delete_document
+
 # --- Icon Library Import ---
 try:
     import qtawesome as fa
@@ -703,6 +709,7 @@ class QCFailedEndorsementPage(QWidget):
                     conn.execute(text(
                         f"INSERT INTO {table_name} ({column_name}) VALUES (:val) ON CONFLICT ({column_name}) DO NOTHING"),
                         {"val": dialog.new_value})
+                invalidate_reference(table_name)
                 self._load_combobox_data();
                 combo_to_update.setCurrentText(dialog.new_value)
             except Exception as e:
@@ -768,24 +775,12 @@ class QCFailedEndorsementPage(QWidget):
         self.excess_total_label.setText("<b>Total: 0.00 kg</b>")
 
     def _load_combobox_data(self):
-        queries = {
-            "product_code_combo": "SELECT DISTINCT prod_code FROM legacy_production WHERE prod_code IS NOT NULL AND prod_code != '' ORDER BY prod_code",
-            "endorsed_by_combo": "SELECT name FROM qcf_endorsers ORDER BY name",
-            "warehouse_combo": "SELECT name FROM warehouses ORDER BY name",
-            "received_by_name_combo": "SELECT name FROM qcf_receivers ORDER BY name",
-            "bag_no_combo": "SELECT name FROM qce_bag_numbers ORDER BY name"}
+        reference_keys = {"product_code_combo": "product_codes", "endorsed_by_combo": "qcf_endorsers",
+                          "warehouse_combo": "warehouses", "received_by_name_combo": "qcf_receivers",
+                          "bag_no_combo": "qce_bag_numbers"}
         try:
-            with self.engine.connect() as conn:
-                for combo_name, query in queries.items():
-                    combo = getattr(self, combo_name);
-                    current_text = combo.currentText();
-                    items = conn.execute(text(query)).scalars().all()
-                    combo.blockSignals(True);
-                    combo.clear();
-                    combo.addItems([""] + [item for item in items if item]);
-                    index = combo.findText(current_text)
-                    combo.setCurrentIndex(index if index != -1 else (0 if combo.count() > 0 else -1));
-                    combo.blockSignals(False)
+            for combo_name, key in reference_keys.items():
+                bind_reference_combo(getattr(self, combo_name), self.engine, key)
         except Exception as e:
             print(f"Error loading combobox data: {e}")
 
@@ -855,63 +850,23 @@ class QCFailedEndorsementPage(QWidget):
             return None
 
     def _perform_lot_calculation(self, total_qty, weight_per_lot, lot_input, is_range, excess_handling_method):
-        num_full_lots, excess_qty = int(total_qty // weight_per_lot), total_qty % weight_per_lot
-        breakdown_data, excess_data, calculated_lots = [], [], []
-        if is_range:
-            range_info = self._parse_lot_range(lot_input, num_full_lots)
-            if not range_info: return None
-            calculated_lots = range_info['lots']
-            breakdown_data = [{'lot_number': lot, 'quantity_kg': float(weight_per_lot), 'source_lot': lot} for lot in
-                              calculated_lots]
-        else:
-            calculated_lots = [lot_input.upper()] * num_full_lots
-            if calculated_lots:
-                breakdown_data = [{'lot_number': lot, 'quantity_kg': float(weight_per_lot), 'source_lot': lot_input} for
-                                  lot in calculated_lots]
-        if excess_qty > 0:
-            if not is_range and excess_handling_method == 'RETAIN_ORIGINAL_LOT':
-                excess_data.append(
-                    {'lot_number': lot_input.upper(), 'quantity_kg': float(excess_qty), 'source_lot': lot_input})
-            else:
-                last_lot = calculated_lots[-1] if calculated_lots else lot_input.upper()
-                match = re.search(r'([A-Z]*?)(\d+)([A-Z]*?)$', last_lot)
-                excess_lot_number = f"{last_lot}-EXCESS"
-                if match:
-                    try:
-                        prefix, num_part, suffix = match.groups()
-                        next_num = str(int(num_part) + 1).zfill(len(num_part))
-                        excess_lot_number = f"{prefix}{next_num}{suffix}"
-                    except ValueError:
-                        pass
-                source_for_excess = calculated_lots[-1] if calculated_lots else lot_input
-                excess_data.append({'lot_number': excess_lot_number, 'quantity_kg': float(excess_qty),
-                                    'source_lot': source_for_excess})
-        return {"breakdown": breakdown_data, "excess": excess_data}
-
-    def _parse_lot_range(self, lot_input, num_lots_needed):
         try:
-            parts = lot_input.split('-')
-            if len(parts) != 2: raise ValueError("Lot range must contain exactly one hyphen.")
-            start_str, end_str = [s.strip().upper() for s in parts]
-            start_match = re.match(r'^([A-Z]*?)(\d+)([A-Z]*?)$', start_str)
-            end_match = re.match(r'^([A-Z]*?)(\d+)([A-Z]*?)$', end_str)
-            if not start_match or not end_match or start_match.groups()[::2] != end_match.groups()[
-                                                                                ::2]: raise ValueError(
-                "Format invalid or prefixes/suffixes mismatch.")
-            prefix, start_num_str, suffix = start_match.groups()
-            _, end_num_str, _ = end_match.groups()
-            start_num, end_num, num_len = int(start_num_str), int(end_num_str), len(start_num_str)
-            if start_num > end_num: raise ValueError("Start lot > end lot.")
-            available_lots = end_num - start_num + 1
-            if available_lots < num_lots_needed:
-                QMessageBox.warning(self, "Lot Range Too Small",
-                                    f"The provided range has {available_lots} lots, but {num_lots_needed} are required based on the quantity.");
-                return None
-            return {'lots': [f"{prefix}{str(start_num + i).zfill(num_len)}{suffix}" for i in range(num_lots_needed)],
-                    'end_lot': end_str}
-        except Exception as e:
+            result = split_lots(total_qty, weight_per_lot, lot_input, is_range, excess_handling_method,
+                                number_excess_after_range=False, allow_prefix=True)
+        except LotRangeTooSmall as e:
+            QMessageBox.warning(self, "Lot Range Too Small",
+                                f"The provided range has {e.available} lots, but {e.needed} are required based on the quantity.");
+            return None
+        except LotRangeError as e:
             QMessageBox.critical(self, "Lot Range Error", f"Could not parse lot range '{lot_input}': {e}");
             return None
+        breakdown_data = [{'lot_number': row['lot_number'], 'quantity_kg': float(row['quantity_kg']),
+                           'source_lot': row['lot_number'] if is_range else lot_input} for row in result['breakdown']]
+        source_for_excess = breakdown_data[-1]['lot_number'] if breakdown_data else lot_input
+        excess_data = [{'lot_number': row['lot_number'], 'quantity_kg': float(row['quantity_kg']),
+                        'source_lot': lot_input if excess_handling_method == 'RETAIN_ORIGINAL_LOT' and not is_range
+                        else source_for_excess} for row in result['excess']]
+        return {"breakdown": breakdown_data, "excess": excess_data}
 
     def _populate_preview_widgets(self, data):
         breakdown_data, excess_data = data.get('breakdown', []), data.get('excess', [])
@@ -931,7 +886,7 @@ class QCFailedEndorsementPage(QWidget):
         if not self.preview_data: QMessageBox.warning(self, "Preview Required",
                                                       "Please click 'Preview Breakdown' before saving."); return
         is_update = self.current_editing_ref is not None;
-        sys_ref_no = self.current_editing_ref if is_update else self._generate_system_ref_no()
+        sys_ref_no = self.current_editing_ref  # new endorsements are numbered inside the save transaction
         all_lots_to_log = self.preview_data.get('breakdown', []) + self.preview_data.get('excess', [])
         if not all_lots_to_log: QMessageBox.critical(self, "Save Error",
                                                      "No lots were generated or loaded for saving."); return
@@ -953,62 +908,36 @@ class QCFailedEndorsementPage(QWidget):
                         "encoded_on": datetime.now(), "edited_by": self.username, "edited_on": datetime.now()}
         try:
             with self.engine.connect() as conn, conn.begin():
-                if is_update:
-                    conn.execute(text("DELETE FROM qcf_endorsements_secondary WHERE system_ref_no = :ref"),
-                                 {"ref": sys_ref_no});
-                    conn.execute(text("DELETE FROM qcf_endorsements_excess WHERE system_ref_no = :ref"),
-                                 {"ref": sys_ref_no})
-                    conn.execute(text(
-                        "DELETE FROM failed_transactions WHERE source_ref_no = :ref AND transaction_type = 'QC_FAILED_ENDORSEMENT'"),
-                        {"ref": sys_ref_no});
-                    conn.execute(text(
-                        "DELETE FROM transactions WHERE source_ref_no = :ref AND transaction_type = 'QC_TRANSFER_OUT'"),
-                        {"ref": sys_ref_no})
-                    update_sql = text(
-                        "UPDATE qcf_endorsements_primary SET form_ref_no=:form_ref_no, endorsement_date=:endorsement_date, product_code=:product_code, lot_number=:lot_number, quantity_kg=:quantity_kg, weight_per_lot=:weight_per_lot, remarks=:remarks, endorsed_by=:endorsed_by, warehouse=:warehouse, received_by_name=:received_by_name, received_date_time=:received_date_time, bag_no=:bag_no, edited_by=:edited_by, edited_on=:edited_on WHERE system_ref_no = :system_ref_no")
-                    conn.execute(update_sql, primary_data);
-                    self.log_audit_trail("UPDATE_QC_FAILED", f"Updated endorsement: {sys_ref_no}");
-                    action_text = "updated"
-                else:
-                    insert_sql = text(
-                        "INSERT INTO qcf_endorsements_primary (system_ref_no, form_ref_no, endorsement_date, product_code, lot_number, quantity_kg, weight_per_lot, remarks, endorsed_by, warehouse, received_by_name, received_date_time, bag_no, encoded_by, encoded_on, edited_by, edited_on) VALUES (:system_ref_no, :form_ref_no, :endorsement_date, :product_code, :lot_number, :quantity_kg, :weight_per_lot, :remarks, :endorsed_by, :warehouse, :received_by_name, :received_date_time, :bag_no, :encoded_by, :encoded_on, :edited_by, :edited_on)")
-                    conn.execute(insert_sql, primary_data);
-                    self.log_audit_trail("CREATE_QC_FAILED", f"Created endorsement: {sys_ref_no}");
-                    action_text = "saved"
-                secondary_records = [
-                    {'system_ref_no': sys_ref_no, 'lot_number': lot['lot_number'], 'quantity_kg': lot['quantity_kg']}
-                    for lot in self.preview_data.get('breakdown', [])]
-                excess_records = [
-                    {'system_ref_no': sys_ref_no, 'lot_number': lot['lot_number'], 'quantity_kg': lot['quantity_kg']}
-                    for lot in self.preview_data.get('excess', [])]
-                if secondary_records: conn.execute(text(
-                    "INSERT INTO qcf_endorsements_secondary (system_ref_no, lot_number, quantity_kg) VALUES (:system_ref_no, :lot_number, :quantity_kg)"),
-                    secondary_records)
-                if excess_records: conn.execute(text(
-                    "INSERT INTO qcf_endorsements_excess (system_ref_no, lot_number, quantity_kg) VALUES (:system_ref_no, :lot_number, :quantity_kg)"),
-                    excess_records)
+                if not is_update:
+                    sys_ref_no = primary_data["system_ref_no"] = self._generate_system_ref_no(conn)
+                lots = {table: [{'system_ref_no': sys_ref_no, 'lot_number': lot['lot_number'],
+                                 'quantity_kg': lot['quantity_kg']} for lot in self.preview_data.get(key, [])]
+                        for table, key in (("qcf_endorsements_secondary", 'breakdown'),
+                                           ("qcf_endorsements_excess", 'excess'))}
                 failed_txs, main_txs = [], []
                 for lot_data in all_lots_to_log:
                     source_lot = lot_data.get('source_lot', primary_data['lot_number'])
-                    failed_txs.append({"transaction_date": primary_data["endorsement_date"],
-                                       "transaction_type": "QC_FAILED_ENDORSEMENT", "source_ref_no": sys_ref_no,
-                                       "product_code": primary_data["product_code"],
-                                       "lot_number": lot_data["lot_number"], "quantity_in": lot_data["quantity_kg"],
-                                       "quantity_out": 0, "unit": "KG.", "warehouse": primary_data["warehouse"],
-                                       "encoded_by": self.username,
-                                       "remarks": f"QC Failure: {primary_data['remarks']}. Bag: {primary_data['bag_no']}. Orig Lot: {source_lot}"})
+                    failed_txs.append(LedgerRow(transaction_date=primary_data["endorsement_date"],
+                                                transaction_type="QC_FAILED_ENDORSEMENT", source_ref_no=sys_ref_no,
+                                                product_code=primary_data["product_code"],
+                                                lot_number=lot_data["lot_number"], quantity_in=lot_data["quantity_kg"],
+                                                warehouse=primary_data["warehouse"], encoded_by=self.username,
+                                                remarks=f"QC Failure: {primary_data['remarks']}. Bag: {primary_data['bag_no']}. Orig Lot: {source_lot}"))
                     main_txs.append(
-                        {"transaction_date": primary_data["endorsement_date"], "transaction_type": "QC_TRANSFER_OUT",
-                         "source_ref_no": sys_ref_no, "product_code": primary_data["product_code"],
-                         "lot_number": source_lot, "quantity_in": 0, "quantity_out": lot_data["quantity_kg"],
-                         "unit": "KG.", "warehouse": primary_data["warehouse"], "encoded_by": self.username,
-                         "remarks": f"Transfer OUT for QC Failed endorsement: {sys_ref_no}. New Lot: {lot_data['lot_number']}"})
-                if failed_txs: conn.execute(text(
-                    "INSERT INTO failed_transactions (transaction_date, transaction_type, source_ref_no, product_code, lot_number, quantity_in, quantity_out, unit, warehouse, encoded_by, remarks) VALUES (:transaction_date, :transaction_type, :source_ref_no, :product_code, :lot_number, :quantity_in, :quantity_out, :unit, :warehouse, :encoded_by, :remarks)"),
-                    failed_txs)
-                if main_txs: conn.execute(text(
-                    "INSERT INTO transactions (transaction_date, transaction_type, source_ref_no, product_code, lot_number, quantity_in, quantity_out, unit, warehouse, encoded_by, remarks) VALUES (:transaction_date, :transaction_type, :source_ref_no, :product_code, :lot_number, :quantity_in, :quantity_out, :unit, :warehouse, :encoded_by, :remarks)"),
-                    main_txs)
+                        LedgerRow(transaction_date=primary_data["endorsement_date"], transaction_type="QC_TRANSFER_OUT",
+                                  source_ref_no=sys_ref_no, product_code=primary_data["product_code"],
+                                  lot_number=source_lot, quantity_out=lot_data["quantity_kg"],
+                                  warehouse=primary_data["warehouse"], encoded_by=self.username,
+                                  remarks=f"Transfer OUT for QC Failed endorsement: {sys_ref_no}. New Lot: {lot_data['lot_number']}"))
+                batch = endorsement_batch(conn, QCF_TABLES, primary_data, lots,
+                                          {"failed_transactions": failed_txs, "transactions": main_txs}, is_update)
+                if is_update:
+                    self.log_audit_trail("UPDATE_QC_FAILED", f"Updated endorsement: {sys_ref_no}", batch=batch);
+                    action_text = "updated"
+                else:
+                    self.log_audit_trail("CREATE_QC_FAILED", f"Created endorsement: {sys_ref_no}", batch=batch);
+                    action_text = "saved"
+                batch.execute()
 
             # FIX: Update retained variables after SAVE/UPDATE
             self._retained_form_ref = self.form_ref_no_edit.text().strip()
@@ -1047,15 +976,7 @@ class QCFailedEndorsementPage(QWidget):
         if reply == QMessageBox.StandardButton.Yes:
             try:
                 with self.engine.connect() as conn, conn.begin():
-                    conn.execute(text(
-                        "UPDATE qcf_endorsements_primary SET is_deleted = TRUE, edited_by = :user, edited_on = :now WHERE system_ref_no = :ref"),
-                        {"ref": ref_no, "user": self.username, "now": datetime.now()})
-                    conn.execute(text(
-                        "DELETE FROM failed_transactions WHERE source_ref_no = :ref AND transaction_type = 'QC_FAILED_ENDORSEMENT'"),
-                        {"ref": ref_no})
-                    conn.execute(text(
-                        "DELETE FROM transactions WHERE source_ref_no = :ref AND transaction_type = 'QC_TRANSFER_OUT'"),
-                        {"ref": ref_no})
+                    soft_delete_document(conn, 'QCF', ref_no, self.username)
                 self.log_audit_trail("DELETE_QC_FAILED_REVERSE",
                                      f"Soft-deleted endorsement {ref_no} and reversed stock transfer.")
                 QMessageBox.information(self, "Success",
@@ -1084,44 +1005,33 @@ class QCFailedEndorsementPage(QWidget):
                                 QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No) == QMessageBox.StandardButton.Yes:
             try:
                 with self.engine.connect() as conn, conn.begin():
-                    conn.execute(text(
-                        "UPDATE qcf_endorsements_primary SET is_deleted = FALSE, edited_by = :user, edited_on = :now WHERE system_ref_no = :ref"),
-                        {"ref": ref_no, "user": self.username, "now": datetime.now()})
-                    primary_data = conn.execute(
-                        text("SELECT * FROM qcf_endorsements_primary WHERE system_ref_no = :ref"),
-                        {"ref": ref_no}).mappings().one()
-                    all_lots_data = conn.execute(text(
-                        "SELECT lot_number, quantity_kg FROM qcf_endorsements_secondary WHERE system_ref_no = :ref UNION ALL SELECT lot_number, quantity_kg FROM qcf_endorsements_excess WHERE system_ref_no = :ref"),
-                        {"ref": ref_no}).mappings().all()
-                    failed_txs, main_txs, source_lot_input = [], [], primary_data.get('lot_number')
-                    for lot in all_lots_data:
-                        failed_txs.append({"transaction_date": primary_data["endorsement_date"],
-                                           "transaction_type": "QC_FAILED_ENDORSEMENT", "source_ref_no": ref_no,
-                                           "product_code": primary_data["product_code"],
-                                           "lot_number": lot["lot_number"], "quantity_in": lot["quantity_kg"],
-                                           "quantity_out": 0, "unit": "KG.", "warehouse": primary_data["warehouse"],
-                                           "encoded_by": self.username,
-                                           "remarks": f"RESTORED: QC Failure {primary_data.get('remarks', 'N/A')}. Bag: {primary_data.get('bag_no', 'N/A')}. Orig Lot Input: {source_lot_input}"})
-                        main_txs.append({"transaction_date": primary_data["endorsement_date"],
-                                         "transaction_type": "QC_TRANSFER_OUT", "source_ref_no": ref_no,
-                                         "product_code": primary_data["product_code"], "lot_number": source_lot_input,
-                                         "quantity_in": 0, "quantity_out": lot["quantity_kg"], "unit": "KG.",
-                                         "warehouse": primary_data["warehouse"], "encoded_by": self.username,
-                                         "remarks": f"RESTORED: Transfer OUT for QC Failed endorsement: {ref_no}. Failed Lot: {lot['lot_number']}"})
-                    if failed_txs:
-                        conn.execute(text(
-                            "DELETE FROM failed_transactions WHERE source_ref_no = :ref AND transaction_type = 'QC_FAILED_ENDORSEMENT'"),
-                            {"ref": ref_no})
-                        conn.execute(text(
-                            "INSERT INTO failed_transactions (transaction_date, transaction_type, source_ref_no, product_code, lot_number, quantity_in, quantity_out, unit, warehouse, encoded_by, remarks) VALUES (:transaction_date, :transaction_type, :source_ref_no, :product_code, :lot_number, :quantity_in, :quantity_out, :unit, :warehouse, :encoded_by, :remarks)"),
-                            failed_txs)
-                    if main_txs:
-                        conn.execute(text(
-                            "DELETE FROM transactions WHERE source_ref_no = :ref AND transaction_type = 'QC_TRANSFER_OUT'"),
-                            {"ref": ref_no})
-                        conn.execute(text(
-                            "INSERT INTO transactions (transaction_date, transaction_type, source_ref_no, product_code, lot_number, quantity_in, quantity_out, unit, warehouse, encoded_by, remarks) VALUES (:transaction_date, :transaction_type, :source_ref_no, :product_code, :lot_number, :quantity_in, :quantity_out, :unit, :warehouse, :encoded_by, :remarks)"),
-                            main_txs)
+                    if not restore_document(conn, 'QCF', ref_no, self.username):
+                        # Deleted before deleted_ledger_rows existed: rebuild its ledger rows
+                        primary_data = conn.execute(
+                            text("SELECT * FROM qcf_endorsements_primary WHERE system_ref_no = :ref"),
+                            {"ref": ref_no}).mappings().one()
+                        all_lots_data = conn.execute(text(
+                            "SELECT lot_number, quantity_kg FROM qcf_endorsements_secondary WHERE system_ref_no = :ref UNION ALL SELECT lot_number, quantity_kg FROM qcf_endorsements_excess WHERE system_ref_no = :ref"),
+                            {"ref": ref_no}).mappings().all()
+                        ledger, source_lot_input = LedgerWriter(), primary_data.get('lot_number')
+                        for lot in all_lots_data:
+                            ledger.add('failed_transactions', LedgerRow(
+                                transaction_date=primary_data["endorsement_date"],
+                                transaction_type="QC_FAILED_ENDORSEMENT", source_ref_no=ref_no,
+                                product_code=primary_data["product_code"], lot_number=lot["lot_number"],
+                                quantity_in=lot["quantity_kg"], warehouse=primary_data["warehouse"],
+                                encoded_by=self.username,
+                                remarks=f"RESTORED: QC Failure {primary_data.get('remarks', 'N/A')}. Bag: {primary_data.get('bag_no', 'N/A')}. Orig Lot Input: {source_lot_input}"))
+                            ledger.add('transactions', LedgerRow(
+                                transaction_date=primary_data["endorsement_date"], transaction_type="QC_TRANSFER_OUT",
+                                source_ref_no=ref_no, product_code=primary_data["product_code"],
+                                lot_number=source_lot_input, quantity_out=lot["quantity_kg"],
+                                warehouse=primary_data["warehouse"], encoded_by=self.username,
+                                remarks=f"RESTORED: Transfer OUT for QC Failed endorsement: {ref_no}. Failed Lot: {lot['lot_number']}"))
+                        if ledger:
+                            for table, types in QCF_TABLES.ledger.items():
+                                ledger.replace(ref_no, (table,), types)
+                            ledger.to_batch(SaveBatch(conn)).execute()
                 self.log_audit_trail("RESTORE_QC_FAILED_REINSTATE",
                                      f"Restored endorsement {ref_no} and reinstated inventory transfer.");
                 QMessageBox.information(self, "Success", f"Endorsement {ref_no} has been restored.");
@@ -1141,16 +1051,8 @@ class QCFailedEndorsementPage(QWidget):
                 msg_box.setStandardButtons(QMessageBox.StandardButton.Ok);
                 msg_box.exec()
 
-    def _generate_system_ref_no(self):
-        prefix = f"QCF-{datetime.now().strftime('%y%m')}-"
-        try:
-            with self.engine.connect() as conn:
-                last_ref = conn.execute(text(
-                    "SELECT system_ref_no FROM qcf_endorsements_primary WHERE system_ref_no LIKE :p ORDER BY id DESC LIMIT 1"),
-                    {"p": f"{prefix}%"}).scalar_one_or_none()
-                return f"{prefix}{int(last_ref.split('-')[-1]) + 1 if last_ref else 1:04d}"
-        except:
-            return f"{prefix}0001"
+    def _generate_system_ref_no(self, conn):
+        return next_document_number(conn, 'QCF')
 
     def _populate_records_table(self, table, data, headers):
         table.setRowCount(0);
@@ -1418,6 +1320,7 @@ if __name__ == "__main__":
     mock_engine = create_engine("sqlite:///:memory:")
     try:
         with mock_engine.connect() as conn, conn.begin():
+            ensure_document_counters(conn)
             conn.execute(text(
                 "CREATE TABLE IF NOT EXISTS qcf_endorsements_primary (id INTEGER PRIMARY KEY, system_ref_no TEXT UNIQUE, form_ref_no TEXT, endorsement_date DATE, product_code TEXT, lot_number TEXT, quantity_kg REAL, weight_per_lot REAL, remarks TEXT, endorsed_by TEXT, warehouse TEXT, received_by_name TEXT, received_date_time DATE, bag_no TEXT, encoded_by TEXT, encoded_on DATETIME, edited_by TEXT, edited_on DATETIME, is_deleted BOOLEAN DEFAULT FALSE);"))
             conn.execute(text(
@@ -1434,6 +1337,8 @@ if __name__ == "__main__":
             conn.execute(text(
                 "CREATE TABLE IF NOT EXISTS transactions(id INTEGER PRIMARY KEY, transaction_date DATE, transaction_type TEXT, source_ref_no TEXT, product_code TEXT, lot_number TEXT, quantity_in REAL, quantity_out REAL, unit TEXT, warehouse TEXT, encoded_by TEXT, remarks TEXT);"))
             conn.execute(text("INSERT OR IGNORE INTO legacy_production (prod_code) VALUES ('FG-A01'), ('FG-B02');"))
+            conn.execute(text("CREATE TABLE IF NOT EXISTS products (product_code TEXT PRIMARY KEY, fg_type TEXT);"))
+            conn.execute(text("INSERT OR IGNORE INTO products (product_code, fg_type) VALUES ('FG-A01', 'DC'), ('FG-B02', 'DC');"))
             conn.execute(text("INSERT OR IGNORE INTO warehouses (name) VALUES ('WH1'), ('WH2');"))
             conn.execute(text("INSERT OR IGNORE INTO qcf_endorsers (name) VALUES ('QC1'), ('QC2');"))
             conn.execute(text("INSERT OR IGNORE INTO qcf_receivers (name) VALUES ('REC1'), ('REC2');"))
@@ -1453,7 +1358,7 @@ if __name__ == "__main__":
     mock_username = "TEST_USER"
 
 
-    def mock_log_audit_trail(action, details):
+    def mock_log_audit_trail(action, details, batch=None):
         print(f"[AUDIT LOG] Action: {action}, Details: {details}")
 
 
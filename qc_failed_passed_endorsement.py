@@ -1,5 +1,4 @@
 import sys
-import re
 import traceback
 from datetime import datetime, date
 from decimal import Decimal, InvalidOperation
@@ -16,6 +15,13 @@ from PyQt6.QtGui import QDoubleValidator
 # --- SQLAlchemy Imports ---
 from sqlalchemy import text, create_engine
 
+from document_counters import ensure_document_counters, next_document_number
+from endorsement_store import QCFP_TABLES, SaveBatch, endorsement_batch
+from ledger import LedgerRow, LedgerWriter
+from lot_ranges import LotRangeError, LotRangeTooSmall, split_lots
+from reference_data import bind_reference_combo, invalidate_reference
+from soft_delete import restore_document, soft_delete_document
+
 # --- Icon Library Import ---
 try:
     import qtawesome as fa
@@ -442,26 +448,18 @@ class QCFailedPassedPage(QWidget):
         if reply == QMessageBox.StandardButton.Yes:
             try:
                 with self.engine.connect() as conn, conn.begin():
-                    primary_data = conn.execute(
-                        text("SELECT * FROM qcfp_endorsements_primary WHERE system_ref_no = :ref"),
-                        {"ref": ref_no}).mappings().one()
-                    breakdown_lots = conn.execute(text(
-                        "SELECT lot_number, quantity_kg FROM qcfp_endorsements_secondary WHERE system_ref_no = :ref"),
-                                                  {"ref": ref_no}).mappings().all()
-                    excess_lots = conn.execute(
-                        text("SELECT lot_number, quantity_kg FROM qcfp_endorsements_excess WHERE system_ref_no = :ref"),
-                        {"ref": ref_no}).mappings().all()
-                    all_lots = breakdown_lots + excess_lots
-                    conn.execute(text(
-                        "UPDATE qcfp_endorsements_primary SET is_deleted = FALSE, edited_by = :u, edited_on = :n WHERE system_ref_no = :ref"),
-                                 {"u": self.username, "n": datetime.now(), "ref": ref_no})
-                    conn.execute(text(
-                        "DELETE FROM failed_transactions WHERE source_ref_no = :ref AND transaction_type LIKE 'QC_FP_DELETED%'"),
-                                 {"ref": ref_no})
-                    conn.execute(text(
-                        "DELETE FROM transactions WHERE source_ref_no = :ref AND transaction_type LIKE 'QC_FP_DELETED%'"),
-                                 {"ref": ref_no})
-                    self._create_inventory_transactions(conn, ref_no, primary_data, all_lots)
+                    if not restore_document(conn, 'QCFP', ref_no, self.username):
+                        # Deleted before deleted_ledger_rows existed: rebuild its ledger rows
+                        primary_data = conn.execute(
+                            text("SELECT * FROM qcfp_endorsements_primary WHERE system_ref_no = :ref"),
+                            {"ref": ref_no}).mappings().one()
+                        all_lots = conn.execute(text(
+                            "(SELECT lot_number, quantity_kg FROM qcfp_endorsements_secondary WHERE system_ref_no = :ref) UNION ALL (SELECT lot_number, quantity_kg FROM qcfp_endorsements_excess WHERE system_ref_no = :ref)"),
+                                                {"ref": ref_no}).mappings().all()
+                        ledger = LedgerWriter()
+                        for table, rows in self._inventory_transactions(ref_no, primary_data, all_lots).items():
+                            ledger.extend(table, rows)
+                        ledger.to_batch(SaveBatch(conn)).execute()
                 self.log_audit_trail("RESTORE_QCFP_ENDORSEMENT", f"Restored QCFP: {ref_no}")
                 QMessageBox.information(self, "Success", f"Endorsement {ref_no} has been restored.")
                 self._refresh_all_data_views()
@@ -571,24 +569,18 @@ class QCFailedPassedPage(QWidget):
                 with self.engine.connect() as conn, conn.begin():
                     conn.execute(text(f"INSERT INTO {table_name} (name) VALUES (:name) ON CONFLICT (name) DO NOTHING"),
                                  {"name": new_item_text})
+                invalidate_reference(table_name)
                 self._load_combobox_data();
                 combo_to_update.setCurrentText(new_item_text)
             except Exception as e:
                 QMessageBox.critical(self, "Database Error", f"Could not add new record: {e}")
 
     def _load_combobox_data(self):
-        queries = {self.endorsed_by_combo: "SELECT name FROM qcfp_endorsers ORDER BY name",
-                   self.warehouse_combo: "SELECT name FROM warehouses ORDER BY name",
-                   self.received_by_combo: "SELECT name FROM qcfp_receivers ORDER BY name",
-                   self.product_code_combo: "SELECT DISTINCT prod_code FROM legacy_production WHERE prod_code IS NOT NULL AND prod_code != '' ORDER BY prod_code"}
+        reference_keys = {self.endorsed_by_combo: "qcfp_endorsers", self.warehouse_combo: "warehouses",
+                          self.received_by_combo: "qcfp_receivers", self.product_code_combo: "product_codes"}
         try:
-            with self.engine.connect() as conn:
-                for combo, query in queries.items():
-                    current_text = combo.currentText();
-                    items = conn.execute(text(query)).scalars().all()
-                    combo.clear();
-                    combo.addItems([""] + items)
-                    if current_text in items: combo.setCurrentText(current_text)
+            for combo, key in reference_keys.items():
+                bind_reference_combo(combo, self.engine, key)
         except Exception as e:
             QMessageBox.critical(self, "DB Error", f"Could not load dropdown data: {e}")
 
@@ -691,37 +683,16 @@ class QCFailedPassedPage(QWidget):
             return None
 
     def _perform_lot_calculation(self, total_qty, weight_per_lot, lot_input, is_range, excess_handling_method):
-        num_full_lots = int(total_qty // weight_per_lot);
-        excess_qty = total_qty % weight_per_lot;
-        breakdown_data, excess_data = [], [];
-        range_end_lot = None
-        calculated_lots = [lot_input.upper()] * num_full_lots
-        if is_range:
-            range_info = self._parse_lot_range(lot_input, num_full_lots)
-            if range_info is None: return None
-            calculated_lots = range_info['lots'];
-            range_end_lot = range_info['end_lot']
-        if calculated_lots:
-            breakdown_data = [{'lot_number': lot, 'quantity_kg': weight_per_lot} for lot in calculated_lots]
-        if excess_qty > 0:
-            if is_range and excess_handling_method == 'ASSIGN_TO_LAST_IN_RANGE' and range_end_lot:
-                excess_data.append({'lot_number': range_end_lot, 'quantity_kg': excess_qty})
-            elif not is_range and excess_handling_method == 'RETAIN_ORIGINAL_LOT':
-                excess_data.append({'lot_number': lot_input.upper(), 'quantity_kg': excess_qty})
-            else:
-                last_lot = calculated_lots[-1] if calculated_lots else lot_input.upper()
-                match = re.match(r'^(\d+)([A-Z]*)$', last_lot)
-                if match:
-                    try:
-                        next_num = str(int(match.group(1)) + 1).zfill(len(match.group(1))); suffix = match.group(
-                            2); excess_lot_number = f"{next_num}{suffix}"
-                    except ValueError:
-                        excess_lot_number = f"{last_lot}-EXCESS"
-                else:
-                    excess_lot_number = f"{last_lot}-EXCESS"
-                target_list = breakdown_data if not breakdown_data else excess_data
-                target_list.append({'lot_number': excess_lot_number, 'quantity_kg': excess_qty})
-        return {"breakdown": breakdown_data, "excess": excess_data}
+        # ASSIGN_TO_LAST_IN_RANGE lists the excess under the range's end lot; a NEW_LOT excess follows the last full lot
+        try:
+            return split_lots(total_qty, weight_per_lot, lot_input, is_range, excess_handling_method,
+                              merge_assigned_excess=False, number_excess_after_range=False,
+                              excess_into_empty_breakdown=True)
+        except LotRangeTooSmall as e:
+            QMessageBox.warning(self, "Lot Range Too Small", f"Range has {e.available} lots, but {e.needed} are required.")
+        except LotRangeError as e:
+            QMessageBox.critical(self, "Lot Range Error", f"Could not parse lot range '{lot_input}': {e}")
+        return None
 
     ### FINAL FIX 1: The definitive save/refresh logic ###
     def _save_record(self):
@@ -730,7 +701,7 @@ class QCFailedPassedPage(QWidget):
             return
 
         is_update = self.current_editing_ref_no is not None
-        sys_ref_no = self.current_editing_ref_no if is_update else self._generate_ref_no()
+        sys_ref_no = self.current_editing_ref_no  # new endorsements are numbered inside the save transaction
 
         primary_data = {
             "system_ref_no": sys_ref_no, "form_ref_no": self.form_ref_no_edit.text().strip(),
@@ -749,39 +720,25 @@ class QCFailedPassedPage(QWidget):
 
         try:
             with self.engine.connect() as conn, conn.begin():
+                if not is_update:
+                    sys_ref_no = primary_data["system_ref_no"] = self._generate_ref_no(conn)
+                breakdown_lots = self.preview_data.get('breakdown', [])
+                excess_lots = self.preview_data.get('excess', [])
+                lots = {table: [{'system_ref_no': sys_ref_no, 'lot_number': lot['lot_number'],
+                                 'quantity_kg': lot['quantity_kg']} for lot in table_lots]
+                        for table, table_lots in (("qcfp_endorsements_secondary", breakdown_lots),
+                                                  ("qcfp_endorsements_excess", excess_lots))}
+                all_lots_to_log = breakdown_lots + excess_lots
+                batch = endorsement_batch(conn, QCFP_TABLES, primary_data, lots,
+                                          self._inventory_transactions(sys_ref_no, primary_data, all_lots_to_log),
+                                          is_update)
                 if is_update:
-                    conn.execute(text("DELETE FROM qcfp_endorsements_secondary WHERE system_ref_no = :ref"),
-                                 {"ref": sys_ref_no})
-                    conn.execute(text("DELETE FROM qcfp_endorsements_excess WHERE system_ref_no = :ref"),
-                                 {"ref": sys_ref_no})
-                    update_sql = text("""UPDATE qcfp_endorsements_primary SET 
-                        form_ref_no=:form_ref_no, endorsement_date=:endorsement_date, product_code=:product_code, lot_number=:lot_number, quantity_kg=:quantity_kg, weight_per_lot=:weight_per_lot, endorsed_by=:endorsed_by, warehouse=:warehouse, received_by_name=:received_by_name, received_date_time=:received_date_time, edited_by=:edited_by, edited_on=:edited_on 
-                        WHERE system_ref_no = :system_ref_no""")
-                    conn.execute(update_sql, primary_data)
-                    self.log_audit_trail("UPDATE_QCFP_ENDORSEMENT", f"Updated QCFP: {sys_ref_no}")
+                    self.log_audit_trail("UPDATE_QCFP_ENDORSEMENT", f"Updated QCFP: {sys_ref_no}", batch=batch)
                     action_text = "updated"
                 else:
-                    insert_sql = text("""INSERT INTO qcfp_endorsements_primary (system_ref_no, form_ref_no, endorsement_date, product_code, lot_number, quantity_kg, weight_per_lot, endorsed_by, warehouse, received_by_name, received_date_time, encoded_by, encoded_on, edited_by, edited_on) 
-                        VALUES (:system_ref_no, :form_ref_no, :endorsement_date, :product_code, :lot_number, :quantity_kg, :weight_per_lot, :endorsed_by, :warehouse, :received_by_name, :received_date_time, :encoded_by, :encoded_on, :edited_by, :edited_on)""")
-                    conn.execute(insert_sql, primary_data)
-                    self.log_audit_trail("CREATE_QCFP_ENDORSEMENT", f"Created QCFP: {sys_ref_no}")
+                    self.log_audit_trail("CREATE_QCFP_ENDORSEMENT", f"Created QCFP: {sys_ref_no}", batch=batch)
                     action_text = "saved"
-
-                breakdown_lots = self.preview_data.get('breakdown', [])
-                excess_lots = self.preview_data.get('excess', [])
-                if breakdown_lots:
-                    conn.execute(text(
-                        "INSERT INTO qcfp_endorsements_secondary (system_ref_no, lot_number, quantity_kg) VALUES (:system_ref_no, :lot_number, :quantity_kg)"),
-                                 [{'system_ref_no': sys_ref_no, **lot} for lot in breakdown_lots])
-                if excess_lots:
-                    conn.execute(text(
-                        "INSERT INTO qcfp_endorsements_excess (system_ref_no, lot_number, quantity_kg) VALUES (:system_ref_no, :lot_number, :quantity_kg)"),
-                                 [{'system_ref_no': sys_ref_no, **lot} for lot in excess_lots])
-
-                conn.execute(text("DELETE FROM failed_transactions WHERE source_ref_no = :ref"), {"ref": sys_ref_no})
-                conn.execute(text("DELETE FROM transactions WHERE source_ref_no = :ref"), {"ref": sys_ref_no})
-                all_lots_to_log = breakdown_lots + excess_lots
-                self._create_inventory_transactions(conn, sys_ref_no, primary_data, all_lots_to_log)
+                batch.execute()
 
             QMessageBox.information(self, "Success", f"QC Endorsement {sys_ref_no} {action_text} successfully.")
             self._clear_form()
@@ -801,26 +758,20 @@ class QCFailedPassedPage(QWidget):
             print(f"SAVE RECORD FAILED: {e}\n{trace_info}")
             QMessageBox.critical(self, "Database Error", f"An error occurred: {e}")
 
-    def _create_inventory_transactions(self, conn, sys_ref_no, primary_data, all_lots_to_log):
+    def _inventory_transactions(self, sys_ref_no, primary_data, all_lots_to_log):
+        """{ledger table: LedgerRows}: each lot leaves failed stock and enters FG stock."""
         failed_transactions_out = [
-            {"transaction_date": primary_data["endorsement_date"], "transaction_type": "QC_FP_OUT_FROM_FAILED",
-             "source_ref_no": sys_ref_no, "product_code": primary_data["product_code"], "lot_number": lot["lot_number"],
-             "quantity_in": 0, "quantity_out": lot["quantity_kg"], "unit": "KG.",
-             "warehouse": primary_data["warehouse"], "encoded_by": self.username,
-             "remarks": f"Passed QC. Ref: {sys_ref_no}"} for lot in all_lots_to_log]
-        if failed_transactions_out:
-            conn.execute(text(
-                """INSERT INTO failed_transactions (transaction_date, transaction_type, source_ref_no, product_code, lot_number, quantity_in, quantity_out, unit, warehouse, encoded_by, remarks) VALUES (:transaction_date, :transaction_type, :source_ref_no, :product_code, :lot_number, :quantity_in, :quantity_out, :unit, :warehouse, :encoded_by, :remarks)"""),
-                         failed_transactions_out)
-        transactions_in = [{"transaction_date": primary_data["endorsement_date"], "transaction_type": "QC_FP_IN_TO_FG",
-                            "source_ref_no": sys_ref_no, "product_code": primary_data["product_code"],
-                            "lot_number": lot["lot_number"], "quantity_in": lot["quantity_kg"], "quantity_out": 0,
-                            "unit": "KG.", "warehouse": primary_data["warehouse"], "encoded_by": self.username,
-                            "remarks": f"Received from QC. Ref: {sys_ref_no}"} for lot in all_lots_to_log]
-        if transactions_in:
-            conn.execute(text(
-                """INSERT INTO transactions (transaction_date, transaction_type, source_ref_no, product_code, lot_number, quantity_in, quantity_out, unit, warehouse, encoded_by, remarks) VALUES (:transaction_date, :transaction_type, :source_ref_no, :product_code, :lot_number, :quantity_in, :quantity_out, :unit, :warehouse, :encoded_by, :remarks)"""),
-                         transactions_in)
+            LedgerRow(transaction_date=primary_data["endorsement_date"], transaction_type="QC_FP_OUT_FROM_FAILED",
+                      source_ref_no=sys_ref_no, product_code=primary_data["product_code"],
+                      lot_number=lot["lot_number"], quantity_out=lot["quantity_kg"],
+                      warehouse=primary_data["warehouse"], encoded_by=self.username,
+                      remarks=f"Passed QC. Ref: {sys_ref_no}") for lot in all_lots_to_log]
+        transactions_in = [LedgerRow(transaction_date=primary_data["endorsement_date"], transaction_type="QC_FP_IN_TO_FG",
+                                     source_ref_no=sys_ref_no, product_code=primary_data["product_code"],
+                                     lot_number=lot["lot_number"], quantity_in=lot["quantity_kg"],
+                                     warehouse=primary_data["warehouse"], encoded_by=self.username,
+                                     remarks=f"Received from QC. Ref: {sys_ref_no}") for lot in all_lots_to_log]
+        return {"failed_transactions": failed_transactions_out, "transactions": transactions_in}
 
     ### FINAL FIX 2: Corrected the is_deleted check for SQLite compatibility ###
     def _load_all_records(self):
@@ -914,33 +865,7 @@ class QCFailedPassedPage(QWidget):
         if password != "Itadmin": QMessageBox.critical(self, "Access Denied", "Incorrect password."); return
         try:
             with self.engine.connect() as conn, conn.begin():
-                primary_data = conn.execute(text("SELECT * FROM qcfp_endorsements_primary WHERE system_ref_no = :ref"),
-                                            {"ref": ref_no}).mappings().one()
-                all_lots = conn.execute(text(
-                    "(SELECT lot_number, quantity_kg FROM qcfp_endorsements_secondary WHERE system_ref_no = :ref) UNION ALL (SELECT lot_number, quantity_kg FROM qcfp_endorsements_excess WHERE system_ref_no = :ref)"),
-                                        {"ref": ref_no}).mappings().all()
-                conn.execute(text(
-                    "UPDATE qcfp_endorsements_primary SET is_deleted = TRUE, edited_by = :user, edited_on = :now WHERE system_ref_no = :ref"),
-                             {"ref": ref_no, "user": self.username, "now": datetime.now()})
-                conn.execute(text("DELETE FROM failed_transactions WHERE source_ref_no = :ref"), {"ref": ref_no});
-                conn.execute(text("DELETE FROM transactions WHERE source_ref_no = :ref"), {"ref": ref_no})
-                failed_trans_in = [
-                    {"type": "QC_FP_DELETED (RETURN_TO_FAILED)", "in": lot['quantity_kg'], "out": 0, **lot} for lot in
-                    all_lots]
-                if failed_trans_in: conn.execute(text(
-                    """INSERT INTO failed_transactions (transaction_date, transaction_type, source_ref_no, product_code, lot_number, quantity_in, quantity_out, unit, warehouse, encoded_by, remarks) VALUES (:date, :type, :ref, :pcode, :lot, :in, :out, 'KG.', :wh, :user, 'Stock returned on deletion')"""),
-                                                 [{"date": primary_data['endorsement_date'], "ref": ref_no,
-                                                   "pcode": primary_data['product_code'], "lot": l['lot_number'], **l,
-                                                   "wh": primary_data['warehouse'], "user": self.username} for l in
-                                                  failed_trans_in])
-                trans_out = [{"type": "QC_FP_DELETED (RETURN_FROM_FG)", "in": 0, "out": lot['quantity_kg'], **lot} for
-                             lot in all_lots]
-                if trans_out: conn.execute(text(
-                    """INSERT INTO transactions (transaction_date, transaction_type, source_ref_no, product_code, lot_number, quantity_in, quantity_out, unit, warehouse, encoded_by, remarks) VALUES (:date, :type, :ref, :pcode, :lot, :in, :out, 'KG.', :wh, :user, 'Stock returned on deletion')"""),
-                                           [{"date": primary_data['endorsement_date'], "ref": ref_no,
-                                             "pcode": primary_data['product_code'], "lot": l['lot_number'], **l,
-                                             "wh": primary_data['warehouse'], "user": self.username} for l in
-                                            trans_out])
+                soft_delete_document(conn, 'QCFP', ref_no, self.username)
             self.log_audit_trail("DELETE_QCFP_ENDORSEMENT", f"Soft-deleted QCFP: {ref_no}");
             QMessageBox.information(self, "Success", f"Endorsement {ref_no} deleted.");
             self._refresh_all_data_views()
@@ -964,36 +889,8 @@ class QCFailedPassedPage(QWidget):
         self.prev_btn.setEnabled(self.current_page > 1);
         self.next_btn.setEnabled(self.current_page < self.total_pages)
 
-    def _generate_ref_no(self):
-        prefix = f"QCFP-{datetime.now().strftime('%y%m')}-"
-        with self.engine.connect() as conn:
-            last_ref = conn.execute(text(
-                "SELECT system_ref_no FROM qcfp_endorsements_primary WHERE system_ref_no LIKE :p ORDER BY id DESC LIMIT 1"),
-                                    {"p": f"{prefix}%"}).scalar_one_or_none()
-            next_seq = int(last_ref.split('-')[-1]) + 1 if last_ref else 1;
-            return f"{prefix}{next_seq:04d}"
-
-    def _parse_lot_range(self, lot_input, num_lots_needed):
-        try:
-            parts = [s.strip().upper() for s in lot_input.split('-')];
-            if len(parts) != 2: raise ValueError("Lot range must contain exactly one hyphen.")
-            start_str, end_str = parts;
-            start_match = re.match(r'^(\d+)([A-Z]*)$', start_str);
-            end_match = re.match(r'^(\d+)([A-Z]*)$', end_str)
-            if not start_match or not end_match or start_match.group(2) != end_match.group(2): raise ValueError(
-                "Format invalid or suffixes mismatch.")
-            start_num, end_num, suffix, num_len = int(start_match.group(1)), int(end_match.group(1)), start_match.group(
-                2), len(start_match.group(1))
-            if start_num > end_num: raise ValueError("Start lot cannot be greater than end lot.")
-            if end_num - start_num + 1 < num_lots_needed:
-                QMessageBox.warning(self, "Lot Range Too Small",
-                                    f"Range has {end_num - start_num + 1} lots, but {num_lots_needed} are required.");
-                return None
-            lots = [f"{str(start_num + i).zfill(num_len)}{suffix}" for i in range(num_lots_needed)];
-            return {'lots': lots, 'end_lot': end_str}
-        except Exception as e:
-            QMessageBox.critical(self, "Lot Range Error", f"Could not parse lot range '{lot_input}': {e}");
-            return None
+    def _generate_ref_no(self, conn):
+        return next_document_number(conn, 'QCFP')
 
     def _populate_records_table(self, data: list, headers: list):
         table = self.records_table;
@@ -1045,6 +942,7 @@ if __name__ == "__main__":
     try:
         with db_engine.connect() as conn, conn.begin():
             # Create tables
+            ensure_document_counters(conn)
             conn.execute(text(
                 "CREATE TABLE qcfp_endorsements_primary (id INTEGER PRIMARY KEY, system_ref_no TEXT, form_ref_no TEXT, endorsement_date DATE, product_code TEXT, lot_number TEXT, quantity_kg REAL, weight_per_lot REAL, endorsed_by TEXT, warehouse TEXT, received_by_name TEXT, received_date_time DATE, encoded_by TEXT, encoded_on DATETIME, edited_by TEXT, edited_on DATETIME, is_deleted BOOLEAN DEFAULT 0)"))
             conn.execute(text(
@@ -1065,6 +963,8 @@ if __name__ == "__main__":
             conn.execute(text("INSERT INTO warehouses (name) VALUES ('MAIN-WH'), ('QC-WH')"))
             conn.execute(text("INSERT INTO qcfp_receivers (name) VALUES ('WAREHOUSE STAFF 1'), ('WAREHOUSE STAFF 2')"))
             conn.execute(text("INSERT INTO legacy_production (prod_code) VALUES ('PROD-A'), ('PROD-B')"))
+            conn.execute(text("CREATE TABLE products (product_code TEXT PRIMARY KEY, fg_type TEXT)"))
+            conn.execute(text("INSERT INTO products (product_code, fg_type) VALUES ('PROD-A', 'DC'), ('PROD-B', 'DC')"))
 
     except Exception as e:
         print(f"Error setting up dummy database: {e}")
@@ -1072,7 +972,7 @@ if __name__ == "__main__":
     main_window = QMainWindow()
     main_window.setWindowTitle("QC Failed to Passed Module - Standalone")
     main_window.setGeometry(100, 100, 1200, 800)
-    main_widget = QCFailedPassedPage(db_engine, "TEST_USER", lambda x, y: print(f"AUDIT: {x} - {y}"))
+    main_widget = QCFailedPassedPage(db_engine, "TEST_USER", lambda x, y, batch=None: print(f"AUDIT: {x} - {y}"))
     main_window.setCentralWidget(main_widget)
     main_window.show()
     sys.exit(app.exec())
\ No newline at end of file
@@ -0,0 +1,250 @@
+"""
+Camera / video QR scanning for the DR scanner tab.
+
+The capture loop only reads frames and hands them off:
+  * decoding runs on its own thread, on a downscaled grayscale copy of the most recent frame (older frames
+    are dropped, never queued) with zbar restricted to QR symbols;
+  * the preview is resized to the label's size and emitted at most at the screen refresh rate (capped);
+  * repeated sightings of the same code are debounced, so a DR held in front of the camera fires once.
+
+The source is a camera index or a video file path, so a recorded clip can stand in for the camera.
+Run this module directly to scan a clip headless and print detections and throughput.
+"""
+import sys
+import threading
+import time
+
+from PyQt6.QtCore import QThread, pyqtSignal, QSize
+from PyQt6.QtGui import QImage, QGuiApplication
+
+try:
+    import cv2
+    from pyzbar.pyzbar import decode, ZBarSymbol
+
+    CAMERA_AVAILABLE = True
+except ImportError:
+    CAMERA_AVAILABLE = False
+    print("WARNING: 'opencv-python' or 'pyzbar' not found. Camera features will be disabled.")
+    print("Install with: pip install opencv-python pyzbar numpy")
+
+DECODE_WIDTH = 640  # decode frames are shrunk to this width; a printed DR code stays well above zbar's minimum
+MAX_DISPLAY_FPS = 30
+DEBOUNCE_SECONDS = 2.0
+CAMERA_SOURCE_SETTING_KEY = "scanner/camera_source"  # camera index, or a video file path for testing
+
+
+def parse_source(value):
+    """'0' / 0 -> camera index 0; anything else is treated as a video file path."""
+    if isinstance(value, int):
+        return value
+    value = str(value or '0').strip()
+    return int(value) if value.isdigit() else value
+
+
+def open_capture(source):
+    if isinstance(source, int) and sys.platform == 'win32':
+        return cv2.VideoCapture(source, cv2.CAP_DSHOW)
+    return cv2.VideoCapture(source)
+
+
+def display_fps_for(widget) -> float:
+    screen = widget.screen() if widget is not None else QGuiApplication.primaryScreen()
+    refresh_rate = screen.refreshRate() if screen is not None else MAX_DISPLAY_FPS
+    return max(1.0, min(float(refresh_rate or MAX_DISPLAY_FPS), MAX_DISPLAY_FPS))
+
+
+class ScanDebouncer:
+    """Accepts a code once, then ignores it until it has been out of view for hold_seconds."""
+
+    def __init__(self, hold_seconds: float = DEBOUNCE_SECONDS, clock=time.monotonic):
+        self.hold_seconds = hold_seconds
+        self.clock = clock
+        self._last_seen = {}
+
+    def accept(self, data: str) -> bool:
+        now = self.clock()
+        last = self._last_seen.get(data)
+        self._last_seen[data] = now
+        if len(self._last_seen) > 64:
+            self._last_seen = {k: t for k, t in self._last_seen.items() if now - t < self.hold_seconds}
+        return last is None or now - last >= self.hold_seconds
+
+
+def decode_frame(frame, decode_width: int = DECODE_WIDTH) -> list:
+    """Returns the QR payloads found in a BGR frame, decoded from a downscaled grayscale copy."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    h, w = gray.shape
+    if w > decode_width:
+        gray = cv2.resize(gray, (decode_width, int(h * decode_width / w)), interpolation=cv2.INTER_AREA)
+    return [obj.data.decode('utf-8', errors='replace') for obj in decode(gray, symbols=[ZBarSymbol.QRCODE])]
+
+
+class QrDecoder(threading.Thread):
+    """Decodes the latest submitted frame on a background thread; frames arriving while busy replace each other."""
+
+    def __init__(self, on_decoded, decode_width: int = DECODE_WIDTH):
+        super().__init__(name="QrDecoder", daemon=True)
+        self.on_decoded = on_decoded
+        self.decode_width = decode_width
+        self.frames_decoded = 0
+        self._frame = None
+        self._cond = threading.Condition()
+        self._running = True
+
+    def submit(self, frame):
+        with self._cond:
+            self._frame = frame
+            self._cond.notify()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+
+    def drain(self, timeout: float = 5.0):
+        """Waits until the pending frame has been picked up, so file sources never drop a frame."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._frame is not None and self._running and time.monotonic() < deadline:
+                self._cond.wait(0.01)
+
+    def run(self):
+        while True:
+            with self._cond:
+                while self._frame is None and self._running:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                frame, self._frame = self._frame, None
+                self._cond.notify_all()
+            try:
+                for data in decode_frame(frame, self.decode_width):
+                    self.on_decoded(data)
+            except Exception as e:
+                print(f"QrDecoder: Error during QR decoding: {e}")
+            self.frames_decoded += 1
+
+
+class CameraThread(QThread):
+    """
+    A QThread that captures video from a camera (or a video file), feeds the QR decoder and
+    emits throttled, display-sized preview frames.
+    """
+    frame_ready = pyqtSignal(QImage)
+    qr_code_detected = pyqtSignal(str)
+    camera_error = pyqtSignal(str)
+
+    def __init__(self, camera_index=0, parent=None, display_size: QSize = None, display_fps: float = MAX_DISPLAY_FPS,
+                 realtime: bool = True):
+        super().__init__(parent)
+        self.source = parse_source(camera_index)
+        self.display_interval = 1.0 / max(1.0, display_fps)
+        self.realtime = realtime  # pace file sources at their native frame rate
+        self.debouncer = ScanDebouncer()
+        self._display_size = (display_size.width(), display_size.height()) if display_size else None
+        self._is_running = True
+
+    def set_display_size(self, size: QSize):
+        self._display_size = (size.width(), size.height())
+
+    def _on_decoded(self, data: str):
+        if self.debouncer.accept(data):
+            self.qr_code_detected.emit(data)
+
+    def _emit_preview(self, frame):
+        h, w = frame.shape[:2]
+        if self._display_size:
+            max_w, max_h = self._display_size
+            scale = min(max_w / w, max_h / h)
+            if 0 < scale < 1:
+                frame = cv2.resize(frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_LINEAR)
+                h, w = frame.shape[:2]
+        # BGR888 avoids a full cvtColor pass; copy() detaches the image from the numpy buffer
+        qt_image = QImage(frame.data, w, h, frame.strides[0], QImage.Format.Format_BGR888)
+        self.frame_ready.emit(qt_image.copy())
+
+    def run(self):
+        print(f"CameraThread: Starting ({self.source})...")
+        cap = open_capture(self.source)
+        if not cap.isOpened():
+            self.camera_error.emit(f"Could not open camera/video source {self.source}.")
+            return
+
+        is_file = not isinstance(self.source, int)
+        if not is_file:
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # keep latency low; stale buffered frames are useless
+        file_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        decoder = QrDecoder(self._on_decoded)
+        decoder.start()
+        next_preview = 0.0
+        started, frame_no = time.monotonic(), 0
+        try:
+            while self._is_running:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                frame_no += 1
+                decoder.submit(frame)
+                now = time.monotonic()
+                if now >= next_preview:
+                    next_preview = now + self.display_interval
+                    try:
+                        self._emit_preview(frame)
+                    except Exception as e:
+                        print(f"CameraThread: Error converting frame: {e}")
+                if is_file:
+                    if self.realtime:
+                        delay = started + frame_no / file_fps - time.monotonic()
+                        if delay > 0: self.msleep(int(delay * 1000))
+                    else:
+                        decoder.drain()
+        finally:
+            decoder.stop()
+            decoder.join(timeout=2)
+            print("CameraThread: Releasing camera...")
+            cap.release()
+            print("CameraThread: Finished.")
+
+    def stop(self):
+        print("CameraThread: Stop requested.")
+        self._is_running = False
+
+
+if __name__ == "__main__":
+    # Headless check against a recorded clip: python qr_scanner.py clip.mp4 [--decode-width 640]
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Scan a video file (or camera index) for DR QR codes.")
+    parser.add_argument("source", help="Video file path or camera index")
+    parser.add_argument("--decode-width", type=int, default=DECODE_WIDTH)
+    args = parser.parse_args()
+    if not CAMERA_AVAILABLE:
+        sys.exit("opencv-python and pyzbar are required.")
+
+    debouncer = ScanDebouncer()
+    detections = []
+
+    def report(data: str):
+        if debouncer.accept(data):
+            detections.append(data)
+            print(f"{time.monotonic() - t0:8.2f}s  {data}")
+
+    capture = open_capture(parse_source(args.source))
+    if not capture.isOpened():
+        sys.exit(f"Could not open {args.source}")
+    qr_decoder = QrDecoder(report, args.decode_width)
+    qr_decoder.start()
+    t0, frames = time.monotonic(), 0
+    while True:
+        ok, img = capture.read()
+        if not ok:
+            break
+        frames += 1
+        qr_decoder.submit(img)
+        qr_decoder.drain()
+    qr_decoder.stop()
+    qr_decoder.join()
+    capture.release()
+    elapsed = time.monotonic() - t0
+    print(f"{frames} frames in {elapsed:.2f}s ({frames / max(elapsed, 1e-9):.1f} fps), "
+          f"{qr_decoder.frames_decoded} decoded, {len(detections)} detection(s)")
@@ -1,27 +1,25 @@
-import sys
-import io
 from datetime import datetime, date
 from decimal import Decimal
-from functools import partial
 import traceback
 
 # --- PDF & Printing Imports (Unchanged) ---
-import fitz  # PyMuPDF
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER, TA_RIGHT
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import (SimpleDocTemplate, Paragraph, Table, TableStyle)
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+from pdf_render import paint_pdf, release_pdf
+from print_documents import DOC_RR, build_receiving_report_pdf
+from batch_print import BatchPrintDialog
+from completion import attach_prefix_query_completer
+from document_counters import next_document_number
+from endorsement_store import SaveBatch
+from ledger import LedgerRow, LedgerWriter
+from reference_data import bind_reference_combo, invalidate_reference, reference_values
+from soft_delete import restore_document, soft_delete_document
 
 # --- PyQt6 Imports ---
 from PyQt6.QtCore import Qt, QDate, pyqtSignal, QSizeF, QDateTime, QSize
-from PyQt6.QtWidgets import (QApplication, QWidget, QVBoxLayout, QTabWidget, QFormLayout, QLineEdit, QDateEdit,
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QTabWidget, QFormLayout, QLineEdit, QDateEdit,
                              QPushButton, QTableWidget, QTableWidgetItem, QComboBox, QCompleter,
                              QAbstractItemView, QHeaderView, QMessageBox, QHBoxLayout, QLabel,
                              QDialog, QDialogButtonBox, QGroupBox, QMenu, QGridLayout, QSplitter, QInputDialog, QFrame)
-from PyQt6.QtGui import QDoubleValidator, QPainter, QPageSize, QImage, QFont
+from PyQt6.QtGui import QDoubleValidator, QPageSize
 from PyQt6.QtPrintSupport import QPrinter, QPrintPreviewDialog
 
 from sqlalchemy import text
@@ -121,6 +119,7 @@ class AddNewRecordDialog(QDialog):
             with self.engine.connect() as conn, conn.begin():
                 conn.execute(text(f"INSERT INTO {self.table_name} (name) VALUES (:name) ON CONFLICT (name) DO NOTHING"),
                              {"name": name})
+            invalidate_reference(self.table_name)
             self.new_record_name = name
             self.accept()
         except Exception as e:
@@ -154,6 +153,7 @@ class AddItemDialog(QDialog):
         )
 
         self.lot_no_edit = UpperCaseLineEdit()
+        attach_prefix_query_completer(self.lot_no_edit, self.engine, 'production_lots')
 
         # --- UPDATED VALIDATION WIDGETS ---
         self.check_lot_btn = QPushButton("Verify Lot")
@@ -234,13 +234,7 @@ class AddItemDialog(QDialog):
     # (Other methods in AddItemDialog remain unchanged as they are logic related)
     def _load_product_codes(self):
         try:
-            with self.engine.connect() as conn:
-                prod_codes = conn.execute(
-                    text("SELECT DISTINCT prod_code FROM legacy_production ORDER BY prod_code")
-                ).scalars().all()
-
-            self.material_code_edit.addItems([""] + prod_codes)
-            self.material_code_edit.completer().setModel(self.material_code_edit.model())
+            bind_reference_combo(self.material_code_edit, self.engine, 'product_codes')
         except Exception as e:
             QMessageBox.warning(self, "Database Error", f"Could not load product codes: {e}")
 
@@ -633,47 +627,24 @@ class ReceivingReportPage(QWidget):
         if reply == QMessageBox.StandardButton.Yes:
             try:
                 with self.engine.connect() as conn, conn.begin():
-                    conn.execute(text(
-                        "UPDATE receiving_reports_primary SET is_deleted = FALSE, edited_by = :u, edited_on = :n WHERE rr_no = :rr"),
-                        {"u": self.username, "n": datetime.now(), "rr": rr_no})
-
-                    primary_data = conn.execute(
-                        text("SELECT receive_date FROM receiving_reports_primary WHERE rr_no = :rr_no"),
-                        {"rr_no": rr_no}).mappings().one()
-                    items_data = conn.execute(text("SELECT * FROM receiving_reports_items WHERE rr_no = :rr_no"),
-                                              {"rr_no": rr_no}).mappings().all()
-
-                    transactions_to_insert = []
-                    for item in items_data:
-                        transactions_to_insert.append({
-                            "transaction_date": primary_data["receive_date"],
-                            "transaction_type": "RECEIVING_REPORT",
-                            "source_ref_no": rr_no,
-                            "product_code": item["material_code"],
-                            "lot_number": item["lot_no"],
-                            "quantity_in": item["quantity_kg"],
-                            "quantity_out": 0,
-                            "unit": "KG.",
-                            "warehouse": item["location"],
-                            "encoded_by": self.username,
-                            "remarks": f"Restored from RRRG No. {rr_no}"
-                        })
-
-                    if transactions_to_insert:
-                        conn.execute(text(
-                            "DELETE FROM transactions WHERE source_ref_no = :rr_no AND transaction_type = 'RECEIVING_REPORT'"),
-                            {"rr_no": rr_no})
-                        conn.execute(text("""
-                            INSERT INTO transactions (
-                                transaction_date, transaction_type, source_ref_no, product_code, 
-                                lot_number, quantity_in, quantity_out, unit, warehouse, 
-                                encoded_by, remarks
-                            ) VALUES (
-                                :transaction_date, :transaction_type, :source_ref_no, :product_code, 
-                                :lot_number, :quantity_in, :quantity_out, :unit, :warehouse, 
-                                :encoded_by, :remarks
-                            )
-                        """), transactions_to_insert)
+                    if not restore_document(conn, 'RR', rr_no, self.username):
+                        # Deleted before deleted_ledger_rows existed: rebuild its ledger rows
+                        primary_data = conn.execute(
+                            text("SELECT receive_date FROM receiving_reports_primary WHERE rr_no = :rr_no"),
+                            {"rr_no": rr_no}).mappings().one()
+                        items_data = conn.execute(text("SELECT * FROM receiving_reports_items WHERE rr_no = :rr_no"),
+                                                  {"rr_no": rr_no}).mappings().all()
+
+                        ledger = LedgerWriter()
+                        for item in items_data:
+                            ledger.add('transactions', LedgerRow(
+                                transaction_date=primary_data["receive_date"], transaction_type="RECEIVING_REPORT",
+                                source_ref_no=rr_no, product_code=item["material_code"], lot_number=item["lot_no"],
+                                quantity_in=item["quantity_kg"], warehouse=item["location"],
+                                encoded_by=self.username, remarks=f"Restored from RRRG No. {rr_no}"))
+                        if ledger:
+                            ledger.replace(rr_no, ('transactions',), ('RECEIVING_REPORT',))
+                            ledger.to_batch(SaveBatch(conn)).execute()
 
                 self.log_audit_trail("RESTORE_RECEIVING_REPORT",
                                      f"Restored report: {rr_no} and re-logged transactions.")
@@ -689,24 +660,12 @@ class ReceivingReportPage(QWidget):
 
     def _load_combobox_data(self):
         try:
-            with self.engine.connect() as conn:
-                self.warehouses_list = conn.execute(text("SELECT name FROM warehouses ORDER BY name")).scalars().all()
-                self.receivers_list = conn.execute(text("SELECT name FROM rr_receivers ORDER BY name")).scalars().all()
-                self.reporters_list = conn.execute(text("SELECT name FROM rr_reporters ORDER BY name")).scalars().all()
-                customers = conn.execute(
-                    text("SELECT name FROM customers WHERE is_deleted IS NOT TRUE ORDER BY name")).scalars().all()
-
-            for combo, data_list in [(self.received_by_combo, self.receivers_list),
-                                     (self.reported_by_combo, self.reporters_list)]:
-                current_text = combo.currentText()
-                combo.clear();
-                combo.addItems([""] + data_list);
-                combo.setCurrentText(current_text)
-
-            current_customer = self.customer_combo.currentText()
-            self.customer_combo.clear();
-            self.customer_combo.addItems([""] + customers)
-            self.customer_combo.setCurrentText(current_customer)
+            self.warehouses_list = reference_values(self.engine, 'warehouses')
+            self.receivers_list = reference_values(self.engine, 'rr_receivers')
+            self.reporters_list = reference_values(self.engine, 'rr_reporters')
+            bind_reference_combo(self.received_by_combo, self.engine, 'rr_receivers')
+            bind_reference_combo(self.reported_by_combo, self.engine, 'rr_reporters')
+            bind_reference_combo(self.customer_combo, self.engine, 'customers')
         except Exception as e:
             QMessageBox.critical(self, "DB Error", f"Could not load data for dropdowns: {e}")
 
@@ -735,10 +694,12 @@ class ReceivingReportPage(QWidget):
         self.refresh_btn = QPushButton("Refresh")
         self.update_btn = QPushButton("Load for Update");
         self.delete_btn = QPushButton("Delete Selected");
+        self.batch_print_btn = QPushButton("Batch Print...")
 
         self.refresh_btn.setIcon(fa.icon('fa5s.sync-alt', color=COLOR_DEFAULT))
         self.update_btn.setIcon(fa.icon('fa5s.edit', color=COLOR_PRIMARY))
         self.delete_btn.setIcon(fa.icon('fa5s.trash-alt', color=COLOR_DANGER))
+        self.batch_print_btn.setIcon(fa.icon('fa5s.print', color=COLOR_PRIMARY))
         self.refresh_btn.setObjectName("DefaultButton")
         self.update_btn.setObjectName("PrimaryButton")
         self.delete_btn.setObjectName("delete_btn")
@@ -748,6 +709,7 @@ class ReceivingReportPage(QWidget):
         top_layout.addWidget(self.refresh_btn)
         top_layout.addWidget(self.update_btn);
         top_layout.addWidget(self.delete_btn)
+        top_layout.addWidget(self.batch_print_btn)
         layout.addWidget(controls_group)
 
         self.records_table = QTableWidget()
@@ -788,6 +750,7 @@ class ReceivingReportPage(QWidget):
         self.records_table.itemSelectionChanged.connect(self._on_record_selection_changed)
         self.update_btn.clicked.connect(self._load_record_for_update)
         self.delete_btn.clicked.connect(self._delete_record)
+        self.batch_print_btn.clicked.connect(self._open_batch_print)
         self.prev_btn.clicked.connect(self._go_to_prev_page)
         self.next_btn.clicked.connect(self._go_to_next_page)
         self._on_record_selection_changed()
@@ -1215,9 +1178,6 @@ class ReceivingReportPage(QWidget):
                 if self.current_editing_rr_no:
                     rr_no = self.current_editing_rr_no;
                     primary_data["rr_no"] = rr_no
-                    conn.execute(text(
-                        "DELETE FROM transactions WHERE source_ref_no = :rr_no AND transaction_type = 'RECEIVING_REPORT'"),
-                        {"rr_no": rr_no})
                     conn.execute(text(
                         "UPDATE receiving_reports_primary SET receive_date=:receive_date, receive_from=:receive_from, pull_out_form_no=:pull_out_form_no, received_by=:received_by, reported_by=:reported_by, remarks=:remarks, edited_by=:edited_by, edited_on=:edited_on WHERE rr_no=:rr_no"),
                         primary_data)
@@ -1225,7 +1185,7 @@ class ReceivingReportPage(QWidget):
                     self.log_audit_trail("UPDATE_RECEIVING_REPORT", f"Updated: {rr_no}");
                     action_text = "updated"
                 else:
-                    rr_no = self._generate_rr_no();
+                    rr_no = self._generate_rr_no(conn);
                     primary_data["rr_no"] = rr_no;
                     primary_data["encoded_by"] = self.username;
                     primary_data["encoded_on"] = datetime.now()
@@ -1240,26 +1200,16 @@ class ReceivingReportPage(QWidget):
                     "INSERT INTO receiving_reports_items (rr_no, material_code, lot_no, quantity_kg, status, location) VALUES (:rr_no, :material_code, :lot_no, :quantity_kg, :status, :location)"),
                     items_data)
 
-                transactions_to_insert = []
+                ledger = LedgerWriter()
                 for item in items_data:
-                    transactions_to_insert.append({
-                        "transaction_date": primary_data["receive_date"],
-                        "transaction_type": "RECEIVING_REPORT",
-                        "source_ref_no": rr_no,
-                        "product_code": item["material_code"],
-                        "lot_number": item["lot_no"],
-                        "quantity_in": item["quantity_kg"],
-                        "quantity_out": 0, "unit": "KG.", "warehouse": item["location"],
-                        "encoded_by": self.username, "remarks": f"Received via RRRG No. {rr_no}"
-                    })
-
-                if transactions_to_insert:
-                    conn.execute(text("""
-                        INSERT INTO transactions (
-                            transaction_date, transaction_type, source_ref_no, product_code, lot_number, quantity_in, quantity_out, unit, warehouse, encoded_by, remarks
-                        ) VALUES (
-                            :transaction_date, :transaction_type, :source_ref_no, :product_code, :lot_number, :quantity_in, :quantity_out, :unit, :warehouse, :encoded_by, :remarks
-                        )"""), transactions_to_insert)
+                    ledger.add('transactions', LedgerRow(
+                        transaction_date=primary_data["receive_date"], transaction_type="RECEIVING_REPORT",
+                        source_ref_no=rr_no, product_code=item["material_code"], lot_number=item["lot_no"],
+                        quantity_in=item["quantity_kg"], warehouse=item["location"],
+                        encoded_by=self.username, remarks=f"Received via RRRG No. {rr_no}"))
+                if self.current_editing_rr_no:  # only the rows that changed are rewritten
+                    ledger.replace(rr_no, ('transactions',), ('RECEIVING_REPORT',))
+                ledger.to_batch(SaveBatch(conn)).execute()
 
             QMessageBox.information(self, "Success", f"Receiving Report {rr_no} {action_text} successfully.");
             self._clear_form();
@@ -1337,31 +1287,15 @@ class ReceivingReportPage(QWidget):
 
         try:
             with self.engine.connect() as conn, conn.begin():
-                conn.execute(text(
-                    "UPDATE receiving_reports_primary SET is_deleted = TRUE, edited_by = :u, edited_on = :n WHERE rr_no = :rr"),
-                    {"u": self.username, "n": datetime.now(), "rr": rr_no})
-                conn.execute(text(
-                    "DELETE FROM transactions WHERE source_ref_no = :rr_no AND transaction_type = 'RECEIVING_REPORT'"),
-                    {"rr_no": rr_no})
+                soft_delete_document(conn, 'RR', rr_no, self.username)
             self.log_audit_trail("DELETE_RECEIVING_REPORT", f"Soft-deleted report: {rr_no} and reversed transactions.")
             QMessageBox.information(self, "Success", f"Report {rr_no} moved to the Deleted tab.")
             self._refresh_all_data_views()
         except Exception as e:
             QMessageBox.critical(self, "Database Error", f"Could not delete record: {e}")
 
-    def _generate_rr_no(self):
-        prefix = f"RRRG{datetime.now().strftime('%y%m')}"
-        with self.engine.connect() as conn:
-            last_ref = conn.execute(
-                text("SELECT rr_no FROM receiving_reports_primary WHERE rr_no LIKE :p ORDER BY rr_no DESC LIMIT 1"),
-                {"p": f"{prefix}%"}).scalar_one_or_none()
-            last_seq = 0
-            if last_ref and last_ref.startswith(prefix):
-                try:
-                    last_seq = int(last_ref[len(prefix):])
-                except (ValueError, IndexError):
-                    pass
-            return f"{prefix}{(last_seq + 1):03d}"
+    def _generate_rr_no(self, conn):
+        return next_document_number(conn, 'RR')
 
     def _populate_records_table(self, data, headers):
         table = self.records_table
@@ -1447,166 +1381,20 @@ class ReceivingReportPage(QWidget):
         preview.paintRequested.connect(self._handle_paint_request)
         preview.resize(1000, 800)
         preview.exec()
+        release_pdf(self.current_pdf_buffer)
 
     def _handle_paint_request(self, printer: QPrinter):
         if not self.current_pdf_buffer: return
-        painter = QPainter()
-        if not painter.begin(printer):
-            QMessageBox.critical(self, "Print Error", "Could not initialize painter.")
-            return
-        self.current_pdf_buffer.seek(0)
-        pdf_doc = fitz.open(stream=self.current_pdf_buffer, filetype="pdf")
-        dpi = 300
-        zoom = dpi / 72.0
-        mat = fitz.Matrix(zoom, zoom)
-        page_rect_dev_pixels = printer.pageRect(QPrinter.Unit.DevicePixel)
-
-        for i, page in enumerate(pdf_doc):
-            if i > 0: printer.newPage()
-            pix = page.get_pixmap(matrix=mat, alpha=False)
-            image = QImage(pix.samples, pix.width, pix.height, pix.stride, QImage.Format.Format_RGB888)
-            painter.drawImage(page_rect_dev_pixels.toRect(), image, image.rect())
-        pdf_doc.close()
-        painter.end()
-
-    def _draw_page_template(self, canvas, doc, header_table, footer_table):
-        canvas.saveState()
-        page_width, page_height = doc.pagesize
-        header_table.wrapOn(canvas, doc.width, doc.topMargin)
-        header_table.drawOn(canvas, doc.leftMargin, page_height - header_table._height - (0.2 * inch))
-        footer_table.wrapOn(canvas, doc.width, doc.bottomMargin)
-        footer_table.drawOn(canvas, doc.leftMargin, 0.2 * inch)
-        canvas.restoreState()
+        try:
+            paint_pdf(printer, self.current_pdf_buffer, print_dpi=300)
+        except Exception as e:
+            QMessageBox.critical(self, "Print Error", f"An error occurred during printing: {e}")
 
     def _generate_report_pdf(self, primary_data, items_data):
-        try:
-            pdfmetrics.registerFont(TTFont('LucidaSans', 'C:/Windows/Fonts/LSANS.TTF'))
-            pdfmetrics.registerFont(TTFont('LucidaSans-Bold', 'C:/Windows/Fonts/LTYPEB.TTF'))
-            pdfmetrics.registerFontFamily('LucidaSans', normal='LucidaSans', bold='LucidaSans-Bold')
-        except Exception:
-            try:
-                pdfmetrics.registerFont(TTFont('Arial', 'arial.ttf'))
-                pdfmetrics.registerFont(TTFont('Arial-Bold', 'arialbd.ttf'))
-                pdfmetrics.registerFontFamily('LucidaSans', normal='Arial', bold='Arial-Bold')
-            except Exception as e:
-                QMessageBox.critical(self, "Font Error", f"Could not register fallback font 'Arial'.\nError: {e}")
-                return None
-
-        buffer = io.BytesIO()
-        page_width, page_height = (8.5 * inch, 5.5 * inch)
-        styles = getSampleStyleSheet()
-        styles.add(ParagraphStyle(name='MainStyle', fontName='LucidaSans', fontSize=9, leading=10))
-        styles.add(ParagraphStyle(name='MainStyleBold', parent=styles['MainStyle'], fontName='LucidaSans-Bold'))
-        styles.add(ParagraphStyle(name='MainStyleRight', parent=styles['MainStyle'], alignment=TA_RIGHT))
-        styles.add(ParagraphStyle(name='MainStyleBoldRight', parent=styles['MainStyleBold'], alignment=TA_RIGHT))
-        styles.add(ParagraphStyle(name='MainStyleCenter', parent=styles['MainStyle'], alignment=TA_CENTER))
-        styles.add(ParagraphStyle(name='MainStyleBoldCenter', parent=styles['MainStyleBold'], alignment=TA_CENTER))
-        styles.add(ParagraphStyle(name='Footer', fontName='LucidaSans-Bold', fontSize=8, leading=9))
-        styles.add(ParagraphStyle(name='FooterSig', fontName='LucidaSans', fontSize=8, alignment=TA_CENTER))
-        styles.add(ParagraphStyle(name='FooterSub', fontName='LucidaSans', fontSize=7, alignment=TA_CENTER))
-        styles.add(ParagraphStyle(name='RemarkStyle', fontName='LucidaSans', fontSize=8, leading=9, leftIndent=5))
-
-        header_left_text = """<font name='LucidaSans-Bold' size='12'>MASTERBATCH PHILIPPINES INC.</font><br/><font size='8'>24 Diamond Road, Caloocan Industrial Subd., Bo. Kaybiga Caloocan City</font><br/><font size='8'>Tel. Nos.: 8935-93-75 | 8935-93-76 | 7738-1207</font>"""
-        header_right_text = f"""<font name='LucidaSans-Bold' size='12'>RECEIVING REPORT</font><br/><font name='LucidaSans-Bold' size='12'>FOR RETURNED GOODS</font><br/><br/><font name='LucidaSans-Bold' size='11'>RRRG No.: {primary_data['rr_no']}</font>"""
-        header_table = Table([[Paragraph(header_left_text, styles['MainStyle']),
-                               Paragraph(header_right_text, styles['MainStyleBoldRight'])]],
-                             colWidths=[4.8 * inch, 2.8 * inch], style=[('VALIGN', (0, 0), (-1, -1), 'TOP')])
-
-        signature_line = "_" * 25
-        footer_data = [
-            [Paragraph("Received and checked by:", styles['Footer']), Paragraph("Reported by:", styles['Footer']),
-             Paragraph("Noted by:", styles['Footer'])],
-            [Paragraph(f"<br/>{primary_data.get('received_by', '').upper()}", styles['FooterSig']),
-             Paragraph(f"<br/>{primary_data.get('reported_by', '').upper()}", styles['FooterSig']),
-             Paragraph("<br/>", styles['FooterSig'])],
-            [Paragraph(signature_line, styles['FooterSig']), Paragraph(signature_line, styles['FooterSig']),
-             Paragraph(signature_line, styles['FooterSig'])],
-            [Paragraph("Signature Over Printed Name", styles['FooterSub']),
-             Paragraph("Signature Over Printed Name", styles['FooterSub']),
-             Paragraph("Signature Over Printed Name", styles['FooterSub'])]]
-        footer_table = Table(footer_data, colWidths=[2.6 * inch] * 3,
-                             rowHeights=[0.15 * inch, 0.25 * inch, 0.05 * inch, 0.15 * inch])
-        footer_table.setStyle(TableStyle([('VALIGN', (0, 0), (-1, -1), 'BOTTOM'), ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                                          ('LEFTPADDING', (0, 0), (-1, -1), 0), ('RIGHTPADDING', (0, 0), (-1, -1), 0)]))
-
-        _, header_height = header_table.wrap(page_width, page_height)
-        _, footer_height = footer_table.wrap(page_width, page_height)
-        doc = SimpleDocTemplate(buffer, pagesize=(page_width, page_height), leftMargin=0.3 * inch,
-                                rightMargin=0.3 * inch, topMargin=header_height + 0.3 * inch,
-                                bottomMargin=footer_height + 0.25 * inch)
-        Story = []
-
-        details_data = [
-            [Paragraph(f"<b>Received From:</b> {primary_data['receive_from']}", styles['MainStyle']),
-             Paragraph(f"<b>Date Received:</b> {primary_data['receive_date']}", styles['MainStyle'])],
-            [Paragraph(f"<b>Pull Out Form#:</b> {primary_data['pull_out_form_no']}", styles['MainStyle']), ""]]
-        details_table = Table(details_data, colWidths=[5.4 * inch, 2.5 * inch])
-        details_table.setStyle(TableStyle(
-            [('GRID', (0, 0), (-1, -1), 0.5, colors.black), ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-             ('LEFTPADDING', (0, 0), (-1, -1), 5), ('SPAN', (1, 1), (1, 1))]))
-        Story.append(details_table)
-
-        MAX_CONTENT_ROWS = 10
-        items_tbl_headers = ["Product Code", "Lot no.", "Quantity (kg)", "Status", "Location"]
-        items_tbl_data = [[Paragraph(f'<b>{h}</b>', styles['MainStyleBoldCenter']) for h in items_tbl_headers]]
-        row_heights = [0.25 * inch]
-
-        styles_dyn = [('VALIGN', (0, 0), (-1, -1), 'MIDDLE'), ('LEFTPADDING', (0, 0), (-1, -1), 3),
-                      ('RIGHTPADDING', (0, 0), (-1, -1), 3), ('LINEBELOW', (0, 0), (-1, 0), 0.5, colors.black),
-                      ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey), ]
-
-        for item in items_data:
-            if len(items_tbl_data) > MAX_CONTENT_ROWS: break
-            qty_val = item.get('quantity_kg', 0)
-
-            # --- QTY FORMATTING MODIFICATION START ---
-            try:
-                # Need to handle case where quantity_kg might be a string (from entry form) containing commas
-                qty_float = float(str(qty_val).replace(',', ''))
-                qty_str = f"{qty_float:,.2f}"  # Format with comma
-            except (ValueError, TypeError):
-                qty_str = "0.00"
-            # --- QTY FORMATTING MODIFICATION END ---
-
-            items_tbl_data.append([Paragraph(str(item.get('material_code', '')), styles['MainStyle']),
-                                   Paragraph(str(item.get('lot_no', '')), styles['MainStyle']),
-                                   Paragraph(qty_str, styles['MainStyleRight']),
-                                   Paragraph(str(item.get('status', '')), styles['MainStyleCenter']),
-                                   Paragraph(str(item.get('location', '')), styles['MainStyleCenter'])])
-            row_heights.append(0.22 * inch)
-
-        remarks_text = primary_data.get('remarks', '').strip()
-        if remarks_text:
-            if len(items_tbl_data) <= MAX_CONTENT_ROWS:
-                remark_idx = len(items_tbl_data)
-                remark_para = Paragraph(f"<b>Remarks:</b> {remarks_text}", styles['RemarkStyle'])
-                items_tbl_data.append([remark_para, '', '', '', ''])
-                row_heights.append(0.5 * inch)
-                styles_dyn.extend(
-                    [('SPAN', (0, remark_idx), (-1, remark_idx)), ('VALIGN', (0, remark_idx), (-1, remark_idx), 'TOP'),
-                     ('TOPPADDING', (0, remark_idx), (-1, remark_idx), 5)])
-
-        if len(items_tbl_data) <= MAX_CONTENT_ROWS:
-            nf_idx = len(items_tbl_data)
-            items_tbl_data.append([Paragraph("***** NOTHING FOLLOWS *****", styles['MainStyleCenter']), '', '', '', ''])
-            row_heights.append(0.22 * inch)
-            styles_dyn.append(('SPAN', (0, nf_idx), (-1, nf_idx)))
-
-        while len(items_tbl_data) <= MAX_CONTENT_ROWS:
-            items_tbl_data.append([''] * len(items_tbl_headers))
-            row_heights.append(0.22 * inch)
-
-        styles_dyn.append(('LINEBELOW', (0, len(items_tbl_data) - 1), (-1, len(items_tbl_data) - 1), 0.5, colors.black))
-
-        items_table = Table(items_tbl_data, colWidths=[2.0 * inch, 2.0 * inch, 1.2 * inch, 1.3 * inch, 1.4 * inch],
-                            rowHeights=row_heights)
-        items_table.setStyle(TableStyle(styles_dyn))
-        Story.append(items_table)
-
-        doc.build(Story,
-                  onFirstPage=partial(self._draw_page_template, header_table=header_table, footer_table=footer_table))
-        buffer.seek(0)
-        return buffer
+        return build_receiving_report_pdf(primary_data, items_data)
+
+    def _open_batch_print(self):
+        BatchPrintDialog(self.engine, self.username, self.log_audit_trail, DOC_RR, self).exec()
 
     def _populate_table_generic(self, table, data, headers):
         table.setRowCount(0);
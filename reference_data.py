@@ -0,0 +1,234 @@
+"""
+Process-wide cache of the lookup lists behind the dropdowns: product codes, customers, units, warehouses,
+the endorser / receiver lists of each endorsement page and the requisition lookups.
+
+Each list is loaded once per process. reference_values() returns the cached list and bind_reference_combo()
+points a combo at one QStringListModel per list, shared by every combo that shows it, so a page reload costs
+nothing unless the list changed.
+
+Staleness is tracked per source table in reference_data_versions:
+- statement triggers on the lookup tables bump a table's version on every write, from any workstation;
+- products is bumped by product_master.register_products() only when a code is new (a statement trigger
+  there would fire on every endorsement save);
+- invalidate_reference() drops this process's copy right after it writes, so its own change shows at once.
+Other workstations pick up a bump on their next version check, at most every VERSION_CHECK_SECONDS.
+"""
+import difflib
+import threading
+import time
+
+from PyQt6.QtCore import QStringListModel, Qt
+from PyQt6.QtWidgets import QComboBox
+from sqlalchemy import text
+
+from completion import IndexedCompleter, PrefixIndex
+
+VERSION_CHECK_SECONDS = 10
+
+
+def _name_list(table: str, column: str = 'name'):
+    return table, f"SELECT {column} FROM {table} WHERE {column} IS NOT NULL AND {column} <> '' ORDER BY {column}"
+
+
+# key -> (source table, query); one-column queries give a list of values, wider ones a list of tuples
+LOOKUPS = {
+    'product_codes': ('products', "SELECT product_code FROM products ORDER BY product_code"),
+    'product_aliases': ('products', "SELECT product_code, alias_code, description FROM products "
+                                    "WHERE alias_code IS NOT NULL OR description IS NOT NULL ORDER BY product_code"),
+    'customers': ('customers', "SELECT name FROM customers WHERE is_deleted IS NOT TRUE ORDER BY name"),
+    'endorsement_remarks': _name_list('endorsement_remarks', 'remark_text'),
+    'requisition_statuses': _name_list('requisition_statuses', 'status_name'),
+}
+LOOKUPS.update({table: _name_list(table) for table in (
+    'units', 'warehouses', 'endorsers', 'rr_receivers', 'rr_reporters',
+    'qcf_endorsers', 'qcf_receivers', 'qce_endorsers', 'qce_receivers', 'qce_bag_numbers', 'qce_box_numbers',
+    'qce_remarks', 'qcfp_endorsers', 'qcfp_receivers',
+    'requisition_requesters', 'requisition_departments', 'requisition_approvers')})
+
+# Shown when the table is still empty, as the pages did before.
+FALLBACKS = {'requisition_statuses': ["PENDING", "APPROVED", "COMPLETED", "REJECTED"]}
+
+SYNCED_TABLES = {'products'}  # bumped by their writers, not by a trigger
+
+# Serialises the startup DDL between workstations starting at the same time.
+REFERENCE_LOCK_SQL = "SELECT pg_advisory_xact_lock(hashtext('reference_data'))"
+
+VERSIONS_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS reference_data_versions (
+        table_name VARCHAR(63) PRIMARY KEY,
+        version BIGINT NOT NULL DEFAULT 0,
+        changed_on TIMESTAMP NOT NULL DEFAULT NOW()
+    );
+"""
+
+BUMP_SQL = """
+    INSERT INTO reference_data_versions AS v (table_name, version, changed_on) VALUES ({name}, 1, NOW())
+    ON CONFLICT (table_name) DO UPDATE SET version = v.version + 1, changed_on = NOW();
+"""
+
+BUMP_FUNCTION_DDL = f"""
+    CREATE OR REPLACE FUNCTION reference_data_bump() RETURNS trigger AS $$
+    BEGIN
+        {BUMP_SQL.format(name='TG_TABLE_NAME').strip()}
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+
+def ensure_reference_versions(connection):
+    """
+    Creates the version table and the bump triggers on every lookup table that exists. Run in a transaction.
+    A trigger that is already there is not recreated, which would lock the lookup table against its readers.
+    """
+    connection.execute(text(REFERENCE_LOCK_SQL))
+    connection.execute(text(VERSIONS_TABLE_DDL))
+    connection.execute(text(BUMP_FUNCTION_DDL))
+    for table in sorted({table for table, _ in LOOKUPS.values()} - SYNCED_TABLES):
+        if not connection.execute(text("SELECT to_regclass(:t) IS NOT NULL"), {"t": table}).scalar():
+            continue
+        trigger = f"trg_{table}_reference_bump"
+        if connection.execute(text("SELECT EXISTS (SELECT 1 FROM pg_trigger WHERE tgrelid = to_regclass(:t) "
+                                   "AND tgname = :name)"), {"t": table, "name": trigger}).scalar():
+            continue
+        connection.execute(text(f"CREATE TRIGGER {trigger} AFTER INSERT OR UPDATE OR DELETE "
+                                f"ON {table} FOR EACH STATEMENT EXECUTE FUNCTION reference_data_bump();"))
+
+
+def bump_reference_version(connection, table: str):
+    """For writers of SYNCED_TABLES: bumps the version inside the caller's transaction."""
+    connection.execute(text(BUMP_SQL.format(name=':t')), {"t": table})
+
+
+class ReferenceListModel(QStringListModel):
+    """A shared list model updated row by row, so bound combos keep their current item across a refresh."""
+
+    def update(self, values: list):
+        current = self.stringList()
+        if current == values:
+            return
+        if not current:
+            self.setStringList(values)
+            return
+        opcodes = difflib.SequenceMatcher(a=current, b=values, autojunk=False).get_opcodes()
+        for tag, i1, i2, j1, j2 in reversed(opcodes):  # back to front, so earlier row numbers stay valid
+            if tag in ('replace', 'delete'):
+                self.removeRows(i1, i2 - i1)
+            if tag in ('replace', 'insert'):
+                self.insertRows(i1, j2 - j1)
+                for offset, value in enumerate(values[j1:j2]):
+                    self.setData(self.index(i1 + offset), value)
+
+
+class ReferenceDataCache:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._values = {}  # key -> list
+        self._loaded_versions = {}  # key -> table version the list was read at
+        self._checked_at = 0.0
+        self._models = {}  # (key, blank) -> ReferenceListModel
+        self._indexes = {}  # key -> (list it was built from, PrefixIndex)
+
+    def values(self, engine, key: str) -> list:
+        self._check_versions(engine)
+        with self._lock:
+            if key not in self._values:
+                self._load(engine, key)
+            return self._values[key]
+
+    def model(self, engine, key: str, blank: bool = True) -> ReferenceListModel:
+        values = self.values(engine, key)
+        model = self._models.get((key, blank))
+        if model is None:
+            model = self._models[(key, blank)] = ReferenceListModel()
+        model.update([""] + values if blank else list(values))
+        return model
+
+    def index(self, engine, key: str) -> PrefixIndex:
+        values = self.values(engine, key)
+        built_from, index = self._indexes.get(key, (None, None))
+        if built_from is not values:
+            index = PrefixIndex(values)
+            self._indexes[key] = (values, index)
+        return index
+
+    def invalidate(self, table: str):
+        with self._lock:
+            for key, (source, _) in LOOKUPS.items():
+                if source == table:
+                    self._values.pop(key, None)
+
+    def _load(self, engine, key: str):
+        table, query = LOOKUPS[key]
+        with engine.connect() as conn:
+            # Version first: a write landing in between then only costs one extra reload.
+            version = self._read_versions(conn, table).get(table)
+            values = [row[0] if len(row) == 1 else tuple(row) for row in conn.execute(text(query))]
+        self._values[key] = values or list(FALLBACKS.get(key, []))
+        self._loaded_versions[key] = version
+
+    def _check_versions(self, engine):
+        now = time.monotonic()
+        if now - self._checked_at < VERSION_CHECK_SECONDS:
+            return
+        self._checked_at = now
+        with engine.connect() as conn:
+            versions = self._read_versions(conn)
+        with self._lock:
+            for key in list(self._values):
+                if self._loaded_versions.get(key) != versions.get(LOOKUPS[key][0]):
+                    self._values.pop(key)
+
+    @staticmethod
+    def _read_versions(conn, table: str = None) -> dict:
+        """{table: version}; empty where the version table is missing (e.g. the pages' standalone test DBs)."""
+        query = "SELECT table_name, version FROM reference_data_versions"
+        params = {}
+        if table:
+            query += " WHERE table_name = :t"
+            params["t"] = table
+        try:
+            with conn.begin_nested():
+                return dict(conn.execute(text(query), params).all())
+        except Exception:
+            return {}
+
+
+_cache = ReferenceDataCache()
+
+
+def reference_values(engine, key: str) -> list:
+    return _cache.values(engine, key)
+
+
+def invalidate_reference(*tables):
+    """Call after this process writes to a lookup table; the next read reloads it."""
+    for table in tables:
+        _cache.invalidate(table)
+
+
+def bind_reference_combo(combo: QComboBox, engine, key: str, blank: bool = True):
+    """
+    Points the combo at the shared model for key, refreshed if the list changed, keeping the combo's current
+    text; editable combos get a PrefixIndex-backed completer. Bound combos must not be filled with
+    clear()/addItems(): that would edit the model every other combo shows.
+    """
+    model = _cache.model(engine, key, blank)
+    if combo.model() is model:
+        return
+    current_text = combo.currentText()
+    combo.blockSignals(True)
+    combo.setInsertPolicy(QComboBox.InsertPolicy.NoInsert)  # typed values must not land in the shared model
+    combo.setModel(model)
+    if combo.isEditable():
+        old = combo.completer()
+        contains = old is not None and old.filterMode() == Qt.MatchFlag.MatchContains
+        IndexedCompleter(combo, lambda typed: _cache.index(engine, key).matches(typed, contains=contains))
+        if old is not None and old.parent() in (combo, combo.lineEdit()):
+            old.deleteLater()
+    combo.blockSignals(False)
+    if combo.isEditable():
+        combo.setCurrentText(current_text)
+    else:
+        index = combo.findText(current_text)
+        combo.setCurrentIndex(index if index != -1 else 0)
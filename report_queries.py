@@ -0,0 +1,274 @@
+"""
+Report queries shared by the inventory pages and the headless report scheduler (scheduled_reports.py).
+
+Every function takes an engine and plain ISO date strings and returns a DataFrame, so the same SQL runs in a
+page's QThread worker and in the off-peak batch. The *_export helpers turn those frames into the
+{sheet name: DataFrame} layout of the page exports, so a precomputed workbook matches a live one column for
+column.
+"""
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+INVENTORY_COLUMNS = ['product_code', 'lot_number', 'current_balance', 'location', 'bag_box_number', 'fg_type']
+INVENTORY_EXPORT_RENAME = {'product_code': 'PRODUCT_CODE', 'lot_number': 'LOT_NUMBER', 'current_balance': 'QTY',
+                           'bag_box_number': 'BAG/BOX_NUMBER', 'location': 'LOCATION'}
+INVENTORY_EXPORT_COLUMNS = ['PRODUCT_CODE', 'LOT_NUMBER', 'BAG/BOX_NUMBER', 'QTY', 'LOCATION']
+ENDORSEMENT_SUMMARY_QTY_HEADER = 'TOTAL_QTY (Net: Passed - Failed)'
+
+
+def good_inventory(engine: Engine, as_of_date: str, product_filter: str = "", lot_filter: str = "",
+                   fg_type_filter: str = "") -> pd.DataFrame:
+    """Passed lots with a non-zero balance as of the date (beginv_sheet1 plus transactions)."""
+    params = {'as_of_date': as_of_date}
+    date_filter_clause = "AND t.transaction_date <= :as_of_date"
+    product_filter_clause = ""
+    if product_filter:
+        product_filter_clause = "AND s.product_code ILIKE :product_search"
+        params['product_search'] = f"%{product_filter}%"
+    lot_filter_clause = ""
+    if lot_filter:
+        lot_filter_clause = "AND s.lot_number ILIKE :lot_search"
+        params['lot_search'] = f"%{lot_filter}%"
+    fg_type_clause = ""
+    if fg_type_filter in ["MB", "DC"]:
+        fg_type_clause = "AND s.fg_type = :fg_type"
+        params['fg_type'] = fg_type_filter
+    query_str = f"""
+        WITH all_tx AS (
+            SELECT UPPER(TRIM(product_code)) AS product_code, UPPER(TRIM(lot_number)) AS lot_number, COALESCE(UPPER(TRIM(fg_type)), CASE WHEN product_code LIKE '%-%' THEN 'DC' ELSE 'MB' END) AS fg_type, COALESCE(CAST(qty AS NUMERIC), 0) AS quantity_in, 0.0 AS quantity_out, location
+            FROM beginv_sheet1 WHERE product_code IS NOT NULL AND TRIM(product_code) <> '' AND lot_number IS NOT NULL AND TRIM(lot_number) <> ''
+            UNION ALL
+            SELECT UPPER(TRIM(t.product_code)) AS product_code, UPPER(TRIM(t.lot_number)) AS lot_number, CASE WHEN t.product_code LIKE '%-%' THEN 'DC' ELSE 'MB' END AS fg_type, COALESCE(CAST(t.quantity_in AS NUMERIC), 0) AS quantity_in, COALESCE(CAST(t.quantity_out AS NUMERIC), 0) AS quantity_out, t.warehouse as location
+            FROM transactions t WHERE t.product_code IS NOT NULL AND TRIM(t.product_code) <> '' AND t.lot_number IS NOT NULL AND TRIM(t.lot_number) <> '' {date_filter_clause}
+        ),
+        lot_details_source AS (
+            ( SELECT DISTINCT ON (t.lot_number) t.lot_number, t.warehouse AS location, COALESCE(fg_b.bag_no, qcf_b.bag_no, '') AS bag_box_number, 0 as priority FROM transactions t
+                LEFT JOIN (SELECT DISTINCT ON (system_ref_no) system_ref_no, bag_no FROM fg_endorsements_primary ORDER BY system_ref_no, bag_no) fg_b ON t.source_ref_no = fg_b.system_ref_no
+                LEFT JOIN (SELECT DISTINCT ON (system_ref_no) system_ref_no, bag_no FROM qcf_endorsements_primary ORDER BY system_ref_no, bag_no) qcf_b ON t.source_ref_no = qcf_b.system_ref_no
+                WHERE t.transaction_date <= :as_of_date ORDER BY t.lot_number, t.transaction_date DESC )
+            UNION ALL
+            ( SELECT DISTINCT ON (b.lot_number) b.lot_number, b.location, COALESCE(b.bag_number, b.box_number, '') as bag_box_number, 1 as priority FROM beginv_sheet1 b
+                WHERE b.lot_number IS NOT NULL AND TRIM(b.lot_number) <> '' ORDER BY b.lot_number )
+        ),
+        lot_details AS (SELECT DISTINCT ON (lot_number) lot_number, location, bag_box_number FROM lot_details_source ORDER BY lot_number, priority ASC),
+        lot_summary AS (
+            SELECT lot_number, MAX(product_code) AS product_code, MAX(fg_type) AS fg_type, COALESCE(SUM(quantity_in), 0) - COALESCE(SUM(quantity_out), 0) AS current_balance
+            FROM all_tx GROUP BY lot_number HAVING (COALESCE(SUM(quantity_in), 0) - COALESCE(SUM(quantity_out), 0)) != 0
+        )
+        SELECT s.product_code, s.lot_number, s.current_balance, d.location, d.bag_box_number, s.fg_type
+        FROM lot_summary s LEFT JOIN lot_details d ON s.lot_number = d.lot_number
+        WHERE 1=1 {product_filter_clause} {lot_filter_clause} {fg_type_clause} ORDER BY s.product_code, s.lot_number;
+    """
+    with engine.connect() as conn:
+        results = conn.execute(text(query_str), params).mappings().all()
+    df = pd.DataFrame(results) if results else pd.DataFrame(columns=INVENTORY_COLUMNS)
+    if not df.empty:
+        df['current_balance'] = pd.to_numeric(df['current_balance'])
+    return df
+
+
+def failed_inventory(engine: Engine, as_of_date: str, product_filter: str = "", lot_filter: str = "") -> pd.DataFrame:
+    """Failed lots with a non-zero balance as of the date (beg_invfailed1 plus failed_transactions)."""
+    params = {'as_of_date': as_of_date}
+    product_filter_raw_clause = ""
+    if product_filter:
+        product_filter_raw_clause = "AND UPPER(TRIM(product_code)) LIKE :product_search"
+        params['product_search'] = f"%{product_filter}%"
+    lot_filter_raw_clause = ""
+    if lot_filter:
+        lot_filter_raw_clause = "AND UPPER(TRIM(lot_number)) LIKE :lot_search"
+        params['lot_search'] = f"%{lot_filter}%"
+    query_str = f"""
+        WITH all_failed_tx AS (
+            SELECT
+                UPPER(TRIM(product_code)) AS product_code, UPPER(TRIM(lot_number)) AS lot_number,
+                COALESCE(CAST(qty AS NUMERIC), 0) AS quantity_in, 0.0 AS quantity_out,
+                production_date AS transaction_date, UPPER(TRIM(location)) as location,
+                COALESCE(UPPER(TRIM(bag_number)), UPPER(TRIM(box_number)), '') as bag_box_number,
+                'BEGINV' as transaction_type
+            FROM beg_invfailed1
+            WHERE product_code IS NOT NULL AND TRIM(product_code) <> '' AND lot_number IS NOT NULL AND TRIM(lot_number) <> ''
+              {product_filter_raw_clause} {lot_filter_raw_clause}
+            UNION ALL
+            SELECT
+                UPPER(TRIM(ft.product_code)) AS product_code, UPPER(TRIM(ft.lot_number)) AS lot_number,
+                COALESCE(CAST(ft.quantity_in AS NUMERIC), 0) AS quantity_in,
+                COALESCE(CAST(ft.quantity_out AS NUMERIC), 0) AS quantity_out,
+                ft.transaction_date, UPPER(TRIM(ft.warehouse)) as location,
+                COALESCE(qcf.bag_no, '') as bag_box_number, ft.transaction_type
+            FROM failed_transactions ft
+            LEFT JOIN qcf_endorsements_primary qcf ON ft.source_ref_no = qcf.system_ref_no
+            WHERE ft.product_code IS NOT NULL AND TRIM(ft.product_code) <> '' AND ft.lot_number IS NOT NULL AND TRIM(ft.lot_number) <> ''
+              AND ft.transaction_date <= :as_of_date
+              {product_filter_raw_clause.replace('product_code', 'ft.product_code')}
+              {lot_filter_raw_clause.replace('lot_number', 'ft.lot_number')}
+        ),
+        ranked_lot_details AS (
+            SELECT lot_number, location, bag_box_number,
+                ROW_NUMBER() OVER (
+                    PARTITION BY lot_number ORDER BY
+                        CASE WHEN bag_box_number IS NOT NULL AND bag_box_number <> '' THEN 0 ELSE 1 END,
+                        transaction_date DESC NULLS LAST,
+                        CASE WHEN transaction_type = 'BEGINV' THEN 1 ELSE 0 END
+                ) as rn
+            FROM all_failed_tx
+        ),
+        lot_summary AS (
+            SELECT lot_number, MAX(product_code) AS product_code,
+                CASE WHEN MAX(product_code) LIKE '%-%' THEN 'DC' ELSE 'MB' END AS fg_type,
+                COALESCE(SUM(quantity_in), 0) - COALESCE(SUM(quantity_out), 0) AS current_balance
+            FROM all_failed_tx
+            GROUP BY lot_number
+            HAVING (COALESCE(SUM(quantity_in), 0) - COALESCE(SUM(quantity_out), 0)) != 0
+        )
+        SELECT s.product_code, s.lot_number, s.current_balance, d.location, d.bag_box_number, s.fg_type
+        FROM lot_summary s
+        JOIN ranked_lot_details d ON s.lot_number = d.lot_number AND d.rn = 1
+        WHERE d.location IS NOT NULL
+        ORDER BY s.product_code, s.lot_number;
+    """
+    with engine.connect() as conn:
+        results = conn.execute(text(query_str), params).mappings().all()
+    df = pd.DataFrame(results) if results else pd.DataFrame(columns=INVENTORY_COLUMNS)
+    if not df.empty:
+        df['current_balance'] = pd.to_numeric(df['current_balance'])
+    return df
+
+
+# Net endorsement (Passed - Failed) per product for a date range. Quantities come from the movement_daily
+# rollup (FG_ENDORSEMENT rows in the passed ledger, QC_FAILED_ENDORSEMENT rows in the failed ledger), so the
+# cost depends on the number of days and products, not on ledger size. Remarks still come from the endorsement
+# headers, which are date-indexed and small.
+NET_ENDORSEMENT_QUERY = text("""
+    WITH net AS (
+        SELECT product_code,
+               SUM(CASE WHEN is_failed THEN -quantity_in ELSE quantity_in END) AS net_qty
+        FROM movement_daily
+        WHERE movement_date BETWEEN :start_date AND :end_date
+          AND ((NOT is_failed AND transaction_type = 'FG_ENDORSEMENT')
+               OR (is_failed AND transaction_type = 'QC_FAILED_ENDORSEMENT'))
+        GROUP BY product_code
+        HAVING SUM(CASE WHEN is_failed THEN -quantity_in ELSE quantity_in END) != 0
+    ),
+    notes AS (
+        SELECT product_code, STRING_AGG(DISTINCT remark, '; ' ORDER BY remark) AS remarks
+        FROM (
+            SELECT UPPER(TRIM(product_code)) AS product_code, NULLIF(TRIM(remarks), '') AS remark
+            FROM fg_endorsements_primary
+            WHERE date_endorsed BETWEEN :start_date AND :end_date AND is_deleted IS NOT TRUE
+            UNION ALL
+            SELECT UPPER(TRIM(product_code)), NULLIF(TRIM(remarks), '')
+            FROM qcf_endorsements_primary
+            WHERE endorsement_date BETWEEN :start_date AND :end_date AND is_deleted IS NOT TRUE
+        ) r
+        WHERE remark IS NOT NULL
+        GROUP BY product_code
+    )
+    SELECT net.product_code, net.net_qty AS net_quantity, notes.remarks
+    FROM net LEFT JOIN notes ON notes.product_code = net.product_code
+    ORDER BY net.product_code;
+""")
+
+
+def net_endorsements(engine: Engine, start_date: str, end_date: str) -> pd.DataFrame:
+    """product_code, net_quantity, remarks for the date range."""
+    with engine.connect() as conn:
+        results = conn.execute(NET_ENDORSEMENT_QUERY,
+                               {'start_date': start_date, 'end_date': end_date}).mappings().all()
+    df = pd.DataFrame(results) if results else pd.DataFrame(columns=['product_code', 'net_quantity', 'remarks'])
+    if not df.empty:
+        df['net_quantity'] = pd.to_numeric(df['net_quantity'])
+    return df
+
+
+def failed_monthly(engine: Engine, start_date: str, end_date: str) -> pd.DataFrame:
+    """Net failed movement per lot for the date range."""
+    params = {'start_date': start_date, 'end_date': end_date}
+    query_str = """
+        WITH period_failed_tx AS (
+            SELECT
+                UPPER(TRIM(product_code)) AS product_code, UPPER(TRIM(lot_number)) AS lot_number,
+                COALESCE(CAST(qty AS NUMERIC), 0) AS quantity_in, 0.0 AS quantity_out,
+                production_date AS transaction_date, UPPER(TRIM(location)) as location,
+                COALESCE(UPPER(TRIM(bag_number)), UPPER(TRIM(box_number)), '') as bag_box_number
+            FROM beg_invfailed1
+            WHERE product_code IS NOT NULL AND TRIM(product_code) <> '' AND lot_number IS NOT NULL AND TRIM(lot_number) <> ''
+              AND production_date BETWEEN :start_date AND :end_date
+            UNION ALL
+            SELECT
+                UPPER(TRIM(ft.product_code)) AS product_code, UPPER(TRIM(ft.lot_number)) AS lot_number,
+                COALESCE(CAST(ft.quantity_in AS NUMERIC), 0) AS quantity_in,
+                COALESCE(CAST(ft.quantity_out AS NUMERIC), 0) AS quantity_out,
+                ft.transaction_date, UPPER(TRIM(ft.warehouse)) as location,
+                COALESCE(qcf.bag_no, '') as bag_box_number
+            FROM failed_transactions ft
+            LEFT JOIN qcf_endorsements_primary qcf ON ft.source_ref_no = qcf.system_ref_no
+            WHERE ft.product_code IS NOT NULL AND TRIM(ft.product_code) <> '' AND ft.lot_number IS NOT NULL AND TRIM(ft.lot_number) <> ''
+              AND ft.transaction_date BETWEEN :start_date AND :end_date
+        ),
+        lot_details AS (
+            SELECT DISTINCT ON (lot_number) lot_number, location, bag_box_number
+            FROM period_failed_tx
+            ORDER BY lot_number, transaction_date DESC
+        ),
+        lot_summary AS (
+            SELECT
+                lot_number, MAX(product_code) AS product_code,
+                COALESCE(SUM(quantity_in), 0) - COALESCE(SUM(quantity_out), 0) AS net_quantity
+            FROM period_failed_tx
+            GROUP BY lot_number
+            HAVING (COALESCE(SUM(quantity_in), 0) - COALESCE(SUM(quantity_out), 0)) != 0
+        )
+        SELECT s.product_code, s.lot_number, s.net_quantity, d.location, d.bag_box_number
+        FROM lot_summary s
+        LEFT JOIN lot_details d ON s.lot_number = d.lot_number
+        ORDER BY s.product_code, s.lot_number;
+    """
+    with engine.connect() as conn:
+        results = conn.execute(text(query_str), params).mappings().all()
+    df = pd.DataFrame(results) if results else pd.DataFrame(
+        columns=['product_code', 'lot_number', 'net_quantity', 'location', 'bag_box_number'])
+    if not df.empty:
+        df['net_quantity'] = pd.to_numeric(df['net_quantity'])
+    return df
+
+
+def inventory_export(df: pd.DataFrame, mb_sheet: str, dc_sheet: str) -> dict:
+    """The MB / DC sheets of an inventory export; empty sheets are left out."""
+    if df.empty:
+        return {}
+    export_df = df.rename(columns=INVENTORY_EXPORT_RENAME)
+    if 'fg_type' not in export_df.columns:
+        export_df['fg_type'] = export_df['PRODUCT_CODE'].apply(
+            lambda x: 'DC' if isinstance(x, str) and '-' in x else 'MB')
+    sheets = {}
+    for sheet_name, fg_type in ((mb_sheet, 'MB'), (dc_sheet, 'DC')):
+        part = export_df[export_df['fg_type'] == fg_type][INVENTORY_EXPORT_COLUMNS].copy()
+        if not part.empty:
+            sheets[sheet_name] = part
+    return sheets
+
+
+def monthly_summary_export(df: pd.DataFrame) -> dict:
+    export_df = df.rename(columns={'product_code': 'PROD_CODE', 'net_quantity': 'QTY (Net Endorsement Change)',
+                                   'remarks': 'ENDORSEMENT REMARKS'})
+    final_cols = ['PROD_CODE', 'QTY (Net Endorsement Change)', 'ENDORSEMENT REMARKS']
+    return {'Monthly Endorsement Net': export_df[final_cols]}
+
+
+def endorsement_summary_export(df: pd.DataFrame) -> dict:
+    """Takes net_endorsements() output, or the renamed total_qty / aggregated_remarks frame of the page worker."""
+    export_df = df.rename(columns={'product_code': 'PRODUCT_CODE', 'net_quantity': ENDORSEMENT_SUMMARY_QTY_HEADER,
+                                   'total_qty': ENDORSEMENT_SUMMARY_QTY_HEADER, 'remarks': 'REMARKS',
+                                   'aggregated_remarks': 'REMARKS'})
+    return {'Endorsement Summary': export_df[['PRODUCT_CODE', ENDORSEMENT_SUMMARY_QTY_HEADER, 'REMARKS']]}
+
+
+def failed_monthly_export(df: pd.DataFrame) -> dict:
+    export_df = df.rename(columns={'product_code': 'PROD_CODE', 'lot_number': 'LOTNUMBER', 'net_quantity': 'QTY',
+                                   'location': 'LOCATION', 'bag_box_number': 'BAG_NUMBER'})
+    export_df['REMARKS'] = export_df['QTY'].apply(
+        lambda quantity: "Net consumption from prior inventory" if quantity < 0 else "Net increase in inventory")
+    final_cols = ['PROD_CODE', 'LOTNUMBER', 'QTY', 'LOCATION', 'BAG_NUMBER', 'REMARKS']
+    return {'Failed Monthly Transactions': export_df[final_cols]}
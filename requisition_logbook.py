@@ -19,6 +19,14 @@ from PyQt6.QtGui import QDoubleValidator
 # --- Database Imports ---
 from sqlalchemy import create_engine, text, inspect
 
+from document_counters import ensure_document_counters, next_document_number
+from endorsement_store import SaveBatch
+from ledger import LedgerRow, LedgerWriter
+from reference_data import bind_reference_combo, invalidate_reference
+
+# Lookup tables whose reference_data key differs from the table name.
+REFERENCE_KEYS = {'products': 'product_codes'}
+
 
 # --- DUMMY DEPENDENCIES ---
 def mock_log_audit_trail(action, description):
@@ -43,16 +51,19 @@ def setup_in_memory_db():
         conn.execute(text("CREATE TABLE IF NOT EXISTS requisition_approvers (name TEXT UNIQUE)"))
         conn.execute(text("CREATE TABLE IF NOT EXISTS requisition_statuses (status_name TEXT UNIQUE)"))
         conn.execute(text("CREATE TABLE IF NOT EXISTS legacy_production (prod_code TEXT UNIQUE)"))
+        conn.execute(text("CREATE TABLE IF NOT EXISTS products (product_code TEXT PRIMARY KEY, fg_type TEXT)"))
         conn.execute(text("""
             CREATE TABLE IF NOT EXISTS transactions (
                 id INTEGER PRIMARY KEY, transaction_date DATE, transaction_type TEXT, source_ref_no TEXT,
-                product_code TEXT, lot_number TEXT, quantity_out REAL, unit TEXT, warehouse TEXT, encoded_by TEXT, remarks TEXT
+                product_code TEXT, lot_number TEXT, quantity_in REAL, quantity_out REAL, unit TEXT, warehouse TEXT,
+                encoded_by TEXT, remarks TEXT
             )
         """))
         conn.execute(text("""
             CREATE TABLE IF NOT EXISTS failed_transactions (
                 id INTEGER PRIMARY KEY, transaction_date DATE, transaction_type TEXT, source_ref_no TEXT,
-                product_code TEXT, lot_number TEXT, quantity_out REAL, unit TEXT, warehouse TEXT, encoded_by TEXT, remarks TEXT
+                product_code TEXT, lot_number TEXT, quantity_in REAL, quantity_out REAL, unit TEXT, warehouse TEXT,
+                encoded_by TEXT, remarks TEXT
             )
         """))
 
@@ -71,9 +82,13 @@ def setup_in_memory_db():
         for val in initial_products: conn.execute(
             text("INSERT INTO legacy_production (prod_code) VALUES (:val) ON CONFLICT(prod_code) DO NOTHING"),
             {"val": val})
+        for val in initial_products: conn.execute(
+            text("INSERT INTO products (product_code) VALUES (:val) ON CONFLICT(product_code) DO NOTHING"),
+            {"val": val})
         for val in initial_statuses: conn.execute(
             text("INSERT INTO requisition_statuses (status_name) VALUES (:val) ON CONFLICT(status_name) DO NOTHING"),
             {"val": val})
+        ensure_document_counters(conn)
         conn.commit()
     return engine
 
@@ -599,6 +614,7 @@ class RequisitionLogbookPage(QWidget):
                 with self.engine.connect() as conn, conn.begin():
                     conn.execute(text(f"INSERT INTO {table} ({col}) VALUES (:val) ON CONFLICT ({col}) DO NOTHING"),
                                  {"val": new_val})
+                invalidate_reference(table)
                 self._populate_combo(combo, table, col);
                 combo.setCurrentText(new_val)
             except Exception as e:
@@ -613,7 +629,7 @@ class RequisitionLogbookPage(QWidget):
             combo.completer().setFilterMode(Qt.MatchFlag.MatchContains)
 
     def _refresh_entry_combos(self):
-        for combo, table, col in [(self.product_code_combo, 'legacy_production', 'prod_code'),
+        for combo, table, col in [(self.product_code_combo, 'products', 'product_code'),
                                   (self.requester_name_combo, 'requisition_requesters', 'name'),
                                   (self.approved_by_combo, 'requisition_approvers', 'name'),
                                   (self.department_combo, 'requisition_departments', 'name'),
@@ -621,18 +637,8 @@ class RequisitionLogbookPage(QWidget):
             self._populate_combo(combo, table, col)
 
     def _populate_combo(self, combo: QComboBox, table: str, column: str):
-        current_text = combo.currentText()
         try:
-            with self.engine.connect() as conn:
-                results = conn.execute(text(
-                    f"SELECT DISTINCT {column} FROM {table} WHERE {column} IS NOT NULL AND {column} != '' ORDER BY {column}")).scalars().all()
-            combo.blockSignals(True);
-            combo.clear()
-            if table == 'requisition_statuses' and not results: results = ["PENDING", "APPROVED", "COMPLETED",
-                                                                           "REJECTED"]
-            combo.addItems(results);
-            combo.blockSignals(False);
-            combo.setCurrentText(current_text)
+            bind_reference_combo(combo, self.engine, REFERENCE_KEYS.get(table, table), blank=False)
             if combo.lineEdit(): combo.lineEdit().setPlaceholderText("SELECT OR TYPE...")
         except Exception as e:
             print(f"Warning: Could not populate combobox from {table}.{column}: {e}")
@@ -675,27 +681,12 @@ class RequisitionLogbookPage(QWidget):
         self.request_for_combo.setCurrentIndex(0);
         self.manual_ref_no_edit.setFocus()
 
-    def _generate_req_id(self):
-        prefix = f"REQ-{datetime.now().strftime('%Y%m%d')}-"
-        try:
-            with self.engine.connect() as conn:
-                last_ref = conn.execute(
-                    text("SELECT req_id FROM requisition_logbook WHERE req_id LIKE :p ORDER BY id DESC LIMIT 1"),
-                    {"p": f"{prefix}%"}).scalar_one_or_none()
-                if last_ref:
-                    try:
-                        return f"{prefix}{int(last_ref.split('-')[-1]) + 1:04d}"
-                    except (ValueError, IndexError):
-                        return f"{prefix}0001"
-                return f"{prefix}0001"
-        except Exception as e:
-            QMessageBox.critical(self, "DB Error", f"Could not generate Requisition ID: {e}");
-            return None
+    def _generate_req_id(self, conn):
+        return next_document_number(conn, 'REQ')
 
     def _save_record(self):
         is_update = self.current_editing_req_id is not None
-        req_id = self.current_editing_req_id or self._generate_req_id()
-        if not req_id: return
+        req_id = self.current_editing_req_id  # new requisitions are numbered inside the save transaction
         data = {"req_id": req_id, "manual_ref_no": self.manual_ref_no_edit.text(),
                 "category": self.category_combo.currentText(),
                 "request_date": self.request_date_edit.date().toPyDate(),
@@ -718,6 +709,8 @@ class RequisitionLogbookPage(QWidget):
                                         (data['status'], 'requisition_statuses', 'status_name')]:
                     if val: conn.execute(
                         text(f"INSERT INTO {table} ({col}) VALUES (:val) ON CONFLICT ({col}) DO NOTHING"), {"val": val})
+                if not is_update:
+                    req_id = data['req_id'] = self._generate_req_id(conn)
                 if is_update:
                     sql = text("""UPDATE requisition_logbook SET manual_ref_no=:manual_ref_no, category=:category, request_date=:request_date,
                                   requester_name=:requester_name, department=:department, product_code=:product_code, lot_no=:lot_no, quantity_kg=:quantity_kg,
@@ -735,6 +728,8 @@ class RequisitionLogbookPage(QWidget):
                 self._update_or_create_transaction(conn, data)
                 self.log_audit_trail(log_action, f"{action.capitalize()} requisition: {req_id}")
                 QMessageBox.information(self, "Success", f"Requisition has been {action}.")
+            invalidate_reference('requisition_requesters', 'requisition_departments', 'requisition_approvers',
+                                 'requisition_statuses')
 
             # Refresh the main table data (but don't switch tabs)
             self.current_page = 1
@@ -750,16 +745,16 @@ class RequisitionLogbookPage(QWidget):
             QMessageBox.critical(self, "Database Error", f"Could not save record: {e}\n{traceback.format_exc()}")
 
     def _update_or_create_transaction(self, conn, req_data):
+        """The requisition's one ledger row, replacing what it wrote before; an unchanged row is left alone."""
         req_id = req_data['req_id']
-        conn.execute(text("DELETE FROM transactions WHERE source_ref_no = :req_id"), {"req_id": req_id})
-        conn.execute(text("DELETE FROM failed_transactions WHERE source_ref_no = :req_id"), {"req_id": req_id})
-        tx_data = {"date": req_data['request_date'], "type": "REQUISITION", "ref": req_id,
-                   "pcode": req_data['product_code'], "lot": req_data['lot_no'], "qty_out": req_data['quantity_kg'],
-                   "unit": "KG.", "wh": req_data['location'], "user": self.username, "remarks": req_data['remarks']}
-        table = 'transactions' if req_data['request_for'] == 'PASSED' else 'failed_transactions'
-        sql = text(
-            f"INSERT INTO {table} (transaction_date, transaction_type, source_ref_no, product_code, lot_number, quantity_out, unit, warehouse, encoded_by, remarks) VALUES (:date, :type, :ref, :pcode, :lot, :qty_out, :unit, :wh, :user, :remarks)")
-        conn.execute(sql, tx_data)
+        ledger = LedgerWriter()
+        ledger.add('transactions' if req_data['request_for'] == 'PASSED' else 'failed_transactions', LedgerRow(
+            transaction_date=req_data['request_date'], transaction_type="REQUISITION", source_ref_no=req_id,
+            product_code=req_data['product_code'], lot_number=req_data['lot_no'],
+            quantity_out=req_data['quantity_kg'], warehouse=req_data['location'], encoded_by=self.username,
+            remarks=req_data['remarks']))
+        ledger.replace(req_id)
+        ledger.to_batch(SaveBatch(conn)).execute()
 
     def _load_record_for_update(self):
         row = self.records_table.currentRow()
@@ -1,21 +1,20 @@
-import sys
-import io
 import re
 import math
 from datetime import datetime, date
-from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
-from functools import partial
+from decimal import Decimal, InvalidOperation
 import traceback
 
-# --- ReportLab & PyMuPDF Imports ---
-import fitz
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import (SimpleDocTemplate, Paragraph, Table, TableStyle)
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+# --- PDF Imports ---
+from pdf_render import paint_pdf, release_pdf
+from print_documents import DOC_RRF, build_rrf_pdf
+from batch_print import BatchPrintDialog
+from completion import attach_prefix_query_completer
+from document_counters import next_document_number, preview_document_number
+from endorsement_store import SaveBatch
+from ledger import LedgerRow, LedgerWriter
+from lot_ranges import LotRangeError, LotRangeTooSmall, expand_lot_range, lot_sequence, fill_lots
+from reference_data import bind_reference_combo, invalidate_reference
+from soft_delete import restore_document, soft_delete_document
 
 # --- PyQt6 Imports ---
 from PyQt6.QtCore import Qt, QDate, QSize, QSizeF, QDateTime, QTimer
@@ -23,16 +22,16 @@ from PyQt6.QtWidgets import (QApplication, QWidget, QVBoxLayout, QTabWidget, QFo
                              QPushButton, QTableWidget, QTableWidgetItem, QComboBox,
                              QAbstractItemView, QHeaderView, QMessageBox, QHBoxLayout, QLabel,
                              QGroupBox, QMenu, QGridLayout, QDialog, QDialogButtonBox,
-                             QPlainTextEdit, QSplitter, QCheckBox, QInputDialog, QCompleter,
-                             QListWidget, QListWidgetItem, QTextEdit, QSizePolicy, QFrame)
+                             QPlainTextEdit, QSplitter, QInputDialog, QCompleter,
+                             QListWidget, QListWidgetItem, QTextEdit)
 
-from PyQt6.QtGui import (QDoubleValidator, QPainter, QPageSize, QImage, QFont)
+from PyQt6.QtGui import (QDoubleValidator, QPageSize, QFont)
 from PyQt6.QtPrintSupport import QPrinter, QPrintPreviewDialog
 
 # --- Icon Imports ---
 import qtawesome as fa
 # --- Database Imports ---
-from sqlalchemy import create_engine, text, inspect
+from sqlalchemy import text, inspect
 
 # --- CONSTANTS ---
 ADMIN_PASSWORD = "Itadmin"
@@ -172,6 +171,7 @@ class ManageListDialog(QDialog):
                             text(
                                 f"INSERT INTO {self.table_name} ({self.column_name}) VALUES (:v) ON CONFLICT ({self.column_name}) DO NOTHING"),
                             {"v": value})
+                    invalidate_reference(self.table_name)
                     self._load_items()
                 except Exception as e:
                     QMessageBox.critical(self, "DB Error", f"Could not add item: {e}")
@@ -184,6 +184,7 @@ class ManageListDialog(QDialog):
                 with self.engine.connect() as conn, conn.begin():
                     conn.execute(text(f"DELETE FROM {self.table_name} WHERE id = :id"),
                                  {"id": item.data(Qt.ItemDataRole.UserRole)})
+                invalidate_reference(self.table_name)
                 self._load_items()
             except Exception as e:
                 QMessageBox.critical(self, "DB Error", f"Could not remove item: {e}")
@@ -227,6 +228,7 @@ class RRFItemEntryDialog(QDialog):
         set_combo_box_uppercase(self.product_code_edit)
 
         self.lot_number_edit = UpperCaseLineEdit()
+        attach_prefix_query_completer(self.lot_number_edit, self.engine, 'production_lots')
         self.check_inventory_btn = QPushButton(" Check Stock")
 
         # --- QTAWESOME ICON & LIGHT BUTTON STYLE ---
@@ -293,31 +295,15 @@ class RRFItemEntryDialog(QDialog):
 
     def _load_units(self):
         try:
-            with self.engine.connect() as conn:
-                units = conn.execute(text("SELECT name FROM units ORDER BY name")).scalars().all()
-            current_unit = self.unit_edit.currentText()
-            self.unit_edit.blockSignals(True)
-            self.unit_edit.clear()
-            self.unit_edit.addItems(units)
-            self.unit_edit.blockSignals(False)
-            if current_unit and current_unit in units:
-                self.unit_edit.setCurrentText(current_unit)
-            elif "KG." in units:
+            bind_reference_combo(self.unit_edit, self.engine, 'units', blank=False)
+            if not self.unit_edit.currentText() and self.unit_edit.findText("KG.") != -1:
                 self.unit_edit.setCurrentText("KG.")
         except Exception as e:
             QMessageBox.warning(self, "Database Error", f"Could not load unit data: {e}")
 
     def _load_product_codes(self):
         try:
-            with self.engine.connect() as conn:
-                query_str = conn.execute(
-                    text("SELECT DISTINCT prod_code FROM legacy_production ORDER BY prod_code")).scalars().all()
-                current = self.product_code_edit.currentText()
-                self.product_code_edit.clear()
-                self.product_code_edit.addItems([""] + query_str)
-                self.product_code_edit.completer().setModel(self.product_code_edit.model())
-                if current in query_str:
-                    self.product_code_edit.setCurrentText(current)
+            bind_reference_combo(self.product_code_edit, self.engine, 'product_codes')
         except Exception as e:
             QMessageBox.warning(self, "Database Error", f"Could not load product codes: {e}")
 
@@ -689,11 +675,13 @@ class RRFPage(QWidget):
         self.refresh_records_btn = QPushButton(" Refresh")
         self.update_btn = QPushButton(" Update Selected")
         self.delete_btn = QPushButton(" Delete Selected")
+        self.batch_print_btn = QPushButton(" Batch Print...")
 
         # --- QTAWESOME ICON & LIGHT BUTTON STYLE ---
         self.refresh_records_btn.setIcon(fa.icon('fa5s.sync-alt', color=COLOR_PRIMARY))
         self.update_btn.setIcon(fa.icon('fa5s.edit', color=COLOR_SECONDARY))
         self.delete_btn.setIcon(fa.icon('fa5s.trash-alt', color=DESTRUCTIVE_COLOR))
+        self.batch_print_btn.setIcon(fa.icon('fa5s.print', color=COLOR_PRIMARY))
 
         self.refresh_records_btn.setObjectName("PrimaryButton")
         self.update_btn.setObjectName("SecondaryButton")
@@ -704,6 +692,7 @@ class RRFPage(QWidget):
         top_layout.addWidget(self.refresh_records_btn)
         top_layout.addWidget(self.update_btn)
         top_layout.addWidget(self.delete_btn)
+        top_layout.addWidget(self.batch_print_btn)
         layout.addWidget(controls_group)
 
         self.records_table = QTableWidget()
@@ -741,6 +730,7 @@ class RRFPage(QWidget):
         self.refresh_records_btn.clicked.connect(self._load_all_records)
         self.update_btn.clicked.connect(self._load_record_for_update)
         self.delete_btn.clicked.connect(self._delete_record)
+        self.batch_print_btn.clicked.connect(self._open_batch_print)
         self.records_table.doubleClicked.connect(self._load_record_for_update)
         self.records_table.customContextMenuRequested.connect(self._show_records_table_context_menu)
         self.records_table.itemSelectionChanged.connect(self._on_record_selection_changed)
@@ -1522,7 +1512,7 @@ class RRFPage(QWidget):
 
         # Clear the form state and all widgets
         self.current_editing_rrf_no = None
-        self.rrf_no_edit.setText(self._generate_rrf_no())
+        self.rrf_no_edit.setText(self._preview_rrf_no())
         self.rrf_date_edit.setDate(QDate.currentDate())
         self.customer_combo.setCurrentIndex(-1)
         self.items_table.setRowCount(0)
@@ -1543,13 +1533,7 @@ class RRFPage(QWidget):
 
     def _load_combobox_data(self):
         try:
-            with self.engine.connect() as conn:
-                customers = conn.execute(
-                    text("SELECT name FROM customers WHERE is_deleted IS NOT TRUE ORDER BY name")).scalars().all()
-            current = self.customer_combo.currentText()
-            self.customer_combo.clear();
-            self.customer_combo.addItems([""] + customers)
-            if current in customers: self.customer_combo.setCurrentText(current)
+            bind_reference_combo(self.customer_combo, self.engine, 'customers')
         except Exception as e:
             QMessageBox.critical(self, "DB Error", f"Could not load customer data: {e}")
 
@@ -1557,7 +1541,7 @@ class RRFPage(QWidget):
         if not self.customer_combo.currentText() or self.items_table.rowCount() == 0:
             QMessageBox.warning(self, "Input Error", "Customer/Supplier and at least one item are required.");
             return
-        rrf_no = self.current_editing_rrf_no or self._generate_rrf_no()
+        rrf_no = self.current_editing_rrf_no  # new RRFs are numbered inside the save transaction
         rrf_date = self.rrf_date_edit.date().toPyDate()
         material_type = self.material_type_combo.currentText()
 
@@ -1602,6 +1586,9 @@ class RRFPage(QWidget):
 
                 else:
                     # Insert scenario
+                    rrf_no = primary_data['rrf_no'] = self._generate_rrf_no(conn)
+                    for item in items_data:
+                        item['rrf_no'] = rrf_no
                     conn.execute(text(
                         "INSERT INTO rrf_primary (rrf_no, rrf_date, customer_name, material_type, prepared_by, encoded_by, encoded_on, edited_by, edited_on) VALUES (:rrf_no, :rrf_date, :customer_name, :material_type, :prepared_by, :encoded_by, :encoded_on, :edited_by, :edited_on)"),
                         primary_data)
@@ -1614,51 +1601,40 @@ class RRFPage(QWidget):
                         items_data)
 
                     # --- LOG TRANSACTIONS ---
-                    transaction_inserts = []
+                    ledger = LedgerWriter()
                     for item in items_data:
                         qty = item['quantity']  # Already Decimal/float
 
                         if material_type == "FINISHED GOOD" or material_type == "SEMI-FINISHED GOOD" or material_type == "OTHER":
                             # RRF for FG/SFG/Other means IN to inventory
-                            transaction_inserts.append({
-                                "transaction_date": rrf_date,
-                                "transaction_type": "RRF_FG_IN",
-                                "source_ref_no": rrf_no,
-                                "product_code": item['product_code'],
-                                "lot_number": item['lot_number'],
-                                "quantity_in": qty,
-                                "quantity_out": 0,
-                                "unit": item['unit'],
-                                "warehouse": "WH1",  # Default warehouse for RRF return
-                                "encoded_by": self.username,
-                                "remarks": f"RRF Return/Replacement (Material Type: {material_type})"
-                            })
+                            ledger.add('transactions', LedgerRow(
+                                transaction_date=rrf_date,
+                                transaction_type="RRF_FG_IN",
+                                source_ref_no=rrf_no,
+                                product_code=item['product_code'],
+                                lot_number=item['lot_number'],
+                                quantity_in=qty,
+                                unit=item['unit'],
+                                warehouse="WH1",  # Default warehouse for RRF return
+                                encoded_by=self.username,
+                                remarks=f"RRF Return/Replacement (Material Type: {material_type})"
+                            ))
                         elif material_type == "RAW MATERIAL":
                             # RRF for RM means OUT of inventory (consumption/adjustment)
-                            transaction_inserts.append({
-                                "transaction_date": rrf_date,
-                                "transaction_type": "RRF_RM_OUT",
-                                "source_ref_no": rrf_no,
-                                "product_code": item['product_code'],
-                                "lot_number": item['lot_number'],
-                                "quantity_in": 0,
-                                "quantity_out": qty,
-                                "unit": item['unit'],
-                                "warehouse": "WH1",  # Default warehouse for RRF consumption
-                                "encoded_by": self.username,
-                                "remarks": f"RRF Return/Replacement Consumption (Material Type: {material_type})"
-                            })
-
-                    if transaction_inserts:
-                        conn.execute(text("""
-                            INSERT INTO transactions (
-                                transaction_date, transaction_type, source_ref_no, product_code,
-                                lot_number, quantity_in, quantity_out, unit, warehouse, encoded_by, remarks
-                            ) VALUES (
-                                :transaction_date, :transaction_type, :source_ref_no, :product_code,
-                                :lot_number, :quantity_in, :quantity_out, :unit, :warehouse, :encoded_by, :remarks
-                            )
-                        """), transaction_inserts)
+                            ledger.add('transactions', LedgerRow(
+                                transaction_date=rrf_date,
+                                transaction_type="RRF_RM_OUT",
+                                source_ref_no=rrf_no,
+                                product_code=item['product_code'],
+                                lot_number=item['lot_number'],
+                                quantity_out=qty,
+                                unit=item['unit'],
+                                warehouse="WH1",  # Default warehouse for RRF consumption
+                                encoded_by=self.username,
+                                remarks=f"RRF Return/Replacement Consumption (Material Type: {material_type})"
+                            ))
+
+                    ledger.to_batch(SaveBatch(conn)).execute()
 
                     # --- END LOG TRANSACTIONS ---
 
@@ -1666,6 +1642,7 @@ class RRFPage(QWidget):
                 if new_units:
                     insert_stmt = text("INSERT INTO units (name) VALUES (:name) ON CONFLICT(name) DO NOTHING")
                     conn.execute(insert_stmt, [{"name": unit} for unit in new_units])
+                    invalidate_reference('units')
 
                 self.log_audit_trail(log, f"RRF: {rrf_no}")
 
@@ -1732,17 +1709,8 @@ class RRFPage(QWidget):
                                 f"Delete RRF No: <b>{rrf_no}</b> and move it to the deleted tab?") == QMessageBox.StandardButton.Yes:
             try:
                 with self.engine.connect() as conn, conn.begin():
-                    # Soft delete the primary record
-                    conn.execute(text(
-                        "UPDATE rrf_primary SET is_deleted = TRUE, edited_by = :u, edited_on = :n WHERE rrf_no = :rrf"),
-                        {"u": self.username, "n": datetime.now(), "rrf": rrf_no})
-
-                    # Remove all associated transactions upon soft delete
-                    conn.execute(text("""
-                        DELETE FROM transactions 
-                        WHERE source_ref_no = :rrf_no 
-                        AND transaction_type IN ('RRF_FG_IN', 'RRF_RM_OUT', 'RRF_BREAKDOWN_OUT')
-                    """), {"rrf_no": rrf_no})
+                    # Soft delete the primary record and move its transactions to the recycle table
+                    soft_delete_document(conn, 'RRF', rrf_no, self.username)
 
                 self.log_audit_trail("DELETE_RRF", f"Soft-deleted RRF: {rrf_no} and removed transactions.")
                 self.show_notification(f"RRF {rrf_no} moved to Deleted tab.", 'success')
@@ -1823,25 +1791,16 @@ class RRFPage(QWidget):
         table.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeMode.Stretch)
         table.horizontalHeader().setSectionResizeMode(4, QHeaderView.ResizeMode.Stretch)
 
-    def _generate_rrf_no(self):
-        with self.engine.connect() as conn:
-            start_num_query = text("SELECT setting_value FROM app_settings WHERE setting_key = 'RRF_SEQUENCE_START'")
-            start_num_str = conn.execute(start_num_query).scalar_one_or_none()
-            try:
-                start_number = int(start_num_str) if start_num_str else 1
-            except (ValueError, TypeError):
-                start_number = 1
-
-            last_num_query = text("""
-                SELECT MAX(CAST(rrf_no AS INTEGER)) 
-                FROM rrf_primary 
-                WHERE rrf_no ~ '^[0-9]+$' AND LENGTH(rrf_no) = 5
-            """)
-            last_num = conn.execute(last_num_query).scalar_one_or_none()
+    def _generate_rrf_no(self, conn):
+        return next_document_number(conn, 'RRF')
 
-        base_number = max((last_num or 0), start_number - 1)
-        next_seq = base_number + 1
-        return f"{next_seq:05d}"
+    def _preview_rrf_no(self):
+        try:
+            with self.engine.connect() as conn:
+                return preview_document_number(conn, 'RRF')
+        except Exception as e:
+            print(f"Could not preview the next RRF number: {e}")
+            return ""
 
     def _show_records_table_context_menu(self, pos):
         if not self.records_table.selectedItems(): return
@@ -1929,85 +1888,71 @@ class RRFPage(QWidget):
                                 f"Restore RRF No: <b>{rrf_no}</b>?") == QMessageBox.StandardButton.Yes:
             try:
                 with self.engine.connect() as conn, conn.begin():
-                    # Restore primary record
-                    conn.execute(text(
-                        "UPDATE rrf_primary SET is_deleted = FALSE, edited_by = :u, edited_on = :n WHERE rrf_no = :rrf"),
-                        {"u": self.username, "n": datetime.now(), "rrf": rrf_no})
-
-                    # Fetch data needed for transaction restoration
-                    primary_data = conn.execute(text("SELECT * FROM rrf_primary WHERE rrf_no = :rrf_no"),
-                                                {"rrf_no": rrf_no}).mappings().one()
-                    items_data = conn.execute(text("SELECT * FROM rrf_items WHERE rrf_no = :rrf_no"),
-                                              {"rrf_no": rrf_no}).mappings().all()
-
-                    material_type = primary_data.get('material_type')
-                    rrf_date = primary_data.get('rrf_date')
-
-                    transaction_inserts = []
-
-                    # Restore base transactions (RRF_FG_IN / RRF_RM_OUT)
-                    for item in items_data:
-                        qty = Decimal(item.get('quantity', 0))
-
-                        if material_type in ["FINISHED GOOD", "SEMI-FINISHED GOOD", "OTHER"]:
-                            transaction_type = "RRF_FG_IN"
-                            qty_in, qty_out = qty, 0
-                            remarks = f"RRF Return/Replacement (Material Type: {material_type})"
-                        elif material_type == "RAW MATERIAL":
-                            transaction_type = "RRF_RM_OUT"
-                            qty_in, qty_out = 0, qty
-                            remarks = f"RRF Return/Replacement Consumption (Material Type: {material_type})"
-                        else:
-                            continue  # Skip unknown material types
-
-                        transaction_inserts.append({
-                            "transaction_date": rrf_date,
-                            "transaction_type": transaction_type,
-                            "source_ref_no": rrf_no,
-                            "product_code": item['product_code'],
-                            "lot_number": item['lot_number'],
-                            "quantity_in": qty_in,
-                            "quantity_out": qty_out,
-                            "unit": item['unit'],
-                            "warehouse": "WH1",
-                            "encoded_by": self.username,
-                            "remarks": remarks
-                        })
-
-                    # If RRF Breakdown records exist, restore RRF_BREAKDOWN_OUT transactions as well
-                    breakdown_records = conn.execute(text("""
-                        SELECT T1.item_id, T1.lot_number, T1.quantity_kg, T2.product_code, T2.unit
-                        FROM rrf_lot_breakdown T1
-                        JOIN rrf_items T2 ON T1.rrf_no = T2.rrf_no AND T1.item_id = T2.id
-                        WHERE T1.rrf_no = :rrf_no
-                    """), {"rrf_no": rrf_no}).mappings().all()
-
-                    remark_base = f"Generated from RRF {rrf_no}"
-                    for rec in breakdown_records:
-                        transaction_inserts.append({
-                            "transaction_date": rrf_date,
-                            "transaction_type": "RRF_BREAKDOWN_OUT",
-                            "source_ref_no": rrf_no,
-                            "product_code": rec['product_code'],
-                            "lot_number": rec['lot_number'],
-                            "quantity_in": 0,
-                            "quantity_out": rec['quantity_kg'],
-                            "unit": rec['unit'],
-                            "warehouse": "WH1",  # Default to WH1 if original location isn't stored in breakdown table
-                            "encoded_by": self.username,
-                            "remarks": f"{remark_base} (Item {rec['item_id']})"
-                        })
-
-                    if transaction_inserts:
-                        conn.execute(text("""
-                            INSERT INTO transactions (
-                                transaction_date, transaction_type, source_ref_no, product_code,
-                                lot_number, quantity_in, quantity_out, unit, warehouse, encoded_by, remarks
-                            ) VALUES (
-                                :transaction_date, :transaction_type, :source_ref_no, :product_code,
-                                :lot_number, :quantity_in, :quantity_out, :unit, :warehouse, :encoded_by, :remarks
-                            )
-                        """), transaction_inserts)
+                    if not restore_document(conn, 'RRF', rrf_no, self.username):
+                        # Deleted before deleted_ledger_rows existed: rebuild its transactions
+                        primary_data = conn.execute(text("SELECT * FROM rrf_primary WHERE rrf_no = :rrf_no"),
+                                                    {"rrf_no": rrf_no}).mappings().one()
+                        items_data = conn.execute(text("SELECT * FROM rrf_items WHERE rrf_no = :rrf_no"),
+                                                  {"rrf_no": rrf_no}).mappings().all()
+
+                        material_type = primary_data.get('material_type')
+                        rrf_date = primary_data.get('rrf_date')
+
+                        ledger = LedgerWriter()
+
+                        # Restore base transactions (RRF_FG_IN / RRF_RM_OUT)
+                        for item in items_data:
+                            qty = Decimal(item.get('quantity', 0))
+
+                            if material_type in ["FINISHED GOOD", "SEMI-FINISHED GOOD", "OTHER"]:
+                                transaction_type = "RRF_FG_IN"
+                                qty_in, qty_out = qty, 0
+                                remarks = f"RRF Return/Replacement (Material Type: {material_type})"
+                            elif material_type == "RAW MATERIAL":
+                                transaction_type = "RRF_RM_OUT"
+                                qty_in, qty_out = 0, qty
+                                remarks = f"RRF Return/Replacement Consumption (Material Type: {material_type})"
+                            else:
+                                continue  # Skip unknown material types
+
+                            ledger.add('transactions', LedgerRow(
+                                transaction_date=rrf_date,
+                                transaction_type=transaction_type,
+                                source_ref_no=rrf_no,
+                                product_code=item['product_code'],
+                                lot_number=item['lot_number'],
+                                quantity_in=qty_in,
+                                quantity_out=qty_out,
+                                unit=item['unit'],
+                                warehouse="WH1",
+                                encoded_by=self.username,
+                                remarks=remarks
+                            ))
+
+                        # If RRF Breakdown records exist, restore RRF_BREAKDOWN_OUT transactions as well
+                        breakdown_records = conn.execute(text("""
+                            SELECT T1.item_id, T1.lot_number, T1.quantity_kg, T2.product_code, T2.unit
+                            FROM rrf_lot_breakdown T1
+                            JOIN rrf_items T2 ON T1.rrf_no = T2.rrf_no AND T1.item_id = T2.id
+                            WHERE T1.rrf_no = :rrf_no
+                        """), {"rrf_no": rrf_no}).mappings().all()
+
+                        remark_base = f"Generated from RRF {rrf_no}"
+                        for rec in breakdown_records:
+                            ledger.add('transactions', LedgerRow(
+                                transaction_date=rrf_date,
+                                transaction_type="RRF_BREAKDOWN_OUT",
+                                source_ref_no=rrf_no,
+                                product_code=rec['product_code'],
+                                lot_number=rec['lot_number'],
+                                quantity_out=rec['quantity_kg'],
+                                unit=rec['unit'],
+                                warehouse="WH1",  # Default to WH1 if original location isn't stored in breakdown table
+                                encoded_by=self.username,
+                                remarks=f"{remark_base} (Item {rec['item_id']})"
+                            ))
+
+                        ledger.to_batch(SaveBatch(conn)).execute()
 
                 self.log_audit_trail("RESTORE_RRF", f"Restored RRF: {rrf_no} and transactions.")
                 self.show_notification(f"RRF {rrf_no} has been restored.", 'success')
@@ -2231,38 +2176,22 @@ class RRFPage(QWidget):
                     QMessageBox.warning(self, "Input Error",
                                         f"Invalid format for a single starting lot: '{lot_input}'. Expected '1234' or '1234AA'.");
                     return None
-                start_match = re.match(r'^(\d+)([A-Z]*)$', lot_input.upper())
-                if start_match:
-                    start_num, suffix, num_len = int(start_match.group(1)), start_match.group(2), len(
-                        start_match.group(1))
-                    lot_list = [f"{str(start_num + i).zfill(num_len)}{suffix}" for i in range(num_lots)]
-                else:
-                    return None
+                lot_list = lot_sequence(lot_input, num_lots)
         except Exception as e:
             QMessageBox.critical(self, "Lot Generation Error", f"Error generating lots: {e}");
             return None
 
         # Calculate quantities for THIS batch
-        num_full_lots = int(target_qty // weight_per_lot)
-        remainder_qty = target_qty % weight_per_lot
-        breakdown_items = []
-
         if len(lot_list) < num_lots:
             QMessageBox.warning(self, "Mismatch Error",
                                 f"The calculated number of lots ({num_lots}) exceeds the generated lot identifiers ({len(lot_list)}). Please check your range/start lot and weight.")
             return None
-
-        for i in range(num_full_lots):
-            breakdown_items.append({'lot_number': lot_list[i], 'quantity_kg': weight_per_lot})
-
-        # Handle the remainder lot if necessary
-        if remainder_qty > 0:
-            if num_full_lots < len(lot_list):
-                breakdown_items.append({'lot_number': lot_list[num_full_lots], 'quantity_kg': remainder_qty})
-            else:
-                QMessageBox.critical(self, "Calculation Error",
-                                     "Lot identifier count error during remainder calculation. Please contact support.")
-                return None
+        try:
+            breakdown_items = fill_lots(lot_list, target_qty, weight_per_lot)
+        except LotRangeTooSmall:
+            QMessageBox.critical(self, "Calculation Error",
+                                 "Lot identifier count error during remainder calculation. Please contact support.")
+            return None
 
         # Return the structured data for THIS single batch/preview attempt
         return {
@@ -2277,18 +2206,8 @@ class RRFPage(QWidget):
 
     def _parse_lot_range(self, lot_input):
         try:
-            parts = [s.strip().upper() for s in lot_input.split('-')]
-            if len(parts) != 2: raise ValueError("Lot range must contain exactly one hyphen.")
-            start_str, end_str = parts;
-            start_match = re.match(r'^(\d+)([A-Z]*)$', start_str);
-            end_match = re.match(r'^(\d+)([A-Z]*)$', end_str)
-            if not start_match or not end_match or start_match.group(2) != end_match.group(2): raise ValueError(
-                "Format invalid or suffixes mismatch. Expected: '100A-105A'.")
-            start_num, end_num, suffix, num_len = int(start_match.group(1)), int(end_match.group(1)), start_match.group(
-                2), len(start_match.group(1))
-            if start_num > end_num: raise ValueError("Start lot cannot be greater than end lot.")
-            return [f"{str(start_num + i).zfill(num_len)}{suffix}" for i in range(end_num - start_num + 1)]
-        except Exception as e:
+            return expand_lot_range(lot_input)
+        except LotRangeError as e:
             QMessageBox.critical(self, "Lot Range Error", f"Could not parse lot range '{lot_input}': {e}");
             return None
 
@@ -2415,7 +2334,7 @@ class RRFPage(QWidget):
                                         {"rrf_no": rrf_no}).scalar_one()
 
                 all_breakdown_inserts = []
-                all_transaction_inserts = []
+                ledger = LedgerWriter()
                 remark_base = f"Generated from RRF {rrf_no}"
 
                 for item_id, data in lots_by_item_id.items():
@@ -2450,19 +2369,18 @@ class RRFPage(QWidget):
                             })
 
                             # Insert corresponding transactions
-                            all_transaction_inserts.append({
-                                "transaction_date": rrf_date,
-                                "transaction_type": "RRF_BREAKDOWN_OUT",
-                                "source_ref_no": rrf_no,
-                                "product_code": product_code,
-                                "lot_number": rec['lot_number'],
-                                "quantity_in": 0,
-                                "quantity_out": rec['quantity_kg'],
-                                "unit": unit,
-                                "warehouse": batch['location'],
-                                "encoded_by": self.username,
-                                "remarks": specific_remark  # Use the unique remark
-                            })
+                            ledger.add('transactions', LedgerRow(
+                                transaction_date=rrf_date,
+                                transaction_type="RRF_BREAKDOWN_OUT",
+                                source_ref_no=rrf_no,
+                                product_code=product_code,
+                                lot_number=rec['lot_number'],
+                                quantity_out=rec['quantity_kg'],
+                                unit=unit,
+                                warehouse=batch['location'],
+                                encoded_by=self.username,
+                                remarks=specific_remark  # Use the unique remark
+                            ))
 
                 # Bulk insert operations
                 if all_breakdown_inserts:
@@ -2470,17 +2388,7 @@ class RRFPage(QWidget):
                         "INSERT INTO rrf_lot_breakdown (rrf_no, item_id, lot_number, quantity_kg) VALUES (:rrf_no, :item_id, :lot_number, :quantity_kg)"),
                         all_breakdown_inserts)
 
-                if all_transaction_inserts:
-                    conn.execute(text("""
-                        INSERT INTO transactions (
-                            transaction_date, transaction_type, source_ref_no, product_code,
-                            lot_number, quantity_in, quantity_out, unit, warehouse, encoded_by, remarks
-                        ) VALUES (
-                            :transaction_date, :transaction_type, :source_ref_no, :product_code,
-                            :lot_number, :quantity_in, :quantity_out, :unit, :warehouse,
-                            :encoded_by, :remarks
-                        )
-                    """), all_transaction_inserts)
+                ledger.to_batch(SaveBatch(conn)).execute()
 
             self.log_audit_trail("CREATE_RRF_BREAKDOWN",
                                  f"Saved breakdown for RRF: {rrf_no}, across {len(lots_by_item_id)} items.")
@@ -2565,137 +2473,17 @@ class RRFPage(QWidget):
         preview.paintRequested.connect(self._handle_paint_request)
         preview.resize(1000, 800);
         preview.exec()
-
-    def _draw_page_template(self, canvas, doc, header_table, footer_table):
-        canvas.saveState();
-        page_width, page_height = doc.pagesize
-        header_table.wrapOn(canvas, doc.width, doc.topMargin);
-        header_table.drawOn(canvas, doc.leftMargin, page_height - header_table._height - (0.2 * inch))
-        footer_table.wrapOn(canvas, doc.width, doc.bottomMargin);
-        footer_table.drawOn(canvas, doc.leftMargin, 0.2 * inch)
-        canvas.restoreState()
+        release_pdf(self.current_pdf_buffer)
 
     def _generate_rrf_pdf(self, primary_data, items_data):
-        try:
-            pdfmetrics.registerFont(TTFont('LucidaSans', 'C:/Windows/Fonts/LSANS.TTF'));
-            pdfmetrics.registerFont(TTFont('LucidaSans-Bold', 'C:/Windows/Fonts/LTYPEB.TTF'))
-            pdfmetrics.registerFontFamily('LucidaSans', normal='LucidaSans', bold='LucidaSans-Bold')
-        except Exception:
-            try:
-                pdfmetrics.registerFont(TTFont('Arial', 'arial.ttf'));
-                pdfmetrics.registerFont(TTFont('Arial-Bold', 'arialbd.ttf'))
-                pdfmetrics.registerFontFamily('LucidaSans', normal='Arial', bold='Arial-Bold')
-            except Exception as e:
-                QMessageBox.critical(self, "Font Error",
-                                     f"Could not register fallback font 'Arial'. Ensure it is installed.\nError: {e}");
-                return None
-        buffer = io.BytesIO();
-        page_width, page_height = (8.5 * inch, 5.5 * inch)
-        styles = getSampleStyleSheet()
-        styles.add(ParagraphStyle(name='MainStyle', fontName='LucidaSans', fontSize=10, leading=11))
-        styles.add(ParagraphStyle(name='MainStyleBold', parent=styles['MainStyle'], fontName='LucidaSans-Bold'))
-        styles.add(ParagraphStyle(name='MainStyleRight', parent=styles['MainStyleBold'], alignment=TA_RIGHT))
-        styles.add(ParagraphStyle(name='MainStyleCenter', parent=styles['MainStyleBold'], alignment=TA_CENTER))
-        styles.add(ParagraphStyle(name='Footer', fontName='LucidaSans-Bold', fontSize=9, leading=10))
-        styles.add(ParagraphStyle(name='FooterSig', fontName='LucidaSans', fontSize=8, alignment=TA_CENTER))
-        styles.add(ParagraphStyle(name='FooterSub', fontName='LucidaSans', fontSize=8, alignment=TA_CENTER))
-        styles.add(ParagraphStyle(name='RemarkStyle', fontName='LucidaSans', fontSize=9, leading=9, leftIndent=10))
-        header_left_text = """<font name='LucidaSans-Bold' size='14'>MASTERBATCH PHILIPPINES INC.</font><br/><font size='9'>24 Diamond Road, Caloocan Industrial Subd., Bo. Kaybiga Caloocan City</font><br/><font size='9'>Tel. Nos.: 8935-93-75 | 8935-9376 | 7738-1207</font>"""
-        header_right_text = f"""<font name='LucidaSans-Bold' size='14'>RETURN/REPLACEMENT FORM</font><br/><br/><font name='LucidaSans-Bold' size='14'>RRF No.: {primary_data['rrf_no']}</font>"""
-        header_table = Table([[Paragraph(header_left_text, styles['MainStyle']),
-                               Paragraph(header_right_text, styles['MainStyleRight'])]],
-                             colWidths=[4.5 * inch, 3.1 * inch], style=[('VALIGN', (0, 0), (-1, -1), 'TOP')])
-        signature_line = "_" * 28
-        footer_data = [[Paragraph("Prepared by:", styles['Footer']), Paragraph("Checked by:", styles['Footer']),
-                        Paragraph("Approved by:", styles['Footer']), Paragraph("Received by:", styles['Footer'])],
-                       [Paragraph(f"<br/>{primary_data.get('prepared_by', '').upper()}", styles['FooterSig']),
-                        Paragraph("<br/>", styles['FooterSig']), Paragraph("<br/>", styles['FooterSig']),
-                        Paragraph("<br/>", styles['FooterSig'])],
-                       [Paragraph(signature_line, styles['FooterSig']), Paragraph(signature_line, styles['FooterSig']),
-                        Paragraph(signature_line, styles['FooterSig']), Paragraph(signature_line, styles['FooterSig'])],
-                       [Paragraph("Signature Over Printed Name", styles['FooterSub']),
-                        Paragraph("Signature Over Printed Name", styles['FooterSub']),
-                        Paragraph("Signature Over Printed Name", styles['FooterSub']),
-                        Paragraph("Signature Over Printed Name", styles['FooterSub'])]]
-        footer_table = Table(footer_data, colWidths=[1.9 * inch] * 4,
-                             rowHeights=[0.15 * inch, 0.25 * inch, 0.05 * inch, 0.15 * inch])
-        footer_table.setStyle(TableStyle([('VALIGN', (0, 0), (-1, -1), 'BOTTOM'), ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                                          ('LEFTPADDING', (0, 0), (-1, -1), 0), ('RIGHTPADDING', (0, 0), (-1, -1), 0)]))
-        _, header_height = header_table.wrap(page_width, page_height);
-        _, footer_height = footer_table.wrap(page_width, page_height)
-        doc = SimpleDocTemplate(buffer, pagesize=(page_width, page_height), leftMargin=0.3 * inch,
-                                rightMargin=0.3 * inch, topMargin=header_height + 0.3 * inch,
-                                bottomMargin=footer_height + 0.2 * inch)
-        page_template_drawer = partial(self._draw_page_template, header_table=header_table, footer_table=footer_table)
-        Story = []
-        details_data = [[Paragraph(f"<b>Supplier / Customer:</b> {primary_data['customer_name']}", styles['MainStyle']),
-                         Paragraph(f"<b>Date:</b> {primary_data['rrf_date']}", styles['MainStyle'])],
-                        [Paragraph(f"<b>Material Type:</b> {primary_data['material_type']}", styles['MainStyle']), ""]]
-        details_table = Table(details_data, colWidths=[5.4 * inch, 2.5 * inch], rowHeights=[0.25 * inch, 0.25 * inch])
-        details_table.setStyle(TableStyle(
-            [('GRID', (0, 0), (-1, -1), 0.5, colors.black), ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-             ('LEFTPADDING', (0, 0), (-1, -1), 5), ('SPAN', (1, 0), (1, 1))]));
-        Story.append(details_table)
-        MAX_PDF_ROWS = 10;
-        H_ROW = 0.25 * inch;
-        D_ROW = 0.22 * inch
-        items_tbl_data, row_heights, styles_dyn = [[Paragraph(f'<b>{h}</b>', styles['MainStyleCenter']) for h in
-                                                    ["Quantity", "Unit", "Product Code", "Lot Number",
-                                                     "Reference #"]]], [H_ROW], [
-            ('LINEBELOW', (0, 0), (-1, 0), 1, colors.black), ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('LEFTPADDING', (0, 0), (-1, -1), 3), ('RIGHTPADDING', (0, 0), (-1, -1), 3)]
-        lines_used = 0
-        for item in items_data:
-            if lines_used >= MAX_PDF_ROWS: break
-            qty = item.get('quantity', 0);
-            # Apply comma formatting to PDF quantity display
-            display_qty = f"{float(qty):,.2f}" if qty else "0.00"
-            items_tbl_data.append([Paragraph(display_qty, styles['MainStyleRight']),
-                                   Paragraph(str(item.get('unit', '')), styles['MainStyle']),
-                                   Paragraph(str(item.get('product_code', '')), styles['MainStyle']),
-                                   Paragraph(str(item.get('lot_number', '')), styles['MainStyle']),
-                                   Paragraph(str(item.get('reference_number', '')), styles['MainStyle'])]);
-            row_heights.append(D_ROW);
-            lines_used += 1
-            if remarks := item.get('remarks', '').strip():
-                if lines_used >= MAX_PDF_ROWS: continue
-                remark_idx = len(items_tbl_data);
-                items_tbl_data.append(
-                    [Paragraph(f"<i><b>Remarks:</b> {remarks}</i>", styles['RemarkStyle']), '', '', '', '']);
-                row_heights.append(D_ROW);
-                lines_used += 1;
-                styles_dyn.append(('SPAN', (0, remark_idx), (-1, remark_idx)))
-        if lines_used < MAX_PDF_ROWS:
-            nf_idx = len(items_tbl_data);
-            items_tbl_data.append(
-                [Paragraph("***** NOTHING FOLLOWS *****", styles['MainStyleCenter']), '', '', '', '']);
-            row_heights.append(D_ROW);
-            styles_dyn.append(('SPAN', (0, nf_idx), (-1, nf_idx)));
-            lines_used += 1
-        while lines_used < MAX_PDF_ROWS: items_tbl_data.append([''] * 5); row_heights.append(D_ROW); lines_used += 1
-        items_table = Table(items_tbl_data, colWidths=[1.1 * inch, 0.6 * inch, 1.8 * inch, 2.4 * inch, 2.0 * inch],
-                            rowHeights=row_heights)
-        items_table.setStyle(TableStyle(styles_dyn));
-        Story.append(items_table)
-        doc.build(Story, onFirstPage=page_template_drawer, onLaterPages=page_template_drawer)
-        buffer.seek(0);
-        return buffer
+        return build_rrf_pdf(primary_data, items_data)
+
+    def _open_batch_print(self):
+        BatchPrintDialog(self.engine, self.username, self.log_audit_trail, DOC_RRF, self).exec()
 
     def _handle_paint_request(self, printer: QPrinter):
         if not self.current_pdf_buffer: return
-        painter = QPainter();
-        if not painter.begin(printer): QMessageBox.critical(self, "Print Error",
-                                                            "Could not initialize painter."); return
-        self.current_pdf_buffer.seek(0);
-        pdf_doc = fitz.open(stream=self.current_pdf_buffer, filetype="pdf")
-        dpi = 300;
-        zoom = dpi / 72.0;
-        mat = fitz.Matrix(zoom, zoom)
-        page_rect_dev_pixels = printer.pageRect(QPrinter.Unit.DevicePixel)
-        for i, page in enumerate(pdf_doc):
-            if i > 0: printer.newPage()
-            pix = page.get_pixmap(matrix=mat, alpha=False)
-            image = QImage(pix.samples, pix.width, pix.height, pix.stride, QImage.Format.Format_RGB888)
-            painter.drawImage(page_rect_dev_pixels.toRect(), image, image.rect())
-        pdf_doc.close();
-        painter.end()
\ No newline at end of file
+        try:
+            paint_pdf(printer, self.current_pdf_buffer, print_dpi=300)
+        except Exception as e:
+            QMessageBox.critical(self, "Print Error", f"An error occurred during printing: {e}")
\ No newline at end of file
@@ -0,0 +1,159 @@
+"""
+Soft delete and restore of documents together with their inventory ledger rows.
+
+Every document page used to flip is_deleted, delete the document's transactions / failed_transactions rows, and on
+restore re-read the primary, secondary and excess tables to rebuild those rows in Python, one statement at a time.
+
+soft_delete_document() and restore_document() do it set-based, as one SaveBatch (a single round trip on
+PostgreSQL), whatever the size of the document:
+- on delete the document's ledger rows move, whole and with their ids, into deleted_ledger_rows;
+- on restore they move back, so the ledger comes back exactly as it was, with no re-read of the lot tables.
+Documents deleted before deleted_ledger_rows existed have nothing to move back; restore_document() returns 0 and the
+page rebuilds their rows as before. Other databases (the pages' SQLite harnesses) delete the ledger rows outright
+and always take that path.
+"""
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import text
+
+from endorsement_store import SaveBatch
+
+RECYCLE_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS deleted_ledger_rows (
+        id BIGSERIAL PRIMARY KEY,
+        document_type VARCHAR(20) NOT NULL,
+        document_ref TEXT NOT NULL,
+        ledger_table VARCHAR(63) NOT NULL,
+        row_data JSONB NOT NULL,
+        deleted_on TIMESTAMP NOT NULL DEFAULT NOW()
+    );
+"""
+RECYCLE_INDEX_DDL = ("CREATE INDEX IF NOT EXISTS idx_deleted_ledger_rows_document "
+                     "ON deleted_ledger_rows (document_type, document_ref);")
+
+# primary / key_column: the document row; ledger_ref: format of its source_ref_no in the ledgers;
+# ledger: {ledger table: WHERE clause (with :ledger_ref) of the rows the document owns};
+# on_delete: statements adding reversal rows (with :ref, :user, :now); on_restore: {ledger table: WHERE clause of
+# the reversal rows to remove}.
+DocumentType = namedtuple('DocumentType', 'primary key_column ledger_ref ledger on_delete on_restore')
+
+
+TYPE_PARAMS = {}  # bind name -> transaction type, for the scopes built by _typed(); part of every _params()
+
+
+def _typed(*types):
+    names = []
+    for t in types:
+        name = next((k for k, v in TYPE_PARAMS.items() if v == t), f"type_{len(TYPE_PARAMS)}")
+        TYPE_PARAMS[name] = t
+        names.append(':' + name)
+    return f"source_ref_no = :ledger_ref AND transaction_type IN ({', '.join(names)})"
+
+
+_QCFP_LOTS = ("(SELECT lot_number, quantity_kg FROM qcfp_endorsements_secondary WHERE system_ref_no = :ref "
+              "UNION ALL SELECT lot_number, quantity_kg FROM qcfp_endorsements_excess WHERE system_ref_no = :ref) l")
+_QCFP_REVERSAL = """
+    INSERT INTO {table} (transaction_date, transaction_type, source_ref_no, product_code, lot_number, quantity_in,
+                         quantity_out, unit, warehouse, encoded_by, remarks)
+    SELECT p.endorsement_date, '{type}', p.system_ref_no, p.product_code, l.lot_number, {qty_in}, {qty_out}, 'KG.',
+           p.warehouse, :user, 'Stock returned on deletion'
+    FROM qcfp_endorsements_primary p, {lots} WHERE p.system_ref_no = :ref
+"""
+
+DOCUMENT_TYPES = {
+    'FG': DocumentType('fg_endorsements_primary', 'system_ref_no', '{}',
+                       {'transactions': _typed('FG_ENDORSEMENT')}, (), {}),
+    'QCF': DocumentType('qcf_endorsements_primary', 'system_ref_no', '{}',
+                        {'failed_transactions': _typed('QC_FAILED_ENDORSEMENT'),
+                         'transactions': _typed('QC_TRANSFER_OUT')}, (), {}),
+    'QCE': DocumentType('qce_endorsements_primary', 'system_ref_no', '{}',
+                        {'transactions': "source_ref_no = :ledger_ref",
+                         'failed_transactions': "source_ref_no = :ledger_ref"}, (), {}),
+    'QCFP': DocumentType(
+        'qcfp_endorsements_primary', 'system_ref_no', '{}',
+        {'failed_transactions': "source_ref_no = :ledger_ref", 'transactions': "source_ref_no = :ledger_ref"},
+        (_QCFP_REVERSAL.format(table='failed_transactions', type='QC_FP_DELETED (RETURN_TO_FAILED)',
+                               qty_in='l.quantity_kg', qty_out='0', lots=_QCFP_LOTS),
+         _QCFP_REVERSAL.format(table='transactions', type='QC_FP_DELETED (RETURN_FROM_FG)',
+                               qty_in='0', qty_out='l.quantity_kg', lots=_QCFP_LOTS)),
+        {'failed_transactions': "source_ref_no = :ledger_ref AND transaction_type LIKE 'QC_FP_DELETED%'",
+         'transactions': "source_ref_no = :ledger_ref AND transaction_type LIKE 'QC_FP_DELETED%'"}),
+    'OUTGOING': DocumentType('outgoing_records_primary', 'id', 'OF-{}-%',
+                             {'transactions': "source_ref_no LIKE :ledger_ref",
+                              'failed_transactions': "source_ref_no LIKE :ledger_ref"}, (), {}),
+    'RRF': DocumentType('rrf_primary', 'rrf_no', '{}',
+                        {'transactions': _typed('RRF_FG_IN', 'RRF_RM_OUT', 'RRF_BREAKDOWN_OUT')}, (), {}),
+    'RR': DocumentType('receiving_reports_primary', 'rr_no', '{}',
+                       {'transactions': _typed('RECEIVING_REPORT')}, (), {}),
+    'DR': DocumentType(
+        'product_delivery_primary', 'dr_no', '{}', {'transactions': _typed('DELIVERY')},
+        ("""INSERT INTO transactions (transaction_date, transaction_type, source_ref_no, product_code, lot_number,
+                                      quantity_in, quantity_out, unit, encoded_by, encoded_on, remarks)
+            SELECT p.delivery_date, 'DELIVERY_DELETED (RETURN)', p.dr_no, b.product_code, b.lot_number, b.quantity_kg,
+                   0, 'KG.', :user, :now, 'Stock returned on deletion of DR ' || p.dr_no
+            FROM product_delivery_primary p JOIN product_delivery_lot_breakdown b ON b.dr_no = p.dr_no
+            WHERE p.dr_no = :ref""",),
+        {'transactions': "source_ref_no = :ledger_ref AND transaction_type LIKE '%DELETED%'"}),
+}
+
+RECYCLE_SQL = """
+    WITH moved AS (DELETE FROM {table} WHERE {scope} RETURNING *)
+    INSERT INTO deleted_ledger_rows (document_type, document_ref, ledger_table, row_data)
+    SELECT :doc_type, :doc_ref, '{table}', to_jsonb(moved) FROM moved
+"""
+
+
+def ensure_soft_delete(connection):
+    connection.execute(text(RECYCLE_TABLE_DDL))
+    connection.execute(text(RECYCLE_INDEX_DDL))
+
+
+def _flag_sql(doc: DocumentType, deleted: bool) -> str:
+    return (f"UPDATE {doc.primary} SET is_deleted = {'TRUE' if deleted else 'FALSE'}, edited_by = :user, "
+            f"edited_on = :now WHERE {doc.key_column} = :ref")
+
+
+def _params(doc_type: str, ref, username: str) -> dict:
+    return {"ref": ref, "ledger_ref": DOCUMENT_TYPES[doc_type].ledger_ref.format(ref), "doc_type": doc_type,
+            "doc_ref": str(ref), "user": username, "now": datetime.now(), **TYPE_PARAMS}
+
+
+def soft_delete_document(connection, doc_type: str, ref, username: str):
+    """Marks the document deleted and takes its ledger rows out of stock. Run inside a transaction."""
+    doc, params = DOCUMENT_TYPES[doc_type], _params(doc_type, ref, username)
+    batch = SaveBatch(connection)
+    batch.add(_flag_sql(doc, True), params)
+    for table, scope in doc.ledger.items():
+        if batch.pipelined:
+            batch.add(RECYCLE_SQL.format(table=table, scope=scope), params)
+        else:
+            batch.add(f"DELETE FROM {table} WHERE {scope}", params)
+    for sql in doc.on_delete:
+        batch.add(sql, params)
+    batch.execute()
+
+
+def restore_document(connection, doc_type: str, ref, username: str) -> int:
+    """
+    Clears the deleted flag and any reversal rows, and moves the document's recycled ledger rows back. Returns how
+    many rows came back; 0 means there were none recycled, and the caller rebuilds them. Run inside a transaction.
+    """
+    doc, params = DOCUMENT_TYPES[doc_type], _params(doc_type, ref, username)
+    batch = SaveBatch(connection)
+    batch.add(_flag_sql(doc, False), params)
+    for table, scope in doc.on_restore.items():
+        batch.add(f"DELETE FROM {table} WHERE {scope}", params)
+    if not batch.pipelined:
+        batch.execute()
+        return 0
+    moves = ",\n".join(f"restored_{i} AS (INSERT INTO {table} SELECT r.* FROM back, "
+                       f"jsonb_populate_record(CAST(NULL AS {table}), back.row_data) AS r "
+                       f"WHERE back.ledger_table = '{table}')" for i, table in enumerate(doc.ledger))
+    batch.add(f"""
+        WITH back AS (DELETE FROM deleted_ledger_rows WHERE document_type = :doc_type AND document_ref = :doc_ref
+                      RETURNING ledger_table, row_data),
+        {moves}
+        SELECT COUNT(*) FROM back
+    """, params)
+    return batch.execute().scalar()
@@ -0,0 +1,72 @@
+import io
+
+import openpyxl
+import pytest
+
+from beginning_import import ImportReport, prepare_chunk, read_sheet_chunks
+
+
+def _read_only_sheet(rows):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = 'MB'
+    for row in rows:
+        ws.append(row)
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    buffer.seek(0)
+    return openpyxl.load_workbook(buffer, read_only=True, data_only=True).worksheets[0]
+
+
+def _stage(ws, chunk_rows):
+    report = ImportReport('beginning.xlsx', 'beginv_sheet1', 'replace', True)
+    staged = [prepare_chunk(chunk, ws.title, report) for _, chunk in read_sheet_chunks(ws, chunk_rows)]
+    return report, staged
+
+
+def test_chunk_of_single_lots_is_staged():
+    ws = _read_only_sheet([
+        ['PRODUCT CODE', 'LOT NUMBER', 'QTY', 'LOCATION'],
+        ['ga-1234', '1000AA-1001AA', 50, 'WH1'],
+        ['GA-1234', '1002AA', 25, 'WH1'],
+        ['GA-5678', '2000BB', 12.5, 'WH2'],
+    ])
+    # chunk_rows=1 puts the single lots in chunks of their own, without any range to expand
+    report, staged = _stage(ws, chunk_rows=1)
+
+    assert not report.rejects and not report.skipped_sheets
+    assert [len(df) for df in staged] == [2, 1, 1]
+    assert report.sheet('MB') == {'read': 3, 'rejected': 0, 'staged': 4}
+    assert list(staged[0]['lot_number']) == ['1000AA', '1001AA']
+    assert list(staged[0]['qty']) == [25, 25]
+    assert staged[2][['product_code', 'lot_number', 'qty', 'location', 'fg_type', 'source_row']].values.tolist() \
+        == [['GA-5678', '2000BB', 12.5, 'WH2', 'MB', 4]]
+
+
+def test_sheet_of_single_lots_only():
+    ws = _read_only_sheet([['PRODUCT', 'LOT', 'QUANTITY']]
+                          + [['GA-1234', f'{1000 + i}AA', i + 1] for i in range(5)])
+    report, staged = _stage(ws, chunk_rows=2)
+
+    assert not report.rejects
+    assert [list(df['lot_number']) for df in staged] == [['1000AA', '1001AA'], ['1002AA', '1003AA'], ['1004AA']]
+
+
+def test_blank_cells_are_rejected_not_fatal():
+    ws = _read_only_sheet([
+        ['PRODUCT CODE', 'LOT NUMBER', 'QTY', 'FG TYPE'],
+        [None, '101', 5, None],
+        ['GA-1234', None, 5, None],
+        ['GA-1234', '102AA', 5, None],
+    ])
+    report, staged = _stage(ws, chunk_rows=10)
+
+    assert [(row, reason) for _, row, reason, *_ in report.rejects] == [(2, "Missing product code"),
+                                                                          (3, "Missing lot number")]
+    assert staged[0][['product_code', 'lot_number', 'fg_type']].values.tolist() == [['GA-1234', '102AA', 'MB']]
+
+
+def test_missing_column_raises_before_any_chunk():
+    ws = _read_only_sheet([['PRODUCT CODE', 'QTY'], ['GA-1234', 10]])
+    with pytest.raises(ValueError, match='LOT_NUMBER'):
+        read_sheet_chunks(ws)
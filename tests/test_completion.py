@@ -0,0 +1,92 @@
+import time
+
+import pytest
+
+QtWidgets = pytest.importorskip("PyQt6.QtWidgets")
+
+from sqlalchemy import create_engine, event, text  # noqa: E402
+
+from completion import SUGGESTION_LIMIT, PrefixIndex, PrefixQueryService  # noqa: E402
+from reference_data import ReferenceDataCache  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def qapp():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'completion.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE legacy_production (lot_number TEXT, prod_id TEXT)"))
+        conn.execute(text("INSERT INTO legacy_production VALUES (:lot, :prod)"),
+                     [{'lot': f"{lot}AA", 'prod': f"P{lot}"} for lot in range(1000, 1100)]
+                     + [{'lot': '12_5%X', 'prod': 'P9'}])
+        conn.execute(text("CREATE TABLE customers (name TEXT, is_deleted BOOLEAN)"))
+        conn.execute(text("INSERT INTO customers VALUES ('Acme Foods', 0), ('ACME Trading', 0), "
+                          "('Beta Mills', 0), ('Acme Closed', 1)"))
+    return engine
+
+
+def test_prefix_index_matches_case_insensitively_in_order():
+    index = PrefixIndex(['gb-200', 'GA-110', None, 'ga-101', 'GB-100', '', 'Ga-102'])
+    assert len(index) == 5
+    assert index.matches('ga') == ['ga-101', 'Ga-102', 'GA-110']
+    assert index.matches(' gA-10 ') == ['ga-101', 'Ga-102']
+    assert index.matches('gc') == []
+    assert index.matches('  ') == []
+
+
+def test_prefix_index_limit_and_substring_matches():
+    index = PrefixIndex([f"{n}AB" for n in range(100, 200)] + ['X150', 'Y1500'])
+    assert index.matches('1', limit=5) == ['100AB', '101AB', '102AB', '103AB', '104AB']
+    assert len(index.matches('1')) == SUGGESTION_LIMIT
+    # Prefix hits first, then substring hits in sort order, all within the limit.
+    assert index.matches('150', contains=True) == ['150AB', 'X150', 'Y1500']
+    assert index.matches('150', limit=2, contains=True) == ['150AB', 'X150']
+
+
+def test_reference_cache_rebuilds_the_index_after_a_change(engine):
+    cache = ReferenceDataCache()
+    index = cache.index(engine, 'customers')
+    assert index.matches('acme') == ['Acme Foods', 'ACME Trading']
+    assert cache.index(engine, 'customers') is index  # unchanged list, same index
+
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO customers VALUES ('acme north', 0)"))
+    cache.invalidate('customers')
+    refreshed = cache.index(engine, 'customers')
+    assert refreshed is not index
+    assert refreshed.matches('acme') == ['Acme Foods', 'acme north', 'ACME Trading']
+
+
+def _wait_for(service, engine, source, typed, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    values = service.lookup(engine, source, typed)
+    while values is None and time.monotonic() < deadline:
+        QtWidgets.QApplication.processEvents()
+        time.sleep(0.01)
+        values = service._cached(engine, source, typed.strip().upper())
+    assert values is not None, f"no answer for {typed!r}"
+    return values
+
+
+def test_prefix_queries_refine_complete_results_locally(qapp, engine):
+    queries = []
+    event.listen(engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+    service = PrefixQueryService()
+    try:
+        # 100 lots start with '10': more than the limit, so longer prefixes still go to the database.
+        assert _wait_for(service, engine, 'production_lots', '10') == [f"{n}AA" for n in range(1000, 1050)]
+        assert _wait_for(service, engine, 'production_lots', '105') == [f"{n}AA" for n in range(1050, 1060)]
+        assert len(queries) == 2
+        # '105' came back complete, so '1057' is filtered from it without a query.
+        assert service.lookup(engine, 'production_lots', '1057') == ['1057AA']
+        assert service.lookup(engine, 'production_lots', '1057aa ') == ['1057AA']
+        assert len(queries) == 2
+        # LIKE wildcards in what was typed are matched literally.
+        assert _wait_for(service, engine, 'production_lots', '12_5%') == ['12_5%X']
+        assert service.lookup(engine, 'production_lots', '') == []
+    finally:
+        service.shutdown()
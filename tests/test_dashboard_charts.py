@@ -0,0 +1,89 @@
+import random
+
+import pytest
+
+QtWidgets = pytest.importorskip("PyQt6.QtWidgets")
+QtCharts = pytest.importorskip("PyQt6.QtCharts")
+
+from PyQt6.QtCore import QObject  # noqa: E402
+
+from dashboard_charts import DashboardCharts  # noqa: E402
+from dashboard_data import DashboardDataService, build_chart_data  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def qapp():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+@pytest.fixture
+def charts(qapp):
+    views = [QtCharts.QChartView() for _ in range(3)]
+    charts = DashboardCharts(*views, in_color='#27ae60', out_color='#c0392b', net_color='#2980b9')
+    yield charts
+    for view in views:
+        view.deleteLater()
+
+
+def fake_payload(rng: random.Random) -> dict:
+    months = rng.randint(6, 12)
+    return {
+        'flow': [{'month': f"2026-{m:02d}", 'total_in': rng.uniform(0, 5e4), 'total_out': rng.uniform(0, 5e4)}
+                 for m in range(1, months + 1)],
+        'volume': [{'transaction_type': f"TYPE_{t}", 'tx_count': rng.randint(1, 5000)}
+                   for t in range(rng.randint(3, 12))],
+        'top_products': [{'product_code': f"P{p:04d}", 'stock_balance': rng.uniform(1, 1e4)}
+                         for p in range(rng.randint(1, 10))],
+    }
+
+
+def owned_objects(charts) -> int:
+    return sum(len(c.findChildren(QObject)) for c in (charts.flow_chart, charts.volume_chart, charts.top_chart))
+
+
+def test_refreshes_reuse_the_chart_objects(qapp, charts):
+    rng = random.Random(42)
+    charts.update(build_chart_data(fake_payload(rng)))
+    qapp.processEvents()
+    objects, series_in, volume_set = owned_objects(charts), charts.series_in, charts.volume_set
+    for _ in range(100):
+        data = build_chart_data(fake_payload(rng))
+        charts.update(data)
+        qapp.processEvents()
+        assert owned_objects(charts) == objects
+
+    assert charts.series_in is series_in and charts.volume_set is volume_set
+    assert charts.flow_axis_x.categories() == data['flow']['categories']
+    assert [p.y() for p in charts.series_net.points()] == pytest.approx(data['flow']['net'])
+    assert charts.volume_axis_y.categories() == data['volume']['categories']
+    assert [charts.volume_set.at(i) for i in range(charts.volume_set.count())] == data['volume']['values']
+    assert [charts.top_set.at(i) for i in range(charts.top_set.count())] == pytest.approx(
+        data['top_products']['values'])
+
+
+def test_refresh_to_empty_data_clears_the_charts(charts):
+    charts.update(build_chart_data(fake_payload(random.Random(1))))
+    charts.update(build_chart_data({}))
+    assert charts.series_in.count() == 0 and charts.volume_set.count() == 0 and charts.top_set.count() == 0
+    assert charts.top_axis_y.max() == 10
+
+
+class CountingService(DashboardDataService):
+    def __init__(self, ttl_seconds):
+        super().__init__(engine=None, ttl_seconds=ttl_seconds)
+        self.fetches = 0
+
+    def _fetch(self) -> dict:
+        self.fetches += 1
+        return {'fetch': self.fetches}
+
+
+def test_data_service_serves_the_snapshot_until_it_expires():
+    service = CountingService(ttl_seconds=60)
+    assert service.get() == service.get() == {'fetch': 1}
+    assert service.get(force=True) == {'fetch': 2}
+    service.invalidate()
+    assert service.get() == {'fetch': 3}
+    expired = CountingService(ttl_seconds=0)
+    expired.get()
+    assert expired.get() == {'fetch': 2}
@@ -0,0 +1,89 @@
+import os
+import socket
+import time
+
+import pytest
+
+controller_module = pytest.importorskip("aiosmtpd.controller")
+
+from email_spool import EmailSpool, SpoolSender, report_email_body  # noqa: E402
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class CollectingHandler:
+    def __init__(self):
+        self.sessions, self.messages = set(), []
+
+    async def handle_DATA(self, server, session, envelope):
+        if b'Subject: Rejected' in envelope.content:
+            return '554 Message rejected'
+        self.sessions.add(id(session))
+        self.messages.append(envelope)
+        return '250 OK'
+
+
+@pytest.fixture
+def smtp_stub():
+    handler = CollectingHandler()
+    controller = controller_module.Controller(handler, hostname='127.0.0.1', port=_free_port())
+    controller.start()
+    yield handler, {'sender_email': 'reports@example.com', 'smtp_server': '127.0.0.1',
+                    'smtp_port': controller.port, 'smtp_security': 'none'}
+    controller.stop()
+
+
+@pytest.fixture
+def spool(tmp_path):
+    return EmailSpool(str(tmp_path / 'spool'))
+
+
+def test_due_messages_share_one_smtp_session(smtp_stub, spool):
+    handler, config = smtp_stub
+    for n in range(3):
+        spool.enqueue(f"Report {n}", ['a@example.com', 'b@example.com'], report_email_body([]), {})
+    sent = []
+    sender = SpoolSender(spool, lambda: config, on_sent=sent.append)
+
+    assert sender.process_due() == 3
+    assert sender.connections_opened == 1 and len(handler.sessions) == 1
+    assert [job['subject'] for job in sent] == ['Report 0', 'Report 1', 'Report 2']
+    assert handler.messages[0].rcpt_tos == ['a@example.com', 'b@example.com']
+    assert not spool.jobs()
+
+
+def test_offline_server_defers_and_retry_delivers(smtp_stub, spool):
+    handler, config = smtp_stub
+    spool.enqueue("Unreachable", ['a@example.com'], report_email_body([]), {})
+    failures = []
+    offline = SpoolSender(spool, lambda: {**config, 'smtp_port': _free_port()},
+                          on_failed=lambda job, error, final: failures.append(final))
+
+    assert offline.process_due() == 0
+    assert failures == [False]
+    job, = spool.jobs()
+    assert job['attempts'] == 1 and job['last_error'] and job['next_attempt_at'] > time.time()
+    assert not spool.due_jobs()
+
+    job['next_attempt_at'] = 0
+    spool._write_job(os.path.join(spool.root, job['id']), job)
+    assert SpoolSender(spool, lambda: config).process_due() == 1
+    assert not spool.jobs() and len(handler.messages) == 1
+
+
+def test_permanent_rejection_moves_message_to_failed(smtp_stub, spool):
+    handler, config = smtp_stub
+    spool.enqueue("Rejected", ['a@example.com'], report_email_body([]), {})
+    spool.enqueue("Accepted", ['a@example.com'], report_email_body([]), {})
+    failures = []
+    sender = SpoolSender(spool, lambda: config, on_failed=lambda job, error, final: failures.append((error, final)))
+
+    assert sender.process_due() == 1
+    (error, final), = failures
+    assert error.startswith('554') and final
+    assert not spool.jobs()
+    assert len(os.listdir(spool.failed_dir)) == 1
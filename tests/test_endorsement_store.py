@@ -0,0 +1,136 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine, event, text
+
+from endorsement_store import EndorsementTables, SaveBatch, endorsement_batch
+from ledger import LedgerRow
+
+TABLES = EndorsementTables('end_primary', ('end_secondary', 'end_excess'), {'transactions': ('FG_ENDORSEMENT',)})
+REF = 'FGE-20260314-0001'
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'endorsements.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE end_primary (system_ref_no TEXT PRIMARY KEY, product_code TEXT, "
+                          "quantity_kg NUMERIC, remarks TEXT, encoded_by TEXT, edited_by TEXT)"))
+        for table in TABLES.lot_tables:
+            conn.execute(text(f"CREATE TABLE {table} (id INTEGER PRIMARY KEY, system_ref_no TEXT, lot_number TEXT, "
+                              f"quantity_kg NUMERIC)"))
+        conn.execute(text("CREATE TABLE transactions (id INTEGER PRIMARY KEY, transaction_date DATE, "
+                          "transaction_type TEXT, source_ref_no TEXT, product_code TEXT, lot_number TEXT, "
+                          "quantity_in NUMERIC, quantity_out NUMERIC, unit TEXT, remarks TEXT)"))
+    return engine
+
+
+@pytest.fixture
+def writes(engine):
+    """INSERT/UPDATE/DELETE statements sent, as (verb, table)."""
+    sent = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        words = statement.split()
+        verb = words[0].upper()
+        if verb in ('INSERT', 'UPDATE', 'DELETE'):
+            sent.append((verb, words[2] if verb in ('INSERT', 'DELETE') else words[1]))
+
+    event.listen(engine, "before_cursor_execute", record)
+    return sent
+
+
+def save(engine, lots, remarks='new', is_update=False, quantity=Decimal('25.00')):
+    primary = {"system_ref_no": REF, "product_code": "OA14430E", "quantity_kg": float(quantity * len(lots)),
+               "remarks": remarks, "encoded_by": "enc", "edited_by": "ed"}
+    rows = [{"system_ref_no": REF, "lot_number": lot, "quantity_kg": quantity} for lot in lots]
+    ledger = [LedgerRow(transaction_date=date(2026, 3, 14), transaction_type="FG_ENDORSEMENT", source_ref_no=REF,
+                        product_code="OA14430E", lot_number=row["lot_number"], quantity_in=row["quantity_kg"],
+                        remarks=remarks) for row in rows]
+    with engine.begin() as conn:
+        endorsement_batch(conn, TABLES, primary, {"end_secondary": rows[:-1], "end_excess": rows[-1:]},
+                          {"transactions": ledger}, is_update).execute()
+
+
+def stored(engine, table, columns='id, lot_number'):
+    with engine.connect() as conn:
+        return [tuple(r) for r in conn.execute(text(f"SELECT {columns} FROM {table} ORDER BY rowid"))]
+
+
+def test_new_endorsement_inserts_every_row(engine):
+    save(engine, ['1000AA', '1001AA', '1002AA'])
+    assert [lot for _, lot in stored(engine, 'end_secondary')] == ['1000AA', '1001AA']
+    assert [lot for _, lot in stored(engine, 'end_excess')] == ['1002AA']
+    assert stored(engine, 'transactions', 'lot_number, quantity_in, remarks') == [
+        ('1000AA', 25, 'new'), ('1001AA', 25, 'new'), ('1002AA', 25, 'new')]
+
+
+def test_remarks_only_edit_writes_only_the_primary(engine, writes):
+    lots = [f'{1000 + i}AA' for i in range(50)]
+    save(engine, lots)
+    before = {table: stored(engine, table) for table in ('end_secondary', 'end_excess', 'transactions')}
+    writes.clear()
+
+    save(engine, lots, remarks='edited', is_update=True)
+
+    assert writes == [('UPDATE', 'end_primary')]
+    assert {table: stored(engine, table) for table in before} == before
+    assert stored(engine, 'end_primary', 'remarks, encoded_by') == [('edited', 'enc')]
+
+
+def test_edit_writes_only_the_changed_lots(engine, writes):
+    save(engine, ['1000AA', '1001AA', '1002AA', '1003AA'])
+    kept = stored(engine, 'end_secondary')[:2]
+    writes.clear()
+
+    save(engine, ['1000AA', '1001AA', '1009AA', '1003AA'], is_update=True)
+
+    assert stored(engine, 'end_secondary')[:2] == kept
+    assert sorted(lot for _, lot in stored(engine, 'end_secondary')) == ['1000AA', '1001AA', '1009AA']
+    assert stored(engine, 'transactions', 'lot_number') == [('1000AA',), ('1001AA',), ('1003AA',), ('1009AA',)]
+    assert sorted(writes) == [('DELETE', 'end_secondary'), ('DELETE', 'transactions'), ('INSERT', 'end_secondary'),
+                              ('INSERT', 'transactions'), ('UPDATE', 'end_primary')]
+
+
+def test_quantity_change_replaces_the_ledger_rows(engine):
+    save(engine, ['1000AA', '1001AA'])
+    save(engine, ['1000AA', '1001AA'], is_update=True, quantity=Decimal('30'))
+    assert stored(engine, 'transactions', 'lot_number, quantity_in') == [('1000AA', 30), ('1001AA', 30)]
+
+
+def test_other_transaction_types_of_the_ref_are_left_alone(engine):
+    save(engine, ['1000AA', '1001AA'])
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO transactions (transaction_type, source_ref_no, product_code, lot_number) "
+                          "VALUES ('QC_TRANSFER_OUT', :ref, 'OA14430E', '1000AA')"), {"ref": REF})
+    save(engine, ['1001AA'], is_update=True)
+    assert stored(engine, 'transactions', 'transaction_type, lot_number') == [
+        ('FG_ENDORSEMENT', '1001AA'), ('QC_TRANSFER_OUT', '1000AA')]
+
+
+def test_transaction_types_are_bound_parameters(engine):
+    save(engine, ['1000AA'])
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+    save(engine, ['1001AA'], is_update=True)
+    scoped = [s for s in statements if 'transaction_type IN' in s]
+    assert scoped and not any("'FG_ENDORSEMENT'" in s for s in scoped)
+
+
+def test_sync_rows_matches_identical_rows_as_a_multiset(engine):
+    with engine.begin() as conn:
+        batch = SaveBatch(conn)
+        batch.insert_rows('end_secondary', [{"system_ref_no": REF, "lot_number": '1000AA', "quantity_kg": 5}] * 3)
+        batch.execute()
+    with engine.begin() as conn:
+        batch = SaveBatch(conn)
+        batch.sync_rows('end_secondary', [{"system_ref_no": REF, "lot_number": '1000AA', "quantity_kg": '5.000'}] * 2,
+                        "system_ref_no = :ref", {"ref": REF}, ignore=('system_ref_no',))
+        batch.execute()
+    assert [lot for _, lot in stored(engine, 'end_secondary')] == ['1000AA', '1000AA']
+    with engine.begin() as conn:
+        batch = SaveBatch(conn)
+        batch.sync_rows('end_secondary', [], "system_ref_no = :ref", {"ref": REF})
+        batch.execute()
+    assert stored(engine, 'end_secondary') == []
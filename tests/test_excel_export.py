@@ -0,0 +1,55 @@
+import io
+
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+from sqlalchemy import create_engine, text
+
+from excel_export import DataFrameSheet, ExportSheet, QTY_FORMAT, QuerySheet, write_workbook
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'export.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE stock (product_code TEXT, lot_number TEXT, qty NUMERIC, id INTEGER)"))
+        conn.execute(text("INSERT INTO stock VALUES (:p, :l, :q, :i)"),
+                     [{'p': 'GA-1234', 'l': f"{1000 + i}X", 'q': i * 2.5, 'i': i} for i in range(3)])
+    return engine
+
+
+def test_export_sheet_is_abstract():
+    with pytest.raises(TypeError):
+        ExportSheet('Sheet')
+
+
+def test_dataframe_and_query_sheets_round_trip(tmp_path, engine):
+    df = pd.DataFrame({'PRODUCT_CODE': ['GA-1234', 'GB-5678'], 'LOT_NUMBER': ['101AA', None],
+                       'TOTAL_QTY': [12.5, 3.0]})
+    path = tmp_path / 'report.xlsx'
+    counts = write_workbook(str(path), [
+        DataFrameSheet('Summary', df),
+        QuerySheet('Stock', engine, "SELECT product_code, lot_number, qty, id FROM stock WHERE qty > :min ORDER BY id",
+                   {'min': 0}, exclude_columns=('id',), number_columns=['qty'], total_rows=2),
+    ])
+    assert counts == {'Summary': 2, 'Stock': 2}
+
+    wb = load_workbook(path)
+    assert wb.sheetnames == ['Summary', 'Stock']
+    summary = wb['Summary']
+    assert [list(row) for row in summary.iter_rows(values_only=True)] == [
+        ['PRODUCT_CODE', 'LOT_NUMBER', 'TOTAL_QTY'], ['GA-1234', '101AA', 12.5], ['GB-5678', None, 3]]
+    assert summary['A1'].font.bold
+    assert summary['C2'].number_format == QTY_FORMAT
+    stock = wb['Stock']
+    assert [list(row) for row in stock.iter_rows(values_only=True)] == [
+        ['product_code', 'lot_number', 'qty'], ['GA-1234', '1001X', 2.5], ['GA-1234', '1002X', 5]]
+    assert stock['C3'].number_format == QTY_FORMAT
+    assert not list(tmp_path.glob('tmp*.xlsx'))  # the temporary file was moved into place
+
+
+def test_writes_to_file_object_and_truncates_sheet_names():
+    buffer = io.BytesIO()
+    write_workbook(buffer, [DataFrameSheet('A sheet name well over the Excel limit', pd.DataFrame({'a': [1]}))])
+    buffer.seek(0)
+    assert load_workbook(buffer).sheetnames == ['A sheet name well over the Exce']
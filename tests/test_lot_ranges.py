@@ -0,0 +1,91 @@
+import random
+import time
+from decimal import Decimal
+
+import pandas as pd
+import pytest
+
+from lot_ranges import ASSIGN_TO_LAST_IN_RANGE, expand_lot_ranges, split_lots, split_range_evenly
+
+
+def expand_rowwise(df: pd.DataFrame) -> pd.DataFrame:
+    """The original df.iterrows() implementation from the beginning-balance tools."""
+    rows = []
+    for _, row in df.iterrows():
+        lot_number, quantity = str(row['LOT_NUMBER']), row['QTY']
+        result = split_range_evenly(lot_number, quantity)
+        base = {c: row[c] for c in df.columns}
+        if result:
+            rows.extend({**base, 'LOT_NUMBER': lot, 'QTY': q} for lot, q in result)
+        else:
+            rows.append({**base, 'LOT_NUMBER': lot_number, 'QTY': round(float(quantity), 2)})
+    return pd.DataFrame(rows, columns=df.columns)
+
+
+def random_sheet(rng: random.Random, n: int, ranges: bool = True) -> pd.DataFrame:
+    def lot():
+        kind = rng.random() if ranges else 0
+        start = rng.randint(0, 9999)
+        suffix = rng.choice(['', 'X', 'AA', 'b'])
+        if kind < 0.45:
+            return f"{start}{suffix}"
+        if kind < 0.85:
+            return f"{start}{suffix}-{start + rng.randint(-2, 12)}{suffix}"
+        return rng.choice([f"{start}{suffix}-", f"{start}A-{start + 3}B", f"{start}-{start}-{start}", "N/A",
+                           f" {start}{suffix} - {start + 2}{suffix} ", f"A{start}-A{start + 4}", "-"])
+
+    return pd.DataFrame({'PRODUCT_CODE': [f"PC{rng.randint(1, 500):04d}" for _ in range(n)],
+                         'LOT_NUMBER': [lot() for _ in range(n)],
+                         'QTY': [round(rng.uniform(0, 5000), rng.choice([0, 2, 3])) for _ in range(n)],
+                         'LOCATION': [rng.choice(['WH1', 'WH2', 'WH4']) for _ in range(n)],
+                         'BOX_NUMBER': [rng.randint(1, 300) for _ in range(n)]})
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_vectorised_expansion_matches_rowwise(seed):
+    rng = random.Random(seed)
+    for _ in range(10):
+        sheet = random_sheet(rng, rng.randint(1, 60))
+        pd.testing.assert_frame_equal(expand_lot_ranges(sheet), expand_rowwise(sheet), check_dtype=False)
+
+
+def test_expanded_quantities_conserve_row_total():
+    sheet = random_sheet(random.Random(7), 200)
+    for _, source in sheet.iterrows():
+        pieces = split_range_evenly(str(source['LOT_NUMBER']), source['QTY'])
+        if pieces:
+            assert abs(sum(q for _, q in pieces) - source['QTY']) <= 0.005 * len(pieces) + 1e-9
+
+
+@pytest.mark.parametrize("lots", [['100A', '101A', '102B'], ['7'], ['N/A', '12']])
+def test_sheet_without_ranges_is_returned_row_for_row(lots):
+    sheet = pd.DataFrame({'LOT_NUMBER': lots, 'QTY': [1.005, 2.5, 3][:len(lots)], 'LOCATION': 'WH1'})
+    out = expand_lot_ranges(sheet)
+    pd.testing.assert_frame_equal(out, expand_rowwise(sheet), check_dtype=False)
+    assert out['LOT_NUMBER'].tolist() == lots
+
+
+def test_random_sheet_without_ranges():
+    sheet = random_sheet(random.Random(3), 500, ranges=False)
+    pd.testing.assert_frame_equal(expand_lot_ranges(sheet), expand_rowwise(sheet), check_dtype=False)
+
+
+def test_split_lots_excess_handling():
+    assert split_lots(105, 10, '100A-115A', True, ASSIGN_TO_LAST_IN_RANGE)['breakdown'][-1]['quantity_kg'] == 15
+    assert split_lots(105, 10, '100A-115A', True, ASSIGN_TO_LAST_IN_RANGE,
+                      merge_assigned_excess=False)['excess'] == [{'lot_number': '115A', 'quantity_kg': Decimal(5)}]
+    assert split_lots(105, 10, '0100A-0115A', True)['excess'][0]['lot_number'] == '0116A'
+    assert split_lots(105, 10, '100A-115A', True, number_excess_after_range=False)['excess'][0]['lot_number'] == '110A'
+
+
+if __name__ == "__main__":
+    # Benchmark on a 100k-row beginning inventory sheet: PYTHONPATH=. python tests/test_lot_ranges.py
+    sheet = random_sheet(random.Random(1), 100_000)
+    started = time.perf_counter()
+    fast = expand_lot_ranges(sheet)
+    fast_s = time.perf_counter() - started
+    started = time.perf_counter()
+    expand_rowwise(sheet)
+    slow_s = time.perf_counter() - started
+    print(f"100k rows -> {len(fast):,} lots: vectorised {fast_s:.2f}s, iterrows {slow_s:.2f}s "
+          f"({slow_s / max(fast_s, 1e-9):.0f}x)")
@@ -0,0 +1,79 @@
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, text
+
+QtWidgets = pytest.importorskip("PyQt6.QtWidgets")
+
+from lot_ranges import expand_lot_range  # noqa: E402
+from outgoing_form import OutgoingFormPage  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def qapp():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'outgoing.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE outgoing_records_primary (id INTEGER PRIMARY KEY, production_form_id TEXT, "
+                          "date_out DATE, activity TEXT, is_deleted BOOLEAN, edited_by TEXT, edited_on TIMESTAMP)"))
+        conn.execute(text("CREATE TABLE outgoing_records_items (id INTEGER PRIMARY KEY, primary_id INTEGER, "
+                          "product_code TEXT, lot_used TEXT, quantity_required_kg NUMERIC, new_lot_details TEXT, "
+                          "status TEXT, quantity_produced TEXT, warehouse TEXT)"))
+        for table in ('transactions', 'failed_transactions'):
+            conn.execute(text(f"CREATE TABLE {table} (id INTEGER PRIMARY KEY, transaction_date DATE, "
+                              f"transaction_type TEXT, source_ref_no TEXT, product_code TEXT, lot_number TEXT, "
+                              f"quantity_in NUMERIC, quantity_out NUMERIC, unit TEXT, warehouse TEXT, "
+                              f"encoded_by TEXT, encoded_on TIMESTAMP, remarks TEXT)"))
+        conn.execute(text("INSERT INTO outgoing_records_primary VALUES (7, 'PF-7', :d, 'MIXING', 1, 'old', NULL)"),
+                     {"d": date(2024, 5, 2)})
+        conn.execute(text("""
+            INSERT INTO outgoing_records_items (primary_id, product_code, lot_used, quantity_required_kg,
+                                                new_lot_details, status, quantity_produced, warehouse) VALUES
+                (7, 'P100', '100A-101A', 50, '', 'PASSED', '', 'WH1'),
+                (7, 'P200', '200B', 10, '', 'FAILED', '', 'WH2'),
+                (7, 'P300', '300C', 30, '301C-302C', 'PASSED', 'COMPLETION', 'WH1')
+        """))
+    return engine
+
+
+def test_restore_rebuilds_ledger_rows_without_recycled_rows(qapp, engine, monkeypatch):
+    # SQLite has no deleted_ledger_rows, so restore_document() returns 0 and the page rebuilds the rows itself.
+    monkeypatch.setattr(QtWidgets.QMessageBox, "question",
+                        lambda *args, **kwargs: QtWidgets.QMessageBox.StandardButton.Yes)
+    errors = []
+    monkeypatch.setattr(QtWidgets.QMessageBox, "critical", lambda parent, title, message: errors.append(message))
+    monkeypatch.setattr(QtWidgets.QMessageBox, "information", lambda *args: None)
+
+    table = QtWidgets.QTableWidget(1, 2)
+    table.setItem(0, 0, QtWidgets.QTableWidgetItem("7"))
+    table.setItem(0, 1, QtWidgets.QTableWidgetItem("PF-7"))
+    table.setCurrentCell(0, 0)
+    audit = []
+    page = SimpleNamespace(deleted_records_table=table, engine=engine, username="tester",
+                           log_audit_trail=lambda action, details: audit.append(action),
+                           _parse_lot_range=expand_lot_range, _refresh_all_data_views=lambda: None)
+
+    OutgoingFormPage._restore_record(page)
+
+    assert errors == []
+    assert audit == ["RESTORE_OUTGOING_FORM"]
+    with engine.connect() as conn:
+        assert not conn.execute(text("SELECT is_deleted FROM outgoing_records_primary WHERE id = 7")).scalar()
+        passed = conn.execute(text("SELECT source_ref_no, transaction_type, lot_number, quantity_in, quantity_out "
+                                   "FROM transactions ORDER BY id")).all()
+        failed = conn.execute(text("SELECT source_ref_no, transaction_type, lot_number, quantity_out "
+                                   "FROM failed_transactions")).all()
+    assert [(r[0], r[1], r[2], Decimal(str(r[3])), Decimal(str(r[4]))) for r in passed] == [
+        ('OF-7-1', 'OUTGOING_FORM', '100A', 0, 25),
+        ('OF-7-1', 'OUTGOING_FORM', '101A', 0, 25),
+        ('OF-7-3', 'REPROCESSING-OUT', '300C', 0, 30),
+        ('OF-7-3', 'REPROCESSING-IN', '301C', 15, 0),
+        ('OF-7-3', 'REPROCESSING-IN', '302C', 15, 0),
+    ]
+    assert [(r[0], r[1], r[2], Decimal(str(r[3]))) for r in failed] == [('OF-7-2', 'OUTGOING_FORM', '200B', 10)]
@@ -0,0 +1,54 @@
+import pytest
+
+fitz = pytest.importorskip("fitz")
+pytest.importorskip("reportlab")
+pytest.importorskip("qrcode")
+
+import document_resources  # noqa: E402
+from print_documents import DOC_DR, DOC_RR, DOC_RRF, render_print_job, render_spool_pdf  # noqa: E402
+
+JOBS = [
+    (DOC_DR, '100001', {"dr_no": '100001', "delivery_date": '03/14/2026', "charge_to": 'SAMPLE CUSTOMER',
+                        "deliver_to": 'SAMPLE CUSTOMER', "address": '24 Diamond Road\nCaloocan City', "po_no": 'PO-1',
+                        "terms": '30 DAYS'},
+     [{'product_code': 'PC-0001', 'quantity': 500, 'unit': 'KG', 'no_of_packing': 20, 'weight_per_pack': 25,
+       'lot_no_1': '1234AA-1240AA', 'unit_price': 10.5}] * 4, {}),
+    (DOC_RRF, '15000', {"rrf_no": '15000', "rrf_date": '03/14/26', "customer_name": 'SAMPLE CUSTOMER',
+                        "material_type": 'FG', "prepared_by": 'admin'},
+     [{'quantity': 100, 'unit': 'KG', 'product_code': 'PC-0001', 'lot_number': '1234AA',
+       'reference_number': 'DR-100001', 'remarks': ''}] * 5, {}),
+    (DOC_RR, 'RR-0001', {"rr_no": 'RR-0001', "receive_date": '03/14/26', "receive_from": 'SAMPLE CUSTOMER',
+                         "pull_out_form_no": 'POF-1', "received_by": 'qc', "reported_by": 'wh', "remarks": 'Sample'},
+     [{'material_code': 'PC-0001', 'lot_no': '1234AA', 'quantity_kg': 100, 'status': 'OK', 'location': 'A1'}] * 5, {}),
+]
+
+
+def page_texts(pdf_bytes: bytes) -> list:
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        return [page.get_text() for page in doc]
+
+
+def test_fonts_and_stylesheets_are_built_once_per_process():
+    document_resources.warm_up()
+    assert document_resources.font_family('Arial') is document_resources.font_family('Arial')
+    for doc_type in document_resources.STYLESHEET_BUILDERS:
+        assert document_resources.stylesheet(doc_type) is document_resources.stylesheet(doc_type)
+
+
+@pytest.mark.parametrize("job", JOBS, ids=[job[0] for job in JOBS])
+def test_documents_render_the_same_with_shared_resources(job):
+    document_resources.clear_caches()
+    cold = page_texts(render_print_job(job))
+    warm = page_texts(render_print_job(job))
+    assert cold == warm
+    assert job[1] in cold[0]
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_spool_keeps_job_order(max_workers):
+    progress = []
+    spool = page_texts(render_spool_pdf(JOBS * 2, max_workers=max_workers,
+                                        progress_callback=lambda done, total: progress.append((done, total))))
+    expected = [text for job in JOBS * 2 for text in page_texts(render_print_job(job))]
+    assert spool == expected
+    assert progress[-1] == (6, 6)
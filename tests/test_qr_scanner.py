@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+
+pytest.importorskip("PyQt6.QtGui")
+
+import qr_scanner  # noqa: E402
+from qr_scanner import QrDecoder, ScanDebouncer, parse_source  # noqa: E402
+
+
+def test_parse_source():
+    assert parse_source(0) == 0
+    assert parse_source(' 2 ') == 2
+    assert parse_source('') == 0
+    assert parse_source('clips/dr.mp4') == 'clips/dr.mp4'
+
+
+def test_debouncer_fires_once_while_the_code_stays_in_view():
+    now = [0.0]
+    debouncer = ScanDebouncer(hold_seconds=2.0, clock=lambda: now[0])
+    fired = []
+    for t, code in [(0.0, 'DR1'), (0.5, 'DR1'), (1.5, 'DR2'), (2.4, 'DR1'), (5.0, 'DR1'), (5.1, 'DR2')]:
+        now[0] = t
+        if debouncer.accept(code):
+            fired.append((t, code))
+    assert fired == [(0.0, 'DR1'), (1.5, 'DR2'), (5.0, 'DR1'), (5.1, 'DR2')]
+
+
+def test_decoder_drops_frames_that_arrive_while_it_is_busy(monkeypatch):
+    busy, release = threading.Event(), threading.Event()
+    decoded = []
+
+    def fake_decode(frame, decode_width):
+        if frame == 'frame-1':
+            busy.set()
+            release.wait(5)
+        return [f"{frame}@{decode_width}"]
+
+    monkeypatch.setattr(qr_scanner, 'decode_frame', fake_decode)
+    decoder = QrDecoder(decoded.append, decode_width=320)
+    decoder.start()
+    try:
+        decoder.submit('frame-1')
+        assert busy.wait(5)
+        for n in (2, 3, 4):
+            decoder.submit(f'frame-{n}')
+        release.set()
+        decoder.drain()
+    finally:
+        decoder.stop()
+        decoder.join(5)
+    assert decoded == ['frame-1@320', 'frame-4@320']
+    assert decoder.frames_decoded == 2
+
+
+@pytest.mark.skipif(not qr_scanner.CAMERA_AVAILABLE, reason="opencv-python and pyzbar are required")
+def test_decode_frame_reads_a_downscaled_qr_code():
+    np = pytest.importorskip("numpy")
+    qrcode = pytest.importorskip("qrcode")
+    code = np.array(qrcode.make('100234').convert('L'), dtype=np.uint8)
+    frame = np.full((1080, 1920), 255, dtype=np.uint8)
+    frame[200:200 + code.shape[0] * 2, 600:600 + code.shape[1] * 2] = np.kron(code, np.ones((2, 2), dtype=np.uint8))
+    bgr = np.stack([frame] * 3, axis=-1)
+    assert qr_scanner.decode_frame(bgr) == ['100234']
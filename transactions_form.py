@@ -3,13 +3,15 @@ import traceback
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit,
     QPushButton, QTableWidget, QTableWidgetItem, QHeaderView,
-    QMessageBox, QGroupBox, QDialog, QFormLayout, QDialogButtonBox
+    QMessageBox, QGroupBox, QDialog, QFormLayout, QDialogButtonBox, QCheckBox
 )
 from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QFont, QColor
 from sqlalchemy import text, Engine
 import qtawesome as qta
 
+from period_archive import with_archive
+
 
 class UpperCaseLineEdit(QLineEdit):
     """A QLineEdit that automatically converts its text to uppercase."""
@@ -63,6 +65,11 @@ class LotAuditDialog(QDialog):
         header_layout.addRow(self.final_balance_label)
         main_layout.addWidget(header_group)
 
+        self.archived_check = QCheckBox("Include archived movements")
+        self.archived_check.setToolTip("Also show the movements of closed periods moved to the archive.")
+        self.archived_check.toggled.connect(self._load_audit_data)
+        main_layout.addWidget(self.archived_check)
+
         # Transaction Table (Audit Log)
         self.table = QTableWidget()
         self.table.setColumnCount(7)
@@ -89,6 +96,7 @@ class LotAuditDialog(QDialog):
     def _load_audit_data(self):
         """Loads all transactions and beginning inventory for the lot and calculates the running balance."""
         self.table.setRowCount(0)
+        self.table.clearSpans()
 
         # SQL using PostgreSQL Window Functions for running balance calculation
         query_str = """
@@ -104,7 +112,7 @@ class LotAuditDialog(QDialog):
                     location,
                     0 AS sort_order, -- Ensure BEGINV is processed first
                     '' AS source_ref_no
-                FROM beginv_sheet1
+                FROM {beginv} b
                 WHERE lot_number = :lot_num
 
                 UNION ALL
@@ -120,7 +128,7 @@ class LotAuditDialog(QDialog):
                     t.warehouse AS location,
                     1 AS sort_order, -- Transactions come after BEGINV
                     t.source_ref_no
-                FROM transactions t
+                FROM {ledger} t
                 WHERE t.lot_number = :lot_num
             )
             SELECT 
@@ -140,8 +148,13 @@ class LotAuditDialog(QDialog):
 
         try:
             with self.engine.connect() as conn:
+                include_archived = self.archived_check.isChecked()
+                beginv = with_archive(conn, 'beginv_sheet1', ('lot_number', 'qty', 'location'), include_archived)
+                ledger = with_archive(conn, 'transactions', ('encoded_by', 'quantity_in', 'quantity_out',
+                                                             'transaction_date', 'transaction_type', 'lot_number',
+                                                             'warehouse', 'source_ref_no'), include_archived)
                 movements_result = conn.execute(
-                    text(query_str), {'lot_num': self.lot_number}
+                    text(query_str.format(beginv=beginv, ledger=ledger)), {'lot_num': self.lot_number}
                 ).mappings().all()
 
             if not movements_result: